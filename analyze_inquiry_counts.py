@@ -8,11 +8,14 @@ import numpy as np
 import json
 from datetime import datetime
 
+from bootstrap_engine import ci_dict, deal_size_bucket, format_ci, median_cis
+from listing_facts import load_facts
+
 def analyze_inquiry_counts():
     """Analyze inquiry counts across different SBA statuses and outcomes."""
     
-    # Load the launch date analysis which has inquiry counts
-    df = pd.read_csv('launch_date_analysis_v2.csv')
+    # Load the listing fact table, which has inquiry counts
+    df = load_facts()
     
     print("\n" + "="*80)
     print("INQUIRY COUNT ANALYSIS BY SBA STATUS")
@@ -36,14 +39,19 @@ def analyze_inquiry_counts():
     print("\n2. INQUIRY STATISTICS FOR SOLD DEALS")
     print("-"*50)
     
-    sold_df = df[df['status'] == 'sold']
+    sold_df = df[df['status'] == 'sold'].copy()
+    sold_df['size_category'] = deal_size_bucket(sold_df['closed_commission'])
+    
+    # Bootstrap CIs for the medians, resampling within deal-size buckets
+    sold_cis = median_cis(sold_df, ['total_inquiries'], 'sba_status', ['yes', 'no', 'unknown'], 'size_category')
     
     for sba_status in ['yes', 'no', 'unknown']:
         status_df = sold_df[sold_df['sba_status'] == sba_status]
         if len(status_df) > 0:
             print(f"\nSBA Status: {sba_status.upper()} (SOLD)")
             print(f"  Count: {len(status_df)}")
-            print(f"  Median inquiries: {status_df['total_inquiries'].median():.0f}")
+            print(f"  Median inquiries: {status_df['total_inquiries'].median():.0f} "
+                  f"{format_ci(sold_cis, 'total_inquiries', sba_status, 0)}")
             print(f"  Mean inquiries: {status_df['total_inquiries'].mean():.1f}")
             print(f"  25th percentile: {status_df['total_inquiries'].quantile(0.25):.0f}")
             print(f"  75th percentile: {status_df['total_inquiries'].quantile(0.75):.0f}")
@@ -103,33 +111,34 @@ def analyze_inquiry_counts():
     print("\n6. GENERATING ENHANCED VERIFICATION DATA")
     print("-"*50)
     
-    # Load SBA actual usage data
-    sba_usage_df = pd.read_csv('sba_actual_usage_analysis.csv')
-    
-    # Merge with launch date data to get inquiry counts
-    merged_df = pd.merge(
-        sba_usage_df,
-        df[['id', 'total_inquiries', 'days_on_market', 'days_under_loi', 'days_to_loi']],
-        on='id',
-        how='left'
-    )
+    # SBA-prequalified listings, which the usage analysis covers
+    merged_df = df[df['sba_status'] == 'yes'][[
+        'id', 'name', 'status', 'closed_at', 'closed_commission', 'total_lois', 'sba_lois', 'has_sba_loi',
+        'winning_loi_sba', 'pct_sba_lois', 'total_inquiries', 'days_on_market', 'days_under_loi', 'days_to_loi']]
     
     # Filter to sold deals only
     sold_merged = merged_df[merged_df['status'] == 'sold'].copy()
     
     # Calculate statistics by actual financing type
+    sold_merged['size_category'] = deal_size_bucket(sold_merged['closed_commission'])
+    financed_cis = median_cis(sold_merged, ['total_inquiries', 'days_on_market'], 'winning_loi_sba', [True, False],
+                              'size_category')
     sba_financed = sold_merged[sold_merged['winning_loi_sba'] == True]
     non_sba_financed = sold_merged[sold_merged['winning_loi_sba'] == False]
     
     print(f"\nDEALS USING SBA FINANCING (n={len(sba_financed)}):")
-    print(f"  Median inquiries: {sba_financed['total_inquiries'].median():.0f}")
+    print(f"  Median inquiries: {sba_financed['total_inquiries'].median():.0f} "
+          f"{format_ci(financed_cis, 'total_inquiries', True, 0)}")
     print(f"  Mean inquiries: {sba_financed['total_inquiries'].mean():.1f}")
-    print(f"  Median days on market: {sba_financed['days_on_market'].median():.0f}")
+    print(f"  Median days on market: {sba_financed['days_on_market'].median():.0f} "
+          f"{format_ci(financed_cis, 'days_on_market', True, 0)}")
     
     print(f"\nDEALS USING NON-SBA FINANCING (n={len(non_sba_financed)}):")
-    print(f"  Median inquiries: {non_sba_financed['total_inquiries'].median():.0f}")
+    print(f"  Median inquiries: {non_sba_financed['total_inquiries'].median():.0f} "
+          f"{format_ci(financed_cis, 'total_inquiries', False, 0)}")
     print(f"  Mean inquiries: {non_sba_financed['total_inquiries'].mean():.1f}")
-    print(f"  Median days on market: {non_sba_financed['days_on_market'].median():.0f}")
+    print(f"  Median days on market: {non_sba_financed['days_on_market'].median():.0f} "
+          f"{format_ci(financed_cis, 'days_on_market', False, 0)}")
     
     # Save enhanced data
     enhanced_df = merged_df.copy()
@@ -141,27 +150,32 @@ def analyze_inquiry_counts():
             'sba_sold': {
                 'median': int(sold_df[sold_df['sba_status'] == 'yes']['total_inquiries'].median()) if len(sold_df[sold_df['sba_status'] == 'yes']) > 0 else 0,
                 'mean': float(sold_df[sold_df['sba_status'] == 'yes']['total_inquiries'].mean()) if len(sold_df[sold_df['sba_status'] == 'yes']) > 0 else 0,
-                'count': len(sold_df[sold_df['sba_status'] == 'yes'])
+                'count': len(sold_df[sold_df['sba_status'] == 'yes']),
+                'median_ci': ci_dict(sold_cis, 'total_inquiries', 'yes')
             },
             'non_sba_sold': {
                 'median': int(sold_df[sold_df['sba_status'] == 'no']['total_inquiries'].median()) if len(sold_df[sold_df['sba_status'] == 'no']) > 0 else 0,
                 'mean': float(sold_df[sold_df['sba_status'] == 'no']['total_inquiries'].mean()) if len(sold_df[sold_df['sba_status'] == 'no']) > 0 else 0,
-                'count': len(sold_df[sold_df['sba_status'] == 'no'])
+                'count': len(sold_df[sold_df['sba_status'] == 'no']),
+                'median_ci': ci_dict(sold_cis, 'total_inquiries', 'no')
             },
             'unknown_sold': {
                 'median': int(sold_df[sold_df['sba_status'] == 'unknown']['total_inquiries'].median()) if len(sold_df[sold_df['sba_status'] == 'unknown']) > 0 else 0,
                 'mean': float(sold_df[sold_df['sba_status'] == 'unknown']['total_inquiries'].mean()) if len(sold_df[sold_df['sba_status'] == 'unknown']) > 0 else 0,
-                'count': len(sold_df[sold_df['sba_status'] == 'unknown'])
+                'count': len(sold_df[sold_df['sba_status'] == 'unknown']),
+                'median_ci': ci_dict(sold_cis, 'total_inquiries', 'unknown')
             },
             'sba_financed': {
                 'median': int(sba_financed['total_inquiries'].median()) if len(sba_financed) > 0 else 0,
                 'mean': float(sba_financed['total_inquiries'].mean()) if len(sba_financed) > 0 else 0,
-                'count': len(sba_financed)
+                'count': len(sba_financed),
+                'median_ci': ci_dict(financed_cis, 'total_inquiries', True)
             },
             'non_sba_financed': {
                 'median': int(non_sba_financed['total_inquiries'].median()) if len(non_sba_financed) > 0 else 0,
                 'mean': float(non_sba_financed['total_inquiries'].mean()) if len(non_sba_financed) > 0 else 0,
-                'count': len(non_sba_financed)
+                'count': len(non_sba_financed),
+                'median_ci': ci_dict(financed_cis, 'total_inquiries', False)
             }
         }
     }
@@ -9,6 +9,9 @@ import pymysql
 import json
 from datetime import datetime
 
+from listing_facts import load_facts
+from multiples_engine import attach_sba_status, compute_multiples, valid_multiples
+
 def get_db_connection():
     """Establish connection to MySQL database."""
     return pymysql.connect(
@@ -29,7 +32,7 @@ def main():
     
     # Load the SBA classification data
     print("Loading SBA classification data...")
-    df_classification = pd.read_csv('launch_date_analysis.csv')
+    df_classification = load_facts(['id', 'sba_status'])
     
     # Get listing IDs for each category
     sba_ids = df_classification[df_classification['sba_status'] == 'yes']['id'].tolist()
@@ -75,38 +78,13 @@ def main():
     
     # Use the asking_at_close and sde_at_close for closed deals
     # For active deals, use capsule_expected_value as asking price
-    df_listings['asking_price'] = df_listings.apply(
-        lambda row: row['asking_at_close'] if pd.notna(row['asking_at_close']) and row['asking_at_close'] > 0 
-        else row['capsule_expected_value'] if pd.notna(row['capsule_expected_value']) and row['capsule_expected_value'] > 0
-        else None,
-        axis=1
-    )
-    
-    df_listings['sde'] = df_listings['sde_at_close']
-    
-    # Calculate multiples
-    df_listings['multiple'] = df_listings.apply(
-        lambda row: row['asking_price'] / row['sde'] if pd.notna(row['sde']) and row['sde'] > 0 and pd.notna(row['asking_price']) and row['asking_price'] > 0 else None,
-        axis=1
-    )
+    df_listings = compute_multiples(df_listings, ['asking_at_close', 'capsule_expected_value'], ['sde_at_close'])
     
     # Add SBA status
-    def get_sba_status(listing_id):
-        if listing_id in sba_ids:
-            return 'yes'
-        elif listing_id in non_sba_ids:
-            return 'no'
-        else:
-            return 'unknown'
-    
-    df_listings['sba_status'] = df_listings['id'].apply(get_sba_status)
+    df_listings = attach_sba_status(df_listings, df_classification, default='unknown')
     
     # Filter for valid multiples (reasonable range: 0.5 to 10x)
-    df_valid = df_listings[
-        (df_listings['multiple'].notna()) & 
-        (df_listings['multiple'] > 0.5) & 
-        (df_listings['multiple'] < 10)
-    ].copy()
+    df_valid = valid_multiples(df_listings)
     
     print(f"\nFiltered to {len(df_valid)} listings with valid multiples (0.5x - 10x)")
     
@@ -9,6 +9,9 @@ import pymysql
 import json
 from datetime import datetime
 
+from listing_facts import load_facts
+from multiples_engine import attach_sba_status, compute_multiples, valid_multiples
+
 def get_db_connection():
     """Establish connection to MySQL database."""
     return pymysql.connect(
@@ -29,7 +32,7 @@ def main():
     
     # Load the SBA classification data
     print("Loading SBA classification data...")
-    df_classification = pd.read_csv('launch_date_analysis.csv')
+    df_classification = load_facts(['id', 'sba_status'])
     
     # Get listing IDs for each category
     sba_ids = df_classification[df_classification['sba_status'] == 'yes']['id'].tolist()
@@ -97,48 +100,12 @@ def main():
     
     print(f"Retrieved {len(df_listings)} listings from database")
     
-    # Determine asking price (prioritize custom fields, then at_close, then expected_value)
-    def get_asking_price(row):
-        # Try custom fields first
-        for field in ['asking_price_custom', 'asking_custom']:
-            if pd.notna(row.get(field)):
-                try:
-                    val = float(str(row[field]).replace(',', '').replace('$', ''))
-                    if val > 0:
-                        return val
-                except:
-                    pass
-        
-        # Then try asking_at_close
-        if pd.notna(row.get('asking_at_close')) and row['asking_at_close'] > 0:
-            return row['asking_at_close']
-        
-        # Finally try capsule_expected_value
-        if pd.notna(row.get('capsule_expected_value')) and row['capsule_expected_value'] > 0:
-            return row['capsule_expected_value']
-        
-        return None
-    
-    # Determine SDE (prioritize custom fields, then at_close)
-    def get_sde(row):
-        # Try custom fields first
-        for field in ['sde_custom', 'cashflow']:
-            if pd.notna(row.get(field)):
-                try:
-                    val = float(str(row[field]).replace(',', '').replace('$', ''))
-                    if val > 0:
-                        return val
-                except:
-                    pass
-        
-        # Then try sde_at_close
-        if pd.notna(row.get('sde_at_close')) and row['sde_at_close'] > 0:
-            return row['sde_at_close']
-        
-        return None
-    
-    df_listings['asking_price'] = df_listings.apply(get_asking_price, axis=1)
-    df_listings['sde'] = df_listings.apply(get_sde, axis=1)
+    # Asking price: custom fields, then asking_at_close, then capsule_expected_value
+    # SDE: custom fields, then sde_at_close
+    df_listings = compute_multiples(
+        df_listings,
+        ['asking_price_custom', 'asking_custom', 'asking_at_close', 'capsule_expected_value'],
+        ['sde_custom', 'cashflow', 'sde_at_close'])
     
     # Check how many have data
     has_asking = df_listings['asking_price'].notna().sum()
@@ -150,29 +117,11 @@ def main():
     print(f"  Has SDE/cashflow: {has_sde}/{len(df_listings)}")
     print(f"  Has both (can calculate multiple): {has_both}/{len(df_listings)}")
     
-    # Calculate multiples
-    df_listings['multiple'] = df_listings.apply(
-        lambda row: row['asking_price'] / row['sde'] if pd.notna(row['sde']) and row['sde'] > 0 and pd.notna(row['asking_price']) and row['asking_price'] > 0 else None,
-        axis=1
-    )
-    
     # Add SBA status
-    def get_sba_status(listing_id):
-        if listing_id in sba_ids:
-            return 'yes'
-        elif listing_id in non_sba_ids:
-            return 'no'
-        else:
-            return 'unknown'
-    
-    df_listings['sba_status'] = df_listings['id'].apply(get_sba_status)
+    df_listings = attach_sba_status(df_listings, df_classification, default='unknown')
     
     # Filter for valid multiples (reasonable range: 0.5 to 10x)
-    df_valid = df_listings[
-        (df_listings['multiple'].notna()) & 
-        (df_listings['multiple'] > 0.5) & 
-        (df_listings['multiple'] < 10)
-    ].copy()
+    df_valid = valid_multiples(df_listings)
     
     print(f"\nFiltered to {len(df_valid)} listings with valid multiples (0.5x - 10x)")
     
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Bootstrap confidence intervals for group medians.
+
+The SBA vs. non-SBA comparisons report medians (days on market, commission,
+multiples, inquiries) as point estimates. median_cis() adds a percentile
+bootstrap interval to each group's median and to the difference between the
+first two groups, drawing every resample of a group as one (resamples x n)
+index matrix and taking the row medians with np.partition, so there is no
+per-resample Python loop.
+
+With strata (the deal-size bucket, say), each resample keeps every stratum's
+count and draws only within the stratum, so the interval reflects the group's
+own deal-size mix rather than a random one. A metric the strata are cut from
+(closed commission, for the deal-size bucket) is resampled without strata:
+within its own buckets its median could barely move. Resamples are drawn in shards of
+2,500, each with its own seed; workers > 1 runs the shards in a process pool,
+and a seed gives the same intervals with or without workers.
+
+Usage:
+    python3 bootstrap_engine.py                      # CIs for the fact table's SBA vs. non-SBA medians
+    python3 bootstrap_engine.py --benchmark 250      # Time every reported median on synthetic listings
+    python3 bootstrap_engine.py --benchmark 250 --workers 4
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+RESAMPLES = 10000
+CONFIDENCE = 0.95
+SEED = 42
+SHARD_RESAMPLES = 2500  # Resamples per shard (and per seed), whatever the worker count
+MAX_CELLS = 1 << 24  # Index-matrix cells drawn at once (~128 MB of float64 values)
+SIZE_BINS = [0, 250000, 500000, 1000000, 2000000, 5000000, float('inf')]
+SIZE_LABELS = ['<$250K', '$250-500K', '$500K-1M', '$1-2M', '$2-5M', '>$5M']
+COMMISSION_RATE = 0.10  # Deal size is estimated as commission / 10%
+CI_FILE = 'bootstrap_median_cis.csv'
+
+def deal_size_bucket(values, commission: bool = True) -> pd.Series:
+    """Deal-size category from closed commission (or from a price when commission=False)."""
+    size = pd.Series(values, dtype=float)
+    if commission:
+        size = size / COMMISSION_RATE
+    return pd.cut(size, bins=SIZE_BINS, labels=SIZE_LABELS)
+
+def row_medians(matrix: np.ndarray) -> np.ndarray:
+    """Median of each row by partial sort: O(n) per row instead of a full sort."""
+    n = matrix.shape[1]
+    if n % 2:
+        return np.partition(matrix, n // 2, axis=1)[:, n // 2]
+    part = np.partition(matrix, [n // 2 - 1, n // 2], axis=1)
+    return (part[:, n // 2 - 1] + part[:, n // 2]) / 2
+
+def _index_matrix(rng: np.random.Generator, resamples: int, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Resample indices into values sorted by stratum; stratum k fills counts[k] columns."""
+    return np.concatenate([rng.integers(start, start + count, (resamples, count), dtype=np.int32)
+                           for start, count in zip(starts, counts)], axis=1)
+
+def resample_medians(values: np.ndarray, strata: Optional[np.ndarray] = None, resamples: int = RESAMPLES,
+                     seed=SEED) -> np.ndarray:
+    """Medians of `resamples` bootstrap resamples of values (NaNs already dropped)."""
+    rng = np.random.default_rng(seed)
+    values = np.asarray(values, dtype=float)
+    if strata is None:
+        starts, counts = np.array([0]), np.array([len(values)])
+    else:
+        order = np.argsort(strata, kind='stable')
+        values = values[order]
+        _, starts, counts = np.unique(np.asarray(strata)[order], return_index=True, return_counts=True)
+    block = max(1, MAX_CELLS // max(len(values), 1))
+    medians = np.empty(resamples)
+    for first in range(0, resamples, block):
+        size = min(block, resamples - first)
+        medians[first:first + size] = row_medians(values[_index_matrix(rng, size, starts, counts)])
+    return medians
+
+def _shard(task: Tuple) -> np.ndarray:
+    return resample_medians(*task)
+
+def bootstrap_distributions(samples: Sequence[Tuple[np.ndarray, Optional[np.ndarray]]], resamples: int = RESAMPLES,
+                            seed: int = SEED, workers: int = 1) -> List[np.ndarray]:
+    """Bootstrap median distributions for several (values, strata) samples at once."""
+    shards = max(1, -(-resamples // SHARD_RESAMPLES))
+    sizes = [len(part) for part in np.array_split(np.arange(resamples), shards)]
+    tasks = []
+    for (values, strata), sample_seed in zip(samples, np.random.SeedSequence(seed).spawn(len(samples))):
+        tasks.extend((values, strata, size, shard_seed) for size, shard_seed in zip(sizes, sample_seed.spawn(shards)))
+
+    nonempty = [i for i, task in enumerate(tasks) if len(task[0])]
+    results = [np.full(task[2], np.nan) for task in tasks]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for i, medians in zip(nonempty, executor.map(_shard, [tasks[i] for i in nonempty])):
+                results[i] = medians
+    else:
+        for i in nonempty:
+            results[i] = _shard(tasks[i])
+    return [np.concatenate(results[i * shards:(i + 1) * shards]) for i in range(len(samples))]
+
+def percentile_ci(distribution: np.ndarray, confidence: float = CONFIDENCE) -> Tuple[float, float]:
+    if np.isnan(distribution).all():
+        return np.nan, np.nan
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(distribution, [tail, 100 - tail])
+    return float(low), float(high)
+
+def median_cis(df: pd.DataFrame, metrics: Sequence[str], group_col: str, groups: Sequence = ('yes', 'no'),
+               strata_col: Optional[str] = None, resamples: int = RESAMPLES, confidence: float = CONFIDENCE,
+               seed: int = SEED, workers: int = 1, unstratified: Sequence[str] = ()) -> pd.DataFrame:
+    """Median and bootstrap CI per (metric, group), plus the first group minus the second.
+
+    Metrics in unstratified ignore strata_col (pass the metrics strata_col is
+    derived from). Returns one row per metric and group (and group 'difference'
+    when there are two or more groups) with n, median, ci_low and ci_high.
+    """
+    samples, keys = [], []
+    for metric in metrics:
+        for group in groups:
+            rows = df[(df[group_col] == group) & df[metric].notna()]
+            strata = None
+            if strata_col is not None and metric not in unstratified:
+                strata = rows[strata_col].astype('category').cat.codes.to_numpy()  # Missing bucket: -1
+            samples.append((rows[metric].to_numpy(dtype=float), strata))
+            keys.append((metric, group))
+    distributions = bootstrap_distributions(samples, resamples, seed, workers)
+
+    records = []
+    by_key = dict(zip(keys, zip(samples, distributions)))
+    for metric in metrics:
+        for group in groups:
+            (values, _), distribution = by_key[(metric, group)]
+            low, high = percentile_ci(distribution, confidence)
+            records.append({'metric': metric, 'group': group, 'n': len(values),
+                            'median': float(np.median(values)) if len(values) else np.nan,
+                            'ci_low': low, 'ci_high': high})
+        if len(groups) > 1:
+            first, second = records[-len(groups)], records[-len(groups) + 1]
+            difference = by_key[(metric, groups[0])][1] - by_key[(metric, groups[1])][1]
+            low, high = percentile_ci(difference, confidence)
+            records.append({'metric': metric, 'group': 'difference', 'n': first['n'] + second['n'],
+                            'median': first['median'] - second['median'], 'ci_low': low, 'ci_high': high})
+    return pd.DataFrame(records)
+
+def ci_dict(cis: pd.DataFrame, metric: str, group) -> Dict:
+    """One row of median_cis() as {'ci_low', 'ci_high'} for the JSON outputs."""
+    row = cis[(cis['metric'] == metric) & (cis['group'] == group)].iloc[0]
+    return {'ci_low': None if pd.isna(row['ci_low']) else float(row['ci_low']),
+            'ci_high': None if pd.isna(row['ci_high']) else float(row['ci_high'])}
+
+def format_ci(cis: pd.DataFrame, metric: str, group, digits: int = 1) -> str:
+    ci = ci_dict(cis, metric, group)
+    if ci['ci_low'] is None:
+        return "(95% CI n/a)"
+    return f"({CONFIDENCE * 100:.0f}% CI {ci['ci_low']:.{digits}f} to {ci['ci_high']:.{digits}f})"
+
+def ci_records(cis: pd.DataFrame) -> List[Dict]:
+    """median_cis() rows as JSON-safe dicts (NaN as None)."""
+    return [{key: None if pd.isna(value) else value.item() if hasattr(value, 'item') else value
+             for key, value in row.items()} for row in cis.to_dict('records')]
+
+# --- Reported medians --------------------------------------------------------
+
+REPORTED_METRICS = ['days_on_market', 'closed_commission', 'multiple', 'total_inquiries']
+# Resampled without deal-size strata: the buckets are cut from closed commission, which
+# tracks the sale price that multiple is computed from
+PRICE_METRICS = ['closed_commission', 'multiple']
+
+def fact_table_cis(resamples: int = RESAMPLES, workers: int = 1, df: pd.DataFrame = None) -> pd.DataFrame:
+    """CIs for the sold SBA / non-SBA / unknown medians, stratified by deal-size bucket (except PRICE_METRICS)."""
+    if df is None:
+        from listing_facts import load_facts
+        df = load_facts(['id', 'status', 'sba_status', 'closed_commission'] +
+                        [m for m in REPORTED_METRICS if m != 'closed_commission'])
+    sold = df[df['status'] == 'sold'].copy()
+    sold['size_category'] = deal_size_bucket(sold['closed_commission'])
+    return median_cis(sold, REPORTED_METRICS, 'sba_status', ['yes', 'no', 'unknown'], 'size_category',
+                      resamples=resamples, workers=workers, unstratified=PRICE_METRICS)
+
+def synthetic_facts(listings: int, seed: int = SEED) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    commission = np.round(rng.lognormal(11.5, 0.9, listings), -2)
+    return pd.DataFrame({
+        'id': np.arange(listings),
+        'status': rng.choice(['sold', 'lost', 'active'], listings, p=[0.6, 0.25, 0.15]),
+        'sba_status': rng.choice(['yes', 'no', 'unknown'], listings, p=[0.3, 0.55, 0.15]),
+        'closed_commission': np.where(rng.random(listings) < 0.9, commission, np.nan),
+        'days_on_market': rng.gamma(2.0, 100, listings).round(),
+        'multiple': rng.lognormal(1.2, 0.35, listings),
+        'total_inquiries': rng.negative_binomial(3, 0.02, listings),
+    })
+
+def benchmark(listings: int, resamples: int = RESAMPLES, workers: int = 1, seed: int = SEED):
+    df = synthetic_facts(listings, seed)
+    fact_table_cis(resamples, workers, df)  # Warm-up (imports, pool start-up)
+    start = time.perf_counter()
+    cis = fact_table_cis(resamples, workers, df)
+    elapsed = time.perf_counter() - start
+    medians = int((cis['group'] != 'difference').sum())
+    print(f"{listings:,} listings ({(df['status'] == 'sold').sum():,} sold), {resamples:,} resamples, "
+          f"{workers} worker(s)")
+    print(f"{medians} medians + {len(cis) - medians} differences, stratified by deal size: {elapsed:.3f}s")
+    print(cis.round(2).to_string(index=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bootstrap CIs for group medians')
+    parser.add_argument('--benchmark', type=int, metavar='LISTINGS', help='Time the reported medians on synthetic listings')
+    parser.add_argument('--resamples', type=int, default=RESAMPLES)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.resamples, args.workers, args.seed)
+    else:
+        cis = fact_table_cis(args.resamples, args.workers)
+        cis.to_csv(CI_FILE, index=False)
+        print(cis.round(2).to_string(index=False))
+        print(f"Saved to {CI_FILE}")
@@ -4,10 +4,12 @@
 import pandas as pd
 import json
 
+from listing_facts import load_facts
+
 # Load the main dataset
-df = pd.read_csv('launch_date_analysis.csv')
+df = load_facts(['id', 'sba_status', 'status'])
 print("=" * 60)
-print("FULL DATASET (launch_date_analysis.csv)")
+print("FULL DATASET (listing fact table)")
 print("=" * 60)
 print(f"Total listings: {len(df)}")
 print("\nSBA Status breakdown:")
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Persistent catalog of the CIM PDFs on disk.
+Maps each file to its listing ID, SHA-256, page count, size and download time
+in cache/cim_catalog.db, so "do we have a CIM for listing N?" and "which CIMs
+are there?" are index lookups instead of a glob and a regex over the whole
+directory every time.
+
+The catalog is kept current in three ways:
+- the downloaders call record_file() after a CIM lands in place
+- refresh() rescans a directory only when its mtime moved (files added,
+  removed or renamed), and re-hashes only files whose size or mtime changed
+- watch mode follows the directory with watchdog (inotify on Linux), falling
+  back to polling refresh() when watchdog is not installed
+
+Usage:
+    python3 cim_catalog.py sync [--dir cims]     # Full rescan
+    python3 cim_catalog.py watch [--dir cims]
+    python3 cim_catalog.py status [--dir cims]
+    python3 cim_catalog.py find 12345            # Files for a listing
+"""
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+CATALOG_DB = Path('cache/cim_catalog.db')
+POLL_SECONDS = 5  # Refresh interval in watch mode without watchdog
+
+DOWNLOADED_NAME = re.compile(r'^(\d+)[_\-]')  # 12345_business_name.pdf, as the downloaders save CIMs
+
+# Tried in order; the first is the naming the downloaders use
+LISTING_ID_PATTERNS = [
+    DOWNLOADED_NAME,
+    re.compile(r'^listing[_\-](\d+)', re.IGNORECASE),  # listing_12345_name.pdf
+    re.compile(r'[_\-](\d+)[_\-]'),  # business_12345_name.pdf
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cims (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    listing_id INTEGER,
+    sha256 TEXT,
+    pages INTEGER,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    downloaded_at REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cims_listing ON cims(listing_id);
+CREATE INDEX IF NOT EXISTS idx_cims_directory ON cims(directory, file_name);
+CREATE TABLE IF NOT EXISTS directories (
+    directory TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    scanned_at REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+def connect_catalog(db_path: Path = CATALOG_DB) -> sqlite3.Connection:
+    """This thread's connection to the catalog, created on first use."""
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    key = str(db_path)
+    if key not in conns:
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conns[key] = conn
+    return conns[key]
+
+def parse_listing_id(filename: str) -> Optional[int]:
+    """Listing ID from a CIM file name, or None."""
+    for pattern in LISTING_ID_PATTERNS:
+        match = pattern.search(filename)
+        if match:
+            return int(match.group(1))
+    return None
+
+def _describe(path: Path, stat: os.stat_result) -> Dict:
+    """Hash and page count for a PDF. pages is None when PyPDF2 cannot read it."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    pages = None
+    try:
+        import PyPDF2
+        with open(path, 'rb') as f:
+            pages = len(PyPDF2.PdfReader(f).pages)
+    except Exception:
+        pass
+    return {'sha256': h.hexdigest(), 'pages': pages, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def record_file(path: Path, downloaded_at: float = None, conn: sqlite3.Connection = None):
+    """Add or refresh one PDF in the catalog (called by the downloaders)."""
+    path = Path(path).resolve()
+    conn = conn or connect_catalog()
+    if not path.exists():
+        forget_file(path, conn)
+        return
+    info = _describe(path, path.stat())
+    conn.execute(
+        "INSERT INTO cims (path, directory, file_name, listing_id, sha256, pages, size, mtime, downloaded_at, indexed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET sha256 = excluded.sha256, pages = excluded.pages, size = excluded.size, "
+        "mtime = excluded.mtime, indexed_at = excluded.indexed_at, "
+        "downloaded_at = COALESCE(excluded.downloaded_at, cims.downloaded_at)",
+        (str(path), str(path.parent), path.name, parse_listing_id(path.name), info['sha256'], info['pages'],
+         info['size'], info['mtime'], downloaded_at, time.time())
+    )
+
+def forget_file(path: Path, conn: sqlite3.Connection = None):
+    conn = conn or connect_catalog()
+    conn.execute("DELETE FROM cims WHERE path = ?", (str(Path(path).resolve()),))
+
+def sync_directory(directory: Path, conn: sqlite3.Connection = None, verbose: bool = False) -> Dict[str, int]:
+    """
+    Bring the catalog in line with a directory. Files whose size and mtime are
+    unchanged are not re-read.
+    """
+    directory = Path(directory).resolve()
+    conn = conn or connect_catalog()
+    counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    if not directory.is_dir():
+        return counts
+
+    dir_mtime = directory.stat().st_mtime
+    known = {row['path']: row for row in conn.execute(
+        "SELECT path, size, mtime FROM cims WHERE directory = ?", (str(directory),))}
+
+    seen = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith('.pdf') or not entry.is_file():
+                continue
+            path = str(directory / entry.name)
+            seen.add(path)
+            stat = entry.stat()
+            row = known.get(path)
+            if row and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime:
+                counts['unchanged'] += 1
+                continue
+            record_file(Path(path), conn=conn)
+            counts['updated' if row else 'added'] += 1
+            if verbose and (counts['added'] + counts['updated']) % 100 == 0:
+                print(f"  Indexed {counts['added'] + counts['updated']} files...")
+
+    for path in set(known) - seen:
+        forget_file(Path(path), conn)
+        counts['removed'] += 1
+
+    conn.execute("INSERT OR REPLACE INTO directories (directory, mtime, scanned_at) VALUES (?, ?, ?)",
+                 (str(directory), dir_mtime, time.time()))
+    return counts
+
+def refresh(directory: Path, conn: sqlite3.Connection = None) -> bool:
+    """Rescan only if entries were added, removed or renamed since the last scan."""
+    directory = Path(directory).resolve()
+    conn = conn or connect_catalog()
+    if not directory.is_dir():
+        return False
+    row = conn.execute("SELECT mtime FROM directories WHERE directory = ?", (str(directory),)).fetchone()
+    if row and row['mtime'] == directory.stat().st_mtime:
+        return False
+    sync_directory(directory, conn)
+    return True
+
+def existing_listing_ids(directory: Path) -> Set[int]:
+    """
+    Listing IDs with at least one CIM in the directory under the downloaders'
+    own <id>_name.pdf naming. The looser patterns are left out so a number in
+    the middle of some other file name never marks a listing as downloaded.
+    """
+    conn = connect_catalog()
+    refresh(directory, conn)
+    return {row['listing_id'] for row in conn.execute(
+        "SELECT file_name, listing_id FROM cims WHERE directory = ? AND listing_id IS NOT NULL",
+        (str(Path(directory).resolve()),)) if DOWNLOADED_NAME.match(row['file_name'])}
+
+def has_listing(listing_id: int, directory: Path) -> bool:
+    conn = connect_catalog()
+    refresh(directory, conn)
+    return conn.execute("SELECT 1 FROM cims WHERE directory = ? AND listing_id = ? LIMIT 1",
+                        (str(Path(directory).resolve()), listing_id)).fetchone() is not None
+
+def catalog_files(directory: Path) -> List[Path]:
+    """The directory's CIM PDFs, sorted by file name."""
+    conn = connect_catalog()
+    refresh(directory, conn)
+    return [Path(row[0]) for row in conn.execute(
+        "SELECT path FROM cims WHERE directory = ? ORDER BY file_name", (str(Path(directory).resolve()),))]
+
+def files_for_listing(listing_id: int) -> List[Dict]:
+    return [dict(row) for row in connect_catalog().execute(
+        "SELECT * FROM cims WHERE listing_id = ? ORDER BY file_name", (listing_id,))]
+
+class CatalogEventHandler(FileSystemEventHandler):
+    """Keeps the catalog in step with filesystem events for *.pdf files."""
+
+    def _is_pdf(self, path) -> bool:
+        return str(path).lower().endswith('.pdf')
+
+    def on_created(self, event):
+        if not event.is_directory and self._is_pdf(event.src_path):
+            record_file(Path(event.src_path))
+
+    on_modified = on_created
+
+    def on_deleted(self, event):
+        if not event.is_directory and self._is_pdf(event.src_path):
+            forget_file(Path(event.src_path))
+
+    def on_moved(self, event):
+        # Downloads arrive as <name>.part renamed to <name>
+        if self._is_pdf(event.src_path):
+            forget_file(Path(event.src_path))
+        if self._is_pdf(event.dest_path):
+            record_file(Path(event.dest_path))
+
+def watch(directory: Path):
+    """Follow the directory until interrupted."""
+    directory = Path(directory)
+    print(f"Syncing {directory}...")
+    print(f"  {sync_directory(directory, verbose=True)}")
+
+    if Observer is None:
+        print(f"watchdog not installed; polling every {POLL_SECONDS}s (pip install watchdog for inotify)")
+        while True:
+            time.sleep(POLL_SECONDS)
+            if refresh(directory):
+                print(f"  Rescanned {directory}")
+
+    observer = Observer()
+    observer.schedule(CatalogEventHandler(), str(directory), recursive=False)
+    observer.start()
+    print(f"Watching {directory} (Ctrl+C to stop)")
+    try:
+        while observer.is_alive():
+            observer.join(1)
+    finally:
+        observer.stop()
+        observer.join()
+
+def print_catalog_status(directory: Path):
+    conn = connect_catalog()
+    refresh(directory, conn)
+    row = conn.execute(
+        "SELECT COUNT(*) AS files, COUNT(DISTINCT listing_id) AS listings, SUM(size) AS bytes, "
+        "SUM(pages IS NULL) AS unreadable, SUM(listing_id IS NULL) AS unmatched "
+        "FROM cims WHERE directory = ?", (str(Path(directory).resolve()),)
+    ).fetchone()
+    print(f"{directory}: {row['files']} CIMs for {row['listings']} listings, "
+          f"{(row['bytes'] or 0) / 1e6:.1f} MB")
+    print(f"  Unreadable by PyPDF2: {row['unreadable'] or 0}, no listing ID in name: {row['unmatched'] or 0}")
+
+if __name__ == "__main__":
+    from download_cims_from_drive import OUTPUT_DIR
+
+    parser = argparse.ArgumentParser(description='Catalog of downloaded CIM PDFs')
+    parser.add_argument('command', choices=['sync', 'watch', 'status', 'find'])
+    parser.add_argument('listing_id', nargs='?', type=int)
+    parser.add_argument('--dir', default=str(OUTPUT_DIR))
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        print(sync_directory(Path(args.dir), verbose=True))
+    elif args.command == 'watch':
+        try:
+            watch(Path(args.dir))
+        except KeyboardInterrupt:
+            print("\nStopped")
+    elif args.command == 'status':
+        print_catalog_status(Path(args.dir))
+    else:
+        if args.listing_id is None:
+            parser.error('find needs a listing ID')
+        files = files_for_listing(args.listing_id)
+        for f in files:
+            print(f"{f['path']}  {f['pages']} pages  {f['size']:,} B  sha256 {f['sha256'][:12]}")
+        if not files:
+            print(f"No CIM cataloged for listing {args.listing_id}")
+            sys.exit(1)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted chunking and map-reduce classification for long CIMs.
+Instead of truncating extracted PDF text at a fixed character count, the text is
+split on page boundaries into chunks that fit the model's token budget. Each chunk
+is classified in parallel and the answers are merged with a deterministic reducer
+that keeps the highest-confidence evidence.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Configuration
+TOKEN_ENCODING = 'cl100k_base'
+CHARS_PER_TOKEN = 4  # Rough average for English prose, used when tiktoken is missing
+MAX_CHUNK_WORKERS = 4  # Parallel chunk calls per document
+PAGE_MARKER = re.compile(r'(?=\n--- Page \d+ ---\n)')
+
+_encoder = None
+
+def get_encoder():
+    """Load the tiktoken encoder once, or None if tiktoken is not installed."""
+    global _encoder
+    if _encoder is None and tiktoken is not None:
+        _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+    return _encoder
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, falling back to a character estimate."""
+    if not text:
+        return 0
+    encoder = get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def prompt_overhead(prompt_template: str, system_prompt: str = '') -> int:
+    """Tokens used by the prompt itself, excluding the document content."""
+    return count_tokens(prompt_template.replace('{content}', '')) + count_tokens(system_prompt)
+
+def split_pages(text: str) -> List[str]:
+    """Split extracted PDF text into pages, keeping the '--- Page N ---' markers."""
+    return [page for page in PAGE_MARKER.split(text) if page]
+
+def split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Split a single page that does not fit the budget on its own."""
+    encoder = get_encoder()
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        return [encoder.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Pack pages greedily into chunks of at most max_tokens tokens.
+    Page boundaries are preserved so evidence keeps its page numbers.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for page in split_pages(text):
+        page_tokens = count_tokens(page)
+
+        if page_tokens > max_tokens:
+            if current:
+                chunks.append(''.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(split_oversized(page, max_tokens))
+            continue
+
+        if current and current_tokens + page_tokens > max_tokens:
+            chunks.append(''.join(current))
+            current, current_tokens = [], 0
+
+        current.append(page)
+        current_tokens += page_tokens
+
+    if current:
+        chunks.append(''.join(current))
+
+    return chunks
+
+def map_chunks(chunks: List[str], analyze_fn: Callable[[str], Dict],
+               max_workers: int = MAX_CHUNK_WORKERS) -> List[Dict]:
+    """Classify chunks in parallel. Results are returned in chunk order."""
+    if len(chunks) == 1:
+        return [analyze_fn(chunks[0])]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        return list(executor.map(analyze_fn, chunks))
+
+def _dedupe(items: List) -> List:
+    """Drop duplicates while keeping the first occurrence."""
+    seen = set()
+    unique = []
+    for item in items:
+        key = str(item)
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+def reduce_sba_status(results: List[Dict]) -> Dict:
+    """
+    Merge per-chunk results in the process_cims_with_grok format
+    (sba_status / confidence / evidence).
+
+    A decisive answer (qualified / not_qualified) beats undetermined, then higher
+    confidence wins, then the earlier chunk wins. Evidence from every chunk that
+    agrees with the winning status is kept, highest confidence first.
+    """
+    valid = [(i, r) for i, r in enumerate(results) if r.get('sba_status') != 'error']
+    if not valid:
+        return dict(results[0]) if results else {
+            "sba_status": "error", "confidence": 0.0, "evidence": [], "error": "No chunks analyzed"
+        }
+
+    def rank(item):
+        index, result = item
+        decisive = result.get('sba_status') in ('qualified', 'not_qualified')
+        return (not decisive, -float(result.get('confidence') or 0), index)
+
+    ranked = sorted(valid, key=rank)
+    best_index, best = ranked[0]
+
+    merged = dict(best)
+    agreeing = [r for _, r in ranked if r.get('sba_status') == best.get('sba_status')]
+    merged['evidence'] = _dedupe([e for r in agreeing for e in (r.get('evidence') or [])])
+    if any('page_numbers' in r for r in agreeing):
+        merged['page_numbers'] = sorted(set(
+            p for r in agreeing for p in (r.get('page_numbers') or []) if isinstance(p, int)
+        ))
+
+    merged['chunks_analyzed'] = len(results)
+    merged['best_chunk'] = best_index
+    errors = len(results) - len(valid)
+    if errors:
+        merged['chunk_errors'] = errors
+
+    return merged
+
+def reduce_sba_eligible(results: List[Dict]) -> Dict:
+    """
+    Merge per-chunk results in the process_cims_simple format (sba_eligible yes/no/unknown).
+
+    The format has no confidence score, so an explicit yes/no beats unknown and the
+    earliest chunk wins ties (the Executive Summary comes first). Missing financials
+    and location are filled from later chunks.
+    """
+    if not results:
+        return {}
+
+    decisive = [r for r in results if r.get('sba_eligible') in ('yes', 'no')]
+    merged = dict(decisive[0] if decisive else results[0])
+
+    for field in ('asking_price', 'sde'):
+        if not merged.get(field):
+            merged[field] = next((r[field] for r in results if r.get(field)), merged.get(field, 0))
+
+    if merged.get('seller_location', 'unknown') == 'unknown':
+        merged['seller_location'] = next(
+            (r['seller_location'] for r in results if r.get('seller_location') not in (None, '', 'unknown')),
+            'unknown'
+        )
+
+    merged['chunks_analyzed'] = len(results)
+    return merged
+
+def map_reduce(text: str, analyze_fn: Callable[[str], Dict], max_tokens: int,
+               reducer: Callable[[List[Dict]], Dict],
+               max_workers: int = MAX_CHUNK_WORKERS) -> Dict:
+    """Chunk text to the token budget, classify every chunk and merge the answers."""
+    chunks = chunk_text(text, max_tokens) or ['']
+    return reducer(map_chunks(chunks, analyze_fn, max_workers))
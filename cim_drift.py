@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Selective re-classification of CIMs by evidence drift.
+Instead of re-running the whole corpus, only documents whose inputs or outputs
+have drifted since they were classified are sent back through the job queue:
+
+- pdf_changed: the PDF bytes differ (size/mtime first, then SHA-256)
+- title_changed: the listing title in the database differs from the one used
+- undetermined / error: the stored result was inconclusive or failed
+- version: the prompts, models or tier thresholds changed (pipeline_version)
+
+Results classified before fingerprints existed are stamped with the current
+state on the first run, so that run sets the baseline rather than requeueing
+everything.
+
+Usage:
+    python3 cim_drift.py                          # Report drift and estimated cost only
+    python3 cim_drift.py --dispatch --process     # Re-queue drifted CIMs and run them
+    python3 cim_drift.py --dispatch --max-cost 2  # Refuse if the estimate is over $2
+    python3 cim_drift.py --tiered --dispatch      # Compare against the tiered pipeline's version
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cim_tiers import TIER_POLICY
+from cim_job_queue import QUEUE_DB, connect_queue, finished_jobs, update_result, requeue
+from llm_telemetry import call_cost, load_ledger
+import process_cims_with_grok as pipeline
+
+REASONS = ['pdf_changed', 'title_changed', 'undetermined', 'error', 'version']
+REQUEUE_STATUSES = ('undetermined', 'error')
+LLM_STAGES = ('exec_summary', 'full_cim', 'tier_small')
+# Fallback when the ledger has no history: one exec-summary call plus one full-CIM call
+FALLBACK_TOKENS = {'exec_summary': (3000, 300), 'full_cim': (8000, 300)}
+
+def fetch_titles(listing_ids: List[int]) -> Optional[Dict[int, str]]:
+    """Current listing titles from the database, or None if it is unreachable."""
+    ids = sorted({i for i in listing_ids if i})
+    if not ids:
+        return {}
+    try:
+        conn = pipeline.get_db_connection()
+    except Exception as e:
+        print(f"Database unavailable, skipping title drift: {e}")
+        return None
+
+    titles = {}
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"SELECT id, name FROM listings WHERE id IN ({placeholders})", batch)
+            for row in cursor.fetchall():
+                titles[row['id']] = row['name'] or ''
+    finally:
+        conn.close()
+    return titles
+
+def pdf_drift(path: Path, result: Dict) -> Optional[str]:
+    """
+    'changed' if the PDF bytes differ from the classified version, 'baseline' if
+    the result had no fingerprint yet (it is stamped in place), otherwise None.
+    Only hashes when size or mtime moved.
+    """
+    stat = path.stat()
+    if not result.get('pdf_sha256'):
+        result.update({'pdf_sha256': pipeline.file_sha256(str(path)),
+                       'pdf_size': stat.st_size, 'pdf_mtime': stat.st_mtime})
+        return 'baseline'
+
+    if stat.st_size == result.get('pdf_size') and stat.st_mtime == result.get('pdf_mtime'):
+        return None
+
+    if pipeline.file_sha256(str(path)) != result['pdf_sha256']:
+        return 'changed'
+
+    # Touched but identical; remember the new mtime so we do not hash it again
+    result.update({'pdf_size': stat.st_size, 'pdf_mtime': stat.st_mtime})
+    return 'baseline'
+
+def detect_drift(conn, check_titles: bool = True, policy: Dict = None) -> Dict:
+    """
+    Compare every finished job against the current PDF, title and pipeline version
+    (the tiered version when a tier policy is given).
+    Returns {'drifted': {doc_key: [reasons]}, 'missing': [...], 'baselined': n, 'checked': n}.
+    """
+    jobs = finished_jobs(conn)
+    version = pipeline.pipeline_version(policy)
+    titles = fetch_titles([job['listing_id'] for job in jobs]) if check_titles else None
+
+    drifted = {}
+    missing = []
+    baselined = 0
+    for job in jobs:
+        result = job['result']
+        path = Path(job['path'])
+        if not path.exists():
+            path = pipeline.full_text_path(path)  # Streamed without the PDF; fingerprinted by its text
+        if not path.exists():
+            missing.append(job['doc_key'])
+            continue
+
+        reasons = []
+        stamped = False
+
+        pdf = pdf_drift(path, result)
+        if pdf == 'changed':
+            reasons.append('pdf_changed')
+        stamped |= pdf == 'baseline'
+
+        if titles is not None and job['listing_id'] in titles:
+            if 'database_title' not in result:
+                result['database_title'] = titles[job['listing_id']]
+                stamped = True
+            elif titles[job['listing_id']] != result['database_title']:
+                reasons.append('title_changed')
+
+        status = result.get('sba_status')
+        if status in REQUEUE_STATUSES:
+            reasons.append(status)
+
+        if 'pipeline_version' not in result:
+            result['pipeline_version'] = version
+            stamped = True
+        elif result['pipeline_version'] != version:
+            reasons.append('version')
+
+        if stamped:
+            update_result(conn, job['doc_key'], result)
+            baselined += 1
+        if reasons:
+            drifted[job['doc_key']] = reasons
+
+    return {'drifted': drifted, 'missing': missing, 'baselined': baselined, 'checked': len(jobs), 'version': version}
+
+def estimate_cost_per_document(records: List[Dict] = None) -> float:
+    """
+    Average LLM spend per classified document from the ledger: the cost of the
+    classification stages divided by the number of executive-summary calls.
+    """
+    records = load_ledger() if records is None else records
+    calls = [r for r in records if r.get('stage') in LLM_STAGES and r.get('cache') != 'hit']
+    documents = sum(1 for r in calls if r.get('stage') in ('exec_summary', 'tier_small'))
+    if documents:
+        return sum(r.get('cost', 0.0) for r in calls) / documents
+
+    return sum(call_cost(pipeline.LARGE_MODEL, prompt, completion) for prompt, completion in FALLBACK_TOKENS.values())
+
+def print_drift_report(drift: Dict, cost_per_doc: float):
+    drifted = drift['drifted']
+    print("\n" + "=" * 60)
+    print("CIM EVIDENCE DRIFT")
+    print("=" * 60)
+    print(f"Checked {drift['checked']} classified CIMs (pipeline version {drift['version']})")
+    if drift['baselined']:
+        print(f"Recorded fingerprints for {drift['baselined']} results (new baseline, not re-queued)")
+    if drift['missing']:
+        print(f"PDF missing on disk for {len(drift['missing'])} documents (left as is)")
+
+    for reason in REASONS:
+        keys = [key for key, reasons in drifted.items() if reason in reasons]
+        if keys:
+            print(f"  {reason}: {len(keys)}")
+            for key in keys[:5]:
+                print(f"    {key}")
+            if len(keys) > 5:
+                print(f"    ... and {len(keys) - 5} more")
+
+    print(f"\nTo re-classify: {len(drifted)} documents")
+    print(f"Estimated cost: ${len(drifted) * cost_per_doc:.4f} (${cost_per_doc:.4f} per document)")
+
+def dispatch(conn, drifted: Dict[str, List[str]]) -> int:
+    """Send drifted documents back to pending and drop their cached results."""
+    paths = dict(conn.execute("SELECT doc_key, path FROM jobs").fetchall())
+    for key in drifted:
+        pipeline.invalidate_cache(paths[key])
+    return requeue(conn, drifted.keys())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Re-classify only CIMs whose evidence drifted')
+    parser.add_argument('--dispatch', action='store_true', help='Re-queue the drifted documents')
+    parser.add_argument('--process', action='store_true', help='Run the queue after dispatching')
+    parser.add_argument('--max-cost', type=float, default=None, help='Refuse to dispatch above this estimate ($)')
+    parser.add_argument('--no-titles', action='store_true', help='Skip the database title check')
+    parser.add_argument('--workers', type=int, default=pipeline.MAX_WORKERS)
+    parser.add_argument('--queue', default=str(QUEUE_DB))
+    parser.add_argument('--tiered', action='store_true', help='Check against (and process with) the tiered pipeline')
+    parser.add_argument('--rules-threshold', type=float, default=TIER_POLICY['rules'])
+    parser.add_argument('--small-threshold', type=float, default=TIER_POLICY['small'])
+    parser.add_argument('--prefetch-after', type=float, default=TIER_POLICY['prefetch_after'])
+    args = parser.parse_args()
+
+    policy = None
+    if args.tiered:
+        policy = {'rules': args.rules_threshold, 'small': args.small_threshold,
+                  'prefetch_after': args.prefetch_after}
+
+    conn = connect_queue(Path(args.queue))
+    drift = detect_drift(conn, check_titles=not args.no_titles, policy=policy)
+    cost_per_doc = estimate_cost_per_document()
+    print_drift_report(drift, cost_per_doc)
+
+    if not args.dispatch or not drift['drifted']:
+        sys.exit(0)
+
+    estimate = len(drift['drifted']) * cost_per_doc
+    if args.max_cost is not None and estimate > args.max_cost:
+        print(f"\nEstimate ${estimate:.4f} exceeds --max-cost ${args.max_cost:.2f}; nothing dispatched.")
+        sys.exit(1)
+
+    print(f"\nRe-queued {dispatch(conn, drift['drifted'])} documents")
+    conn.close()
+
+    if args.process:
+        pipeline.process_all_cims(workers=args.workers, queue_db=Path(args.queue), policy=policy)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Durable SQLite job queue for CIM processing.
+Each document moves through pending -> extracting -> classifying -> done/failed.
+Workers take a time-limited lease on a job, so a crashed run can be resumed
+without redoing finished documents and without double-processing live ones.
+Jobs are keyed by file name, not by position in a directory listing, so new
+PDFs landing in cims/ never shift the resume point.
+
+Usage:
+    python3 cim_job_queue.py status
+    python3 cim_job_queue.py retry-failed
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUE_DB = Path('cache/cim_jobs.db')
+LEASE_SECONDS = 15 * 60  # A job is handed to another worker if its lease lapses
+MAX_ATTEMPTS = 3  # Leases a job may lose before it is marked failed instead of re-leased
+
+STATES = ['pending', 'extracting', 'classifying', 'done', 'failed']
+IN_FLIGHT = ('extracting', 'classifying')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    doc_key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    listing_id INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, doc_key);
+"""
+
+def connect_queue(db_path: Path = QUEUE_DB) -> sqlite3.Connection:
+    """Open the queue database, creating it if needed. One connection per thread."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def worker_id() -> str:
+    """Identify the lease owner as host:pid:thread."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def enqueue_files(conn: sqlite3.Connection, paths: Iterable[Path],
+                  listing_id_fn: Callable[[str], Optional[int]] = None) -> int:
+    """Add documents to the queue. Already-known documents are left untouched."""
+    now = time.time()
+    rows = [
+        (Path(p).name, str(p), listing_id_fn(Path(p).name) if listing_id_fn else None, now, now)
+        for p in paths
+    ]
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO jobs (doc_key, path, listing_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    return conn.total_changes - before
+
+def claim_job(conn: sqlite3.Connection, owner: str, lease_seconds: int = LEASE_SECONDS,
+              max_attempts: int = MAX_ATTEMPTS) -> Optional[Dict]:
+    """
+    Atomically lease the next runnable job: a pending one, or an in-flight one
+    whose lease has expired. An expired job that has already used max_attempts
+    leases (a document that keeps crashing its worker) is marked failed instead.
+    Returns None when nothing is runnable.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            """
+            UPDATE jobs
+            SET state = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE state IN ('extracting', 'classifying') AND lease_expires < ? AND attempts >= ?
+            """,
+            (f"Lease expired on all {max_attempts} attempts", now, now, max_attempts)
+        )
+        row = conn.execute(
+            """
+            SELECT * FROM jobs
+            WHERE state = 'pending'
+               OR (state IN ('extracting', 'classifying') AND lease_expires < ?)
+            ORDER BY doc_key
+            LIMIT 1
+            """,
+            (now,)
+        ).fetchone()
+
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        conn.execute(
+            """
+            UPDATE jobs
+            SET state = 'extracting', lease_owner = ?, lease_expires = ?,
+                attempts = attempts + 1, error = NULL, updated_at = ?
+            WHERE doc_key = ?
+            """,
+            (owner, now + lease_seconds, now, row['doc_key'])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    job = dict(row)
+    job['attempts'] += 1
+    return job
+
+def set_state(conn: sqlite3.Connection, doc_key: str, owner: str, state: str,
+              lease_seconds: int = LEASE_SECONDS) -> bool:
+    """Move a leased job to an in-flight state and renew its lease."""
+    if state not in IN_FLIGHT:
+        raise ValueError(f"set_state only handles in-flight states, got {state}")
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET state = ?, lease_expires = ?, updated_at = ? WHERE doc_key = ? AND lease_owner = ?",
+        (state, now + lease_seconds, now, doc_key, owner)
+    )
+    return cursor.rowcount == 1
+
+def finish_job(conn: sqlite3.Connection, doc_key: str, owner: str, state: str,
+               result: Dict = None, error: str = None) -> bool:
+    """Mark a leased job done or failed and store its result."""
+    if state not in ('done', 'failed'):
+        raise ValueError(f"finish_job only handles done/failed, got {state}")
+    cursor = conn.execute(
+        """
+        UPDATE jobs
+        SET state = ?, result = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+        WHERE doc_key = ? AND lease_owner = ?
+        """,
+        (state, json.dumps(result) if result is not None else None, error, time.time(), doc_key, owner)
+    )
+    return cursor.rowcount == 1
+
+def reclaim_dead_leases(conn: sqlite3.Connection, max_attempts: int = MAX_ATTEMPTS) -> int:
+    """
+    Return in-flight jobs to pending when their owner was a process on this
+    host that no longer exists, so a crashed run resumes immediately instead of
+    waiting for the lease to lapse. Jobs that have used max_attempts leases are
+    marked failed instead. Returns the number of jobs returned to pending.
+    """
+    host = socket.gethostname()
+    reclaimed = 0
+    for row in conn.execute(
+        "SELECT doc_key, lease_owner, attempts FROM jobs WHERE state IN ('extracting', 'classifying')"
+    ).fetchall():
+        parts = (row['lease_owner'] or '').split(':')
+        if len(parts) != 3 or parts[0] != host or not parts[1].isdigit():
+            continue
+        if _pid_alive(int(parts[1])):
+            continue
+        exhausted = row['attempts'] >= max_attempts
+        conn.execute(
+            "UPDATE jobs SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE doc_key = ? AND lease_owner = ?",
+            ('failed' if exhausted else 'pending',
+             f"Worker died on all {max_attempts} attempts" if exhausted else None,
+             time.time(), row['doc_key'], row['lease_owner'])
+        )
+        reclaimed += not exhausted
+    return reclaimed
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def requeue_failed(conn: sqlite3.Connection, max_attempts: int = None) -> int:
+    """
+    Put failed jobs back to pending, optionally only those under max_attempts.
+    Their attempt count and error are reset so each gets a full set of leases.
+    """
+    query = ("UPDATE jobs SET state = 'pending', attempts = 0, error = NULL, updated_at = ? "
+             "WHERE state = 'failed'")
+    params = [time.time()]
+    if max_attempts:
+        query += " AND attempts < ?"
+        params.append(max_attempts)
+    return conn.execute(query, params).rowcount
+
+def requeue(conn: sqlite3.Connection, doc_keys: Iterable[str]) -> int:
+    """Send specific documents back to pending regardless of their state, with a fresh attempt count."""
+    now = time.time()
+    cursor = conn.executemany(
+        "UPDATE jobs SET state = 'pending', lease_owner = NULL, lease_expires = NULL, "
+        "attempts = 0, error = NULL, updated_at = ? WHERE doc_key = ?",
+        [(now, key) for key in doc_keys]
+    )
+    return cursor.rowcount
+
+def finished_jobs(conn: sqlite3.Connection) -> List[Dict]:
+    """Done and failed jobs with their stored results decoded."""
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE state IN ('done', 'failed') AND result IS NOT NULL ORDER BY doc_key"
+    ).fetchall()
+    return [{**dict(row), 'result': json.loads(row['result'])} for row in rows]
+
+def update_result(conn: sqlite3.Connection, doc_key: str, result: Dict):
+    """Overwrite the stored result of a finished job without changing its state."""
+    conn.execute(
+        "UPDATE jobs SET result = ?, updated_at = ? WHERE doc_key = ? AND state IN ('done', 'failed')",
+        (json.dumps(result), time.time(), doc_key)
+    )
+
+def queue_status(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Number of jobs in each state."""
+    counts = {state: 0 for state in STATES}
+    for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+        counts[row['state']] = row['n']
+    return counts
+
+def done_results(conn: sqlite3.Connection) -> List[Dict]:
+    """Stored results for every finished job (done or failed with a result)."""
+    rows = conn.execute(
+        "SELECT result FROM jobs WHERE result IS NOT NULL AND state IN ('done', 'failed') ORDER BY doc_key"
+    )
+    return [json.loads(row['result']) for row in rows]
+
+def run_workers(handler: Callable[[Dict, Callable[[str], None]], Dict],
+                db_path: Path = QUEUE_DB, workers: int = 5, limit: int = None,
+                is_failure: Callable[[Dict], bool] = None,
+                on_result: Callable[[Dict, Dict], None] = None) -> int:
+    """
+    Drain the queue with a pool of worker threads.
+
+    handler(job, set_state) processes one job; set_state('classifying') reports
+    progress and renews the lease. is_failure(result) decides whether a returned
+    result counts as failed. on_result(job, result) is called after each job is
+    stored. Stops after limit jobs have been claimed. Returns the number of jobs
+    processed.
+    """
+    claimed = {'count': 0}
+    claim_lock = threading.Lock()
+
+    def work():
+        conn = connect_queue(db_path)
+        owner = worker_id()
+        processed = 0
+        try:
+            while True:
+                with claim_lock:
+                    if limit is not None and claimed['count'] >= limit:
+                        break
+                    job = claim_job(conn, owner)
+                    if job is None:
+                        break
+                    claimed['count'] += 1
+
+                try:
+                    result = handler(job, lambda state: set_state(conn, job['doc_key'], owner, state))
+                    failed = bool(is_failure and is_failure(result))
+                    finish_job(conn, job['doc_key'], owner, 'failed' if failed else 'done',
+                               result=result, error=result.get('error') if failed else None)
+                except Exception as e:
+                    result = {"file": job['doc_key'], "error": str(e), "sba_status": "error"}
+                    finish_job(conn, job['doc_key'], owner, 'failed', result=result, error=str(e))
+
+                processed += 1
+                if on_result:
+                    on_result(job, result)
+        finally:
+            conn.close()
+        return processed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work) for _ in range(workers)]
+        return sum(f.result() for f in futures)
+
+def print_status(conn: sqlite3.Connection):
+    counts = queue_status(conn)
+    total = sum(counts.values())
+    print(f"CIM job queue: {total} documents")
+    for state in STATES:
+        print(f"  {state}: {counts[state]}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    conn = connect_queue()
+
+    if command == 'status':
+        print_status(conn)
+    elif command == 'retry-failed':
+        print(f"Re-queued {requeue_failed(conn)} failed jobs")
+    elif command == 'reclaim':
+        print(f"Reclaimed {reclaim_dead_leases(conn)} jobs from dead workers")
+    else:
+        print("Usage: python3 cim_job_queue.py [status|retry-failed|reclaim]")
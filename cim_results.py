@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Streaming results writer for CIM classification runs.
+Each result is appended to a JSONL file the moment its document finishes, and
+status counts and confidence buckets are kept as running aggregates, so a crash
+never loses more than the document in flight. compact_results() turns the log
+into the final JSON (and Parquet, when pyarrow is installed), keeping the
+latest result per file.
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+RESULTS_LOG = Path('sba_cim_analysis_grok.jsonl')
+MAX_SAMPLES = 10  # Undetermined examples kept for the summary
+
+_write_lock = threading.Lock()
+
+def new_aggregates() -> Dict:
+    """Empty running aggregates."""
+    return {
+        'total': 0,
+        'status_counts': {},
+        'confidence': {'high': 0, 'medium': 0, 'low': 0},
+        'undetermined': [],
+    }
+
+def confidence_bucket(confidence: float) -> str:
+    """Same bands as the original summary: >0.7 high, 0.4-0.7 medium, <0.4 low."""
+    if confidence > 0.7:
+        return 'high'
+    if confidence >= 0.4:
+        return 'medium'
+    return 'low'
+
+def update_aggregates(aggregates: Dict, result: Dict):
+    """Fold one result into the running aggregates."""
+    status = result.get('sba_status', 'unknown')
+    aggregates['total'] += 1
+    aggregates['status_counts'][status] = aggregates['status_counts'].get(status, 0) + 1
+    aggregates['confidence'][confidence_bucket(result.get('confidence') or 0)] += 1
+    if status == 'undetermined' and len(aggregates['undetermined']) < MAX_SAMPLES:
+        aggregates['undetermined'].append({
+            'file': result.get('file'),
+            'listing_id': result.get('listing_id'),
+            'confidence': result.get('confidence'),
+        })
+
+def repair_log(path: Path = RESULTS_LOG) -> bool:
+    """Truncate a torn final line left by a crash so the next append starts cleanly."""
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return False
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b'\n':
+            return False
+        f.seek(0)
+        content = f.read()
+        f.truncate(content.rfind(b'\n') + 1)
+    return True
+
+def append_result(result: Dict, aggregates: Dict = None, path: Path = RESULTS_LOG):
+    """Append one result to the log (flushed and fsynced) and update the aggregates."""
+    line = json.dumps(result) + '\n'
+    with _write_lock:
+        with open(path, 'a') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        if aggregates is not None:
+            update_aggregates(aggregates, result)
+
+def iter_results(path: Path = RESULTS_LOG) -> Iterator[Dict]:
+    """Yield logged results in order, skipping a torn final line."""
+    if not Path(path).exists():
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def _latest_offsets(path: Path) -> Dict[str, int]:
+    """Byte offset of the latest result for each file, without holding results in memory."""
+    offsets = {}
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                key = json.loads(line).get('file')
+            except json.JSONDecodeError:
+                key = None
+            if key is not None:
+                offsets[key] = offset
+            offset += len(line)
+    return offsets
+
+def compact_results(log_path: Path = RESULTS_LOG, json_path: Path = Path('sba_cim_analysis_grok.json'),
+                    parquet_path: Optional[Path] = None) -> Dict:
+    """
+    Write the latest result per file to the final JSON array, streaming record by
+    record, and return aggregates over the compacted set. A Parquet copy is written
+    too when parquet_path is given and pyarrow is available.
+    """
+    aggregates = new_aggregates()
+    if not Path(log_path).exists():
+        return aggregates
+
+    offsets = _latest_offsets(log_path)
+    keep = set(offsets.values())
+
+    tmp_path = Path(str(json_path) + '.tmp')
+    with open(log_path, 'rb') as src, open(tmp_path, 'w') as out:
+        out.write('[\n')
+        offset = 0
+        first = True
+        for line in src:
+            if offset in keep:
+                result = json.loads(line)
+                update_aggregates(aggregates, result)
+                out.write(('' if first else ',\n') + json.dumps(result, indent=2))
+                first = False
+            offset += len(line)
+        out.write('\n]\n')
+    os.replace(tmp_path, json_path)
+
+    if parquet_path:
+        write_parquet(json.loads(Path(json_path).read_text()), parquet_path)
+
+    return aggregates
+
+def _flatten_value(value):
+    if value is None or isinstance(value, str) or (isinstance(value, float) and value != value):
+        return value
+    return json.dumps(value)
+
+def write_parquet(records, parquet_path: Path) -> bool:
+    """
+    Parquet copy of the compacted results. Columns holding nested values (chunk
+    lists, evidence dicts) or mixed types are stored as JSON text, since Arrow
+    needs one type per column. Never raises: the JSON is already complete.
+    """
+    try:
+        import pandas as pd
+        import pyarrow
+    except ImportError:
+        print("pyarrow not installed, skipping Parquet output")
+        return False
+
+    df = pd.DataFrame(records)
+    for column in df.columns[df.dtypes == object]:
+        types = {type(value) for value in df[column].dropna()}
+        if len(types) > 1 or types & {dict, list}:
+            df[column] = df[column].map(_flatten_value)
+    try:
+        df.to_parquet(parquet_path, index=False)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, pyarrow.ArrowNotImplementedError) as e:
+        print(f"Could not write {parquet_path} ({e}), skipping Parquet output")
+        return False
+    return True
+
+def print_aggregates(aggregates: Dict, title: str = "SBA Status Summary (Grok Analysis)"):
+    """Print the status and confidence summary."""
+    print(f"\n{title}:")
+    for status, count in sorted(aggregates['status_counts'].items(), key=lambda item: -item[1]):
+        print(f"  {status}: {count}")
+
+    print("\nConfidence Distribution:")
+    print(f"High confidence (>0.7): {aggregates['confidence']['high']}")
+    print(f"Medium confidence (0.4-0.7): {aggregates['confidence']['medium']}")
+    print(f"Low confidence (<0.4): {aggregates['confidence']['low']}")
+
+    undetermined = aggregates['status_counts'].get('undetermined', 0)
+    if undetermined:
+        print(f"\nUndetermined cases requiring human review: {undetermined}")
+        for sample in aggregates['undetermined']:
+            print(f"  {sample['file']} (ID: {sample['listing_id']}, confidence: {sample['confidence']})")
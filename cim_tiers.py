@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Confidence-escalation scheduler for CIM classification across model tiers.
+A document is answered by the cheapest tier that is confident enough:
+rules (regex plus the local classifier), then a small model on the pages most
+likely to mention SBA, then the large model on the full document. When a tier
+is slow, the next tier is started speculatively so an escalation does not pay
+both latencies in full.
+
+The frontier command runs every tier once per labelled CIM and replays the
+policy offline over a grid of thresholds, reporting cost and latency against
+agreement with the existing labels.
+
+Usage:
+    python3 cim_tiers.py frontier --limit 100
+    python3 cim_tiers.py frontier --prefetch-after 2.0
+"""
+
+import re
+import time
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+
+from cim_chunking import count_tokens, split_pages
+
+# Thresholds: a tier's answer is accepted when its confidence reaches the threshold
+TIER_POLICY = {
+    'rules': 0.9,
+    'small': 0.8,
+    'prefetch_after': 3.0,  # Seconds before the next tier is started speculatively
+}
+
+SMALL_MODEL = 'grok-3-mini'
+SMALL_TIER_TOKENS = 3000  # Page budget for the small model
+KEYWORDS = re.compile(r'\bSBA\b|Small Business Administration|financ|quickview|eligib|lender|'
+                      r'down payment|Canada|cash only', re.IGNORECASE)
+
+# (pattern, status, confidence); the strongest match wins, conflicts are undetermined
+RULES = [
+    (re.compile(r'SBA\s*(?:Pre-?)?(?:Eligible|Qualified|Approved)\s*[:\-]?\s*(?:Yes|Y)\b', re.IGNORECASE), 'qualified', 0.95),
+    (re.compile(r'SBA\s*(?:Pre-?)?(?:Eligible|Qualified|Approved)\s*[:\-]?\s*No\b', re.IGNORECASE), 'not_qualified', 0.95),
+    (re.compile(r'\b(?:not|no)\s+SBA\s+(?:eligible|financing|qualified|approved)', re.IGNORECASE), 'not_qualified', 0.9),
+    (re.compile(r'SBA\s+(?:pre-?qualified|financing\s+(?:is\s+)?available|loan\s+eligible)', re.IGNORECASE), 'qualified', 0.85),
+    (re.compile(r'\bcash only\b|all[- ]cash transaction', re.IGNORECASE), 'not_qualified', 0.6),
+]
+PAGE_NUMBER = re.compile(r'--- Page (\d+) ---')
+
+TIER_POOL_WORKERS = 32
+
+_tier_pool = None
+_tier_pool_lock = threading.Lock()
+
+def get_tier_pool() -> ThreadPoolExecutor:
+    """The shared tier thread pool, created on first use rather than at import."""
+    global _tier_pool
+    with _tier_pool_lock:
+        if _tier_pool is None:
+            _tier_pool = ThreadPoolExecutor(max_workers=TIER_POOL_WORKERS)
+        return _tier_pool
+
+def rule_classify(text: str) -> Dict:
+    """Regex rules over the document. Confidence 0 when nothing matches."""
+    best = {}
+    page_numbers = set()
+    evidence = []
+    for page in split_pages(text):
+        number = PAGE_NUMBER.search(page)
+        for pattern, status, confidence in RULES:
+            match = pattern.search(page)
+            if not match:
+                continue
+            evidence.append(match.group(0))
+            if number:
+                page_numbers.add(int(number.group(1)))
+            best[status] = max(best.get(status, 0.0), confidence)
+
+    if not best:
+        return {"sba_status": "undetermined", "confidence": 0.0, "evidence": [], "page_numbers": []}
+
+    if len(best) > 1:
+        # Conflicting explicit statements are for a model to resolve
+        return {"sba_status": "undetermined", "confidence": 0.3, "evidence": evidence,
+                "page_numbers": sorted(page_numbers)}
+
+    status, confidence = next(iter(best.items()))
+    return {"sba_status": status, "confidence": confidence, "evidence": evidence,
+            "page_numbers": sorted(page_numbers)}
+
+def select_pages(text: str, max_tokens: int = SMALL_TIER_TOKENS) -> str:
+    """
+    The first two pages plus the pages with the most SBA/financing keywords,
+    kept in document order and within the token budget.
+    """
+    pages = split_pages(text)
+    ranked = sorted(range(len(pages)), key=lambda i: (i >= 2, -len(KEYWORDS.findall(pages[i])), i))
+
+    chosen = []
+    used = 0
+    for i in ranked:
+        tokens = count_tokens(pages[i])
+        if used + tokens > max_tokens:
+            continue
+        if i >= 2 and not KEYWORDS.search(pages[i]):
+            break
+        chosen.append(i)
+        used += tokens
+    return ''.join(pages[i] for i in sorted(chosen))
+
+def run_tiers(text: str, tiers: List[Dict], policy: Dict = None) -> Dict:
+    """
+    Run the tiers in order until one is confident.
+
+    Each tier is a dict with name and fn(text) -> result. A tier's answer is
+    accepted when its confidence reaches policy[name]; the last tier is always
+    accepted. If a tier has not answered after policy['prefetch_after'] seconds
+    the next tier is started in parallel. The result carries the deciding tier,
+    a per-tier trace and how many speculative calls went unused.
+    """
+    policy = {**TIER_POLICY, **(policy or {})}
+    trace = []
+    evidence = []
+    wasted = 0
+    pool = get_tier_pool()
+
+    future = pool.submit(_timed, tiers[0]['fn'], text)
+    for i, tier in enumerate(tiers):
+        is_last = i == len(tiers) - 1
+        next_future = None
+        if not is_last:
+            done, _ = wait([future], timeout=policy['prefetch_after'])
+            if not done:
+                next_future = pool.submit(_timed, tiers[i + 1]['fn'], text)
+
+        result, latency = future.result()
+        confidence = result.get('confidence', 0) or 0
+        trace.append({'tier': tier['name'], 'status': result.get('sba_status'),
+                      'confidence': confidence, 'latency': round(latency, 3),
+                      'prefetched_next': next_future is not None})
+        evidence.extend(result.get('evidence') or [])
+
+        if is_last or (result.get('sba_status') != 'error' and confidence >= policy.get(tier['name'], 1.0)):
+            if next_future is not None:
+                wasted += 1  # Already in flight; it finishes in the background
+            return {**result, "evidence": evidence, "source": f"tier_{tier['name']}",
+                    "tier_trace": trace, "speculative_wasted": wasted}
+
+        future = next_future or pool.submit(_timed, tiers[i + 1]['fn'], text)
+
+def _timed(fn: Callable[[str], Dict], text: str) -> Tuple[Dict, float]:
+    start = time.perf_counter()
+    result = fn(text)
+    return result, time.perf_counter() - start
+
+def simulate_policy(outcomes: List[Dict], tier_names: List[str], policy: Dict) -> Dict:
+    """
+    Replay a policy over recorded per-tier outcomes for each document.
+    outcomes[d][tier] holds status, confidence, latency and cost from running
+    that tier on its own; label is the reference status.
+    """
+    correct = 0
+    costs = []
+    latencies = []
+    for doc in outcomes:
+        cost = 0.0
+        start = 0.0  # When the current tier was started
+        previous_finish = 0.0  # A tier's answer is only usable once the tier before it has answered
+        for i, name in enumerate(tier_names):
+            tier = doc[name]
+            finish = max(start + tier['latency'], previous_finish)
+            cost += tier['cost']
+            is_last = i == len(tier_names) - 1
+
+            prefetch_at = None
+            if not is_last and tier['latency'] > policy['prefetch_after']:
+                prefetch_at = start + policy['prefetch_after']
+
+            if is_last or (tier['status'] != 'error' and tier['confidence'] >= policy.get(name, 1.0)):
+                if prefetch_at is not None:
+                    cost += doc[tier_names[i + 1]]['cost']  # Speculative call that went unused
+                correct += tier['status'] == doc['label']
+                latencies.append(finish)
+                break
+
+            previous_finish = finish
+            start = prefetch_at if prefetch_at is not None else finish
+        costs.append(cost)
+
+    latencies = np.array(latencies)
+    return {
+        'agreement': correct / len(outcomes) if outcomes else 0.0,
+        'cost_per_doc': float(np.mean(costs)) if costs else 0.0,
+        'latency_p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'latency_p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+    }
+
+def pareto_front(points: List[Dict], cost_key: str) -> List[Dict]:
+    """Policies not beaten on both cost_key (lower) and agreement (higher)."""
+    front = []
+    for point in sorted(points, key=lambda p: (p[cost_key], -p['agreement'])):
+        if not front or point['agreement'] > front[-1]['agreement']:
+            front.append(point)
+    return front
+
+def evaluate_frontier(cims_dir: Path = None, limit: int = None, workers: int = 5,
+                      prefetch_after: float = None) -> Dict:
+    """
+    Run every tier once on each labelled CIM, then sweep the thresholds and
+    report the cost/latency vs. agreement frontier. The rules tier's local
+    classifier is scored out of fold: each CIM is classified by a model
+    trained without it.
+    """
+    import process_cims_with_grok as pipeline
+    from sba_classifier import load_labels, out_of_fold_models
+
+    cims_dir = Path(cims_dir or pipeline.CIMS_DIR)
+    status_for = {'yes': 'qualified', 'no': 'not_qualified', 'unknown': 'undetermined'}
+    labels = {name: status_for[label] for name, label in load_labels().items()}
+    pdfs = [p for p in sorted(cims_dir.glob('*.pdf')) if p.name in labels][:limit]
+
+    tiers = pipeline.build_tiers()
+    names = [tier['name'] for tier in tiers]
+    print("Training out-of-fold local classifiers...")
+    fold_models = out_of_fold_models(cims_dir)
+
+    def run_document(pdf):
+        text, _ = pipeline.extract_pdf_text(str(pdf))
+        if not text:
+            return None
+        outcome = {'label': labels[pdf.name]}
+        for tier in tiers:
+            fn = tier['fn']
+            if tier['name'] == 'rules' and pdf.name in fold_models:
+                fn = lambda text, model=fold_models[pdf.name]: pipeline.rules_tier(text, model)
+            result, latency = _timed(fn, text)
+            outcome[tier['name']] = {
+                'status': result.get('sba_status', 'undetermined'),
+                'confidence': result.get('confidence', 0) or 0,
+                'latency': latency,
+                'cost': tier['estimate_cost'](text),
+            }
+        return outcome
+
+    print(f"Running {len(names)} tiers on {len(pdfs)} labelled CIMs...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = [o for o in executor.map(run_document, pdfs) if o]
+
+    thresholds = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.01]  # 1.01 = never accept this tier
+    base = {**TIER_POLICY}
+    if prefetch_after is not None:
+        base['prefetch_after'] = prefetch_after
+
+    points = []
+    for rules_threshold in thresholds:
+        for small_threshold in thresholds:
+            policy = {**base, 'rules': rules_threshold, 'small': small_threshold}
+            points.append({**simulate_policy(outcomes, names, policy),
+                           'rules': rules_threshold, 'small': small_threshold})
+
+    current = simulate_policy(outcomes, names, base)
+    large_only = simulate_policy(outcomes, names, {**base, 'rules': 1.01, 'small': 1.01})
+
+    def row(point):
+        return (f"  rules>={point['rules']:<5} small>={point['small']:<5} agreement {point['agreement']:.1%}  "
+                f"${point['cost_per_doc']:.5f}/doc  p50 {point['latency_p50']:.2f}s  p95 {point['latency_p95']:.2f}s")
+
+    print("\n" + "=" * 60)
+    print(f"TIER POLICY FRONTIER ({len(outcomes)} documents)")
+    print("=" * 60)
+    print(f"Large model only: agreement {large_only['agreement']:.1%}, ${large_only['cost_per_doc']:.5f}/doc, "
+          f"p50 {large_only['latency_p50']:.2f}s")
+    print(f"Current policy {base}: agreement {current['agreement']:.1%}, "
+          f"${current['cost_per_doc']:.5f}/doc, p50 {current['latency_p50']:.2f}s")
+    print("\nCost vs. agreement frontier:")
+    for point in pareto_front(points, 'cost_per_doc'):
+        print(row(point))
+    print("\nLatency (p95) vs. agreement frontier:")
+    for point in pareto_front(points, 'latency_p95'):
+        print(row(point))
+    print("\nAgreement is measured against the existing cim_analysis_results labels "
+          "(local classifier out of fold).")
+
+    return {'documents': len(outcomes), 'current': current, 'large_only': large_only, 'points': points}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tiered CIM classification policy')
+    parser.add_argument('command', choices=['frontier'])
+    parser.add_argument('--cims-dir', default=None)
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--prefetch-after', type=float, default=None)
+    args = parser.parse_args()
+
+    evaluate_frontier(args.cims_dir, args.limit, args.workers, args.prefetch_after)
@@ -9,6 +9,9 @@ import pymysql
 import json
 from datetime import datetime
 
+from listing_facts import load_facts
+from multiples_engine import attach_sba_status, clean_money, compute_multiples
+
 def get_db_connection():
     """Establish connection to MySQL database."""
     return pymysql.connect(
@@ -29,7 +32,7 @@ def main():
     
     # Load the SBA classification data
     print("Loading SBA classification data...")
-    df_classification = pd.read_csv('launch_date_analysis.csv')
+    df_classification = load_facts(['id', 'sba_status'])
     
     # Get listing IDs for each category
     sba_ids = df_classification[df_classification['sba_status'] == 'yes']['id'].tolist()
@@ -68,13 +71,7 @@ def main():
     
     df_db = pd.DataFrame(db_data)
     df_db['source'] = 'database'
-    df_db['asking_price'] = df_db.apply(
-        lambda row: row['asking_at_close'] if pd.notna(row['asking_at_close']) and row['asking_at_close'] > 0 
-        else row['capsule_expected_value'] if pd.notna(row['capsule_expected_value']) and row['capsule_expected_value'] > 0
-        else None,
-        axis=1
-    )
-    df_db['sde'] = df_db['sde_at_close']
+    df_db = compute_multiples(df_db, ['asking_at_close', 'capsule_expected_value'], ['sde_at_close'])
     
     # 2. Load CIM analysis data
     print("2. Loading CIM analysis data...")
@@ -84,8 +81,8 @@ def main():
     df_cim = pd.DataFrame(cim_data)
     df_cim['source'] = 'cim'
     df_cim['id'] = df_cim['listing_id']
-    df_cim['asking_price'] = pd.to_numeric(df_cim['asking_price'], errors='coerce')
-    df_cim['sde'] = pd.to_numeric(df_cim['sde'], errors='coerce')
+    df_cim['asking_price'] = clean_money(df_cim['asking_price'])
+    df_cim['sde'] = clean_money(df_cim['sde'])
     
     # Map CIM SBA status to our classification
     df_cim['cim_sba'] = df_cim['sba_eligible']
@@ -93,46 +90,18 @@ def main():
     # 3. Merge data sources, preferring database data when available
     print("3. Merging data sources...")
     
-    # Start with all IDs
-    all_data = []
+    # Get SBA status from CSV, in the order of all_ids
+    df_ids = attach_sba_status(pd.DataFrame({'id': all_ids}), df_classification, default='unknown')
     
-    for listing_id in all_ids:
-        record = {'id': listing_id}
-        
-        # Get SBA status from CSV
-        if listing_id in sba_ids:
-            record['sba_status'] = 'yes'
-        elif listing_id in non_sba_ids:
-            record['sba_status'] = 'no'
-        else:
-            record['sba_status'] = 'unknown'
-        
-        # Try to get financials from database first
-        db_row = df_db[df_db['id'] == listing_id]
-        if not db_row.empty:
-            db_asking = db_row.iloc[0]['asking_price']
-            db_sde = db_row.iloc[0]['sde']
-            if pd.notna(db_asking) and pd.notna(db_sde) and db_asking > 0 and db_sde > 0:
-                record['asking_price'] = db_asking
-                record['sde'] = db_sde
-                record['source'] = 'database'
-                record['name'] = db_row.iloc[0]['name']
-                all_data.append(record)
-                continue
-        
-        # If no database data, try CIM
-        cim_row = df_cim[df_cim['id'] == listing_id]
-        if not cim_row.empty:
-            cim_asking = cim_row.iloc[0]['asking_price']
-            cim_sde = cim_row.iloc[0]['sde']
-            if pd.notna(cim_asking) and pd.notna(cim_sde) and cim_asking > 0 and cim_sde > 0:
-                record['asking_price'] = cim_asking
-                record['sde'] = cim_sde
-                record['source'] = 'cim'
-                record['name'] = f"Listing {listing_id}"
-                all_data.append(record)
+    # Database financials where both asking price and SDE are positive, else the first CIM row's
+    columns = ['id', 'asking_price', 'sde', 'source', 'name']
+    db_rows = df_db[df_db['asking_price'].notna() & df_db['sde'].notna()].drop_duplicates('id')
+    cim_rows = df_cim.drop_duplicates('id')
+    cim_rows = cim_rows[cim_rows['asking_price'].notna() & cim_rows['sde'].notna()]
+    cim_rows = cim_rows[~cim_rows['id'].isin(db_rows['id'])].assign(name=lambda d: 'Listing ' + d['id'].astype(str))
+    financials = pd.concat([db_rows[columns], cim_rows[columns]])
     
-    df_combined = pd.DataFrame(all_data)
+    df_combined = df_ids.merge(financials, on='id')
     
     # Calculate multiples
     df_combined['multiple'] = df_combined['asking_price'] / df_combined['sde']
@@ -27,6 +27,15 @@ def has_strong_sba_indicator(name):
             return True
     return False
 
+def corrected_sba_status(name, sba_status):
+    """One listing's SBA status after the title rules applied by correct_classifications()."""
+    if has_strong_sba_indicator(name):
+        if sba_status in ['no', 'unknown']:
+            return 'partial' if 'partial' in name.lower() else 'yes'
+    elif sba_status == 'no' and not pd.isna(name) and 'sba' in str(name).lower():
+        return 'unknown'
+    return sba_status
+
 def correct_classifications():
     """Apply corrections to SBA classifications."""
     
@@ -5,7 +5,6 @@ Searches through folders and subfolders for Business Summary PDFs.
 """
 
 import os
-import io
 import re
 import json
 import time
@@ -13,9 +12,11 @@ import pymysql
 from pathlib import Path
 from typing import List, Dict, Optional, Set
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from cim_catalog import existing_listing_ids
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuration
@@ -24,6 +25,8 @@ SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 OUTPUT_DIR = Path('cims')
 CACHE_FILE = 'drive_search_cache.json'
 MAX_WORKERS = 3  # Parallel downloads
+# Point every Drive client at a stand-in such as mock_drive_server.py (no service account needed)
+DRIVE_API_URL = os.getenv('DRIVE_API_URL')
 
 def get_db_connection():
     return pymysql.connect(
@@ -36,24 +39,42 @@ def get_db_connection():
         cursorclass=pymysql.cursors.DictCursor
     )
 
+def get_credentials():
+    """Service-account credentials for read-only Drive access."""
+    if DRIVE_API_URL:
+        return AnonymousCredentials()
+    return service_account.Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_FILE, scopes=SCOPES
+    )
+
+def has_drive_access() -> bool:
+    return bool(DRIVE_API_URL) or os.path.exists(SERVICE_ACCOUNT_FILE)
+
+def build_drive_client(credentials=None, http=None):
+    """
+    Drive v3 client from the bundled discovery document. With DRIVE_API_URL set,
+    every call, including batch requests, goes to that server instead of Google.
+    """
+    auth = {'http': http} if http is not None else {'credentials': credentials or get_credentials()}
+    if not DRIVE_API_URL:
+        return build('drive', 'v3', cache_discovery=False, **auth)
+    document = json.loads(get_static_doc('drive', 'v3'))
+    document['rootUrl'] = DRIVE_API_URL.rstrip('/') + '/'
+    return build_from_document(document, **auth)
+
+def build_drive_service(credentials=None):
+    """Drive v3 client. Each thread needs its own, since the HTTP transport is not thread-safe."""
+    return build_drive_client(credentials)
+
 def get_existing_cim_ids() -> Set[int]:
-    """Get listing IDs for CIMs we already have."""
-    cim_listing_ids = set()
-    
-    for f in OUTPUT_DIR.glob('*.pdf'):
-        match = re.match(r'^(\d+)[_\-]', f.name)
-        if match:
-            cim_listing_ids.add(int(match.group(1)))
-    
-    return cim_listing_ids
+    """Get listing IDs for CIMs we already have (from the CIM catalog)."""
+    return existing_listing_ids(OUTPUT_DIR)
 
-def get_listings_to_download(limit: int = None) -> List[Dict]:
-    """Get listings with Google Drive links that we don't have CIMs for."""
+def get_drive_listings(limit: int = None) -> List[Dict]:
+    """Get listings with Google Drive links, sold first, then by inquiry count."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    existing_ids = get_existing_cim_ids()
-    
     # Focus on sold and lost listings with Drive links
     query = """
     SELECT 
@@ -88,8 +109,14 @@ def get_listings_to_download(limit: int = None) -> List[Dict]:
     results = cursor.fetchall()
     conn.close()
     
+    return results
+
+def get_listings_to_download(limit: int = None) -> List[Dict]:
+    """Get listings with Google Drive links that we don't have CIMs for."""
+    existing_ids = get_existing_cim_ids()
+    
     # Filter out ones we already have
-    missing = [r for r in results if r['id'] not in existing_ids]
+    missing = [r for r in get_drive_listings(limit) if r['id'] not in existing_ids]
     
     return missing
 
@@ -111,9 +138,41 @@ def extract_folder_id(url: str) -> Optional[str]:
     
     return None
 
+def is_cim_candidate(name: str, listing_id: int) -> bool:
+    """Whether a PDF name looks like the listing's Business Summary / CIM."""
+    fname = name.lower()
+    # Check for various naming patterns
+    return any(term in fname for term in [
+        'business summary', 
+        'cim', 
+        'confidential',
+        'information memorandum',
+        'executive summary',
+        f'{listing_id}',  # Sometimes named with listing ID
+        'start here'  # Common pattern in file names
+    ])
+
+def list_folder(service, query: str, fields: str, page_size: int = 100) -> List[Dict]:
+    """Run a files().list query, following nextPageToken until every page is read."""
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=query,
+            fields=f"nextPageToken, {fields}",
+            pageSize=page_size,
+            pageToken=page_token
+        ).execute()
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
 def search_folder_recursive(service, folder_id: str, listing_id: int, depth: int = 0, max_depth: int = 3) -> Optional[Dict]:
     """
     Recursively search a folder and its subfolders for Business Summary PDFs.
+    For many listings at once use drive_crawler.find_cims, which batches the
+    folder queries instead of walking one folder at a time.
     """
     if depth > max_depth:
         return None
@@ -121,27 +180,11 @@ def search_folder_recursive(service, folder_id: str, listing_id: int, depth: int
     try:
         # Search for PDFs in current folder
         query = f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false"
-        results = service.files().list(
-            q=query,
-            fields="files(id, name, size, mimeType)",
-            pageSize=100
-        ).execute()
-        
-        files = results.get('files', [])
+        files = list_folder(service, query, "files(id, name, size, mimeType, md5Checksum, modifiedTime)")
         
         # Look for Business Summary or CIM files
         for file in files:
-            fname = file['name'].lower()
-            # Check for various naming patterns
-            if any(term in fname for term in [
-                'business summary', 
-                'cim', 
-                'confidential',
-                'information memorandum',
-                'executive summary',
-                f'{listing_id}',  # Sometimes named with listing ID
-                'start here'  # Common pattern in file names
-            ]):
+            if is_cim_candidate(file['name'], listing_id):
                 print(f"    Found: {file['name']}")
                 return file
         
@@ -149,13 +192,7 @@ def search_folder_recursive(service, folder_id: str, listing_id: int, depth: int
         if depth < max_depth:
             # Get all folders in current folder
             folder_query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            folder_results = service.files().list(
-                q=folder_query,
-                fields="files(id, name)",
-                pageSize=50
-            ).execute()
-            
-            subfolders = folder_results.get('files', [])
+            subfolders = list_folder(service, folder_query, "files(id, name)")
             
             # Search each subfolder
             for subfolder in subfolders:
@@ -172,47 +209,29 @@ def search_folder_recursive(service, folder_id: str, listing_id: int, depth: int
     
     return None
 
-def download_file(service, file_id: str, output_path: Path) -> bool:
-    """Download a file from Google Drive."""
-    try:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status and status.progress():
-                print(f"      Download {int(status.progress() * 100)}%", end='\r')
-        
-        # Save file
-        fh.seek(0)
-        with open(output_path, 'wb') as f:
-            f.write(fh.read())
-        
+def download_file(file_id: str, output_path: Path, md5: str = None, size: int = None) -> bool:
+    """
+    Download a file from Google Drive.
+    Goes through drive_downloader: chunked, resumable from a .part file, and
+    verified against md5 before it lands at output_path.
+    """
+    from drive_downloader import download_resumable
+    result = download_resumable(file_id, output_path, md5, size)
+    if result['ok']:
         print(f"      Saved to: {output_path}")
         return True
-        
-    except Exception as e:
-        print(f"      Error downloading: {e}")
-        return False
+    print(f"      Error downloading: {result['error']}")
+    return False
 
-def process_listing(service, listing: Dict) -> Dict:
-    """Process a single listing to find and download its CIM."""
-    listing_id = listing['id']
-    result = {
-        'listing_id': listing_id,
-        'name': listing['name'],
-        'status': listing['status'],
-        'found': False,
-        'downloaded': False,
-        'file_name': None,
-        'error': None
-    }
-    
-    print(f"\nProcessing listing {listing_id}: {listing['name'][:50]}...")
-    
-    # Try different folder sources
+def cim_output_path(listing_id: int, file_name: str) -> Path:
+    """Local path for a listing's CIM: cims/<listing_id>_<cleaned file name>."""
+    # Clean filename for saving
+    safe_name = re.sub(r'[^\w\s\-\.]', '', file_name)
+    safe_name = re.sub(r'\s+', '_', safe_name)
+    return OUTPUT_DIR / f"{listing_id}_{safe_name}"
+
+def listing_folder_ids(listing: Dict) -> List[tuple]:
+    """(folder_type, folder_id) pairs to search for a listing, most likely first."""
     folder_ids = []
     
     # 1. Business summary folder (most likely)
@@ -229,59 +248,79 @@ def process_listing(service, listing: Dict) -> Dict:
         if folder_id:
             folder_ids.append(('drive_link', folder_id))
     
+    return folder_ids
+
+def process_listing(service, listing: Dict, found: Optional[Dict] = None) -> Dict:
+    """
+    Process a single listing to find and download its CIM.
+    found is the file already located by drive_crawler; the folder walk is
+    skipped when it is given.
+    """
+    listing_id = listing['id']
+    result = {
+        'listing_id': listing_id,
+        'name': listing['name'],
+        'status': listing['status'],
+        'found': False,
+        'downloaded': False,
+        'file_name': None,
+        'error': None
+    }
+    
+    print(f"\nProcessing listing {listing_id}: {listing['name'][:50]}...")
+    
+    folder_ids = listing_folder_ids(listing)
+    
     if not folder_ids:
         result['error'] = 'No folder IDs found'
         print(f"  No folder IDs found for listing {listing_id}")
         return result
     
     # Try each folder
+    file = found
     for folder_type, folder_id in folder_ids:
-        print(f"  Searching in {folder_type}: {folder_id}")
-        
-        file = search_folder_recursive(service, folder_id, listing_id)
-        
         if file:
-            result['found'] = True
-            result['file_name'] = file['name']
-            
-            # Clean filename for saving
-            safe_name = re.sub(r'[^\w\s\-\.]', '', file['name'])
-            safe_name = re.sub(r'\s+', '_', safe_name)
-            output_path = OUTPUT_DIR / f"{listing_id}_{safe_name}"
-            
-            # Download the file
-            if download_file(service, file['id'], output_path):
-                result['downloaded'] = True
-                print(f"  ✓ Successfully downloaded CIM for listing {listing_id}")
-            else:
-                result['error'] = 'Download failed'
-            
             break
+        print(f"  Searching in {folder_type}: {folder_id}")
+        file = search_folder_recursive(service, folder_id, listing_id)
     
-    if not result['found']:
+    if file:
+        result['found'] = True
+        result['file_name'] = file['name']
+        
+        output_path = cim_output_path(listing_id, file['name'])
+        
+        # Download the file
+        if download_file(file['id'], output_path, file.get('md5Checksum'), file.get('size')):
+            result['downloaded'] = True
+            print(f"  ✓ Successfully downloaded CIM for listing {listing_id}")
+        else:
+            result['error'] = 'Download failed'
+    else:
         result['error'] = 'No CIM found in any folder'
         print(f"  ✗ No CIM found for listing {listing_id}")
     
     return result
 
-def download_cims_batch(limit: int = 10, start_from: int = 0):
-    """Download CIMs for listings in batches."""
+def download_cims_batch(limit: int = 10, start_from: int = 0, crawl: bool = True):
+    """
+    Download CIMs for listings in batches.
+    With crawl, drive_crawler locates the files for all listings first; otherwise
+    each listing's folders are walked one request at a time.
+    """
     
     # Create output directory
     OUTPUT_DIR.mkdir(exist_ok=True)
     
     # Check for service account file
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
+    if not has_drive_access():
         print("ERROR: service_account.json not found!")
         print("Please add the Google service account JSON file to the current directory.")
         return
     
     # Set up Drive API
     print("Setting up Google Drive API...")
-    credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES
-    )
-    service = build('drive', 'v3', credentials=credentials)
+    service = build_drive_service()
     
     # Test connection
     try:
@@ -303,6 +342,13 @@ def download_cims_batch(limit: int = 10, start_from: int = 0):
     
     print(f"Found {len(listings)} listings to process")
     
+    # Locate every listing's CIM up front with batched folder queries.
+    # Listings the crawler could not finish are walked folder by folder below.
+    found = {}
+    if crawl:
+        from drive_crawler import find_cims
+        found = find_cims(listings)
+    
     # Process listings
     results = []
     successful = 0
@@ -310,7 +356,16 @@ def download_cims_batch(limit: int = 10, start_from: int = 0):
     
     for i, listing in enumerate(listings, 1):
         print(f"\n[{i}/{len(listings)}]", end='')
-        result = process_listing(service, listing)
+        if listing['id'] in found and found[listing['id']] is None:
+            # The crawler already searched every folder of this listing
+            result = {'listing_id': listing['id'], 'name': listing['name'], 'status': listing['status'],
+                      'found': False, 'downloaded': False, 'file_name': None,
+                      'error': 'No CIM found in any folder'}
+            print(f" No CIM found for listing {listing['id']}")
+            results.append(result)
+            failed += 1
+            continue
+        result = process_listing(service, listing, found.get(listing['id']))
         results.append(result)
         
         if result['downloaded']:
@@ -417,6 +472,6 @@ if __name__ == "__main__":
         existing = len(get_existing_cim_ids())
         print(f"\nCurrent status: {existing} CIMs already downloaded")
         
-        if not os.path.exists(SERVICE_ACCOUNT_FILE):
+        if not has_drive_access():
             print("\n⚠️  WARNING: service_account.json not found!")
             print("   Please add your Google service account credentials file")
\ No newline at end of file
@@ -12,6 +12,8 @@ import json
 from typing import Set, List, Dict
 import time
 
+from cim_catalog import existing_listing_ids
+
 def get_db_connection():
     return pymysql.connect(
         host='127.0.0.1',
@@ -24,16 +26,8 @@ def get_db_connection():
     )
 
 def get_existing_cim_ids() -> Set[int]:
-    """Get listing IDs for CIMs we already have."""
-    cims_dir = Path('/Users/markdaoust/Developer/ql_stats/cims')
-    cim_listing_ids = set()
-    
-    for f in cims_dir.glob('*.pdf'):
-        match = re.match(r'^(\d+)[_\-]', f.name)
-        if match:
-            cim_listing_ids.add(int(match.group(1)))
-    
-    return cim_listing_ids
+    """Get listing IDs for CIMs we already have (from the CIM catalog)."""
+    return existing_listing_ids(Path('/Users/markdaoust/Developer/ql_stats/cims'))
 
 def get_listings_with_drive_links() -> List[Dict]:
     """Get listings with Google Drive links that we don't have CIMs for."""
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Batched Google Drive crawler for locating listing CIMs.
+download_cims_from_drive.py walks each listing's folders one request at a time
+(up to three folder sources, four levels deep), so a few hundred listings cost
+thousands of sequential round trips. This crawler walks all listings together,
+breadth-first by depth:
+
+- one files.list query covers many folders ('a' in parents or 'b' in parents ...)
+  and returns both PDFs and subfolders, with the parents field used to map each
+  file back to its listing
+- up to 100 of those queries go in one HTTP batch request, and several batches
+  are in flight at once from an asyncio loop
+- every query follows nextPageToken, so folders with more than one page of files
+  are read completely
+
+Folder sources are preferred in the same order as the sequential search
+(business summary folder, drive folder, drive link), but within a source the
+shallowest is_cim_candidate PDF wins. search_folder_recursive instead returns
+the first candidate of its depth-first walk, which can be a deeper file in an
+earlier subfolder, so the two can pick different files when a source holds
+several candidates. A listing stops being crawled once a preferred source has
+produced a match.
+
+Usage:
+    python3 drive_crawler.py --limit 200                 # Locate CIMs, write drive_crawl_results.json
+    python3 drive_crawler.py --limit 200 --concurrency 8
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from drive_scheduler import scheduled_service, acquire_token, is_rate_limited, on_rate_limited
+from download_cims_from_drive import (
+    get_credentials, is_cim_candidate,
+    listing_folder_ids, get_listings_to_download
+)
+
+PARENTS_PER_QUERY = 40  # Folder ids OR'd into one files.list query
+BATCH_SIZE = 100  # Drive's limit on requests per batch call
+PAGE_SIZE = 1000
+CONCURRENCY = 4  # Batch calls in flight
+MAX_DEPTH = 3
+MAX_RETRIES = 5
+RETRY_STATUSES = (500, 502, 503)  # Transient server errors; rate limits are told apart by is_rate_limited
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+FIELDS = "nextPageToken, files(id, name, size, mimeType, md5Checksum, modifiedTime, parents)"
+RESULTS_FILE = 'drive_crawl_results.json'
+
+def _thread_service(credentials):
+    """One Drive client per executor thread, metered by the shared drive_scheduler bucket."""
+    return scheduled_service(credentials)
+
+def parents_query(folder_ids: List[str]) -> str:
+    """PDFs and subfolders directly inside any of the folders."""
+    parents = ' or '.join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+    return (f"({parents}) and trashed=false and "
+            f"(mimeType='application/pdf' or mimeType='{FOLDER_MIME}')")
+
+def chunked(items: List, size: int) -> List[List]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def execute_batch(queries: List[Tuple[List[str], Optional[str]]], credentials, stats: Dict) -> List[Optional[Dict]]:
+    """
+    Send (folder_ids, page_token) queries as one batch call, retrying the
+    rate-limited ones and server errors with backoff; permission 403s and
+    other client errors are not retried. Returns one response per query,
+    None for queries that could not be completed.
+    """
+    service = _thread_service(credentials)
+    responses = [None] * len(queries)
+    pending = list(range(len(queries)))
+
+    for attempt in range(MAX_RETRIES + 1):
+        failed = []
+
+        def callback(request_id, response, exception):
+            i = int(request_id)
+            if exception is None:
+                responses[i] = response
+                return
+            resp = getattr(exception, 'resp', None)
+            status = getattr(resp, 'status', None)
+            if is_rate_limited(status, getattr(exception, 'content', b'')):
+                # Throttle every worker through the shared bucket, not just this batch
+                retry_after = resp.get('retry-after') if resp is not None else None
+                on_rate_limited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+                failed.append(i)
+            elif status in RETRY_STATUSES:
+                failed.append(i)
+            else:
+                print(f"  Query over {len(queries[i][0])} folders failed: {exception}")
+
+        # The batch call itself takes one token; charge the rest of its requests up front
+        acquire_token(len(pending) - 1)
+        batch = service.new_batch_http_request(callback=callback)
+        for i in pending:
+            folder_ids, page_token = queries[i]
+            batch.add(service.files().list(
+                q=parents_query(folder_ids),
+                fields=FIELDS,
+                pageSize=PAGE_SIZE,
+                pageToken=page_token
+            ), request_id=str(i))
+        batch.execute()
+
+        with stats['lock']:
+            stats['batches'] += 1
+            stats['requests'] += len(pending)
+        if not failed:
+            break
+        pending = sorted(failed)
+        if attempt < MAX_RETRIES:
+            time.sleep(min(2 ** attempt, 32) + random.random())
+
+    return responses
+
+async def crawl(roots: Dict[str, List[Tuple[int, int]]], credentials, max_depth: int = MAX_DEPTH,
+                concurrency: int = CONCURRENCY, full: bool = False,
+                on_files: Callable[[List[Dict]], None] = None) -> Tuple[Dict[int, Optional[Dict]], Dict]:
+    """
+    Breadth-first crawl from the root folders.
+
+    roots maps folder_id -> [(listing_id, priority)], priority being the index of
+    the folder source (lower is preferred). Returns ({listing_id: file or None}, stats);
+    listings whose crawl hit an unrecoverable error are left out so callers can
+    fall back to the sequential search, and stats['failed'] counts the queries lost.
+
+    With full, every folder down to max_depth is listed even after a match, and
+    on_files receives each page of files (drive_index uses this to build its index).
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    stats = {'batches': 0, 'requests': 0, 'pages': 0, 'folders': 0, 'failed': 0, 'lock': threading.Lock()}
+
+    best = {}  # listing_id -> (priority, depth, file)
+    incomplete = set()
+    seen = set(roots)
+    frontier = dict(roots)  # folder_id -> owners still searching through it
+
+    try:
+        for depth in range(max_depth + 1):
+            if not frontier:
+                break
+            stats['folders'] += len(frontier)
+            subfolders = defaultdict(list)
+            queries = [(chunk, None) for chunk in chunked(list(frontier), PARENTS_PER_QUERY)]
+
+            while queries:
+                batches = chunked(queries, BATCH_SIZE)
+                outcomes = await asyncio.gather(*(
+                    loop.run_in_executor(executor, execute_batch, batch, credentials, stats)
+                    for batch in batches
+                ))
+
+                queries = []
+                for batch, responses in zip(batches, outcomes):
+                    for (folder_ids, _), response in zip(batch, responses):
+                        if response is None:
+                            stats['failed'] += 1
+                            for folder_id in folder_ids:
+                                incomplete.update(listing for listing, _ in frontier[folder_id])
+                            continue
+
+                        stats['pages'] += 1
+                        if on_files:
+                            on_files(response.get('files', []))
+                        for file in response.get('files', []):
+                            for parent in file.get('parents', []):
+                                for listing_id, priority in frontier.get(parent, []):
+                                    if file['mimeType'] == FOLDER_MIME:
+                                        subfolders[file['id']].append((listing_id, priority))
+                                    elif is_cim_candidate(file['name'], listing_id):
+                                        current = best.get(listing_id)
+                                        if current is None or (priority, depth) < current[:2]:
+                                            best[listing_id] = (priority, depth, file)
+
+                        if response.get('nextPageToken'):
+                            queries.append((folder_ids, response['nextPageToken']))
+
+            # Only descend for sources that could still beat the match already found
+            frontier = {}
+            for folder_id, owners in subfolders.items():
+                if folder_id in seen:
+                    continue
+                owners = [(listing_id, priority) for listing_id, priority in set(owners)
+                          if full or listing_id not in best or priority < best[listing_id][0]]
+                if owners:
+                    seen.add(folder_id)
+                    frontier[folder_id] = owners
+    finally:
+        executor.shutdown(wait=False)
+
+    listings = {listing_id for owners in roots.values() for listing_id, _ in owners}
+    found = {}
+    for listing_id in listings:
+        if listing_id in best:
+            found[listing_id] = best[listing_id][2]
+        elif listing_id not in incomplete:
+            found[listing_id] = None
+    del stats['lock']
+    return found, stats
+
+def find_cims(listings: List[Dict], credentials=None, max_depth: int = MAX_DEPTH,
+              concurrency: int = CONCURRENCY) -> Dict[int, Optional[Dict]]:
+    """
+    Locate the CIM for each listing. Returns {listing_id: file dict or None};
+    None means every folder was searched without a match, a missing key means
+    the crawl could not finish for that listing.
+    """
+    roots = defaultdict(list)
+    for listing in listings:
+        for priority, (_, folder_id) in enumerate(listing_folder_ids(listing)):
+            roots[folder_id].append((listing['id'], priority))
+    if not roots:
+        return {}
+
+    print(f"Crawling {len(roots)} root folders for {len(listings)} listings...")
+    start = time.time()
+    found, stats = asyncio.run(crawl(dict(roots), credentials or get_credentials(), max_depth, concurrency))
+    elapsed = time.time() - start
+
+    located = sum(1 for file in found.values() if file)
+    print(f"  Located {located} CIMs, {len(found) - located} listings without one, "
+          f"{len({l for o in roots.values() for l, _ in o}) - len(found)} incomplete")
+    print(f"  {stats['folders']} folders in {stats['requests']} queries "
+          f"({stats['pages']} pages, {stats['batches']} batch calls) in {elapsed:.1f}s")
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Locate listing CIMs in Google Drive with batched queries')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    listings = get_listings_to_download(args.limit)
+    found = find_cims(listings, max_depth=args.max_depth, concurrency=args.concurrency)
+
+    results = [{'listing_id': listing_id, 'found': file is not None,
+                'file_id': file['id'] if file else None, 'file_name': file['name'] if file else None}
+               for listing_id, file in sorted(found.items())]
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {args.output}")
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Resumable, checksum-verified downloads from Google Drive.
+
+Files are fetched in Range requests of CHUNK_SIZE and streamed into
+<name>.part next to the destination. After a dropped connection or a killed
+run, the next attempt continues from the size of the .part file instead of
+starting over. A finished file is checked against Drive's md5Checksum (or, when
+Drive has none, its size and PDF markers) and only then moved into place with
+os.replace, so cims/ never holds a truncated PDF for PyPDF2 to trip over later,
+and is then recorded in the CIM catalog.
+
+Concurrency adapts per host: each host starts at a few parallel transfers,
+gains slots while chunks succeed and halves on throttling or connection errors
+(additive increase, multiplicative decrease). Each chunk request also takes a
+token from the shared drive_scheduler bucket.
+
+Usage:
+    python3 drive_downloader.py --from-index --workers 8   # Fetch the drive_index plan in parallel
+    python3 drive_downloader.py --clean                    # Remove leftover .part files
+"""
+
+import os
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import argparse
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+from drive_scheduler import acquire_token, on_success, on_rate_limited, is_rate_limited
+from cim_catalog import record_file
+
+DRIVE_API_URL = os.getenv('DRIVE_API_URL', 'https://www.googleapis.com')
+CHUNK_SIZE = 8 * 1024 * 1024
+SPOOL_MEMORY = 64 * 1024 * 1024  # fetch_to_buffer keeps files up to this size in memory
+TIMEOUT = (10, 60)  # Connect, read
+MAX_RETRIES = 6  # Consecutive failed attempts without progress
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}  # Plus 403s that is_rate_limited() recognizes as quota errors
+
+# Per-host AIMD concurrency
+HOST_LIMITS = {'initial': 2.0, 'min': 1.0, 'max': 16.0}
+
+_hosts = {}  # host -> {'limit', 'active'}
+_host_cond = threading.Condition()
+_session = None
+_session_lock = threading.Lock()
+_totals = {'bytes': 0, 'files': 0}
+
+def get_session() -> requests.Session:
+    """One authorized session with a shared connection pool for every thread."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            from google.auth.transport.requests import AuthorizedSession
+            from download_cims_from_drive import get_credentials
+            session = AuthorizedSession(get_credentials())
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=64))
+            session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=64))
+            _session = session
+        return _session
+
+def acquire_slot(host: str):
+    """Block until the host has a free transfer slot."""
+    with _host_cond:
+        state = _hosts.setdefault(host, {'limit': HOST_LIMITS['initial'], 'active': 0})
+        while state['active'] >= int(state['limit']):
+            _host_cond.wait()
+        state['active'] += 1
+
+def release_slot(host: str, outcome: str):
+    """
+    Return a slot and adjust the host's limit: 'ok' adds 1/limit (about one
+    slot per round of transfers), 'throttled' or 'error' halves it.
+    """
+    with _host_cond:
+        state = _hosts[host]
+        state['active'] -= 1
+        if outcome == 'ok':
+            state['limit'] = min(HOST_LIMITS['max'], state['limit'] + 1.0 / state['limit'])
+        elif outcome in ('throttled', 'error'):
+            state['limit'] = max(HOST_LIMITS['min'], state['limit'] / 2)
+        _host_cond.notify_all()
+
+def transfer_stats() -> Dict[str, int]:
+    """Bytes and files downloaded by this process so far."""
+    with _host_cond:
+        return dict(_totals)
+
+def host_limits() -> Dict[str, float]:
+    with _host_cond:
+        return {host: round(state['limit'], 2) for host, state in _hosts.items()}
+
+def part_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + '.part')
+
+def file_md5(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return stream_md5(f)
+
+def stream_md5(f: BinaryIO) -> str:
+    h = hashlib.md5()
+    f.seek(0)
+    for block in iter(lambda: f.read(1 << 20), b''):
+        h.update(block)
+    return h.hexdigest()
+
+def verify_stream(f: BinaryIO, md5: Optional[str] = None, size: Optional[int] = None) -> Optional[str]:
+    """None when the downloaded bytes are complete, otherwise the reason they are not."""
+    actual_size = f.seek(0, os.SEEK_END)
+    if size is not None and actual_size != int(size):
+        return f"size {actual_size} != {size}"
+    if md5:
+        actual = stream_md5(f)
+        return None if actual == md5 else f"md5 {actual} != {md5}"
+
+    # No checksum from Drive: at least require a PDF that is not cut short
+    f.seek(0)
+    head = f.read(5)
+    f.seek(max(0, actual_size - 1024))
+    tail = f.read()
+    if head != b'%PDF-':
+        return "not a PDF"
+    if b'%%EOF' not in tail:
+        return "PDF truncated (no %%EOF)"
+    return None
+
+def verify_file(path: Path, md5: Optional[str] = None, size: Optional[int] = None) -> Optional[str]:
+    with open(path, 'rb') as f:
+        return verify_stream(f, md5, size)
+
+def _fetch_chunk(session, url: str, sink: BinaryIO, offset: int, durable: bool) -> Tuple[int, Optional[int]]:
+    """
+    Request one range starting at offset and write it to sink at that offset.
+    Returns (new offset, total size if the server reported it).
+    """
+    headers = {'Range': f"bytes={offset}-{offset + CHUNK_SIZE - 1}"}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 416:
+            return offset, offset  # Nothing left past offset
+        if response.status_code >= 400:
+            response.content  # Read the error body before the stream closes; is_rate_limited needs it
+        response.raise_for_status()
+
+        total = None
+        if response.status_code == 206:
+            content_range = response.headers.get('Content-Range', '')  # bytes start-end/total
+            start = int(content_range.split(' ')[1].split('-')[0])
+            if start != offset:
+                raise ValueError(f"Server resumed at {start}, expected {offset}")
+            if not content_range.endswith('/*'):
+                total = int(content_range.rsplit('/', 1)[1])
+        else:
+            # Range ignored: the body is the whole file
+            offset = 0
+            if response.headers.get('Content-Length'):
+                total = int(response.headers['Content-Length'])
+
+        sink.seek(offset)
+        sink.truncate()
+        for block in response.iter_content(chunk_size=1 << 16):
+            sink.write(block)
+            offset += len(block)
+        sink.flush()
+        if durable:
+            os.fsync(sink.fileno())
+
+        if response.status_code == 200:
+            total = offset
+        return offset, total
+
+def _transfer(session, file_id: str, sink: BinaryIO, total: Optional[int], result: Dict,
+              durable: bool = False) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Fill sink with the file, continuing from the bytes already in it. Retries
+    dropped connections and throttling under the host and quota limits.
+    Returns (total size, error).
+    """
+    url = f"{DRIVE_API_URL}/drive/v3/files/{file_id}?alt=media"
+    host = urlparse(url).netloc
+    offset = sink.seek(0, os.SEEK_END)
+    failures = 0
+    error = None
+
+    while total is None or offset < total:
+        acquire_slot(host)
+        acquire_token()
+        outcome = 'error'
+        try:
+            new_offset, reported = _fetch_chunk(session, url, sink, offset, durable)
+            result['bytes'] += max(0, new_offset - offset)
+            outcome = 'ok'
+            on_success()
+            offset = new_offset
+            total = reported if reported is not None else total
+            failures = 0
+            continue
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code
+            rate_limited = is_rate_limited(status, e.response.content)
+            if not rate_limited and status not in RETRYABLE_STATUS:
+                outcome = None  # Permission denied, not found, ...: retrying will not help
+                return total, f"HTTP {status}"
+            outcome = 'throttled' if rate_limited else 'error'
+            if rate_limited:
+                on_rate_limited()
+            error = f"HTTP {status}"
+        except (requests.exceptions.RequestException, ValueError, OSError) as e:
+            error = str(e)
+            if isinstance(e, ValueError):
+                sink.seek(0)
+                sink.truncate()  # Server and file disagree about where we are
+        finally:
+            release_slot(host, outcome or 'neutral')
+
+        # A dropped stream may have written part of a chunk; resume from what is in the sink
+        failures += 1
+        in_sink = sink.seek(0, os.SEEK_END)
+        result['bytes'] += max(0, in_sink - offset)
+        offset = in_sink
+        if failures > MAX_RETRIES:
+            return total, error or 'retries exhausted'
+        time.sleep(min(2 ** failures, 60) * (0.5 + random.random()))
+
+    return total, None
+
+def _record_transfer(result: Dict):
+    with _host_cond:
+        _totals['bytes'] += result['bytes']
+        _totals['files'] += result['ok']
+
+def download_resumable(file_id: str, output_path: Path, md5: Optional[str] = None,
+                       size: Optional[int] = None, session: requests.Session = None) -> Dict:
+    """
+    Download a Drive file to output_path, resuming from an existing .part file.
+    Returns {'ok', 'bytes', 'resumed_from', 'seconds', 'error'}.
+    """
+    session = session or get_session()
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    part = part_path(output_path)
+
+    result = {'ok': False, 'bytes': 0, 'resumed_from': part.stat().st_size if part.exists() else 0,
+              'seconds': 0.0, 'error': None}
+    start = time.time()
+
+    for attempt in range(2):
+        with open(part, 'ab') as sink:
+            total, error = _transfer(session, file_id, sink, int(size) if size is not None else None,
+                                     result, durable=True)
+        if error:
+            result['error'] = error  # The .part file stays for the next run to resume
+            break
+
+        problem = verify_file(part, md5, total)
+        if problem is None:
+            os.replace(part, output_path)
+            record_file(output_path, time.time())
+            result['ok'] = True
+            break
+
+        # A bad resume (e.g. the file changed on Drive mid-download): start over once
+        part.unlink()
+        result['error'] = f"Verification failed: {problem}"
+
+    result['seconds'] = time.time() - start
+    _record_transfer(result)
+    return result
+
+def fetch_to_buffer(file_id: str, md5: Optional[str] = None, size: Optional[int] = None,
+                    session: requests.Session = None) -> Tuple[Optional[BinaryIO], Dict]:
+    """
+    Download a Drive file into a SpooledTemporaryFile (in memory up to
+    SPOOL_MEMORY, then an unnamed temp file) and verify it. Returns the buffer
+    rewound to the start, or None, with the same result dict as download_resumable.
+    """
+    session = session or get_session()
+    result = {'ok': False, 'bytes': 0, 'resumed_from': 0, 'seconds': 0.0, 'error': None}
+    start = time.time()
+    buffer = None
+
+    for attempt in range(2):
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+        total, error = _transfer(session, file_id, buffer, int(size) if size is not None else None, result)
+        if error:
+            result['error'] = error
+            break
+        problem = verify_stream(buffer, md5, total)
+        if problem is None:
+            result['ok'] = True
+            break
+        buffer.close()
+        result['error'] = f"Verification failed: {problem}"
+
+    result['seconds'] = time.time() - start
+    _record_transfer(result)
+    if not result['ok']:
+        if buffer is not None:
+            buffer.close()
+        return None, result
+    result['error'] = None
+    buffer.seek(0)
+    return buffer, result
+
+def save_buffer(buffer: BinaryIO, output_path: Path):
+    """Write a verified buffer to output_path through a .part file and an atomic rename."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    part = part_path(output_path)
+    buffer.seek(0)
+    with open(part, 'wb') as f:
+        shutil.copyfileobj(buffer, f, 1 << 20)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(part, output_path)
+    record_file(output_path, time.time())
+    buffer.seek(0)
+
+def download_many(items: List[Dict], workers: int = 8) -> List[Dict]:
+    """
+    Download items ({'file_id', 'path', 'md5', 'size'}) in parallel. workers
+    bounds the threads; the per-host limits decide how many transfer at once.
+    """
+    session = get_session()
+    started = time.time()
+
+    def run(item):
+        result = download_resumable(item['file_id'], Path(item['path']), item.get('md5'),
+                                    item.get('size'), session=session)
+        status = 'ok' if result['ok'] else f"FAILED ({result['error']})"
+        resumed = f", resumed at {result['resumed_from']:,} B" if result['resumed_from'] else ''
+        print(f"  {Path(item['path']).name}: {status} {result['bytes'] / 1e6:.1f} MB{resumed}")
+        return {**item, **result}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, items))
+
+    elapsed = time.time() - started
+    total_mb = sum(r['bytes'] for r in results) / 1e6
+    print(f"Downloaded {sum(r['ok'] for r in results)}/{len(results)} files, {total_mb:.1f} MB "
+          f"in {elapsed:.1f}s ({total_mb / elapsed if elapsed else 0:.2f} MB/s); host limits {host_limits()}")
+    return results
+
+def clean_partials(directory: Path) -> int:
+    """Delete .part files left by abandoned downloads."""
+    removed = 0
+    for part in Path(directory).glob('*.part'):
+        part.unlink()
+        removed += 1
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resumable, verified Drive downloads')
+    parser.add_argument('--from-index', action='store_true', help='Fetch the new/changed CIMs planned by drive_index.py')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--clean', action='store_true', help='Remove leftover .part files in cims/')
+    args = parser.parse_args()
+
+    if args.clean:
+        from download_cims_from_drive import OUTPUT_DIR
+        print(f"Removed {clean_partials(OUTPUT_DIR)} partial downloads")
+    elif args.from_index:
+        import drive_index
+        conn = drive_index.connect_index()
+        plan = drive_index.plan_downloads(conn)
+        drive_index.print_plan(plan)
+        drive_index.download_planned(conn, plan, workers=args.workers)
+        conn.close()
+    else:
+        parser.print_help()
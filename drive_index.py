@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Local index of the listings' Google Drive folders, kept current with the
+Drive changes API.
+
+The index stores every folder and PDF under each listing's root folders (down
+to the crawler's MAX_DEPTH) with its parents, name, md5Checksum, size and
+modifiedTime, plus which Drive file each listing's local CIM came from. The
+first build crawls the trees with drive_crawler; after that, sync reads only
+the changes since the stored page token. Downloads are planned from the index:
+a listing is fetched only when its selected CIM is new or its checksum moved,
+so unchanged files cost no API traffic at all.
+
+Usage:
+    python3 drive_index.py build              # Full crawl (also re-run after the listings change a lot)
+    python3 drive_index.py sync               # Apply Drive changes since the last run
+    python3 drive_index.py plan               # Show what a download run would fetch
+    python3 drive_index.py download           # sync, then fetch only new or changed CIMs
+    python3 drive_index.py status
+"""
+
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from download_cims_from_drive import (
+    OUTPUT_DIR, get_credentials, build_drive_service, is_cim_candidate,
+    listing_folder_ids, get_drive_listings, cim_output_path
+)
+from drive_crawler import MAX_DEPTH, CONCURRENCY, FOLDER_MIME, crawl
+
+INDEX_DB = Path('cache/drive_index.db')
+CHANGE_FIELDS = ("nextPageToken, newStartPageToken, "
+                 "changes(fileId, removed, file(id, name, mimeType, md5Checksum, size, modifiedTime, parents, trashed))")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    md5 TEXT,
+    size INTEGER,
+    modified_time TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parents (
+    parent_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    PRIMARY KEY (parent_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS idx_parents_file ON parents(file_id);
+CREATE TABLE IF NOT EXISTS roots (
+    folder_id TEXT NOT NULL,
+    listing_id INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    PRIMARY KEY (folder_id, listing_id)
+);
+CREATE TABLE IF NOT EXISTS downloads (
+    listing_id INTEGER PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    md5 TEXT,
+    size INTEGER,
+    modified_time TEXT,
+    path TEXT NOT NULL,
+    downloaded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def connect_index(db_path: Path = INDEX_DB) -> sqlite3.Connection:
+    """Open the index database, creating it if needed."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else None
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def upsert_files(conn: sqlite3.Connection, files: List[Dict]):
+    """Insert or refresh Drive file metadata and its parent links."""
+    now = time.time()
+    for file in files:
+        conn.execute(
+            "INSERT OR REPLACE INTO files (file_id, name, mime_type, md5, size, modified_time, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file['id'], file['name'], file['mimeType'], file.get('md5Checksum'),
+             int(file['size']) if file.get('size') else None, file.get('modifiedTime'), now)
+        )
+        conn.execute("DELETE FROM parents WHERE file_id = ?", (file['id'],))
+        conn.executemany("INSERT OR IGNORE INTO parents (parent_id, file_id) VALUES (?, ?)",
+                         [(parent, file['id']) for parent in file.get('parents', [])])
+
+def remove_file(conn: sqlite3.Connection, file_id: str):
+    conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+    conn.execute("DELETE FROM parents WHERE file_id = ?", (file_id,))
+
+def set_roots(conn: sqlite3.Connection, listings: List[Dict]) -> Dict[str, List]:
+    """
+    Replace the listing -> root folder mapping, inside the caller's transaction.
+    Returns folders not indexed before.
+    """
+    known = {row['folder_id'] for row in conn.execute("SELECT DISTINCT folder_id FROM roots")}
+    roots = {}
+    for listing in listings:
+        for priority, (_, folder_id) in enumerate(listing_folder_ids(listing)):
+            roots.setdefault(folder_id, []).append((listing['id'], priority))
+
+    conn.execute("DELETE FROM roots")
+    conn.executemany("INSERT OR IGNORE INTO roots (folder_id, listing_id, priority) VALUES (?, ?, ?)",
+                     [(folder_id, listing_id, priority)
+                      for folder_id, owners in roots.items() for listing_id, priority in owners])
+    return {folder_id: owners for folder_id, owners in roots.items() if folder_id not in known}
+
+def index_folders(conn: sqlite3.Connection, roots: Dict[str, List], credentials,
+                  concurrency: int = CONCURRENCY, reset: bool = False) -> Dict:
+    """
+    Crawl the given folders completely and store everything found, inside the
+    caller's transaction. Raises if any query failed, so the caller rolls back
+    rather than recording a page token past folders it never listed.
+    """
+    if reset:
+        conn.execute("DELETE FROM files")
+        conn.execute("DELETE FROM parents")
+    _, stats = asyncio.run(crawl(roots, credentials, MAX_DEPTH, concurrency, full=True,
+                                 on_files=lambda files: upsert_files(conn, files)))
+    if stats['failed']:
+        raise RuntimeError(f"Drive crawl lost {stats['failed']} folder queries; index left unchanged, re-run to retry")
+    return stats
+
+def build_index(conn: sqlite3.Connection, listings: List[Dict], credentials=None,
+                concurrency: int = CONCURRENCY) -> Dict:
+    """
+    Full crawl of every listing's folders. The change token is taken before the
+    crawl, so edits made while it runs are picked up by the next sync. Nothing
+    is stored unless the whole crawl succeeds.
+    """
+    credentials = credentials or get_credentials()
+    service = build_drive_service(credentials)
+    start_token = service.changes().getStartPageToken().execute()['startPageToken']
+
+    conn.execute("BEGIN")
+    try:
+        set_roots(conn, listings)
+        roots = {}
+        for row in conn.execute("SELECT folder_id, listing_id, priority FROM roots"):
+            roots.setdefault(row['folder_id'], []).append((row['listing_id'], row['priority']))
+
+        stats = index_folders(conn, roots, credentials, concurrency, reset=True)
+        set_meta(conn, 'page_token', start_token)
+        set_meta(conn, 'built_at', str(time.time()))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    print(f"Indexed {stats['folders']} folders for {len(listings)} listings "
+          f"in {stats['requests']} queries ({stats['batches']} batch calls)")
+    return stats
+
+def is_indexed_folder(conn: sqlite3.Connection, folder_id: str) -> bool:
+    if conn.execute("SELECT 1 FROM roots WHERE folder_id = ?", (folder_id,)).fetchone():
+        return True
+    row = conn.execute("SELECT mime_type FROM files WHERE file_id = ?", (folder_id,)).fetchone()
+    return row is not None and row['mime_type'] == FOLDER_MIME
+
+def sync_changes(conn: sqlite3.Connection, listings: List[Dict] = None, credentials=None,
+                 concurrency: int = CONCURRENCY) -> Dict:
+    """
+    Apply Drive changes since the stored page token. Changes to files outside
+    the indexed trees are ignored. Folders that move into an indexed tree, and
+    new listing roots, are crawled since their contents do not show up as changes.
+    The changes, the crawl and the new page token are committed together, so a
+    failed crawl leaves the token where it was and the next sync retries.
+    """
+    token = get_meta(conn, 'page_token')
+    if token is None:
+        raise RuntimeError("No index yet; run 'python3 drive_index.py build' first")
+
+    credentials = credentials or get_credentials()
+    service = build_drive_service(credentials)
+    counts = {'changes': 0, 'updated': 0, 'removed': 0, 'new_folders': 0}
+    moved_in = {}
+
+    conn.execute("BEGIN")
+    try:
+        crawl_roots = set_roots(conn, listings) if listings is not None else {}
+        while True:
+            response = service.changes().list(
+                pageToken=token,
+                fields=CHANGE_FIELDS,
+                pageSize=1000,
+                includeRemoved=True,
+                spaces='drive'
+            ).execute()
+
+            for change in response.get('changes', []):
+                counts['changes'] += 1
+                file = change.get('file')
+                known = conn.execute("SELECT mime_type FROM files WHERE file_id = ?", (change['fileId'],)).fetchone()
+                if change.get('removed') or not file or file.get('trashed'):
+                    if known:
+                        remove_file(conn, change['fileId'])
+                        counts['removed'] += 1
+                    continue
+
+                in_tree = any(is_indexed_folder(conn, parent) for parent in file.get('parents', []))
+                if in_tree:
+                    if not known and file['mimeType'] == FOLDER_MIME:
+                        # Only its contents matter here; CIMs are selected from the index afterwards
+                        moved_in[file['id']] = [(None, 0)]
+                    upsert_files(conn, [file])
+                    counts['updated'] += 1
+                elif known:
+                    # Moved out of every indexed folder
+                    remove_file(conn, file['id'])
+                    counts['removed'] += 1
+
+            if 'newStartPageToken' in response:
+                token = response['newStartPageToken']
+                break
+            token = response['nextPageToken']
+
+        crawl_roots.update(moved_in)
+        if crawl_roots:
+            counts['new_folders'] = len(crawl_roots)
+            index_folders(conn, crawl_roots, credentials, concurrency)
+
+        set_meta(conn, 'page_token', token)
+        set_meta(conn, 'synced_at', str(time.time()))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+    print(f"Applied {counts['changes']} Drive changes: {counts['updated']} updated, "
+          f"{counts['removed']} removed, {counts['new_folders']} new folders crawled")
+    return counts
+
+def select_cims(conn: sqlite3.Connection, max_depth: int = MAX_DEPTH) -> Dict[int, sqlite3.Row]:
+    """
+    Each listing's CIM according to the index, with the same rule as the crawler:
+    preferred folder source first, then the shallowest candidate PDF.
+    """
+    selected = {}
+    roots = conn.execute("SELECT folder_id, listing_id, priority FROM roots ORDER BY listing_id, priority").fetchall()
+    for root in roots:
+        listing_id = root['listing_id']
+        if listing_id in selected:
+            continue  # A preferred source already matched
+        frontier, seen = [root['folder_id']], {root['folder_id']}
+        for _ in range(max_depth + 1):
+            if not frontier:
+                break
+            placeholders = ', '.join(['?'] * len(frontier))
+            children = conn.execute(
+                f"SELECT DISTINCT f.* FROM parents p JOIN files f ON f.file_id = p.file_id "
+                f"WHERE p.parent_id IN ({placeholders}) ORDER BY f.name", frontier
+            ).fetchall()
+            match = next((f for f in children if f['mime_type'] != FOLDER_MIME
+                          and is_cim_candidate(f['name'], listing_id)), None)
+            if match:
+                selected[listing_id] = match
+                break
+            frontier = [f['file_id'] for f in children if f['mime_type'] == FOLDER_MIME and f['file_id'] not in seen]
+            seen.update(frontier)
+    return selected
+
+def file_md5(path: Path) -> str:
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def plan_downloads(conn: sqlite3.Connection, record: bool = True) -> Dict[str, List]:
+    """
+    Diff the index against what is on disk. CIMs downloaded before the index
+    existed are adopted when their local checksum matches Drive; with record
+    off (a dry run) they are only listed, not written to the downloads table.
+    """
+    plan = {'new': [], 'changed': [], 'unchanged': [], 'adopted': []}  # Lists of (listing_id, file)
+    downloads = {row['listing_id']: row for row in conn.execute("SELECT * FROM downloads")}
+
+    for listing_id, file in sorted(select_cims(conn).items()):
+        previous = downloads.get(listing_id)
+        if previous and Path(previous['path']).exists():
+            same = (previous['file_id'] == file['file_id'] and
+                    (previous['md5'] == file['md5'] if file['md5'] else
+                     previous['modified_time'] == file['modified_time']))
+            plan['unchanged' if same else 'changed'].append((listing_id, file))
+            continue
+
+        path = cim_output_path(listing_id, file['name'])
+        if path.exists() and file['md5'] and file_md5(path) == file['md5']:
+            if record:
+                record_download(conn, listing_id, file, path)
+            plan['adopted'].append((listing_id, file))
+        else:
+            plan['new'].append((listing_id, file))
+    return plan
+
+def record_download(conn: sqlite3.Connection, listing_id: int, file: sqlite3.Row, path: Path):
+    conn.execute(
+        "INSERT OR REPLACE INTO downloads (listing_id, file_id, md5, size, modified_time, path, downloaded_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (listing_id, file['file_id'], file['md5'], file['size'], file['modified_time'], str(path), time.time())
+    )
+
+def download_planned(conn: sqlite3.Connection, plan: Dict[str, List], workers: int = 8) -> Dict:
+    """Fetch the new and changed CIMs from the plan in parallel and record them."""
+    from drive_downloader import download_many
+
+    todo = plan['new'] + plan['changed']
+    items = [{'listing_id': listing_id, 'file_id': file['file_id'], 'md5': file['md5'], 'size': file['size'],
+              'path': str(cim_output_path(listing_id, file['name'])), 'file': file}
+             for listing_id, file in todo]
+    counts = {'downloaded': 0, 'failed': 0}
+    OUTPUT_DIR.mkdir(exist_ok=True)
+
+    for item in download_many(items, workers):
+        if not item['ok']:
+            counts['failed'] += 1
+            continue
+        previous = conn.execute("SELECT path FROM downloads WHERE listing_id = ?", (item['listing_id'],)).fetchone()
+        if previous and previous['path'] != item['path']:
+            Path(previous['path']).unlink(missing_ok=True)  # Renamed on Drive; keep one CIM per listing
+        record_download(conn, item['listing_id'], item['file'], Path(item['path']))
+        counts['downloaded'] += 1
+    return counts
+
+def print_plan(plan: Dict[str, List]):
+    print("\n" + "=" * 60)
+    print("DOWNLOAD PLAN FROM DRIVE INDEX")
+    print("=" * 60)
+    for key in ('new', 'changed', 'adopted', 'unchanged'):
+        print(f"  {key}: {len(plan[key])}")
+    for listing_id, file in (plan['new'] + plan['changed'])[:10]:
+        print(f"    {listing_id}: {file['name']} ({file['file_id']})")
+
+def print_index_status(conn: sqlite3.Connection):
+    counts = conn.execute(
+        "SELECT SUM(mime_type = ?) AS folders, SUM(mime_type != ?) AS pdfs FROM files",
+        (FOLDER_MIME, FOLDER_MIME)
+    ).fetchone()
+    listings = conn.execute("SELECT COUNT(DISTINCT listing_id) FROM roots").fetchone()[0]
+    downloads = conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+    synced = get_meta(conn, 'synced_at') or get_meta(conn, 'built_at')
+    print(f"Drive index: {listings} listings, {counts['folders'] or 0} folders, "
+          f"{counts['pdfs'] or 0} PDFs, {downloads} recorded downloads")
+    if synced:
+        print(f"Last refreshed: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(synced)))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incremental Google Drive index for CIM downloads')
+    parser.add_argument('command', choices=['build', 'sync', 'plan', 'download', 'status'])
+    parser.add_argument('--limit', type=int, default=None, help='Only index the first N listings')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--workers', type=int, default=8, help='Parallel downloads')
+    parser.add_argument('--db', default=str(INDEX_DB))
+    args = parser.parse_args()
+
+    conn = connect_index(Path(args.db))
+    if args.command == 'status':
+        print_index_status(conn)
+    elif args.command == 'build':
+        build_index(conn, get_drive_listings(args.limit), concurrency=args.concurrency)
+    elif args.command == 'sync':
+        sync_changes(conn, get_drive_listings(args.limit), concurrency=args.concurrency)
+    else:
+        if args.command == 'download':
+            sync_changes(conn, get_drive_listings(args.limit), concurrency=args.concurrency)
+        plan = plan_downloads(conn, record=args.command == 'download')
+        print_plan(plan)
+        if args.command == 'download':
+            counts = download_planned(conn, plan, args.workers)
+            print(f"\nDownloaded {counts['downloaded']}, failed {counts['failed']}; "
+                  f"{len(plan['unchanged']) + len(plan['adopted'])} unchanged CIMs skipped without API calls")
+            with open('drive_index_download_results.json', 'w') as f:
+                json.dump(counts, f, indent=2)
+    conn.close()
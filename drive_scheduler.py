@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Shared, quota-aware scheduling for Google Drive traffic.
+
+Every Drive request made through scheduled_service() or drive_downloader takes
+a token from one process-wide token bucket first. The bucket refills at an
+adaptive rate: it creeps up while requests succeed and is halved, with a pause
+for everyone, when Drive answers 403 userRateLimitExceeded / rateLimitExceeded
+or 429. Adding workers therefore raises throughput until the quota is reached
+instead of setting off a storm of rate-limit errors.
+
+run_listings() hands listings to worker threads from one queue. The workers
+share the credentials and the downloader's HTTP session, and each keeps one
+Drive client for all of its listings. It reports listings/min, MB/s and the
+current request rate while it runs.
+"""
+
+import time
+import queue
+import threading
+from typing import Callable, Dict, List
+from google_auth_httplib2 import AuthorizedHttp
+
+RATE_LIMIT = {
+    'rate': 10.0,  # Requests per second to start with
+    'min_rate': 0.5,
+    'max_rate': 100.0,  # Drive's default quota is 12,000 queries/min per user
+    'burst': 20,
+    'increase': 0.05,  # Added to the rate per successful request
+    'pause': 2.0,  # Seconds everyone waits after a rate-limit error, doubled while they continue
+}
+MAX_RETRIES = 5
+REPORT_INTERVAL = 10  # Seconds between progress lines
+RATE_LIMIT_REASONS = (b'userRateLimitExceeded', b'rateLimitExceeded')
+
+_bucket = {
+    'rate': RATE_LIMIT['rate'],
+    'tokens': float(RATE_LIMIT['burst']),
+    'updated': time.monotonic(),
+    'paused_until': 0.0,
+    'last_decrease': 0.0,
+    'streak': 0,  # Consecutive rate-limit errors
+    'requests': 0,
+    'throttled': 0,
+}
+_lock = threading.Lock()
+_local = threading.local()
+
+def acquire_token(cost: float = 1):
+    """
+    Block until the bucket allows cost more Drive requests. A cost above the
+    burst size (a batch call) is taken as soon as one token is available and
+    leaves the bucket in debt, which later callers wait out.
+    """
+    while True:
+        with _lock:
+            now = time.monotonic()
+            _bucket['tokens'] = min(RATE_LIMIT['burst'],
+                                    _bucket['tokens'] + (now - _bucket['updated']) * _bucket['rate'])
+            _bucket['updated'] = now
+            if now < _bucket['paused_until']:
+                wait = _bucket['paused_until'] - now
+            elif _bucket['tokens'] >= min(cost, 1):
+                _bucket['tokens'] -= cost
+                _bucket['requests'] += cost
+                return
+            else:
+                wait = (1 - _bucket['tokens']) / _bucket['rate']
+        time.sleep(wait)
+
+def on_success():
+    with _lock:
+        _bucket['rate'] = min(RATE_LIMIT['max_rate'], _bucket['rate'] + RATE_LIMIT['increase'])
+        _bucket['streak'] = 0
+
+def on_rate_limited(retry_after: float = None):
+    """
+    Halve the rate (at most once per second, so a burst of errors from
+    concurrent requests counts once) and pause every worker.
+    """
+    with _lock:
+        now = time.monotonic()
+        _bucket['throttled'] += 1
+        if now - _bucket['last_decrease'] >= 1.0:
+            _bucket['rate'] = max(RATE_LIMIT['min_rate'], _bucket['rate'] / 2)
+            _bucket['last_decrease'] = now
+            _bucket['streak'] += 1
+        pause = retry_after or RATE_LIMIT['pause'] * 2 ** min(_bucket['streak'] - 1, 5)
+        _bucket['paused_until'] = max(_bucket['paused_until'], now + pause)
+        _bucket['tokens'] = 0.0
+
+def is_rate_limited(status: int, content: bytes = b'') -> bool:
+    if status == 429:
+        return True
+    return status == 403 and any(reason in (content or b'') for reason in RATE_LIMIT_REASONS)
+
+def bucket_stats() -> Dict:
+    with _lock:
+        return {'rate': round(_bucket['rate'], 2), 'requests': _bucket['requests'], 'throttled': _bucket['throttled']}
+
+class ThrottledHttp(AuthorizedHttp):
+    """AuthorizedHttp whose requests go through the shared token bucket."""
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        for _ in range(MAX_RETRIES + 1):
+            acquire_token()
+            response, content = super().request(uri, method, body=body, headers=headers, **kwargs)
+            if not is_rate_limited(response.status, content):
+                if response.status < 400:
+                    on_success()
+                return response, content
+            retry_after = response.get('retry-after')
+            on_rate_limited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response, content
+
+def scheduled_service(credentials):
+    """This thread's Drive client, built once on the shared credentials."""
+    if getattr(_local, 'service', None) is None:
+        from download_cims_from_drive import build_drive_client
+        _local.service = build_drive_client(http=ThrottledHttp(credentials))
+    return _local.service
+
+def _report(start: float, bytes_before: int, done: List[Dict], total: int, stop: threading.Event):
+    from drive_downloader import transfer_stats
+    while not stop.wait(REPORT_INTERVAL):
+        elapsed = time.time() - start
+        stats = bucket_stats()
+        print(f"  [{elapsed:.0f}s] {len(done)}/{total} listings ({len(done) / elapsed * 60:.1f}/min), "
+              f"{(transfer_stats()['bytes'] - bytes_before) / 1e6 / elapsed:.2f} MB/s, "
+              f"{stats['rate']:.1f} req/s allowed, {stats['throttled']} rate-limit errors")
+
+def run_listings(listings: List[Dict], handler: Callable, credentials, workers: int = 3) -> Dict:
+    """
+    Run handler(service, listing) -> result dict for every listing on worker
+    threads pulling from one shared queue. Returns the per-worker results and
+    aggregate throughput.
+    """
+    from drive_downloader import transfer_stats
+
+    work = queue.Queue()
+    for listing in listings:
+        work.put(listing)
+
+    done = []
+    per_worker = [{'worker_id': i, 'total': 0, 'successful': 0, 'failed': 0, 'listings': []}
+                  for i in range(workers)]
+    start = time.time()
+    bytes_before = transfer_stats()['bytes']
+    stop = threading.Event()
+    reporter = threading.Thread(target=_report, args=(start, bytes_before, done, len(listings), stop), daemon=True)
+    reporter.start()
+
+    def worker(results):
+        service = scheduled_service(credentials)
+        while True:
+            try:
+                listing = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = handler(service, listing)
+            except Exception as e:
+                print(f"[Worker {results['worker_id']}] Error processing {listing['id']}: {e}")
+                result = {'listing_id': listing['id'], 'downloaded': False, 'error': str(e)}
+            results['total'] += 1
+            results['successful' if result.get('downloaded') else 'failed'] += 1
+            results['listings'].append(result)
+            done.append(result)
+
+    threads = [threading.Thread(target=worker, args=(results,)) for results in per_worker]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+
+    elapsed = time.time() - start
+    megabytes = (transfer_stats()['bytes'] - bytes_before) / 1e6
+    return {
+        'workers': per_worker,
+        'elapsed': elapsed,
+        'listings_per_min': len(done) / elapsed * 60 if elapsed else 0,
+        'mb_per_sec': megabytes / elapsed if elapsed else 0,
+        'megabytes': megabytes,
+        **{f'api_{k}': v for k, v in bucket_stats().items()},
+    }
@@ -9,6 +9,10 @@ import pymysql
 import json
 from datetime import datetime
 
+from bootstrap_engine import ci_dict, format_ci, median_cis
+from listing_facts import load_facts
+from multiples_engine import attach_sba_status, compute_multiples, valid_multiples
+
 def get_db_connection():
     """Establish connection to MySQL database."""
     return pymysql.connect(
@@ -29,16 +33,13 @@ def main():
     
     # Load the SBA classification data
     print("Loading SBA classification data...")
-    df_classification = pd.read_csv('launch_date_analysis.csv')
+    df_classification = load_facts(['id', 'sba_status'])
     
-    # Get listing IDs for each category
-    sba_ids = df_classification[df_classification['sba_status'] == 'yes']['id'].tolist()
-    non_sba_ids = df_classification[df_classification['sba_status'] == 'no']['id'].tolist()
-    unknown_ids = df_classification[df_classification['sba_status'] == 'unknown']['id'].tolist()
+    status_counts = df_classification['sba_status'].value_counts()
     
-    print(f"Found {len(sba_ids)} SBA pre-qualified listings")
-    print(f"Found {len(non_sba_ids)} non-SBA listings") 
-    print(f"Found {len(unknown_ids)} unknown status listings")
+    print(f"Found {status_counts.get('yes', 0)} SBA pre-qualified listings")
+    print(f"Found {status_counts.get('no', 0)} non-SBA listings") 
+    print(f"Found {status_counts.get('unknown', 0)} unknown status listings")
     print()
     
     # Connect to database
@@ -76,74 +77,23 @@ def main():
     df_all = pd.DataFrame(listings_data)
     print(f"Retrieved {len(df_all)} listings with financial data from database")
     
-    # Determine asking price and SDE
-    def get_asking_price(row):
-        # Priority: custom field 'asking', then asking_at_close, then capsule_expected_value
-        if pd.notna(row.get('asking')):
-            try:
-                val = float(str(row['asking']).replace(',', '').replace('$', ''))
-                if val > 0:
-                    return val
-            except:
-                pass
-        
-        if pd.notna(row.get('asking_at_close')) and row['asking_at_close'] > 0:
-            return row['asking_at_close']
-        
-        if pd.notna(row.get('capsule_expected_value')) and row['capsule_expected_value'] > 0:
-            return row['capsule_expected_value']
-        
-        return None
-    
-    def get_sde(row):
-        # Priority: custom field 'cashflow', then sde_at_close
-        if pd.notna(row.get('cashflow')):
-            try:
-                val = float(str(row['cashflow']).replace(',', '').replace('$', ''))
-                if val > 0:
-                    return val
-            except:
-                pass
-        
-        if pd.notna(row.get('sde_at_close')) and row['sde_at_close'] > 0:
-            return row['sde_at_close']
-        
-        return None
-    
-    df_all['asking_price'] = df_all.apply(get_asking_price, axis=1)
-    df_all['sde'] = df_all.apply(get_sde, axis=1)
-    
-    # Calculate multiples
-    df_all['multiple'] = df_all.apply(
-        lambda row: row['asking_price'] / row['sde'] 
-        if pd.notna(row['sde']) and row['sde'] > 0 and pd.notna(row['asking_price']) and row['asking_price'] > 0 
-        else None,
-        axis=1
-    )
+    # Asking price: custom field 'asking', then asking_at_close, then capsule_expected_value
+    # SDE: custom field 'cashflow', then sde_at_close
+    df_all = compute_multiples(df_all, ['asking', 'asking_at_close', 'capsule_expected_value'],
+                               ['cashflow', 'sde_at_close'])
     
     # Add SBA status - for listings not in our CSV, mark as 'not_classified'
-    def get_sba_status(listing_id):
-        if listing_id in sba_ids:
-            return 'yes'
-        elif listing_id in non_sba_ids:
-            return 'no'
-        elif listing_id in unknown_ids:
-            return 'unknown'
-        else:
-            return 'not_classified'
-    
-    df_all['sba_status'] = df_all['id'].apply(get_sba_status)
+    df_all = attach_sba_status(df_all, df_classification, default='not_classified')
     
     # Show data distribution
     print(f"\nSBA classification coverage:")
     print(df_all['sba_status'].value_counts())
     
     # Filter for valid multiples (reasonable range: 0.5 to 10x)
-    df_valid = df_all[
-        (df_all['multiple'].notna()) & 
-        (df_all['multiple'] > 0.5) & 
-        (df_all['multiple'] < 10)
-    ].copy()
+    df_valid = valid_multiples(df_all)
+    
+    # Bootstrap CIs for the medians; not stratified by asking price, the multiple's own numerator
+    cis = median_cis(df_valid, ['multiple'], 'sba_status', ['yes', 'no'])
     
     print(f"\nFiltered to {len(df_valid)} listings with valid multiples (0.5x - 10x)")
     print("By SBA status:")
@@ -169,7 +119,8 @@ def main():
             'min': float(np.min(sba_multiples)) if len(sba_multiples) > 0 else None,
             'max': float(np.max(sba_multiples)) if len(sba_multiples) > 0 else None,
             'q25': float(np.percentile(sba_multiples, 25)) if len(sba_multiples) > 0 else None,
-            'q75': float(np.percentile(sba_multiples, 75)) if len(sba_multiples) > 0 else None
+            'q75': float(np.percentile(sba_multiples, 75)) if len(sba_multiples) > 0 else None,
+            'median_ci': ci_dict(cis, 'multiple', 'yes')
         },
         'non_sba': {
             'count': len(non_sba_multiples),
@@ -179,7 +130,8 @@ def main():
             'min': float(np.min(non_sba_multiples)) if len(non_sba_multiples) > 0 else None,
             'max': float(np.max(non_sba_multiples)) if len(non_sba_multiples) > 0 else None,
             'q25': float(np.percentile(non_sba_multiples, 25)) if len(non_sba_multiples) > 0 else None,
-            'q75': float(np.percentile(non_sba_multiples, 75)) if len(non_sba_multiples) > 0 else None
+            'q75': float(np.percentile(non_sba_multiples, 75)) if len(non_sba_multiples) > 0 else None,
+            'median_ci': ci_dict(cis, 'multiple', 'no')
         },
         'not_classified': {
             'count': len(not_classified_multiples),
@@ -195,6 +147,7 @@ def main():
         results['comparison'] = {
             'median_difference': median_diff,
             'median_difference_percent': median_diff_pct,
+            'median_difference_ci': ci_dict(cis, 'multiple', 'difference'),
             'sba_premium': median_diff > 0
         }
     
@@ -206,7 +159,7 @@ def main():
     print("\n📊 SBA Pre-qualified Deals:")
     print(f"   Count: {results['sba_prequalified']['count']} listings")
     if results['sba_prequalified']['median']:
-        print(f"   Median Multiple: {results['sba_prequalified']['median']:.2f}x")
+        print(f"   Median Multiple: {results['sba_prequalified']['median']:.2f}x {format_ci(cis, 'multiple', 'yes', 2)}")
         print(f"   Mean Multiple: {results['sba_prequalified']['mean']:.2f}x")
         print(f"   Range: {results['sba_prequalified']['min']:.2f}x - {results['sba_prequalified']['max']:.2f}x")
         print(f"   IQR: {results['sba_prequalified']['q25']:.2f}x - {results['sba_prequalified']['q75']:.2f}x")
@@ -214,7 +167,7 @@ def main():
     print("\n📊 Non-SBA Deals:")
     print(f"   Count: {results['non_sba']['count']} listings")
     if results['non_sba']['median']:
-        print(f"   Median Multiple: {results['non_sba']['median']:.2f}x")
+        print(f"   Median Multiple: {results['non_sba']['median']:.2f}x {format_ci(cis, 'multiple', 'no', 2)}")
         print(f"   Mean Multiple: {results['non_sba']['mean']:.2f}x")
         print(f"   Range: {results['non_sba']['min']:.2f}x - {results['non_sba']['max']:.2f}x")
         print(f"   IQR: {results['non_sba']['q25']:.2f}x - {results['non_sba']['q75']:.2f}x")
@@ -231,6 +184,7 @@ def main():
             print(f"⚠️  SBA pre-qualified deals have LOWER median multiples")
             print(f"   Difference: {results['comparison']['median_difference']:.2f}x")
             print(f"   Percentage: {results['comparison']['median_difference_percent']:.1f}%")
+        print(f"   Difference {format_ci(cis, 'multiple', 'difference', 2)}")
     
     # Save results to JSON
     output_file = 'final_multiples_analysis.json'
@@ -7,11 +7,13 @@ import pandas as pd
 import json
 from collections import Counter
 
+from listing_facts import load_facts
+
 def generate_chart_data():
     """Generate all chart data needed for the dashboard."""
     
-    # Load the launch date analysis
-    df = pd.read_csv('launch_date_analysis_v2.csv')
+    # Load the listing fact table
+    df = load_facts()
     
     # Generate commission scatter plot data
     commission_data = {
@@ -7,18 +7,21 @@ import pandas as pd
 import json
 from datetime import datetime
 
+from listing_facts import load_facts
+
 def generate_enhanced_verification():
     """Generate comprehensive verification data with inquiry information."""
     
-    # Load the enhanced data with inquiries
-    df = pd.read_csv('sba_analysis_with_inquiries.csv')
+    # SBA-prequalified listings, with inquiries, from the fact table
+    df = load_facts()
+    df = df[df['sba_status'] == 'yes']
     
     # Filter to sold deals only for verification
     sold_df = df[df['status'] == 'sold'].copy()
     
     # Add financing type for clarity
     sold_df['financing_type'] = sold_df.apply(
-        lambda x: 'SBA' if x['winning_loi_sba'] else 'Non-SBA', 
+        lambda x: 'Unknown' if pd.isna(x['winning_loi_sba']) else 'SBA' if x['winning_loi_sba'] else 'Non-SBA', 
         axis=1
     )
     
@@ -30,13 +33,13 @@ def generate_enhanced_verification():
             'id': int(row['id']),
             'name': row['name'],
             'status': row['status'],
-            'closed_at': row['closed_at'] if pd.notna(row['closed_at']) else None,
+            'closed_at': str(row['closed_at']) if pd.notna(row['closed_at']) else None,
             'closed_commission': float(row['closed_commission']) if pd.notna(row['closed_commission']) else None,
             'total_inquiries': int(row['total_inquiries']) if pd.notna(row['total_inquiries']) else 0,
             'total_lois': int(row['total_lois']) if pd.notna(row['total_lois']) else 0,
             'sba_lois': int(row['sba_lois']) if pd.notna(row['sba_lois']) else 0,
-            'has_sba_loi': bool(row['has_sba_loi']),
-            'winning_loi_sba': bool(row['winning_loi_sba']),
+            'has_sba_loi': None if pd.isna(row['has_sba_loi']) else bool(row['has_sba_loi']),
+            'winning_loi_sba': None if pd.isna(row['winning_loi_sba']) else bool(row['winning_loi_sba']),
             'financing_type': row['financing_type'],
             'pct_sba_lois': float(row['pct_sba_lois']) if pd.notna(row['pct_sba_lois']) else 0,
             'days_on_market': int(row['days_on_market']) if pd.notna(row['days_on_market']) else None,
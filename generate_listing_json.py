@@ -6,47 +6,12 @@ Generate JSON data for dashboard modal popups with actual listing details.
 import pandas as pd
 import json
 from datetime import datetime
-import pymysql
 
-def get_db_connection():
-    return pymysql.connect(
-        host='127.0.0.1',
-        port=3307,
-        user='forge',
-        password='mFGaHKEBBYLqpnUV3VUW',
-        database='ac_prod',
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
+from listing_facts import load_facts
 
-# Load the launch date analysis data
-df = pd.read_csv('launch_date_analysis.csv')
-
-# Get commission data from database
-conn = get_db_connection()
-cursor = conn.cursor()
-
-listing_ids = df['id'].tolist()
-id_list = ','.join(map(str, listing_ids))
-
-query = f"""
-SELECT 
-    id,
-    closed_commission
-FROM listings
-WHERE id IN ({id_list})
-"""
-
-cursor.execute(query)
-commission_data = cursor.fetchall()
-cursor.close()
-conn.close()
-
-# Create commission lookup
-commission_map = {row['id']: row['closed_commission'] for row in commission_data}
-
-# Add commission to dataframe
-df['closed_commission'] = df['id'].map(commission_map)
+# Load the listing fact table (commission included)
+df = load_facts(['id', 'name', 'sba_status', 'status', 'days_on_market', 'launch_date', 'closed_at',
+                 'closed_commission'])
 
 # Prepare data for each category
 categories = {
@@ -97,7 +62,7 @@ for category, data in categories.items():
 
 # Generate JavaScript for dashboard
 js_output = f"""
-// Generated listing data from launch_date_analysis.csv
+// Generated listing data from the listing fact table
 // Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}
 
 const listingData = {json.dumps(listing_data, indent=2)};
@@ -7,22 +7,14 @@ import pandas as pd
 import json
 from datetime import datetime
 
+from listing_facts import load_facts
+
 def generate_verification_data():
     """Generate comprehensive verification data for the dashboard."""
     
-    # Load the datasets
-    sba_usage_df = pd.read_csv('sba_actual_usage_analysis.csv')
-    launch_df = pd.read_csv('launch_date_analysis_v2.csv')
-    
-    # Merge the datasets
-    merged_df = pd.merge(
-        sba_usage_df,
-        launch_df[['id', 'days_on_market', 'days_under_loi', 'days_to_loi', 
-                   'first_loi_date', 'last_loi_date', 'num_lois', 'launch_date']],
-        on='id',
-        how='left',
-        suffixes=('', '_launch')
-    )
+    # SBA-prequalified listings from the fact table
+    facts = load_facts()
+    merged_df = facts[facts['sba_status'] == 'yes'].copy()
     
     # Clean up the merge - prefer num_lois from launch_df if available
     merged_df['num_lois_final'] = merged_df['num_lois'].fillna(merged_df['total_lois'])
@@ -32,7 +24,7 @@ def generate_verification_data():
     
     # Add financing type column for clarity
     sold_df['financing_type'] = sold_df.apply(
-        lambda x: 'SBA' if x['winning_loi_sba'] else 'Non-SBA', 
+        lambda x: 'Unknown' if pd.isna(x['winning_loi_sba']) else 'SBA' if x['winning_loi_sba'] else 'Non-SBA', 
         axis=1
     )
     
@@ -74,20 +66,20 @@ def generate_verification_data():
             'id': int(row['id']),
             'name': row['name'],
             'status': row['status'],
-            'closed_at': row['closed_at'] if pd.notna(row['closed_at']) else None,
+            'closed_at': str(row['closed_at']) if pd.notna(row['closed_at']) else None,
             'closed_commission': float(row['closed_commission']) if pd.notna(row['closed_commission']) else None,
             'total_lois': int(row['total_lois']) if pd.notna(row['total_lois']) else 0,
             'sba_lois': int(row['sba_lois']) if pd.notna(row['sba_lois']) else 0,
-            'has_sba_loi': bool(row['has_sba_loi']),
-            'winning_loi_sba': bool(row['winning_loi_sba']),
+            'has_sba_loi': None if pd.isna(row['has_sba_loi']) else bool(row['has_sba_loi']),
+            'winning_loi_sba': None if pd.isna(row['winning_loi_sba']) else bool(row['winning_loi_sba']),
             'financing_type': row['financing_type'],
             'pct_sba_lois': float(row['pct_sba_lois']) if pd.notna(row['pct_sba_lois']) else 0,
             'days_on_market': int(row['days_on_market']) if pd.notna(row['days_on_market']) else None,
             'days_under_loi': int(row['days_under_loi']) if pd.notna(row['days_under_loi']) else None,
             'days_to_loi': int(row['days_to_loi']) if pd.notna(row['days_to_loi']) else None,
-            'launch_date': row['launch_date'] if pd.notna(row['launch_date']) else None,
-            'first_loi_date': row['first_loi_date'] if pd.notna(row['first_loi_date']) else None,
-            'last_loi_date': row['last_loi_date'] if pd.notna(row['last_loi_date']) else None
+            'launch_date': str(row['launch_date'].date()) if pd.notna(row['launch_date']) else None,
+            'first_loi_date': str(row['first_loi_date'].date()) if pd.notna(row['first_loi_date']) else None,
+            'last_loi_date': str(row['last_loi_date'].date()) if pd.notna(row['last_loi_date']) else None
         })
     
     # Sort by days_on_market for better visualization
@@ -3,29 +3,20 @@
 Generate a polished written report from the fact-check analysis using Grok 4 API.
 """
 import os
-import json
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
+from llm_provider import chat_completion
 
 # Load environment variables
 load_dotenv('/Users/markdaoust/Developer/ql_stats/.env')
 
 def call_grok_api(prompt, api_key):
     """Call Grok 4 API to process the fact-check report."""
-    url = "https://api.x.ai/v1/chat/completions"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
-    payload = {
-        "model": "grok-2-1212",
-        "messages": [
-            {
-                "role": "system",
-                "content": """You are a professional business analyst writing for executive leadership at Quiet Light Brokerage. 
+    messages = [
+        {
+            "role": "system",
+            "content": """You are a professional business analyst writing for executive leadership at Quiet Light Brokerage. 
                 Your task is to transform a technical fact-checking report into a polished, narrative-driven written report.
                 
                 The report should:
@@ -39,10 +30,10 @@ def call_grok_api(prompt, api_key):
                 
                 Do not use bullet points excessively. Write in full paragraphs with smooth transitions.
                 The report should read like a professional consulting deliverable."""
-            },
-            {
-                "role": "user", 
-                "content": f"""Please transform the following technical fact-checking analysis into a polished written report 
+        },
+        {
+            "role": "user", 
+            "content": f"""Please transform the following technical fact-checking analysis into a polished written report 
                 suitable for Quiet Light Brokerage leadership. Focus on the business implications and strategic insights 
                 while maintaining accuracy about the verification findings.
                 
@@ -57,18 +48,13 @@ def call_grok_api(prompt, api_key):
                 5. Concludes with confidence assessment and recommendations
                 
                 Write this as a flowing narrative document, not a technical checklist."""
-            }
-        ],
-        "temperature": 0.7,
-        "max_tokens": 4000
-    }
+        }
+    ]
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        response = chat_completion(messages, provider='grok', api_key=api_key,
+                                   temperature=0.7, max_tokens=4000, timeout=300, stage="report")
+        return response['content']
     
     except requests.exceptions.RequestException as e:
         print(f"Error calling Grok API: {e}")
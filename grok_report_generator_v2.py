@@ -3,29 +3,20 @@
 Generate a plain-spoken, actionable report from the fact-check analysis using Grok 4 API.
 """
 import os
-import json
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
+from llm_provider import chat_completion
 
 # Load environment variables
 load_dotenv('/Users/markdaoust/Developer/ql_stats/.env')
 
 def call_grok_api(prompt, api_key):
     """Call Grok 4 API to process the fact-check report."""
-    url = "https://api.x.ai/v1/chat/completions"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
-    payload = {
-        "model": "grok-2-1212",
-        "messages": [
-            {
-                "role": "system",
-                "content": """You are an academic researcher writing a fact-checking report for internal use at a business brokerage.
+    messages = [
+        {
+            "role": "system",
+            "content": """You are an academic researcher writing a fact-checking report for internal use at a business brokerage.
 
 CRITICAL INSTRUCTIONS:
 - Write in plain, direct language - NO business jargon or corporate speak
@@ -37,10 +28,10 @@ CRITICAL INSTRUCTIONS:
 - Write like you're explaining to a smart colleague, not selling to a client
 
 The goal is academic rigor with plain English. Think more like a research paper abstract than a consulting report."""
-            },
-            {
-                "role": "user", 
-                "content": f"""Take this technical fact-check and turn it into a clear, actionable report. 
+        },
+        {
+            "role": "user", 
+            "content": f"""Take this technical fact-check and turn it into a clear, actionable report. 
 
 Remember:
 - NO phrases like "underscores the strategic importance" or "comprehensive fact-checking analysis" 
@@ -60,18 +51,13 @@ Write a report that:
 5. Ends with confidence level and key takeaways
 
 Write it like you're talking to someone who needs to make decisions, not someone you're trying to impress."""
-            }
-        ],
-        "temperature": 0.6,
-        "max_tokens": 4000
-    }
+        }
+    ]
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        response = chat_completion(messages, provider='grok', api_key=api_key,
+                                   temperature=0.6, max_tokens=4000, timeout=300, stage="report")
+        return response['content']
     
     except requests.exceptions.RequestException as e:
         print(f"Error calling Grok API: {e}")
@@ -10,6 +10,8 @@ import re
 from pathlib import Path
 import json
 
+from listing_facts import load_facts
+
 def has_sba_in_title(name):
     """Check if listing title mentions SBA."""
     if pd.isna(name):
@@ -39,7 +41,7 @@ def analyze_conflicts():
     """Analyze conflicts between title and status."""
     
     # Load the data
-    df = pd.read_csv('launch_date_analysis_v2.csv')
+    df = load_facts()
     
     # Add title analysis
     df['sba_in_title'] = df['name'].apply(has_sba_in_title)
@@ -2,8 +2,12 @@
 """
 Calculate launch dates based on inquiry surge with re-launch detection and LOI timing.
 Handles multiple launches and gaps in listing activity.
+
+LAUNCH_METHOD=changepoint uses change points in the daily inquiry rate instead
+of the surge / 10+ / 5+ / first-inquiry rules (see launch_engine.py).
 """
 
+import os
 import pymysql
 import pandas as pd
 import json
@@ -11,6 +15,10 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import numpy as np
 
+from launch_engine import load_inquiry_days, detect_launches_from_frame, launch_result
+
+LAUNCH_METHOD = os.getenv('LAUNCH_METHOD', 'rules')
+
 def get_db_connection():
     return pymysql.connect(
         host='127.0.0.1',
@@ -44,7 +52,8 @@ def load_cim_results():
 def detect_relaunches(inquiry_df, gap_threshold_days=30):
     """
     Detect if there are multiple launches by finding gaps in inquiry activity.
-    Returns list of launch periods.
+    Returns list of launch periods as (start, end) row positions.
+    launch_engine.segment_inquiries builds the same periods for all listings.
     """
     if len(inquiry_df) == 0:
         return []
@@ -52,24 +61,12 @@ def detect_relaunches(inquiry_df, gap_threshold_days=30):
     # Sort by date
     inquiry_df = inquiry_df.sort_values('inquiry_date')
     
-    # Find gaps between consecutive inquiry dates
-    inquiry_df['prev_date'] = inquiry_df['inquiry_date'].shift(1)
-    inquiry_df['days_gap'] = (inquiry_df['inquiry_date'] - inquiry_df['prev_date']).dt.days
-    
-    # Identify significant gaps (default 30+ days of no inquiries)
-    launch_periods = []
-    current_period_start = 0
-    
-    for i, row in inquiry_df.iterrows():
-        if pd.notna(row['days_gap']) and row['days_gap'] > gap_threshold_days:
-            # End current period and start new one
-            launch_periods.append((current_period_start, i-1))
-            current_period_start = i
-    
-    # Add final period
-    launch_periods.append((current_period_start, len(inquiry_df)-1))
+    # A gap of more than gap_threshold_days between inquiry dates starts a new period
+    days_gap = inquiry_df['inquiry_date'].diff().dt.days.to_numpy()
+    starts = np.flatnonzero(np.r_[True, days_gap[1:] > gap_threshold_days])
+    ends = np.r_[starts[1:] - 1, len(inquiry_df) - 1]
     
-    return launch_periods
+    return list(zip(starts.tolist(), ends.tolist()))
 
 def calculate_launch_date_with_relaunches(conn, listing_id, closed_date=None):
     """
@@ -95,6 +92,14 @@ def calculate_launch_date_with_relaunches(conn, listing_id, closed_date=None):
     inquiries = cursor.fetchall()
     cursor.close()
     
+    return launch_date_from_inquiries(inquiries, closed_date)
+
+def launch_date_from_inquiries(inquiries, closed_date=None):
+    """
+    Launch date from a listing's daily inquiry counts (rows with inquiry_date
+    and daily_inquiries, in date order). launch_engine.detect_launches computes
+    the same thing for every listing at once.
+    """
     if not inquiries:
         return None, "No inquiries", {}, None
     
@@ -202,7 +207,7 @@ def get_loi_timing(conn, listing_id):
     
     return first_loi_date, last_loi_date, 0, len(lois)
 
-def analyze_launch_dates_for_cim_listings():
+def analyze_launch_dates_for_cim_listings(method=LAUNCH_METHOD):
     """Analyze launch dates and days on market for all CIM listings with re-launch detection."""
     
     # Load CIM results
@@ -248,6 +253,10 @@ def analyze_launch_dates_for_cim_listings():
     
     print(f"Processing {len(listings)} listings...")
     
+    # Launch dates for every listing from one inquiry query (launch_engine)
+    closed_dates = {l['id']: l['closed_at'].date() for l in listings if l['closed_at']}
+    launches = detect_launches_from_frame(load_inquiry_days(conn, listing_ids), closed_dates, method=method)
+    
     results = []
     strategy_counts = {}
     relaunch_count = 0
@@ -260,13 +269,8 @@ def analyze_launch_dates_for_cim_listings():
         cim_data = cim_map[listing_id]
         listing['sba_status'] = cim_data.get('sba_eligible', 'unknown')
         
-        # Get closed date if available
-        closed_date = listing['closed_at'].date() if listing['closed_at'] else None
-        
-        # Calculate launch date with re-launch detection
-        launch_date, strategy, details, num_periods = calculate_launch_date_with_relaunches(
-            conn, listing_id, closed_date
-        )
+        # Launch date with re-launch detection
+        launch_date, strategy, details, num_periods = launch_result(launches, listing_id)
         
         listing['launch_date'] = launch_date
         listing['launch_strategy'] = strategy
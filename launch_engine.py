@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Vectorized launch-date detection for every listing at once.
+
+detect_launches() takes one long (listing_id, date, count) array of daily
+inquiry counts and returns each listing's launch date and strategy with the
+same rules, and the same results, as
+launch_date_analysis_v2.calculate_launch_date_with_relaunches:
+
+1. split the history into periods at gaps of more than 30 days and keep the
+   last period that ended by the close date (the latest period for active
+   listings; the whole history if no period ended before the close)
+2. first day whose 2-day window holds 20+ inquiries (surge_20_in_2days)
+3. else the first day with 10+, then 5+ inquiries, else the first inquiry
+
+The 2-day window is a day plus the next day that had inquiries, as in the
+per-listing function; calendar_window=True only counts the next day when it is
+the following calendar day. Everything is a sort, cumsum and reduceat over the
+whole array, so there is no per-listing Python loop.
+
+segment_inquiries() returns the launch periods themselves as a table
+(listing_id, segment_id, start, end, inquiries, days); select_periods() picks
+each listing's period from it, and detect_launches() joins the inquiry days to
+that period.
+
+method='changepoint' replaces the surge and single-day rules with change points
+in each period's daily Poisson rate (binary segmentation; zero-inquiry days
+count towards a segment's length): the launch is the start of the first rate
+segment running at half the period's peak rate or more, so a slow ramp does
+not launch on its first stray inquiry. All periods are split together, one
+level per round, so the cost is O(n log n) in inquiry days over the whole
+table. compare_methods() reports agreement with the rules and the runtime of
+both.
+
+Usage:
+    python3 launch_engine.py --benchmark 100000   # Synthetic histories for 100k listings
+    python3 launch_engine.py --verify 5000        # Compare with the per-listing function
+    python3 launch_engine.py --segments           # Segment table for the CIM listings (needs DB)
+    python3 launch_engine.py --compare 100000     # Change points vs. rules on synthetic histories
+    python3 launch_engine.py --compare-db         # Change points vs. rules on the full inquiries table
+"""
+
+import time
+import argparse
+from datetime import date
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+GAP_THRESHOLD_DAYS = 30
+SURGE_INQUIRIES = 20
+SURGE_WINDOW = 2  # Inquiry days
+DAY_THRESHOLDS = [(10, 'single_day_10plus'), (5, 'single_day_5plus')]
+NO_CLOSE = np.iinfo(np.int64).max
+SEGMENTS_FILE = 'launch_segments.csv'
+CHANGEPOINT_PENALTY = 2.0  # Log-likelihood gain per split, times log(period days)
+CHANGEPOINT_ROUNDS = 6  # Up to 2**6 rate segments per period
+LAUNCH_RATE_SHARE = 0.5  # Launch segment's rate relative to the period's peak
+COMPARISON_FILE = 'launch_method_comparison.csv'
+
+def load_inquiry_days(conn, listing_ids: Iterable[int] = None) -> pd.DataFrame:
+    """Daily inquiry counts (listing_id, inquiry_date, daily_inquiries) in one query."""
+    query = """
+    SELECT
+        listing_id,
+        DATE(created_at) as inquiry_date,
+        COUNT(*) as daily_inquiries
+    FROM inquiries
+    """
+    if listing_ids is not None:
+        query += f" WHERE listing_id IN ({','.join(map(str, listing_ids)) or 'NULL'})"
+    query += " GROUP BY listing_id, DATE(created_at)"
+
+    cursor = conn.cursor()
+    cursor.execute(query)
+    rows = cursor.fetchall()
+    cursor.close()
+    return pd.DataFrame(rows, columns=['listing_id', 'inquiry_date', 'daily_inquiries'])
+
+def _first_per_group(group: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(groups, first row index) for the first True row of each group; group must be sorted."""
+    rows = np.flatnonzero(mask)
+    if len(rows) == 0:
+        return rows, rows
+    keep = np.r_[True, group[rows[1:]] != group[rows[:-1]]]
+    return group[rows[keep]], rows[keep]
+
+def _days(values) -> np.ndarray:
+    """Dates as int64 days since the epoch."""
+    return np.asarray(values, dtype='datetime64[D]').astype(np.int64)
+
+def _daily_arrays(listing_ids, dates, counts) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(listing_id, day, count) sorted by listing and day, with duplicate days summed."""
+    lid = np.asarray(listing_ids, dtype=np.int64)
+    day = _days(dates)
+    cnt = np.asarray(counts, dtype=np.int64)
+    if len(lid) < 2:
+        return lid, day, cnt
+
+    same = lid[1:] == lid[:-1]
+    if not np.all((lid[1:] > lid[:-1]) | (same & (day[1:] >= day[:-1]))):
+        order = np.lexsort((day, lid))
+        lid, day, cnt = lid[order], day[order], cnt[order]
+        same = lid[1:] == lid[:-1]
+    duplicate = same & (day[1:] == day[:-1])
+    if duplicate.any():
+        starts = np.flatnonzero(np.r_[True, ~duplicate])
+        cnt = np.add.reduceat(cnt, starts)
+        lid, day = lid[starts], day[starts]
+    return lid, day, cnt
+
+def _segment_table(lid: np.ndarray, day: np.ndarray, cnt: np.ndarray, gap_threshold_days: int) -> pd.DataFrame:
+    if len(lid) == 0:
+        return pd.DataFrame({'listing_id': lid, 'segment_id': lid, 'start': day.astype('datetime64[D]'),
+                             'end': day.astype('datetime64[D]'), 'inquiries': cnt, 'days': lid})
+    new_listing = np.r_[True, lid[1:] != lid[:-1]]
+    new_segment = new_listing | np.r_[False, np.diff(day) > gap_threshold_days]
+    starts = np.flatnonzero(new_segment)
+    ends = np.r_[starts[1:] - 1, len(day) - 1]
+    first_of_listing = np.maximum.accumulate(np.where(new_listing[starts], np.arange(len(starts)), 0))
+    return pd.DataFrame({
+        'listing_id': lid[starts],
+        'segment_id': np.arange(len(starts)) - first_of_listing,
+        'start': day[starts].astype('datetime64[D]'),
+        'end': day[ends].astype('datetime64[D]'),
+        'inquiries': np.add.reduceat(cnt, starts),
+        'days': ends - starts + 1,
+    })
+
+def segment_inquiries(listing_ids, dates, counts, gap_threshold_days: int = GAP_THRESHOLD_DAYS) -> pd.DataFrame:
+    """
+    Launch periods of every listing: one row per run of inquiry days without a
+    gap of more than gap_threshold_days. Columns listing_id, segment_id
+    (0, 1, ... within the listing), start, end, inquiries and days (days with
+    inquiries), sorted by listing and segment.
+    """
+    return _segment_table(*_daily_arrays(listing_ids, dates, counts), gap_threshold_days)
+
+def select_periods(segments: pd.DataFrame, closed_dates: Mapping[int, date] = None) -> pd.DataFrame:
+    """
+    The period each listing's launch is searched in, indexed by listing_id:
+    the last segment that ended by the close date, the latest segment for
+    active listings, or the whole history (whole_history=True) if no segment
+    ended before the close. Columns period_start, period_end, num_periods.
+    """
+    seg_listing = segments['listing_id'].to_numpy()
+    if len(seg_listing) == 0:
+        return pd.DataFrame({'period_start': segments['start'], 'period_end': segments['end'],
+                             'num_periods': seg_listing, 'whole_history': seg_listing.astype(bool)},
+                            index=pd.Index(seg_listing, name='listing_id'))
+    first = np.flatnonzero(np.r_[True, seg_listing[1:] != seg_listing[:-1]])
+    ids = seg_listing[first]
+    num_periods = np.diff(np.r_[first, len(seg_listing)])
+    last = first + num_periods - 1
+    start, end = _days(segments['start']), _days(segments['end'])
+
+    closed = np.full(len(ids), NO_CLOSE, dtype=np.int64)
+    if closed_dates:
+        close_days = pd.Series(closed_dates, dtype=object).reindex(ids)
+        known = close_days.notna().to_numpy()
+        closed[known] = _days(pd.to_datetime(close_days[known]).to_numpy())
+    has_close = closed != NO_CLOSE
+
+    eligible = np.where(end <= np.repeat(closed, num_periods), np.arange(len(seg_listing)), -1)
+    last_eligible = np.maximum.reduceat(eligible, first)
+    chosen = np.where(has_close, last_eligible, last)
+    whole_history = has_close & (last_eligible < 0)
+    return pd.DataFrame({
+        'period_start': np.where(whole_history, start[first], start[chosen]).astype('datetime64[D]'),
+        'period_end': np.where(whole_history, end[last], end[chosen]).astype('datetime64[D]'),
+        'num_periods': num_periods,
+        'whole_history': whole_history,
+    }, index=pd.Index(ids, name='listing_id'))
+
+def _period_rows(lid: np.ndarray, day: np.ndarray, cnt: np.ndarray, periods: pd.DataFrame):
+    """Inquiry days inside each listing's period: (listing index, day, count, first row of each period)."""
+    listing = np.cumsum(np.r_[True, lid[1:] != lid[:-1]]) - 1
+    selected = ((day >= _days(periods['period_start'])[listing]) &
+                (day <= _days(periods['period_end'])[listing]))
+    s_listing, s_day, s_cnt = listing[selected], day[selected], cnt[selected]
+    return s_listing, s_day, s_cnt, np.flatnonzero(np.r_[True, s_listing[1:] != s_listing[:-1]])
+
+def _poisson_fit(inquiries: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Poisson log-likelihood of a segment at its own rate, less the terms that cancel between splits."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(inquiries > 0, inquiries * np.log(inquiries / np.maximum(days, 1)), 0.0)
+
+def rate_segments(s_day: np.ndarray, s_cnt: np.ndarray, period_starts: np.ndarray,
+                  penalty: float = CHANGEPOINT_PENALTY, rounds: int = CHANGEPOINT_ROUNDS) -> np.ndarray:
+    """
+    Binary segmentation of every period's daily counts at once. Rows are
+    inquiry days sorted by period and day; each row stands for the calendar
+    days up to the next inquiry day, so quiet stretches lower a segment's
+    rate. Each round tries every row as a split of its current segment and
+    splits every segment whose best gain beats penalty * log(period days).
+    Returns a mask of rows that start a rate segment.
+    """
+    n = len(s_cnt)
+    period_stops = np.r_[period_starts[1:], n]
+    span = np.r_[np.diff(s_day), 1]
+    span[period_stops - 1] = 1
+    inquiries, days = np.r_[0, np.cumsum(s_cnt)], np.r_[0, np.cumsum(span)]
+    period_of_row = np.repeat(np.arange(len(period_starts)), period_stops - period_starts)
+    min_gain = (penalty * np.log(np.maximum(days[period_stops] - days[period_starts], 2)))[period_of_row]
+
+    boundary = np.zeros(n, dtype=bool)
+    boundary[period_starts] = True
+    split = np.arange(n)
+    for _ in range(rounds):
+        starts = np.flatnonzero(boundary)
+        segment = np.cumsum(boundary) - 1
+        a, b = starts[segment], np.r_[starts[1:], n][segment]
+        left = (inquiries[split] - inquiries[a], days[split] - days[a])
+        right = (inquiries[b] - inquiries[split], days[b] - days[split])
+        gain = np.where(split > a, _poisson_fit(*left) + _poisson_fit(*right)
+                        - _poisson_fit(left[0] + right[0], left[1] + right[1]), -np.inf)
+        best = np.maximum.reduceat(gain, starts)[segment]
+        _, rows = _first_per_group(segment, (gain == best) & (best > min_gain))
+        if len(rows) == 0:
+            break
+        boundary[rows] = True
+    return boundary
+
+def _changepoint_launches(s_day: np.ndarray, s_cnt: np.ndarray, period_starts: np.ndarray,
+                          penalty: float, rounds: int) -> Dict[str, np.ndarray]:
+    boundary = rate_segments(s_day, s_cnt, period_starts, penalty, rounds)
+    n = len(s_cnt)
+    starts = np.flatnonzero(boundary)
+    stops = np.r_[starts[1:], n]
+    period_stops = np.r_[period_starts[1:], n]
+    # A segment runs to the next segment's first day, or one day past its period's last inquiry
+    end_day = np.where(np.isin(stops, period_stops), s_day[stops - 1] + 1, s_day[np.minimum(stops, n - 1)])
+    rate = np.add.reduceat(s_cnt, starts) / (end_day - s_day[starts])
+
+    period = np.searchsorted(period_starts, starts, side='right') - 1
+    first_segment = np.searchsorted(period, np.arange(len(period_starts)))
+    peak = np.maximum.reduceat(rate, first_segment)
+    _, launch_segment = _first_per_group(period, rate >= LAUNCH_RATE_SHARE * peak[period])
+    previous = launch_segment - 1
+    return {
+        'launch_row': starts[launch_segment],
+        'launch_rate': rate[launch_segment],
+        'prelaunch_rate': np.where(launch_segment > first_segment, rate[np.maximum(previous, 0)], 0.0),
+        'rate_segments': np.diff(np.r_[first_segment, len(starts)]),
+    }
+
+def detect_launches(listing_ids, dates, counts, closed_dates: Mapping[int, date] = None,
+                    gap_threshold_days: int = GAP_THRESHOLD_DAYS, calendar_window: bool = False,
+                    surge_inquiries: int = SURGE_INQUIRIES, surge_window: int = SURGE_WINDOW,
+                    day_thresholds: Sequence[int] = None, method: str = 'rules',
+                    changepoint_penalty: float = CHANGEPOINT_PENALTY,
+                    changepoint_rounds: int = CHANGEPOINT_ROUNDS) -> pd.DataFrame:
+    """
+    Launch date and strategy for every listing in the arrays, indexed by
+    listing_id. Rows may arrive in any order and several rows for one day are
+    summed. closed_dates maps listing_id to its close date (missing or None for
+    active listings). Listings without inquiries are not in the result.
+
+    The thresholds default to the production rules; launch_sweep varies them.
+    A surge is surge_inquiries within surge_window inquiry days (calendar days
+    with calendar_window), and day_thresholds are the single-day fallbacks in
+    priority order. method='changepoint' uses rate_segments() instead, with
+    launch_rate, prelaunch_rate and rate_segments columns in place of the
+    surge columns.
+    """
+    lid, day, cnt = _daily_arrays(listing_ids, dates, counts)
+    periods = select_periods(_segment_table(lid, day, cnt, gap_threshold_days), closed_dates)
+    if len(lid) == 0:
+        extra = ['launch_rate', 'prelaunch_rate', 'rate_segments'] if method == 'changepoint' else \
+            ['surge_inquiries', 'days_in_surge']
+        return pd.DataFrame(columns=['launch_date', 'strategy', 'num_periods', 'relaunch'] + extra +
+                                    ['first_day_inquiries', 'total_inquiries'],
+                            index=periods.index)
+
+    # Join each inquiry day to its listing's period and keep the days inside it
+    s_listing, s_day, s_cnt, period_starts = _period_rows(lid, day, cnt, periods)
+    num_periods = periods['num_periods'].to_numpy()
+
+    if method == 'changepoint':
+        found = _changepoint_launches(s_day, s_cnt, period_starts, changepoint_penalty, changepoint_rounds)
+        launch_row = found['launch_row']
+        return pd.DataFrame({
+            'launch_date': s_day[launch_row].astype('datetime64[D]'),
+            'strategy': 'changepoint',
+            'num_periods': num_periods,
+            'relaunch': num_periods > 1,
+            'launch_rate': found['launch_rate'],
+            'prelaunch_rate': found['prelaunch_rate'],
+            'rate_segments': found['rate_segments'],
+            'first_day_inquiries': s_cnt[launch_row],
+            'total_inquiries': np.add.reduceat(s_cnt, period_starts),
+        }, index=periods.index)
+    if method != 'rules':
+        raise ValueError(f"Unknown launch method: {method}")
+
+    # Window sums from a running total; a window never runs past its listing's period
+    position = np.arange(len(s_cnt))
+    period_stop = np.repeat(np.r_[period_starts[1:], len(s_cnt)], np.diff(np.r_[period_starts, len(s_cnt)]))
+    if calendar_window:
+        span = int(s_day.max() - s_day.min()) + surge_window + 1
+        key = s_listing * span + (s_day - s_day.min())
+        stop = np.minimum(np.searchsorted(key, key + surge_window - 1, side='right'), period_stop)
+    else:
+        stop = np.minimum(position + surge_window, period_stop)
+    running = np.r_[0, np.cumsum(s_cnt)]
+    window = running[stop] - running[position]
+
+    # Lowest-priority strategy first, overwritten by higher-priority matches
+    if day_thresholds is None:
+        day_thresholds = [threshold for threshold, _ in DAY_THRESHOLDS]
+    launch_row = period_starts.copy()
+    strategy = np.full(len(periods), 'first_inquiry', dtype=object)
+    for threshold in reversed(day_thresholds):
+        hit, rows = _first_per_group(s_listing, s_cnt >= threshold)
+        launch_row[hit], strategy[hit] = rows, f'single_day_{threshold}plus'
+    hit, rows = _first_per_group(s_listing, window >= surge_inquiries)
+    launch_row[hit], strategy[hit] = rows, f'surge_{surge_inquiries}_in_{surge_window}days'
+
+    return pd.DataFrame({
+        'launch_date': s_day[launch_row].astype('datetime64[D]'),
+        'strategy': strategy,
+        'num_periods': num_periods,
+        'relaunch': num_periods > 1,
+        'surge_inquiries': window[launch_row],
+        'days_in_surge': (stop - position)[launch_row],
+        'first_day_inquiries': s_cnt[launch_row],
+        'total_inquiries': np.add.reduceat(s_cnt, period_starts),
+    }, index=periods.index)
+
+def detect_launches_from_frame(inquiry_days: pd.DataFrame, closed_dates: Mapping[int, date] = None,
+                               **kwargs) -> pd.DataFrame:
+    """detect_launches over a load_inquiry_days() frame."""
+    return detect_launches(inquiry_days['listing_id'].to_numpy(),
+                           pd.to_datetime(inquiry_days['inquiry_date']).to_numpy(),
+                           inquiry_days['daily_inquiries'].to_numpy(), closed_dates, **kwargs)
+
+def launch_result(launches: pd.DataFrame, listing_id: int) -> Tuple[Optional[date], str, Dict, Optional[int]]:
+    """
+    One listing's (launch_date, strategy, details, num_periods), in the form
+    calculate_launch_date_with_relaunches returns.
+    """
+    if listing_id not in launches.index:
+        return None, "No inquiries", {}, None
+    row = launches.loc[listing_id]
+    launch_date = pd.Timestamp(row['launch_date']).date()
+    relaunch = bool(row['relaunch'])
+    if row['strategy'].startswith('surge_'):
+        details = {'surge_start': str(launch_date), 'surge_inquiries': int(row['surge_inquiries']),
+                   'days_in_surge': int(row['days_in_surge']), 'relaunch': relaunch}
+    elif row['strategy'] == 'changepoint':
+        details = {'launch_date': str(launch_date), 'launch_rate': round(float(row['launch_rate']), 2),
+                   'prelaunch_rate': round(float(row['prelaunch_rate']), 2),
+                   'rate_segments': int(row['rate_segments']), 'relaunch': relaunch}
+    elif row['strategy'] == 'first_inquiry':
+        details = {'launch_date': str(launch_date), 'total_inquiries': int(row['total_inquiries']),
+                   'relaunch': relaunch}
+    else:
+        details = {'launch_date': str(launch_date), 'first_day_inquiries': int(row['first_day_inquiries']),
+                   'relaunch': relaunch}
+    return launch_date, row['strategy'], details, int(row['num_periods'])
+
+def synthetic_inquiry_days(listings: int, seed: int = 42) -> Tuple[pd.DataFrame, Dict[int, date]]:
+    """
+    Daily inquiry histories shaped like real ones: a launch burst that decays,
+    sparse tails, and for some listings a relaunch after a long gap.
+    Returns the long frame and close dates (None for active listings).
+    """
+    rng = np.random.default_rng(seed)
+    days_per_listing = rng.integers(5, 80, listings)
+    listing_ids = np.repeat(np.arange(1, listings + 1), days_per_listing)
+    n = len(listing_ids)
+
+    starts = rng.integers(0, 1400, listings)  # Days after 2021-01-01
+    offsets = np.ones(n, dtype=np.int64)
+    offsets[np.r_[0, np.cumsum(days_per_listing)[:-1]]] = 0
+    gaps = rng.geometric(0.35, n)
+    relaunch = rng.random(n) < 0.01
+    gaps[relaunch] += rng.integers(30, 120, relaunch.sum())
+    day_in_listing = np.cumsum(np.where(offsets == 0, 0, gaps))
+    day_in_listing -= np.repeat(day_in_listing[np.r_[0, np.cumsum(days_per_listing)[:-1]]], days_per_listing)
+    dates = np.datetime64('2021-01-01') + np.repeat(starts, days_per_listing) + day_in_listing
+
+    position = np.arange(n) - np.repeat(np.r_[0, np.cumsum(days_per_listing)[:-1]], days_per_listing)
+    burst = np.repeat(rng.choice([2, 6, 14, 25], listings, p=[0.2, 0.3, 0.3, 0.2]), days_per_listing)
+    counts = 1 + rng.poisson(burst * np.exp(-position / 3.0))
+
+    # A quarter active; the rest closed up to 60 days before their last inquiry
+    ends = dates[np.cumsum(days_per_listing) - 1]
+    status = rng.random(listings)
+    close_dates = (ends - (status * 60).astype(np.int64)).astype(object)
+    closed = {listing_id: None if s < 0.25 else close for listing_id, s, close
+              in zip(range(1, listings + 1), status, close_dates)}
+    frame = pd.DataFrame({'listing_id': listing_ids, 'inquiry_date': dates, 'daily_inquiries': counts})
+    return frame, closed
+
+def verify(listings: int, seed: int = 42) -> int:
+    """Compare detect_launches with the per-listing function on synthetic histories. Returns mismatches."""
+    from launch_date_analysis_v2 import launch_date_from_inquiries
+
+    frame, closed = synthetic_inquiry_days(listings, seed)
+    launches = detect_launches_from_frame(frame, closed)
+    mismatches = 0
+    for listing_id, rows in frame.groupby('listing_id'):
+        expected = launch_date_from_inquiries(rows.to_dict('records'), closed[listing_id])
+        actual = launch_result(launches, listing_id)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  Listing {listing_id}: expected {expected}, got {actual}")
+    print(f"Verified {listings} listings: {mismatches} mismatches")
+    return mismatches
+
+def compare_methods(inquiry_days: pd.DataFrame, closed_dates: Mapping[int, date] = None) -> pd.DataFrame:
+    """
+    Launch dates from the rules and from change points for the same listings,
+    one row per listing with the difference in days. Prints the runtime of
+    each method (total and per listing) and how often they agree.
+    """
+    timings, launches = {}, {}
+    for method in ('rules', 'changepoint'):
+        start = time.perf_counter()
+        launches[method] = detect_launches_from_frame(inquiry_days, closed_dates, method=method)
+        timings[method] = time.perf_counter() - start
+
+    rules, changepoint = launches['rules'], launches['changepoint']
+    comparison = pd.DataFrame({
+        'rules_date': rules['launch_date'],
+        'rules_strategy': rules['strategy'],
+        'changepoint_date': changepoint['launch_date'],
+        'launch_rate': changepoint['launch_rate'].round(2),
+        'prelaunch_rate': changepoint['prelaunch_rate'].round(2),
+        'rate_segments': changepoint['rate_segments'],
+        'inquiry_days': inquiry_days.groupby('listing_id').size(),
+    })
+    comparison['days_apart'] = (comparison['changepoint_date'] - comparison['rules_date']).dt.days
+    comparison['rules_us_per_listing'] = round(timings['rules'] / len(rules) * 1e6, 2)
+    comparison['changepoint_us_per_listing'] = round(timings['changepoint'] / len(rules) * 1e6, 2)
+
+    apart = comparison['days_apart'].abs()
+    print(f"{len(comparison):,} listings, {len(inquiry_days):,} inquiry days")
+    for method, elapsed in timings.items():
+        print(f"  {method:<12} {elapsed:.2f}s ({elapsed / len(comparison) * 1e6:.1f} us/listing)")
+    print(f"Same launch date: {(apart == 0).mean() * 100:.1f}%, within 7 days: {(apart <= 7).mean() * 100:.1f}%, "
+          f"median |difference| {apart.median():.0f} days")
+    by_strategy = comparison.groupby('rules_strategy').agg(
+        listings=('days_apart', 'size'),
+        same_date=('days_apart', lambda d: round((d == 0).mean() * 100, 1)),
+        median_days_apart=('days_apart', 'median'))
+    print(by_strategy.sort_values('listings', ascending=False).to_string())
+    return comparison
+
+def benchmark(listings: int, seed: int = 42):
+    frame, closed = synthetic_inquiry_days(listings, seed)
+    print(f"{listings:,} listings, {len(frame):,} inquiry days")
+
+    start = time.perf_counter()
+    launches = detect_launches_from_frame(frame, closed)
+    elapsed = time.perf_counter() - start
+    print(f"detect_launches: {elapsed:.2f}s ({listings / elapsed:,.0f} listings/s)")
+
+    start = time.perf_counter()
+    segments = segment_inquiries(frame['listing_id'].to_numpy(), frame['inquiry_date'].to_numpy(),
+                                 frame['daily_inquiries'].to_numpy())
+    print(f"segment_inquiries: {time.perf_counter() - start:.2f}s ({len(segments):,} segments)")
+    print(launches['strategy'].value_counts().to_string())
+    print(f"Relaunched: {int(launches['relaunch'].sum())}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Vectorized launch-date detection')
+    parser.add_argument('--benchmark', type=int, metavar='LISTINGS', help='Time detection on synthetic histories')
+    parser.add_argument('--verify', type=int, metavar='LISTINGS', help='Check against the per-listing function')
+    parser.add_argument('--segments', action='store_true', help='Write the segment table for the CIM listings')
+    parser.add_argument('--compare', type=int, metavar='LISTINGS', help='Change points vs. rules on synthetic histories')
+    parser.add_argument('--compare-db', action='store_true', help='Change points vs. rules on every listing in the DB')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.verify:
+        raise SystemExit(1 if verify(args.verify, args.seed) else 0)
+    if args.compare or args.compare_db:
+        if args.compare_db:
+            from launch_date_analysis_v2 import get_db_connection
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, closed_at FROM listings WHERE closed_at IS NOT NULL")
+            closed = {row['id']: row['closed_at'].date() for row in cursor.fetchall()}
+            cursor.close()
+            days = load_inquiry_days(conn)
+            conn.close()
+        else:
+            days, closed = synthetic_inquiry_days(args.compare, args.seed)
+        compare_methods(days, closed).to_csv(COMPARISON_FILE, index_label='listing_id')
+        print(f"Saved to {COMPARISON_FILE}")
+    elif args.segments:
+        from launch_date_analysis_v2 import get_db_connection, load_cim_results
+        conn = get_db_connection()
+        days = load_inquiry_days(conn, list(load_cim_results()))
+        conn.close()
+        segments = segment_inquiries(days['listing_id'], pd.to_datetime(days['inquiry_date']), days['daily_inquiries'])
+        segments.to_csv(SEGMENTS_FILE, index=False)
+        relaunched = (segments.groupby('listing_id').size() > 1).sum()
+        print(f"{len(segments)} segments for {segments['listing_id'].nunique()} listings "
+              f"({relaunched} relaunched); saved to {SEGMENTS_FILE}")
+    else:
+        benchmark(args.benchmark or 100000, args.seed)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep for the launch-date heuristics.
+The production rules (20 inquiries in 2 days, 10+ then 5+ single days, 30-day
+relaunch gap) are one point in a grid. This evaluates the whole grid in worker
+processes over one copy of the daily inquiry arrays, read once from the
+database, sorted once and placed in shared memory, and reports how the median
+days on market of sold SBA and non-SBA listings, and the gap between them,
+move across the grid.
+
+Usage:
+    python3 launch_sweep.py                              # CIM listings, default grid
+    python3 launch_sweep.py --surge 15,20,25 --gap 30,60 --workers 8
+    python3 launch_sweep.py --synthetic 50000            # No database: synthetic histories
+"""
+
+import os
+import json
+import time
+import argparse
+import itertools
+from datetime import date
+from typing import Dict, List, Sequence, Tuple
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from launch_engine import (
+    GAP_THRESHOLD_DAYS, SURGE_INQUIRIES, SURGE_WINDOW, DAY_THRESHOLDS,
+    NO_CLOSE, _daily_arrays, _days, detect_launches, load_inquiry_days,
+)
+
+GRID = {
+    'surge_inquiries': [10, 15, 20, 25, 30],
+    'surge_window': [1, 2, 3, 5],
+    'day_thresholds': [(10, 5), (8, 4), (12, 6), (15, 8)],
+    'gap_threshold_days': [14, 30, 60, 90],
+}
+BASELINE = {
+    'surge_inquiries': SURGE_INQUIRIES,
+    'surge_window': SURGE_WINDOW,
+    'day_thresholds': tuple(threshold for threshold, _ in DAY_THRESHOLDS),
+    'gap_threshold_days': GAP_THRESHOLD_DAYS,
+}
+RESULTS_FILE = 'launch_sweep_results.csv'
+SUMMARY_FILE = 'launch_sweep_summary.json'
+
+# Arrays in shared memory, attached once per worker process
+_shared = {'blocks': [], 'arrays': {}, 'closed_dates': None, 'today': None}
+
+def share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], Dict]:
+    """Copy arrays into shared memory blocks. Returns the blocks and a picklable spec to attach them."""
+    blocks, spec = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+def attach_arrays(spec: Dict, today: int):
+    """Worker initializer: map the shared arrays without copying them."""
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared['blocks'].append(block)
+        _shared['arrays'][name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    arrays = _shared['arrays']
+    has_close = arrays['closed_day'] != NO_CLOSE
+    _shared['closed_dates'] = dict(zip(arrays['ids'][has_close].tolist(),
+                                       arrays['closed_day'][has_close].astype('datetime64[D]').tolist()))
+    _shared['today'] = today
+
+def evaluate(config: Dict) -> Dict:
+    """Launch dates and days-on-market statistics for one grid point."""
+    arrays = _shared['arrays']
+    launches = detect_launches(arrays['listing_id'], arrays['day'].astype('datetime64[D]'), arrays['count'],
+                               _shared['closed_dates'], gap_threshold_days=config['gap_threshold_days'],
+                               surge_inquiries=config['surge_inquiries'], surge_window=config['surge_window'],
+                               day_thresholds=config['day_thresholds'])
+
+    # Listing arrays cover every listing; launches only those with inquiries
+    ids, closed_day, closed_type, sba = arrays['ids'], arrays['closed_day'], arrays['closed_type'], arrays['sba']
+    launch_day = np.full(len(ids), NO_CLOSE, dtype=np.int64)
+    launch_day[np.searchsorted(ids, launches.index.to_numpy())] = _days(launches['launch_date'])
+    has_launch = launch_day != NO_CLOSE
+
+    dom = np.full(len(ids), np.nan)
+    closed = has_launch & np.isin(closed_type, (1, 2)) & (closed_day != NO_CLOSE)
+    dom[closed] = closed_day[closed] - launch_day[closed]
+    active = has_launch & (closed_type == 0)
+    dom[active] = _shared['today'] - launch_day[active]
+    dom[dom < 0] = np.nan
+
+    sold = (closed_type == 1) & ~np.isnan(dom)
+    sba_dom, non_sba_dom = dom[sold & (sba == 1)], dom[sold & (sba == 0)]
+    sba_median = float(np.median(sba_dom)) if len(sba_dom) else None
+    non_sba_median = float(np.median(non_sba_dom)) if len(non_sba_dom) else None
+    return {
+        **config,
+        'day_thresholds': '/'.join(map(str, config['day_thresholds'])),
+        'sba_median_dom': sba_median,
+        'non_sba_median_dom': non_sba_median,
+        'sba_minus_non_sba': sba_median - non_sba_median if sba_median is not None and non_sba_median is not None else None,
+        'sba_sold': len(sba_dom),
+        'non_sba_sold': len(non_sba_dom),
+        'surge_share': float(launches['strategy'].str.startswith('surge_').mean()) if len(launches) else 0.0,
+        'relaunched': int(launches['relaunch'].sum()),
+    }
+
+def grid_configs(grid: Dict[str, Sequence]) -> List[Dict]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def run_sweep(inquiry_days: pd.DataFrame, listings: pd.DataFrame, grid: Dict[str, Sequence] = None,
+              workers: int = None) -> pd.DataFrame:
+    """
+    Evaluate every grid point. inquiry_days has listing_id, inquiry_date,
+    daily_inquiries; listings has listing_id, closed_type, closed_at and
+    sba ('yes' / 'no' / other).
+    """
+    grid = grid or GRID
+    configs = grid_configs(grid)
+    lid, day, cnt = _daily_arrays(inquiry_days['listing_id'].to_numpy(),
+                                  pd.to_datetime(inquiry_days['inquiry_date']).to_numpy(),
+                                  inquiry_days['daily_inquiries'].to_numpy())
+
+    listings = listings.sort_values('listing_id')
+    closed_at = pd.to_datetime(listings['closed_at'])
+    arrays = {
+        'listing_id': lid, 'day': day, 'count': cnt,
+        'ids': listings['listing_id'].to_numpy(dtype=np.int64),
+        'closed_day': np.where(closed_at.notna(), _days(closed_at.fillna(pd.Timestamp(0)).to_numpy()), NO_CLOSE),
+        'closed_type': listings['closed_type'].fillna(-1).to_numpy(dtype=np.int8),
+        'sba': listings['sba'].map({'yes': 1, 'no': 0}).fillna(-1).to_numpy(dtype=np.int8),
+    }
+    today = int(np.datetime64(date.today(), 'D').astype(np.int64))
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Sweeping {len(configs)} configurations over {len(lid):,} inquiry days "
+          f"for {len(listings):,} listings with {workers} workers...")
+    blocks, spec = share_arrays(arrays)
+    start = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_arrays, initargs=(spec, today)) as executor:
+            results = list(executor.map(evaluate, configs, chunksize=max(1, len(configs) // (workers * 4))))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    elapsed = time.time() - start
+    print(f"Done in {elapsed:.1f}s ({len(configs) / elapsed:.1f} configurations/s)")
+    return pd.DataFrame(results)
+
+def report(results: pd.DataFrame) -> Dict:
+    """Print how the SBA vs. non-SBA gap moves across the grid and return a summary."""
+    baseline_key = {**BASELINE, 'day_thresholds': '/'.join(map(str, BASELINE['day_thresholds']))}
+    is_baseline = np.logical_and.reduce([results[k] == v for k, v in baseline_key.items()])
+    gap = results['sba_minus_non_sba'].dropna()
+
+    print("\n" + "=" * 70)
+    print("LAUNCH HEURISTIC SWEEP: MEDIAN DAYS ON MARKET, SOLD LISTINGS")
+    print("=" * 70)
+    if is_baseline.any():
+        base = results[is_baseline].iloc[0]
+        print(f"Production rules: SBA {base['sba_median_dom']} vs non-SBA {base['non_sba_median_dom']} days "
+              f"(difference {base['sba_minus_non_sba']}, n={base['sba_sold']}/{base['non_sba_sold']})")
+    if len(gap):
+        print(f"SBA minus non-SBA across {len(gap)} configurations: min {gap.min():.1f}, "
+              f"median {gap.median():.1f}, max {gap.max():.1f} days; same sign in "
+              f"{max((gap > 0).mean(), (gap < 0).mean()) * 100:.0f}% of the grid")
+
+    summary = {'configurations': len(results), 'by_parameter': {}}
+    for parameter in GRID:
+        by_value = results.groupby(parameter)[['sba_median_dom', 'non_sba_median_dom', 'sba_minus_non_sba']].median()
+        summary['by_parameter'][parameter] = {str(k): v for k, v in by_value.round(1).to_dict('index').items()}
+        print(f"\nBy {parameter} (medians over the rest of the grid):")
+        print(by_value.round(1).to_string())
+
+    ranked = results.dropna(subset=['sba_minus_non_sba']).sort_values('sba_minus_non_sba')
+    columns = list(GRID) + ['sba_median_dom', 'non_sba_median_dom', 'sba_minus_non_sba']
+    print("\nSmallest SBA minus non-SBA:")
+    print(ranked[columns].head(5).to_string(index=False))
+    print("\nLargest SBA minus non-SBA:")
+    print(ranked[columns].tail(5).to_string(index=False))
+
+    if len(gap):
+        summary.update({'gap_min': float(gap.min()), 'gap_median': float(gap.median()), 'gap_max': float(gap.max())})
+    return summary
+
+def load_cim_listings() -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Inquiry days and listing facts for the listings with CIM results."""
+    from launch_date_analysis_v2 import get_db_connection, load_cim_results
+
+    cim_map = load_cim_results()
+    listing_ids = list(cim_map)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id AS listing_id, closed_type, closed_at FROM listings "
+                   f"WHERE id IN ({','.join(map(str, listing_ids)) or 'NULL'})")
+    listings = pd.DataFrame(cursor.fetchall(), columns=['listing_id', 'closed_type', 'closed_at'])
+    cursor.close()
+    inquiry_days = load_inquiry_days(conn, listing_ids)
+    conn.close()
+
+    listings['sba'] = listings['listing_id'].map(lambda lid: cim_map[lid].get('sba_eligible', 'unknown'))
+    return inquiry_days, listings
+
+def synthetic_listings(count: int, seed: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Synthetic inquiry days plus random status and SBA labels, for running without a database."""
+    from launch_engine import synthetic_inquiry_days
+
+    inquiry_days, closed = synthetic_inquiry_days(count, seed)
+    rng = np.random.default_rng(seed)
+    ids = np.array(sorted(closed))
+    closed_at = pd.to_datetime([closed[i] for i in ids])
+    closed_type = np.where(closed_at.isna(), 0, rng.choice([1, 2], len(ids), p=[0.7, 0.3]))
+    listings = pd.DataFrame({'listing_id': ids, 'closed_type': closed_type, 'closed_at': closed_at,
+                             'sba': rng.choice(['yes', 'no', 'unknown'], len(ids), p=[0.4, 0.5, 0.1])})
+    return inquiry_days, listings
+
+def parse_list(text: str, cast=int) -> List:
+    return [cast(value) for value in text.split(',') if value]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep launch-date heuristics')
+    parser.add_argument('--surge', help='Surge inquiry thresholds, e.g. 15,20,25')
+    parser.add_argument('--window', help='Surge windows in inquiry days, e.g. 1,2,3')
+    parser.add_argument('--day-thresholds', help='Single-day fallbacks, e.g. 10/5,8/4')
+    parser.add_argument('--gap', help='Relaunch gaps in days, e.g. 30,60')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--synthetic', type=int, metavar='LISTINGS', help='Use synthetic histories instead of the database')
+    args = parser.parse_args()
+
+    grid = dict(GRID)
+    if args.surge:
+        grid['surge_inquiries'] = parse_list(args.surge)
+    if args.window:
+        grid['surge_window'] = parse_list(args.window)
+    if args.day_thresholds:
+        grid['day_thresholds'] = [tuple(int(t) for t in item.split('/')) for item in args.day_thresholds.split(',')]
+    if args.gap:
+        grid['gap_threshold_days'] = parse_list(args.gap)
+
+    inquiry_days, listings = synthetic_listings(args.synthetic) if args.synthetic else load_cim_listings()
+    results = run_sweep(inquiry_days, listings, grid, args.workers)
+    summary = report(results)
+
+    results.to_csv(RESULTS_FILE, index=False)
+    with open(SUMMARY_FILE, 'w') as f:
+        json.dump(summary, f, indent=2, default=str)
+    print(f"\nResults saved to {RESULTS_FILE} and {SUMMARY_FILE}")
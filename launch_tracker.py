@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Online launch-date detection: keeps a small per-listing state in
+cache/launch_state.db and folds in only the inquiries that arrived since the
+last run, so a daily refresh costs in proportion to new inquiries instead of
+re-reading every listing's full history.
+
+Per listing the state holds the whole-history tracker and one tracker per
+launch period (segment). A tracker is the running form of the launch rules in
+launch_engine: first day of the segment, total inquiries, the first 20-in-2-days
+surge, the first 10+ and 5+ days, and the last day seen (the open half of the
+2-day window). A new inquiry day either extends the current segment or, after a
+gap of more than 30 days, starts a new one. The launch is then picked exactly as
+launch_engine.detect_launches picks it (last segment ended by the close date,
+latest segment for active listings, else the whole history), and
+days_on_market follows launch_date_analysis_v2.
+
+The watermark is the last complete day consumed; inquiries from today are left
+for tomorrow's run so every day's count is final when it is folded in.
+
+Usage:
+    python3 launch_tracker.py refresh          # Fold in inquiries since the watermark
+    python3 launch_tracker.py status
+    python3 launch_tracker.py show 12345
+    python3 launch_tracker.py verify 5000      # Incremental vs. launch_engine on synthetic data
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from launch_engine import GAP_THRESHOLD_DAYS, SURGE_INQUIRIES, DAY_THRESHOLDS
+
+STATE_DB = Path('cache/launch_state.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id INTEGER PRIMARY KEY,
+    num_periods INTEGER NOT NULL,
+    last_day TEXT NOT NULL,
+    whole TEXT NOT NULL,
+    closed_type INTEGER,
+    close_date TEXT,
+    launch_date TEXT,
+    strategy TEXT,
+    details TEXT,
+    days_on_market INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    listing_id INTEGER NOT NULL,
+    segment_id INTEGER NOT NULL,
+    start_day TEXT NOT NULL,
+    end_day TEXT NOT NULL,
+    tracker TEXT NOT NULL,
+    PRIMARY KEY (listing_id, segment_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def connect_state(db_path: Path = STATE_DB) -> sqlite3.Connection:
+    """Open the launch state database, creating it if needed."""
+    if str(db_path) != ':memory:':
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def get_watermark(conn: sqlite3.Connection) -> Optional[date]:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+    return date.fromisoformat(row['value']) if row else None
+
+def set_watermark(conn: sqlite3.Connection, day: date):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (day.isoformat(),))
+
+# --- Trackers ---------------------------------------------------------------
+
+def new_tracker() -> Dict:
+    return {'start': None, 'total': 0, 'last': None, 'surge': None, 'days': {}}
+
+def track(tracker: Dict, day: str, count: int):
+    """Fold one inquiry day (ISO date, later than any seen) into a tracker."""
+    last = tracker['last']
+    surge = tracker['surge']
+    if surge and last and surge[0] == last[0] and surge[2] == 1:
+        # The surge started on the previous day, which now has its second day
+        tracker['surge'] = [surge[0], surge[1] + count, 2]
+    elif surge is None:
+        if last and last[1] + count >= SURGE_INQUIRIES:
+            tracker['surge'] = [last[0], last[1] + count, 2]
+        elif count >= SURGE_INQUIRIES:
+            tracker['surge'] = [day, count, 1]
+
+    for threshold, name in DAY_THRESHOLDS:
+        if name not in tracker['days'] and count >= threshold:
+            tracker['days'][name] = [day, count]
+    if tracker['start'] is None:
+        tracker['start'] = day
+    tracker['total'] += count
+    tracker['last'] = [day, count]
+
+def tracker_launch(tracker: Dict) -> Tuple[str, str, Dict]:
+    """(launch_date, strategy, details without 'relaunch') for a tracker."""
+    if tracker['surge']:
+        day, inquiries, days = tracker['surge']
+        return day, 'surge_20_in_2days', {'surge_start': day, 'surge_inquiries': inquiries, 'days_in_surge': days}
+    for _, name in DAY_THRESHOLDS:
+        if name in tracker['days']:
+            day, count = tracker['days'][name]
+            return day, name, {'launch_date': day, 'first_day_inquiries': count}
+    return tracker['start'], 'first_inquiry', {'launch_date': tracker['start'], 'total_inquiries': tracker['total']}
+
+# --- State updates ----------------------------------------------------------
+
+def apply_inquiry_days(conn: sqlite3.Connection, rows: Iterable[Tuple[int, date, int]]) -> List[int]:
+    """
+    Fold new (listing_id, day, count) rows into the state. Rows are processed in
+    (listing, day) order; days at or before a listing's last seen day were
+    already counted and are skipped. Returns the listing ids that changed.
+    """
+    by_listing = {}
+    for listing_id, day, count in rows:
+        by_listing.setdefault(int(listing_id), []).append((str(day)[:10], int(count)))
+    if not by_listing:
+        return []
+
+    now = time.time()
+    skipped = 0
+    conn.execute("BEGIN")
+    try:
+        for listing_id, days in by_listing.items():
+            days.sort()
+            state = conn.execute("SELECT num_periods, last_day, whole FROM listings WHERE listing_id = ?",
+                                 (listing_id,)).fetchone()
+            if state:
+                num_periods, last_day, whole = state['num_periods'], state['last_day'], json.loads(state['whole'])
+                segment = conn.execute("SELECT start_day, tracker FROM segments WHERE listing_id = ? AND segment_id = ?",
+                                       (listing_id, num_periods - 1)).fetchone()
+                current, start_day = json.loads(segment['tracker']), segment['start_day']
+            else:
+                num_periods, last_day, whole, current, start_day = 0, None, new_tracker(), None, None
+
+            for day, count in days:
+                if last_day and day <= last_day:
+                    skipped += 1
+                    continue
+                if last_day is None or (date.fromisoformat(day) - date.fromisoformat(last_day)).days > GAP_THRESHOLD_DAYS:
+                    if current is not None:
+                        _save_segment(conn, listing_id, num_periods - 1, start_day, last_day, current)
+                    num_periods += 1
+                    current, start_day = new_tracker(), day
+                track(current, day, count)
+                track(whole, day, count)
+                last_day = day
+
+            _save_segment(conn, listing_id, num_periods - 1, start_day, last_day, current)
+            conn.execute(
+                "INSERT INTO listings (listing_id, num_periods, last_day, whole, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(listing_id) DO UPDATE SET num_periods = excluded.num_periods, "
+                "last_day = excluded.last_day, whole = excluded.whole, updated_at = excluded.updated_at",
+                (listing_id, num_periods, last_day, json.dumps(whole), now)
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if skipped:
+        print(f"  Skipped {skipped} inquiry days already in the state")
+    return list(by_listing)
+
+def _save_segment(conn, listing_id: int, segment_id: int, start_day: str, end_day: str, tracker: Dict):
+    conn.execute("INSERT OR REPLACE INTO segments (listing_id, segment_id, start_day, end_day, tracker) "
+                 "VALUES (?, ?, ?, ?, ?)", (listing_id, segment_id, start_day, end_day, json.dumps(tracker)))
+
+def select_launch(conn: sqlite3.Connection, listing_id: int, close_date: Optional[str]) -> Optional[Tuple[str, str, Dict, int]]:
+    """(launch_date, strategy, details, num_periods) from the stored state, chosen as launch_engine.select_periods does."""
+    state = conn.execute("SELECT num_periods, whole FROM listings WHERE listing_id = ?", (listing_id,)).fetchone()
+    if state is None:
+        return None
+    num_periods = state['num_periods']
+    if close_date:
+        row = conn.execute("SELECT tracker FROM segments WHERE listing_id = ? AND end_day <= ? "
+                           "ORDER BY segment_id DESC LIMIT 1", (listing_id, close_date)).fetchone()
+        tracker = json.loads(row['tracker']) if row else json.loads(state['whole'])
+    else:
+        row = conn.execute("SELECT tracker FROM segments WHERE listing_id = ? AND segment_id = ?",
+                           (listing_id, num_periods - 1)).fetchone()
+        tracker = json.loads(row['tracker'])
+    launch_date, strategy, details = tracker_launch(tracker)
+    details['relaunch'] = num_periods > 1
+    return launch_date, strategy, details, num_periods
+
+def days_on_market(launch_date: str, closed_type: Optional[int], close_date: Optional[str], today: date) -> Optional[int]:
+    """Launch to close for sold/lost listings, launch to today for active ones (as in launch_date_analysis_v2)."""
+    launch = date.fromisoformat(launch_date)
+    if closed_type in (1, 2) and close_date:
+        days = (date.fromisoformat(close_date) - launch).days
+    elif closed_type == 0:
+        days = (today - launch).days
+    else:
+        return None
+    return days if days >= 0 else None
+
+def update_launches(conn: sqlite3.Connection, listing_ids: Iterable[int], closings: Dict[int, Tuple] = None,
+                    today: date = None):
+    """
+    Re-pick the launch for the given listings. closings maps listing_id to
+    (closed_type, close_date) for listings whose close status is (re)known;
+    others keep what is stored.
+    """
+    today = today or date.today()
+    closings = closings or {}
+    conn.execute("BEGIN")
+    for listing_id in listing_ids:
+        stored = conn.execute("SELECT closed_type, close_date FROM listings WHERE listing_id = ?",
+                              (listing_id,)).fetchone()
+        if stored is None:
+            continue
+        closed_type, close_date = closings.get(listing_id, (stored['closed_type'], stored['close_date']))
+        launch_date, strategy, details, _ = select_launch(conn, listing_id, close_date)
+        conn.execute("UPDATE listings SET closed_type = ?, close_date = ?, launch_date = ?, strategy = ?, "
+                     "details = ?, days_on_market = ?, updated_at = ? WHERE listing_id = ?",
+                     (closed_type, close_date, launch_date, strategy, json.dumps(details),
+                      days_on_market(launch_date, closed_type, close_date, today), time.time(), listing_id))
+    conn.execute("COMMIT")
+
+def age_active_listings(conn: sqlite3.Connection, today: date = None):
+    """Advance days_on_market of active listings to today in one statement."""
+    today = today or date.today()
+    conn.execute("UPDATE listings SET days_on_market = CAST(julianday(?) - julianday(launch_date) AS INTEGER) "
+                 "WHERE closed_type = 0 AND launch_date IS NOT NULL AND launch_date <= ?",
+                 (today.isoformat(), today.isoformat()))
+
+# --- Refresh from the database ----------------------------------------------
+
+def refresh(conn: sqlite3.Connection, db, today: date = None) -> Dict:
+    """
+    Fold in the inquiries of complete days after the watermark and the close
+    status of listings that changed, then move the watermark to yesterday.
+    """
+    today = today or date.today()
+    watermark = get_watermark(conn)
+    start = time.time()
+
+    cursor = db.cursor()
+    query = """
+    SELECT
+        listing_id,
+        DATE(created_at) as inquiry_date,
+        COUNT(*) as daily_inquiries
+    FROM inquiries
+    WHERE created_at < %s
+    """
+    params = [today]
+    if watermark:
+        query += " AND created_at >= %s"
+        params.append(watermark + timedelta(days=1))
+    query += " GROUP BY listing_id, DATE(created_at)"
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    touched = apply_inquiry_days(conn, ((r['listing_id'], r['inquiry_date'], r['daily_inquiries']) for r in rows))
+
+    # Close status for touched listings and for listings closed since the watermark
+    closing_query = "SELECT id, closed_type, closed_at FROM listings WHERE deleted_at IS NULL"
+    conditions, params = [], []
+    if touched:
+        conditions.append(f"id IN ({','.join(map(str, touched))})")
+    if watermark:
+        conditions.append("closed_at >= %s")
+        params.append(watermark)
+    closings = {}
+    if conditions:
+        closing_query += " AND (" + " OR ".join(conditions) + ")"
+        cursor.execute(closing_query, params)
+        closings = {r['id']: (r['closed_type'], r['closed_at'].date().isoformat() if r['closed_at'] else None)
+                    for r in cursor.fetchall()}
+    cursor.close()
+
+    tracked = {r[0] for r in conn.execute("SELECT listing_id FROM listings")}
+    changed = set(touched) | (set(closings) & tracked)
+    update_launches(conn, sorted(changed), closings, today)
+    age_active_listings(conn, today)
+    set_watermark(conn, today - timedelta(days=1))
+
+    stats = {'inquiry_days': len(rows), 'listings_updated': len(changed), 'seconds': time.time() - start,
+             'watermark': (today - timedelta(days=1)).isoformat()}
+    print(f"Folded in {stats['inquiry_days']} inquiry days since {watermark or 'the beginning'}; "
+          f"{stats['listings_updated']} listings updated in {stats['seconds']:.2f}s (watermark {stats['watermark']})")
+    return stats
+
+def print_status(conn: sqlite3.Connection):
+    row = conn.execute("SELECT COUNT(*) AS listings, SUM(num_periods > 1) AS relaunched, "
+                       "MAX(updated_at) AS updated FROM listings").fetchone()
+    print(f"Watermark: {get_watermark(conn) or 'none'}")
+    print(f"Listings tracked: {row['listings']}, relaunched: {row['relaunched'] or 0}")
+    for r in conn.execute("SELECT strategy, COUNT(*) AS n, AVG(days_on_market) AS dom FROM listings "
+                          "GROUP BY strategy ORDER BY n DESC"):
+        dom = f", mean days on market {r['dom']:.0f}" if r['dom'] is not None else ''
+        print(f"  {r['strategy']}: {r['n']}{dom}")
+
+def verify(listings: int, chunks: int = 30, seed: int = 42) -> int:
+    """
+    Feed synthetic histories in date-ordered chunks and compare the final state
+    with launch_engine.detect_launches over the full history. Returns mismatches.
+    """
+    import numpy as np
+    from launch_engine import synthetic_inquiry_days, detect_launches_from_frame, launch_result
+
+    frame, closed = synthetic_inquiry_days(listings, seed)
+    frame = frame.sort_values(['inquiry_date', 'listing_id'])
+    conn = connect_state(':memory:')
+
+    cuts = np.array_split(np.arange(len(frame)), chunks)
+    timings = []
+    for part in cuts:
+        chunk = frame.iloc[part]
+        start = time.perf_counter()
+        touched = apply_inquiry_days(conn, chunk.itertuples(index=False, name=None))
+        update_launches(conn, touched, {lid: (1, closed[lid].isoformat() if closed[lid] else None)
+                                        for lid in touched})
+        timings.append((len(chunk), time.perf_counter() - start))
+
+    launches = detect_launches_from_frame(frame, closed)
+    mismatches = 0
+    for listing_id in launches.index:
+        launch_date, strategy, details, num_periods = launch_result(launches, listing_id)
+        row = conn.execute("SELECT launch_date, strategy, details, num_periods FROM listings WHERE listing_id = ?",
+                           (int(listing_id),)).fetchone()
+        expected = (launch_date.isoformat(), strategy, json.dumps(details, default=str, sort_keys=True), num_periods)
+        actual = (row['launch_date'], row['strategy'], json.dumps(json.loads(row['details']), sort_keys=True),
+                  row['num_periods'])
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  Listing {listing_id}: expected {expected}, got {actual}")
+
+    rows_per_second = sum(n for n, _ in timings) / sum(t for _, t in timings)
+    print(f"Verified {len(launches)} listings fed in {chunks} chunks: {mismatches} mismatches")
+    print(f"Incremental cost: {rows_per_second:,.0f} inquiry days/s "
+          f"(last chunk {timings[-1][0]:,} days in {timings[-1][1]:.2f}s)")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incremental launch-date detection')
+    parser.add_argument('command', choices=['refresh', 'status', 'show', 'verify'])
+    parser.add_argument('value', nargs='?', type=int, help='Listing ID for show, listing count for verify')
+    parser.add_argument('--db', default=str(STATE_DB))
+    args = parser.parse_args()
+
+    if args.command == 'verify':
+        sys.exit(1 if verify(args.value or 5000) else 0)
+
+    conn = connect_state(Path(args.db))
+    if args.command == 'refresh':
+        from launch_date_analysis_v2 import get_db_connection
+        db = get_db_connection()
+        refresh(conn, db)
+        db.close()
+    elif args.command == 'status':
+        print_status(conn)
+    else:
+        if args.value is None:
+            parser.error('show needs a listing ID')
+        row = conn.execute("SELECT * FROM listings WHERE listing_id = ?", (args.value,)).fetchone()
+        if row is None:
+            print(f"Listing {args.value} is not tracked")
+            sys.exit(1)
+        print(f"Listing {args.value}: launched {row['launch_date']} ({row['strategy']}), "
+              f"{row['num_periods']} launch periods, days on market {row['days_on_market']}")
+        print(f"  Details: {row['details']}")
+        for seg in conn.execute("SELECT segment_id, start_day, end_day FROM segments WHERE listing_id = ? "
+                                "ORDER BY segment_id", (args.value,)):
+            print(f"  Period {seg['segment_id']}: {seg['start_day']} to {seg['end_day']}")
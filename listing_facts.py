@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+One typed, columnar fact table per listing, in place of re-merging
+launch_date_analysis_v2.csv, sba_actual_usage_analysis.csv,
+sba_title_analysis.csv and friends in every analysis.
+
+The table lives in facts/ as one .npy file per column plus schema.json:
+numbers, flags and dates are stored in native dtypes (dates as days and
+timestamps as seconds since the epoch, statuses as small integer codes, flags
+that can be unknown as -1/0/1), so load_facts() memory-maps the columns it is
+asked for and builds the DataFrame without parsing anything. Statuses come
+back as plain strings and unknown flags as <NA> in a nullable boolean column.
+
+build_facts() is incremental. Each row carries a fingerprint of its inputs:
+the listing row, its inquiry and LOI aggregates and its CIM SBA status. A
+rebuild reads those (one grouped query each) and recomputes only listings
+whose fingerprint changed: inquiry days, launch date (launch_engine), LOIs,
+title flags and multiples. Day counts that depend on today are refreshed for
+every row on each build.
+
+Usage:
+    python3 listing_facts.py build              # CIM listings, changed rows only
+    python3 listing_facts.py build --full       # Recompute every row
+    python3 listing_facts.py import-csv         # Seed from the existing CSVs (no DB needed)
+    python3 listing_facts.py status
+    python3 listing_facts.py show 12345
+
+In an analysis:
+    from listing_facts import load_facts
+    df = load_facts()                                   # Every column
+    df = load_facts(['id', 'sba_status', 'days_on_market'])
+"""
+
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Sequence
+import numpy as np
+import pandas as pd
+
+FACTS_DIR = Path('facts')
+FACTS_VERSION = 2  # Bump when a derived column changes meaning, to force a full rebuild
+
+STATUS = ['sold', 'lost', 'active', 'unknown']
+SBA_STATUS = ['yes', 'no', 'unknown', 'partial', 'undetermined']
+
+# Column name -> storage kind: int, float (nullable numbers), bool, flag (nullable bool), date,
+# datetime, str, or a category list
+COLUMNS = {
+    'id': 'int',
+    'name': 'str',
+    'status': STATUS,
+    'closed_type': 'float',
+    'closed_at': 'datetime',
+    'created_at': 'datetime',
+    'closed_commission': 'float',
+    # SBA classification
+    'sba_status': SBA_STATUS,
+    'corrected_sba_status': SBA_STATUS,
+    'sba_in_title': 'bool',
+    'has_strong_sba': 'bool',
+    # Inquiries and launch
+    'total_inquiries': 'int',
+    'inquiry_days': 'int',
+    'first_inquiry': 'datetime',
+    'last_inquiry': 'datetime',
+    'launch_date': 'date',
+    'launch_strategy': 'str',
+    'num_launch_periods': 'float',
+    # LOIs (signed LOIs for timing, all LOIs for SBA usage, as in the original scripts)
+    'first_loi_date': 'date',
+    'last_loi_date': 'date',
+    'num_lois': 'int',
+    'total_lois': 'int',
+    'sba_lois': 'int',
+    'has_sba_loi': 'flag',  # <NA> where LOI usage is unknown
+    'winning_loi_sba': 'flag',
+    'pct_sba_lois': 'float',
+    # Time on market (refreshed for every row on each build)
+    'days_on_market': 'float',
+    'days_under_loi': 'float',
+    'days_to_loi': 'float',
+    # Multiples
+    'asking_price': 'float',
+    'sde': 'float',
+    'revenue': 'float',
+    'multiple': 'float',
+    'fingerprint': 'uint',
+}
+
+def _encode(values: pd.Series, kind) -> np.ndarray:
+    if isinstance(kind, list):
+        codes = pd.Categorical(values.where(values.isin(kind), 'unknown'), categories=kind).codes
+        return codes.astype(np.int8)
+    if kind == 'int':
+        return pd.to_numeric(values).fillna(0).to_numpy(dtype=np.int64)
+    if kind == 'uint':
+        return values.fillna(0).to_numpy(dtype=np.uint64)
+    if kind == 'float':
+        return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+    if kind == 'bool':
+        return values.fillna(False).astype(bool).to_numpy()
+    if kind == 'flag':
+        flags = pd.array(values.astype(object).where(values.notna(), None), dtype='boolean')
+        return np.where(flags.isna(), -1, flags.fillna(False).astype(np.int8)).astype(np.int8)
+    if kind == 'date':
+        return pd.to_datetime(values, errors='coerce').to_numpy(dtype='datetime64[D]').view(np.int64)
+    if kind == 'datetime':
+        return pd.to_datetime(values, errors='coerce').to_numpy(dtype='datetime64[s]').view(np.int64)
+    return values.fillna('').astype(str).to_numpy(dtype=str)
+
+def _decode(array: np.ndarray, kind):
+    if isinstance(kind, list):
+        return np.array(kind, dtype=object)[array]
+    if kind == 'flag':
+        array = np.asarray(array)
+        return pd.arrays.BooleanArray(array == 1, array < 0)
+    if kind == 'date':
+        return array.view('datetime64[D]')
+    if kind == 'datetime':
+        return array.view('datetime64[s]')
+    return array
+
+def save_facts(df: pd.DataFrame, path: Path = FACTS_DIR):
+    """Write every column, then swap the new directory in so readers never see a half-written table."""
+    path = Path(path)
+    staging = path.with_name(path.name + '.new')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    df = df.sort_values('id').reset_index(drop=True)
+    for name, kind in COLUMNS.items():
+        np.save(staging / f'{name}.npy', _encode(df[name], kind))
+    schema = {'version': FACTS_VERSION, 'rows': len(df), 'built_at': datetime.now().isoformat(),
+              'columns': COLUMNS}
+    with open(staging / 'schema.json', 'w') as f:
+        json.dump(schema, f, indent=2)
+
+    previous = path.with_name(path.name + '.old')
+    shutil.rmtree(previous, ignore_errors=True)
+    if path.exists():
+        path.rename(previous)
+    staging.rename(path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+def load_schema(path: Path = FACTS_DIR) -> Dict:
+    with open(Path(path) / 'schema.json') as f:
+        return json.load(f)
+
+def load_facts(columns: Sequence[str] = None, path: Path = FACTS_DIR) -> pd.DataFrame:
+    """The fact table, or just the named columns, memory-mapped from facts/."""
+    path = Path(path)
+    if not (path / 'schema.json').exists():
+        raise FileNotFoundError(f"No fact table in {path}/; run: python3 listing_facts.py build")
+    kinds = load_schema(path)['columns']
+    columns = list(columns or kinds)
+    return pd.DataFrame({name: _decode(np.load(path / f'{name}.npy', mmap_mode='r'), kinds[name])
+                         for name in columns})
+
+# --- Derived columns --------------------------------------------------------
+
+def _nonnegative(days: pd.Series) -> pd.Series:
+    return days.where(days >= 0)
+
+def add_time_on_market(df: pd.DataFrame, today: date = None) -> pd.DataFrame:
+    """days_on_market, days_under_loi and days_to_loi as launch_date_analysis_v2 computes them."""
+    today = pd.Timestamp(today or date.today())
+    launch = pd.to_datetime(df['launch_date'])
+    closed_at = pd.to_datetime(df['closed_at']).dt.normalize()
+    closed = df['status'].isin(['sold', 'lost']) & closed_at.notna() & launch.notna()
+    active = (df['status'] == 'active') & launch.notna()
+
+    df['days_on_market'] = np.nan
+    df.loc[closed, 'days_on_market'] = _nonnegative((closed_at - launch).dt.days)[closed]
+    df.loc[active, 'days_on_market'] = _nonnegative((today - launch).dt.days)[active]
+    df['days_under_loi'] = _nonnegative((closed_at - pd.to_datetime(df['last_loi_date']).dt.normalize()).dt.days).where(closed)
+    df['days_to_loi'] = _nonnegative((pd.to_datetime(df['first_loi_date']).dt.normalize() - launch).dt.days).where(closed)
+    return df
+
+def add_title_flags(df: pd.DataFrame) -> pd.DataFrame:
+    from sba_title_analysis import SBA_TITLE_PATTERNS
+    from correct_sba_classifications import has_strong_sba_indicator, corrected_sba_status
+
+    df['sba_in_title'] = df['name'].str.contains('|'.join(SBA_TITLE_PATTERNS), case=False, na=False, regex=True)
+    df['has_strong_sba'] = df['name'].apply(has_strong_sba_indicator)
+    df['corrected_sba_status'] = [corrected_sba_status(name, status)
+                                  for name, status in zip(df['name'], df['sba_status'])]
+    return df
+
+def add_multiples(df: pd.DataFrame) -> pd.DataFrame:
+    """Asking price at close (else the capsule's expected value) over SDE at close, as analyze_median_multiples does."""
+    for column in ['asking_at_close', 'capsule_expected_value', 'sde_at_close', 'revenue_at_close']:
+        df[column] = pd.to_numeric(df[column], errors='coerce')  # DECIMAL / NULL from MySQL
+    asking = df['asking_at_close'].where(df['asking_at_close'] > 0, df['capsule_expected_value'])
+    df['asking_price'] = asking.where(asking > 0)
+    df['sde'] = df['sde_at_close']
+    df['revenue'] = df['revenue_at_close']
+    df['multiple'] = (df['asking_price'] / df['sde']).where((df['sde'] > 0) & df['asking_price'].notna())
+    return df
+
+# --- Building from the database ---------------------------------------------
+
+def fingerprint(*parts) -> int:
+    digest = hashlib.blake2b(repr((FACTS_VERSION,) + parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def _in_list(listing_ids: Iterable[int]) -> str:
+    return ','.join(map(str, listing_ids)) or 'NULL'
+
+def read_sources(conn, listing_ids: List[int]) -> pd.DataFrame:
+    """Listing rows plus inquiry and LOI aggregates: everything a fingerprint covers."""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT id, name, closed_type, closed_at, created_at, closed_commission,
+           asking_at_close, sde_at_close, revenue_at_close, capsule_expected_value
+    FROM listings WHERE id IN ({_in_list(listing_ids)})
+    """)
+    listings = pd.DataFrame(cursor.fetchall())
+    cursor.execute(f"""
+    SELECT listing_id, COUNT(*) as inquiry_count, MAX(created_at) as inquiry_max
+    FROM inquiries WHERE listing_id IN ({_in_list(listing_ids)}) GROUP BY listing_id
+    """)
+    inquiries = {r['listing_id']: (r['inquiry_count'], r['inquiry_max']) for r in cursor.fetchall()}
+    cursor.execute(f"""
+    SELECT listing_id, COUNT(*) as loi_count, MAX(signed_date) as signed_max,
+           MAX(created_at) as created_max, SUM(has_sba = 1) as sba_count
+    FROM lois WHERE listing_id IN ({_in_list(listing_ids)}) GROUP BY listing_id
+    """)
+    lois = {r['listing_id']: tuple(r.values())[1:] for r in cursor.fetchall()}
+    cursor.close()
+
+    listings['inquiry_aggregate'] = listings['id'].map(inquiries)
+    listings['loi_aggregate'] = listings['id'].map(lois)
+    return listings
+
+def _loi_facts(conn, listing_ids: List[int], status: Dict[int, str]) -> pd.DataFrame:
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT listing_id, signed_date, has_sba
+    FROM lois WHERE listing_id IN ({_in_list(listing_ids)})
+    """)
+    lois = pd.DataFrame(cursor.fetchall(), columns=['listing_id', 'signed_date', 'has_sba'])
+    cursor.close()
+
+    lois['sba'] = pd.array(lois['has_sba'].map({1: True, 0: False}), dtype='boolean')  # NULL: unknown
+    lois['sba_unknown'] = lois['sba'].isna()
+    signed = lois[lois['signed_date'].notna()].sort_values(['listing_id', 'signed_date'])
+    grouped = lois.groupby('listing_id')
+    facts = pd.DataFrame({
+        'total_lois': grouped.size(),
+        'sba_lois': grouped['sba'].sum(),
+        'sba_unknown': grouped['sba_unknown'].any(),
+        'num_lois': signed.groupby('listing_id').size(),
+        'first_loi_date': signed.groupby('listing_id')['signed_date'].first(),
+        'last_loi_date': signed.groupby('listing_id')['signed_date'].last(),
+    })
+    # Winning LOI: the most recently signed one, for sold listings (unknown without one)
+    last_sba = signed.groupby('listing_id').tail(1).set_index('listing_id')['sba']
+    sold = facts.index.map(lambda lid: status.get(lid) == 'sold')
+    facts['winning_loi_sba'] = last_sba.reindex(facts.index).astype('boolean').where(sold, False)
+    return facts
+
+def build_rows(conn, sources: pd.DataFrame, sba_status: Dict[int, str]) -> pd.DataFrame:
+    """Full fact rows for the listings in sources."""
+    from launch_engine import load_inquiry_days, detect_launches_from_frame
+
+    df = sources.copy()
+    listing_ids = df['id'].tolist()
+    df['status'] = df['closed_type'].map({1: 'sold', 2: 'lost', 0: 'active'}).fillna('unknown')
+    df['sba_status'] = df['id'].map(sba_status).fillna('unknown')
+
+    inquiry_days = load_inquiry_days(conn, listing_ids)
+    inquiry_days['inquiry_date'] = pd.to_datetime(inquiry_days['inquiry_date'])
+    by_listing = inquiry_days.groupby('listing_id')
+    df['total_inquiries'] = df['id'].map(by_listing['daily_inquiries'].sum()).fillna(0)
+    df['inquiry_days'] = df['id'].map(by_listing.size()).fillna(0)
+    df['first_inquiry'] = df['id'].map(by_listing['inquiry_date'].min())
+    df['last_inquiry'] = df['id'].map(by_listing['inquiry_date'].max())
+
+    closed_dates = {lid: pd.Timestamp(at).date() for lid, at in zip(df['id'], df['closed_at']) if pd.notna(at)}
+    launches = detect_launches_from_frame(inquiry_days, closed_dates)
+    df['launch_date'] = df['id'].map(launches['launch_date'])
+    df['launch_strategy'] = df['id'].map(launches['strategy'])
+    df['num_launch_periods'] = df['id'].map(launches['num_periods'])
+
+    lois = _loi_facts(conn, listing_ids, dict(zip(df['id'], df['status'])))
+    for column in ['first_loi_date', 'last_loi_date', 'num_lois', 'total_lois', 'sba_lois', 'sba_unknown',
+                   'winning_loi_sba']:
+        df[column] = df['id'].map(lois[column])
+    for column in ['num_lois', 'total_lois', 'sba_lois']:
+        df[column] = df[column].fillna(0)
+    # A sold listing without a signed LOI has no known winning LOI; unsold listings have none
+    winning = df['winning_loi_sba'].astype('boolean')
+    df['winning_loi_sba'] = winning.where((df['status'] == 'sold') | winning.notna(), False)
+    # No SBA LOI is only known when every LOI's has_sba is filled in
+    has_sba = df['sba_lois'] > 0
+    df['has_sba_loi'] = has_sba.astype('boolean').where(has_sba | ~df['sba_unknown'].fillna(False).astype(bool))
+    df['pct_sba_lois'] = np.where(df['total_lois'] > 0, df['sba_lois'] / df['total_lois'].clip(lower=1) * 100, 0.0)
+
+    add_title_flags(df)
+    add_multiples(df)
+    return df
+
+def build_facts(conn, listing_ids: List[int] = None, sba_status: Dict[int, str] = None, full: bool = False,
+                path: Path = FACTS_DIR, today: date = None) -> Dict:
+    """Bring facts/ up to date, recomputing only listings whose inputs changed."""
+    if listing_ids is None or sba_status is None:
+        from launch_date_analysis_v2 import load_cim_results
+        cim_map = load_cim_results()
+        sba_status = sba_status or {lid: item.get('sba_eligible', 'unknown') for lid, item in cim_map.items()}
+        listing_ids = listing_ids if listing_ids is not None else list(cim_map)
+    start = time.time()
+
+    sources = read_sources(conn, listing_ids)
+    sources['fingerprint'] = [fingerprint(tuple(row), sba_status.get(row.id, 'unknown'))
+                              for row in sources.itertuples(index=False)]
+
+    existing = None
+    if not full and (Path(path) / 'schema.json').exists() and load_schema(path).get('version') == FACTS_VERSION:
+        existing = load_facts(path=path)
+        known = dict(zip(existing['id'].tolist(), existing['fingerprint'].tolist()))
+        changed = sources[[known.get(lid) != fp for lid, fp in zip(sources['id'], sources['fingerprint'])]]
+        kept = existing[existing['id'].isin(set(sources['id']) - set(changed['id']))]
+    else:
+        changed, kept = sources, None
+
+    rows = build_rows(conn, changed, sba_status) if len(changed) else None
+    parts = [part for part in (kept, rows) if part is not None and len(part)]
+    df = pd.concat([part.reindex(columns=list(COLUMNS)) for part in parts], ignore_index=True) if parts else \
+        pd.DataFrame(columns=list(COLUMNS))
+    for name, kind in COLUMNS.items():
+        if isinstance(kind, list):
+            df[name] = df[name].astype(str)
+    add_time_on_market(df, today)
+    save_facts(df, path)
+
+    stats = {'listings': len(df), 'rebuilt': len(changed), 'kept': 0 if kept is None else len(kept),
+             'dropped': 0 if existing is None else len(set(existing['id']) - set(sources['id'])),
+             'seconds': time.time() - start}
+    print(f"Fact table: {stats['listings']} listings, {stats['rebuilt']} rebuilt, {stats['kept']} unchanged, "
+          f"{stats['dropped']} dropped in {stats['seconds']:.2f}s -> {path}/")
+    return stats
+
+def import_csv(path: Path = FACTS_DIR) -> pd.DataFrame:
+    """
+    Seed the fact table from the CSVs the analyses used to merge, for use
+    without a database. Rows get a zero fingerprint, so the next build
+    recomputes them from the database. The CSVs only have LOI usage for
+    SBA-prequalified listings; for the other rows has_sba_loi, winning_loi_sba
+    and pct_sba_lois are unknown (<NA>/NaN) and the LOI counts read 0 until then.
+    """
+    df = pd.read_csv('launch_date_analysis_v2.csv')
+    usage = pd.read_csv('sba_actual_usage_analysis.csv')
+    df = df.merge(usage[['id', 'total_lois', 'sba_lois', 'has_sba_loi', 'winning_loi_sba', 'pct_sba_lois']],
+                  on='id', how='left')
+    for column in ['total_lois', 'sba_lois']:
+        df[column] = df[column].fillna(0)
+    df['inquiry_days'] = 0
+    for column in ['asking_price', 'sde', 'revenue', 'multiple']:
+        df[column] = np.nan
+    multiples = Path('median_multiples_details.csv')
+    if multiples.exists():
+        details = pd.read_csv(multiples).set_index('id')
+        for column in ['asking_price', 'sde', 'multiple']:
+            df[column] = df['id'].map(details[column])
+    df['fingerprint'] = 0
+    add_title_flags(df)
+    save_facts(df.reindex(columns=list(COLUMNS)), path)
+    print(f"Imported {len(df)} listings from the CSVs -> {path}/")
+    return df
+
+def print_status(path: Path = FACTS_DIR):
+    schema = load_schema(path)
+    df = load_facts(['status', 'sba_status', 'launch_date', 'fingerprint'], path)
+    size = sum(f.stat().st_size for f in Path(path).glob('*.npy'))
+    print(f"{schema['rows']} listings, {len(schema['columns'])} columns, {size / 1024:.0f} KB; "
+          f"built {schema['built_at']}")
+    print(f"  Status: {df['status'].value_counts().to_dict()}")
+    print(f"  SBA (CIM): {df['sba_status'].value_counts().to_dict()}")
+    print(f"  With launch date: {int(pd.notna(df['launch_date']).sum())}")
+    print(f"  Seeded from CSV, awaiting a DB build: {int((df['fingerprint'] == 0).sum())}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Columnar listing fact table')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Rebuild changed listings from the database')
+    build.add_argument('--full', action='store_true', help='Recompute every listing')
+    sub.add_parser('import-csv', help='Seed from the existing CSVs')
+    sub.add_parser('status')
+    show = sub.add_parser('show')
+    show.add_argument('listing_id', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from launch_date_analysis_v2 import get_db_connection
+        conn = get_db_connection()
+        build_facts(conn, full=args.full)
+        conn.close()
+    elif args.command == 'import-csv':
+        import_csv()
+    elif args.command == 'status':
+        print_status()
+    else:
+        facts = load_facts()
+        row = facts[facts['id'] == args.listing_id]
+        if row.empty:
+            print(f"Listing {args.listing_id} is not in the fact table")
+            sys.exit(1)
+        for column, value in row.iloc[0].items():
+            print(f"  {column:<22} {value}")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Record/replay cassettes for LLM calls, for deterministic pipeline benchmarks.
+In record mode every successful chat completion made through llm_provider
+(Grok and OpenAI alike) is appended to a JSONL cassette. In replay mode the
+same requests are answered from the cassette without touching the network,
+after a recorded, synthetic or zero delay.
+
+Enable from the environment:
+    LLM_CASSETTE=cache/cassettes/cims.jsonl LLM_CASSETTE_MODE=record python3 process_cims_with_grok.py --limit 20
+    LLM_CASSETTE=cache/cassettes/cims.jsonl LLM_CASSETTE_MODE=replay python3 process_cims_with_grok.py
+
+Benchmark the classification engine under replay:
+    python3 llm_cassette.py benchmark --cassette cache/cassettes/cims.jsonl --latency synthetic
+
+Cassette lines use the same {"request", "response"} shape that
+mock_llm_server.py --responses accepts.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+import numpy as np
+
+# Set from LLM_CASSETTE / LLM_CASSETTE_MODE / LLM_CASSETTE_LATENCY, or by configure()
+CASSETTE = {
+    'path': os.getenv('LLM_CASSETTE'),
+    'mode': os.getenv('LLM_CASSETTE_MODE', 'off'),  # off, record, replay
+    'latency': os.getenv('LLM_CASSETTE_LATENCY', 'recorded'),  # recorded, synthetic, none
+    'seed': 42,
+}
+LATENCY_MODES = ('recorded', 'synthetic', 'none')
+
+_entries = {}  # request_key -> {"response": ..., "latency": ...}
+_loaded_path = None
+_synthetic = {}  # Lognormal parameters fitted to the recorded latencies
+_rng = random.Random(CASSETTE['seed'])
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'recorded': 0}
+
+def request_key(payload: Dict) -> str:
+    """Stable hash of the parts of a request that determine the response."""
+    fields = {k: payload.get(k) for k in ('model', 'messages', 'temperature', 'max_tokens', 'response_format')}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+def configure(path: str = None, mode: str = None, latency: str = None, seed: int = None):
+    """Change cassette settings at runtime (the benchmark uses this)."""
+    global _loaded_path
+    with _lock:
+        if path is not None:
+            CASSETTE['path'] = path
+            _loaded_path = None
+        if mode is not None:
+            if mode not in ('off', 'record', 'replay'):
+                raise ValueError(f"Unknown cassette mode: {mode}")
+            CASSETTE['mode'] = mode
+        if latency is not None:
+            if latency not in LATENCY_MODES:
+                raise ValueError(f"Unknown cassette latency mode: {latency}")
+            CASSETTE['latency'] = latency
+        if seed is not None:
+            CASSETTE['seed'] = seed
+            _rng.seed(seed)
+
+def is_replaying() -> bool:
+    return CASSETTE['mode'] == 'replay' and bool(CASSETTE['path'])
+
+def is_recording() -> bool:
+    return CASSETTE['mode'] == 'record' and bool(CASSETTE['path'])
+
+def load_cassette(path: str) -> Dict[str, Dict]:
+    """Read a cassette into request_key -> entry. Later entries win."""
+    entries = {}
+    if not Path(path).exists():
+        return entries
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            key = entry.get('key') or request_key(entry.get('request', {}))
+            entries[key] = entry
+    return entries
+
+def _ensure_loaded():
+    global _loaded_path
+    if _loaded_path == CASSETTE['path']:
+        return
+    _entries.clear()
+    _entries.update(load_cassette(CASSETTE['path']))
+
+    latencies = [e['latency'] for e in _entries.values() if e.get('latency')]
+    _synthetic.clear()
+    if latencies:
+        logs = np.log(latencies)
+        _synthetic.update({'mu': float(np.mean(logs)), 'sigma': float(np.std(logs))})
+    _loaded_path = CASSETTE['path']
+
+def record_interaction(payload: Dict, response: Dict, latency: float):
+    """Append one request/response pair to the cassette."""
+    entry = {
+        'key': request_key(payload),
+        'request': payload,
+        'response': response,
+        'latency': round(latency, 4),
+        'recorded_at': time.time(),
+    }
+    line = json.dumps(entry) + '\n'
+    with _lock:
+        path = Path(CASSETTE['path'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line)
+        _stats['recorded'] += 1
+
+def _replay_delay(entry: Dict) -> float:
+    mode = CASSETTE['latency']
+    if mode == 'none':
+        return 0.0
+    if mode == 'synthetic' and _synthetic:
+        return _rng.lognormvariate(_synthetic['mu'], _synthetic['sigma'])
+    return entry.get('latency') or 0.0
+
+def replay_interaction(payload: Dict) -> Tuple[Dict, float]:
+    """
+    Serve a recorded response for the request, after the configured delay.
+    Raises KeyError when the cassette has no matching request.
+    """
+    with _lock:
+        _ensure_loaded()
+        entry = _entries.get(request_key(payload))
+        if entry is None:
+            _stats['misses'] += 1
+            raise KeyError(f"No cassette entry for request to {payload.get('model')}")
+        _stats['hits'] += 1
+        delay = _replay_delay(entry)
+
+    time.sleep(delay)
+    return entry['response'], delay
+
+def cassette_stats() -> Dict:
+    with _lock:
+        return dict(_stats)
+
+def run_benchmark(cims_dir: Path, cassette: str, latency: str = 'recorded', workers: int = 5,
+                  limit: int = None, repeat: int = 1, use_local: bool = True,
+                  rate_limit: bool = False, seed: int = 42) -> Dict:
+    """
+    Time the classification engine (local classifier, executive summary and
+    full-CIM calls) over extracted CIM text with every LLM call replayed from
+    the cassette. PDF extraction happens up front and is not timed, and the
+    result cache is bypassed, so runs are comparable across engine changes.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import process_cims_with_grok as pipeline
+
+    configure(path=cassette, mode='replay', latency=latency, seed=seed)
+    if not rate_limit:
+        pipeline.RATE_LIMIT_DELAY = 0
+
+    pdfs = sorted(Path(cims_dir).glob('*.pdf'))[:limit]
+    documents = []
+    for pdf in pdfs:
+        text, _ = pipeline.extract_pdf_text(str(pdf))
+        if text:
+            documents.append((pdf.name, text))
+    documents = documents * repeat
+    if not documents:
+        raise ValueError(f"No extractable CIMs found in {cims_dir}")
+
+    before = cassette_stats()
+    statuses = {}
+    latencies = []
+
+    def run_one(item):
+        name, text = item
+        t0 = time.perf_counter()
+        fields = pipeline.classify_document(text, name, use_local=use_local)
+        return fields, time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for fields, elapsed in executor.map(run_one, documents):
+            latencies.append(elapsed)
+            status = fields.get('sba_status', 'unknown')
+            statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    after = cassette_stats()
+    latencies = np.array(latencies)
+    report = {
+        'documents': len(documents),
+        'workers': workers,
+        'latency_mode': latency,
+        'elapsed_seconds': elapsed,
+        'documents_per_second': len(documents) / elapsed if elapsed else 0,
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'latency_p99': float(np.percentile(latencies, 99)),
+        'replayed_calls': after['hits'] - before['hits'],
+        'cassette_misses': after['misses'] - before['misses'],
+        'status_counts': statuses,
+    }
+
+    print("\n" + "=" * 60)
+    print("REPLAY BENCHMARK")
+    print("=" * 60)
+    print(f"Documents: {report['documents']} with {workers} workers, latency mode '{latency}'")
+    print(f"Elapsed: {elapsed:.2f}s ({report['documents_per_second']:.2f} docs/s)")
+    print(f"Per-document latency p50/p95/p99: {report['latency_p50']:.3f}s / "
+          f"{report['latency_p95']:.3f}s / {report['latency_p99']:.3f}s")
+    print(f"Replayed LLM calls: {report['replayed_calls']} ({report['cassette_misses']} cassette misses)")
+    if report['cassette_misses']:
+        print("  Misses mean the engine sent requests that were never recorded; re-record to compare fairly.")
+    print(f"Status counts: {statuses}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='LLM cassette tools')
+    parser.add_argument('command', choices=['benchmark', 'info'])
+    parser.add_argument('--cassette', default=CASSETTE['path'] or 'cache/cassettes/cims.jsonl')
+    parser.add_argument('--cims-dir', default='/Users/markdaoust/Developer/ql_stats/cims')
+    parser.add_argument('--latency', choices=LATENCY_MODES, default='recorded')
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1, help='Replay the document set N times')
+    parser.add_argument('--no-local', action='store_true', help='Skip the local classifier')
+    parser.add_argument('--rate-limit', action='store_true', help='Keep the pipeline sleep between calls')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        entries = load_cassette(args.cassette)
+        latencies = [e['latency'] for e in entries.values() if e.get('latency')]
+        models = {}
+        for entry in entries.values():
+            model = entry.get('request', {}).get('model')
+            models[model] = models.get(model, 0) + 1
+        print(f"{args.cassette}: {len(entries)} recorded requests {models}")
+        if latencies:
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"Recorded latency p50/p95: {p50:.2f}s / {p95:.2f}s")
+    else:
+        run_benchmark(Path(args.cims_dir), args.cassette, args.latency, args.workers, args.limit,
+                      args.repeat, use_local=not args.no_local, rate_limit=args.rate_limit, seed=args.seed)
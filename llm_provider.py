@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Single entry point for chat-completion calls to OpenAI-compatible LLM endpoints.
+Replaces the hand-rolled HTTP payloads in the CIM processing and report scripts.
+
+Set LLM_BASE_URL (and optionally LLM_MODEL) to point every provider at another
+OpenAI-compatible server, e.g. mock_llm_server.py for offline load tests.
+Set LLM_CASSETTE and LLM_CASSETTE_MODE to record or replay calls (see llm_cassette.py).
+"""
+
+import os
+import re
+import json
+import time
+import random
+from typing import Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_telemetry import record_call
+from llm_cassette import request_key, is_recording, is_replaying, record_interaction, replay_interaction
+
+# Known providers. All speak the OpenAI /chat/completions protocol.
+PROVIDERS = {
+    'grok': {
+        'base_url': 'https://api.x.ai/v1',
+        'api_key_env': 'GROK_API_KEY',
+        'default_model': 'grok-2-1212',
+        'supports_json_mode': True,
+    },
+    'openai': {
+        'base_url': 'https://api.openai.com/v1',
+        'api_key_env': 'OPENAI_API_KEY',
+        'default_model': 'gpt-4',
+        'supports_json_mode': True,
+    },
+}
+
+DEFAULT_PROVIDER = 'grok'
+DEFAULT_TIMEOUT = 30
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1.0  # Seconds, doubled on each retry
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# One pooled session shared by every worker thread
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=64))
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=64))
+
+def get_provider_config(provider: str = DEFAULT_PROVIDER, base_url: str = None,
+                        model: str = None, api_key: str = None) -> Dict:
+    """Resolve base URL, model and API key for a provider, applying env overrides."""
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider} (expected one of {', '.join(PROVIDERS)})")
+
+    config = dict(PROVIDERS[provider])
+    config['provider'] = provider
+    config['base_url'] = (base_url or os.getenv('LLM_BASE_URL') or config['base_url']).rstrip('/')
+    config['model'] = model or os.getenv('LLM_MODEL') or config['default_model']
+    config['api_key'] = api_key or os.getenv(config['api_key_env']) or os.getenv('LLM_API_KEY', '')
+    return config
+
+def _retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    """Backoff before the next attempt, honouring Retry-After when the server sends it."""
+    if response is not None and response.headers.get('Retry-After'):
+        try:
+            return float(response.headers['Retry-After'])
+        except ValueError:
+            pass
+    return RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+def chat_completion(messages: List[Dict], provider: str = DEFAULT_PROVIDER, model: str = None,
+                    base_url: str = None, api_key: str = None, json_mode: bool = False,
+                    temperature: float = 0.1, max_tokens: int = 1000,
+                    timeout: float = DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES,
+                    stage: str = None) -> Dict:
+    """
+    Send a chat-completion request and return the assistant message.
+
+    Returns a dict with content, model, usage, latency (seconds for the final
+    attempt) and retries. Raises requests.exceptions.RequestException once the
+    retries are exhausted. Every call, successful or not, is written to the
+    telemetry ledger under the given pipeline stage.
+    """
+    config = get_provider_config(provider, base_url, model, api_key)
+
+    headers = {"Content-Type": "application/json"}
+    if config['api_key']:
+        headers["Authorization"] = f"Bearer {config['api_key']}"
+
+    payload = {
+        "model": config['model'],
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if json_mode and config['supports_json_mode']:
+        payload["response_format"] = {"type": "json_object"}
+
+    url = f"{config['base_url']}/chat/completions"
+
+    attempt = 0
+    start = time.time()
+    cache = 'replay' if is_replaying() else 'miss'  # Replayed calls cost nothing and are not API calls
+    try:
+        if cache == 'replay':
+            result, latency = replay_interaction(payload)
+        else:
+            while True:
+                response = None
+                start = time.time()
+                try:
+                    response = _session.post(url, headers=headers, json=payload, timeout=timeout)
+                    if response.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+                        response.raise_for_status()
+                        break
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if attempt >= max_retries:
+                        raise
+
+                time.sleep(_retry_delay(response, attempt))
+                attempt += 1
+
+            latency = time.time() - start
+            result = response.json()
+            if is_recording():
+                record_interaction(payload, result, latency)
+        content = result['choices'][0]['message']['content']
+    except Exception as e:
+        record_call(config['model'], stage, latency=time.time() - start, retries=attempt, cache=cache,
+                    status='error', error=str(e), provider=provider)
+        raise
+
+    usage = result.get('usage') or {}
+    record_call(config['model'], stage, latency=latency, retries=attempt, usage=usage, cache=cache,
+                provider=provider)
+
+    return {
+        "content": content,
+        "model": result.get('model', config['model']),
+        "usage": usage,
+        "latency": latency,
+        "retries": attempt,
+        "provider": provider,
+    }
+
+def parse_json_content(content: str) -> Optional[Dict]:
+    """
+    Parse a JSON object out of a model response.
+    Handles markdown code fences and prose around the object. Returns None if no
+    JSON object can be recovered.
+    """
+    if content is None:
+        return None
+
+    content = content.strip()
+    if '```' in content:
+        parts = content.split('```')
+        if len(parts) >= 2:
+            content = parts[1]
+            if content.startswith('json'):
+                content = content[4:]
+            content = content.strip()
+
+    try:
+        parsed = json.loads(content)
+        return parsed if isinstance(parsed, dict) else None
+    except json.JSONDecodeError:
+        pass
+
+    # Greedy match first (nested objects), then the first flat object
+    for pattern in (r'\{.*\}', r'\{[^{}]*\}'):
+        match = re.search(pattern, content, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group())
+            except json.JSONDecodeError:
+                continue
+
+    return None
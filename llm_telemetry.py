@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Per-call LLM telemetry and cost ledger.
+Every chat completion made through llm_provider appends one JSON line with token
+usage, latency, retries, model, pipeline stage and cache outcome. The report
+breaks cost and latency down by stage so we can see what dominates before
+scaling to the full listing history.
+
+Usage:
+    python3 llm_telemetry.py            # Report for the most recent run
+    python3 llm_telemetry.py --all      # Report across every run in the ledger
+    python3 llm_telemetry.py --run 20250901_120000
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+
+LEDGER_FILE = Path(os.getenv('LLM_LEDGER_FILE', 'cache/llm_ledger.jsonl'))
+
+# USD per million tokens (prompt, completion)
+PRICING = {
+    'grok-2-1212': (2.00, 10.00),
+    'grok-3-mini': (0.30, 0.50),
+    'gpt-4': (30.00, 60.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+DEFAULT_PRICE = (2.00, 10.00)
+
+# One id per process so a pipeline run can be reported on its own
+RUN_ID = os.getenv('LLM_RUN_ID') or datetime.now().strftime('%Y%m%d_%H%M%S')
+
+_ledger_lock = threading.Lock()
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Dollar cost of one call from its token usage."""
+    prompt_price, completion_price = PRICING.get(model, DEFAULT_PRICE)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+def record_call(model: str, stage: Optional[str], latency: float = 0.0, retries: int = 0,
+                usage: Dict = None, cache: str = 'miss', status: str = 'ok',
+                error: str = None, provider: str = None):
+    """Append one call record to the ledger."""
+    usage = usage or {}
+    prompt_tokens = int(usage.get('prompt_tokens') or 0)
+    completion_tokens = int(usage.get('completion_tokens') or 0)
+
+    record = {
+        'timestamp': time.time(),
+        'run_id': RUN_ID,
+        'provider': provider,
+        'model': model,
+        'stage': stage or 'unspecified',
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'latency': round(latency, 4),
+        'retries': retries,
+        'cache': cache,
+        'status': status,
+        'cost': call_cost(model, prompt_tokens, completion_tokens) if cache == 'miss' else 0.0,
+    }
+    if error:
+        record['error'] = error
+
+    line = json.dumps(record) + '\n'
+    with _ledger_lock:
+        LEDGER_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(LEDGER_FILE, 'a') as f:
+            f.write(line)
+
+def record_cache_hit(stage: str, model: str = None):
+    """Record a lookup answered from a local cache instead of the API."""
+    record_call(model or 'cache', stage, cache='hit')
+
+def load_ledger(path: Path = LEDGER_FILE) -> List[Dict]:
+    """Read every record in the ledger, skipping a torn final line."""
+    if not Path(path).exists():
+        return []
+
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def _latency_stats(latencies: List[float]) -> Dict:
+    if not latencies:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+def summarize_ledger(records: List[Dict], run_id: str = None) -> Dict:
+    """
+    Aggregate ledger records by stage and by run.
+    If run_id is given only that run is summarised.
+    """
+    if run_id:
+        records = [r for r in records if r.get('run_id') == run_id]
+
+    by_stage = {}
+    for record in records:
+        stage = by_stage.setdefault(record['stage'], {
+            'calls': 0, 'cache_hits': 0, 'replays': 0, 'errors': 0, 'retries': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0,
+            'latencies': [], 'models': set()
+        })
+        if record.get('cache') == 'hit':
+            stage['cache_hits'] += 1
+            continue
+        if record.get('cache') == 'replay':
+            stage['replays'] += 1
+            continue
+
+        stage['calls'] += 1
+        stage['errors'] += record.get('status') != 'ok'
+        stage['retries'] += record.get('retries', 0)
+        stage['prompt_tokens'] += record.get('prompt_tokens', 0)
+        stage['completion_tokens'] += record.get('completion_tokens', 0)
+        stage['cost'] += record.get('cost', 0.0)
+        stage['models'].add(record.get('model'))
+        if record.get('status') == 'ok':
+            stage['latencies'].append(record.get('latency', 0.0))
+
+    for stage in by_stage.values():
+        stage.update(_latency_stats(stage.pop('latencies')))
+        stage['models'] = sorted(m for m in stage['models'] if m)
+
+    by_run = {}
+    for record in records:
+        run = by_run.setdefault(record.get('run_id'), {'calls': 0, 'cache_hits': 0, 'replays': 0, 'cost': 0.0})
+        if record.get('cache') == 'hit':
+            run['cache_hits'] += 1
+        elif record.get('cache') == 'replay':
+            run['replays'] += 1
+        else:
+            run['calls'] += 1
+            run['cost'] += record.get('cost', 0.0)
+
+    ok_latencies = [r.get('latency', 0.0) for r in records
+                    if r.get('cache', 'miss') == 'miss' and r.get('status') == 'ok']
+
+    return {
+        'run_id': run_id,
+        'total_calls': sum(s['calls'] for s in by_stage.values()),
+        'total_cost': sum(s['cost'] for s in by_stage.values()),
+        'latency': _latency_stats(ok_latencies),
+        'by_stage': by_stage,
+        'by_run': by_run,
+    }
+
+def print_ledger_report(summary: Dict):
+    """Print the cost and latency breakdown."""
+    def fmt(value):
+        return f"{value:.2f}s" if value is not None else "n/a"
+
+    title = f"run {summary['run_id']}" if summary['run_id'] else "all runs"
+    print("\n" + "=" * 60)
+    print(f"LLM COST & LATENCY LEDGER ({title})")
+    print("=" * 60)
+    print(f"Total API calls: {summary['total_calls']}")
+    print(f"Total cost: ${summary['total_cost']:.4f}")
+    print(f"Latency p50/p95/p99: {fmt(summary['latency']['p50'])} / "
+          f"{fmt(summary['latency']['p95'])} / {fmt(summary['latency']['p99'])}")
+
+    print("\nBy stage:")
+    stages = sorted(summary['by_stage'].items(), key=lambda item: item[1]['cost'], reverse=True)
+    for name, stage in stages:
+        share = stage['cost'] / summary['total_cost'] * 100 if summary['total_cost'] else 0
+        replays = f", {stage['replays']} replayed" if stage['replays'] else ""
+        print(f"  {name}: {stage['calls']} calls, {stage['cache_hits']} cache hits{replays}, "
+              f"{stage['errors']} errors, {stage['retries']} retries")
+        print(f"    tokens: {stage['prompt_tokens']:,} prompt / {stage['completion_tokens']:,} completion")
+        print(f"    cost: ${stage['cost']:.4f} ({share:.1f}% of total)")
+        print(f"    latency p50/p95/p99: {fmt(stage['p50'])} / {fmt(stage['p95'])} / {fmt(stage['p99'])}")
+
+    if len(summary['by_run']) > 1:
+        print("\nDollars per run:")
+        for run_id, run in sorted(summary['by_run'].items(), key=lambda item: str(item[0])):
+            print(f"  {run_id}: ${run['cost']:.4f} ({run['calls']} calls, {run['cache_hits']} cache hits)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='LLM cost and latency ledger report')
+    parser.add_argument('--run', help='Report a specific run id')
+    parser.add_argument('--all', action='store_true', help='Report across every run')
+    parser.add_argument('--ledger', default=str(LEDGER_FILE), help='Ledger file')
+    args = parser.parse_args()
+
+    records = load_ledger(Path(args.ledger))
+    if not records:
+        print(f"No ledger records found in {args.ledger}")
+    else:
+        run_id = None if args.all else (args.run or records[-1].get('run_id'))
+        print_ledger_report(summarize_ledger(records, run_id))
@@ -0,0 +1,765 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the parts of the Google Drive v3 API the CIM downloaders use,
+served from a directory fixture, so download concurrency can be benchmarked and
+regression-tested without network access or service_account.json.
+
+Implemented:
+- files.list with q filters ('x' in parents, mimeType, name, trashed, and/or/not)
+  and pageSize/pageToken pagination
+- files.get (metadata) and files.get alt=media with Range requests
+- changes.getStartPageToken and changes.list (the fixture is rescanned on each
+  call, so files added, edited or deleted on disk show up as changes)
+- batch requests (POST /batch/drive/v3), about.get
+- latency, injected 5xx errors, a per-server request quota answered with
+  403 userRateLimitExceeded / 429, per-transfer bandwidth and dropped transfers
+
+Every folder and file in the fixture gets a stable id derived from its path.
+Point the pipeline at the server with DRIVE_API_URL; credentials are not needed.
+
+Usage:
+    python3 mock_drive_server.py generate --fixture drive_fixture --listings 5000
+    python3 mock_drive_server.py serve --fixture drive_fixture --latency-ms 40 --rate-limit 200
+    python3 mock_drive_server.py loadtest --listings 2000 --workers 16 --rate-limit 300 --drop-rate 0.05
+"""
+
+import os
+import io
+import re
+import sys
+import json
+import math
+import time
+import random
+import socket
+import hashlib
+import argparse
+import tempfile
+import threading
+import mimetypes
+from pathlib import Path
+from collections import defaultdict
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8090
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+LISTINGS_FILE = '.listings.json'  # Written by generate_fixture; dotfiles are not served
+MAX_PAGE_SIZE = 1000
+MAX_BATCH = 100
+STREAM_CHUNK = 64 * 1024
+
+# Server behaviour, set from the command line
+CONFIG = {
+    'latency_ms': 0.0,  # Median latency per request (per batch for batch calls)
+    'latency_sigma': 0.5,  # Lognormal shape; 0 gives a fixed latency
+    'error_rate': 0.0,  # Fraction of requests answered with a 5xx
+    'error_codes': [500, 503],
+    'rate_limit': 0.0,  # Requests per second across all clients; 0 for no quota
+    'burst': 50,
+    'throttle_status': 403,  # 403 userRateLimitExceeded, or 429
+    'bandwidth_mbps': 0.0,  # Per-transfer cap in MB/s; 0 for unlimited
+    'drop_rate': 0.0,  # Fraction of media transfers cut off partway
+    'seed': None,
+}
+
+_tree = {
+    'root': None,  # Fixture directory
+    'root_id': None,
+    'files': {},  # id -> metadata as Drive returns it
+    'paths': {},  # id -> path on disk
+    'children': {},  # parent id -> [child ids], sorted by name
+    'changes': [],  # Change log; page token N starts at changes[N - 1]
+}
+_tree_lock = threading.RLock()
+_md5_cache = {}  # (path, size, mtime_ns) -> md5
+
+_quota = {'tokens': 0.0, 'updated': time.monotonic()}
+_stats = {'requests': 0, 'batches': 0, 'media': 0, 'bytes': 0, 'throttled': 0, 'errors': 0, 'dropped': 0}
+_stats_lock = threading.Lock()
+_rng = random.Random()
+
+def drive_id(relative: str) -> str:
+    """Stable Drive-style id for a path relative to the fixture root."""
+    return hashlib.sha1(f"mock-drive:{relative}".encode()).hexdigest()[:28]
+
+def _rfc3339(timestamp: float) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}Z"
+
+def _md5(path: Path, stat: os.stat_result) -> str:
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _md5_cache:
+        h = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _md5_cache[key] = h.hexdigest()
+    return _md5_cache[key]
+
+def scan_fixture(root: Path) -> Tuple[Dict, Dict]:
+    """Drive metadata and disk paths for everything under root (dotfiles skipped)."""
+    files, paths = {}, {}
+    root = Path(root)
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        directory = Path(directory)
+        relative = directory.relative_to(root).as_posix()
+        parent_id = drive_id('' if relative == '.' else relative)
+
+        for name in dirnames + [f for f in filenames if not f.startswith('.')]:
+            path = directory / name
+            stat = path.stat()
+            file_id = drive_id(path.relative_to(root).as_posix())
+            is_folder = name in dirnames
+            meta = {
+                'kind': 'drive#file',
+                'id': file_id,
+                'name': name,
+                'mimeType': FOLDER_MIME if is_folder else (mimetypes.guess_type(name)[0] or 'application/octet-stream'),
+                'parents': [parent_id],
+                'trashed': False,
+                'modifiedTime': _rfc3339(stat.st_mtime),
+            }
+            if not is_folder:
+                meta['size'] = str(stat.st_size)
+                meta['md5Checksum'] = _md5(path, stat)
+            files[file_id] = meta
+            paths[file_id] = path
+    return files, paths
+
+def load_fixture(root: Path):
+    root = Path(root).resolve()
+    files, paths = scan_fixture(root)
+    with _tree_lock:
+        _tree.update({'root': root, 'root_id': drive_id(''), 'files': files, 'paths': paths, 'changes': []})
+        _index_children()
+
+def _index_children():
+    children = defaultdict(list)
+    for file_id, meta in _tree['files'].items():
+        for parent in meta['parents']:
+            children[parent].append(file_id)
+    for ids in children.values():
+        ids.sort(key=lambda i: (_tree['files'][i]['name'], i))
+    _tree['children'] = dict(children)
+
+def rescan() -> int:
+    """Pick up edits to the fixture on disk as Drive changes. Returns how many were logged."""
+    files, paths = scan_fixture(_tree['root'])
+    with _tree_lock:
+        old = _tree['files']
+        now = _rfc3339(time.time())
+        logged = 0
+        for file_id, meta in files.items():
+            if old.get(file_id) != meta:
+                _tree['changes'].append({'kind': 'drive#change', 'changeType': 'file', 'fileId': file_id,
+                                         'removed': False, 'file': meta, 'time': now})
+                logged += 1
+        for file_id in set(old) - set(files):
+            _tree['changes'].append({'kind': 'drive#change', 'changeType': 'file', 'fileId': file_id,
+                                     'removed': True, 'time': now})
+            logged += 1
+        _tree['files'], _tree['paths'] = files, paths
+        _index_children()
+    return logged
+
+# --- Query language ---------------------------------------------------------
+
+TOKEN_PATTERN = re.compile(r"\s*(?:(?P<string>'(?:\\.|[^'\\])*')|(?P<op>!=|<=|>=|=|<|>|\(|\))|(?P<word>[A-Za-z_.]+))")
+
+class QueryError(ValueError):
+    pass
+
+def _tokenize(q: str) -> List[Tuple[str, str]]:
+    tokens, position = [], 0
+    while position < len(q.rstrip()):
+        match = TOKEN_PATTERN.match(q, position)
+        if not match:
+            raise QueryError(f"Invalid query at: {q[position:position + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+def parse_query(q: str):
+    """
+    Parse a Drive q string into nested tuples:
+    ('or', [...]), ('and', [...]), ('not', node), ('in', value, field), ('cmp', field, op, value).
+    """
+    tokens = _tokenize(q)
+    position = 0
+
+    def peek(value=None):
+        if position < len(tokens) and (value is None or (tokens[position][0] != 'string'
+                                                         and tokens[position][1].lower() == value)):
+            return tokens[position]
+        return None
+
+    def take():
+        nonlocal position
+        if position >= len(tokens):
+            raise QueryError("Unexpected end of query")
+        position += 1
+        return tokens[position - 1]
+
+    def expression():
+        nodes = [term()]
+        while peek('or'):
+            take()
+            nodes.append(term())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def term():
+        nodes = [factor()]
+        while peek('and'):
+            take()
+            nodes.append(factor())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def factor():
+        if peek('not'):
+            take()
+            return ('not', factor())
+        if peek('('):
+            take()
+            node = expression()
+            if take()[1] != ')':
+                raise QueryError("Expected ')'")
+            return node
+        left = take()
+        operator = take()[1].lower()
+        if operator == 'in':
+            return ('in', left[1], take()[1])
+        right = take()
+        value = right[1] if right[0] == 'string' else {'true': True, 'false': False}.get(right[1].lower(), right[1])
+        return ('cmp', left[1], operator, value)
+
+    node = expression() if tokens else ('and', [])
+    if position != len(tokens):
+        raise QueryError(f"Unexpected {tokens[position][1]!r}")
+    return node
+
+def matches(node, meta: Dict) -> bool:
+    kind = node[0]
+    if kind == 'or':
+        return any(matches(n, meta) for n in node[1])
+    if kind == 'and':
+        return all(matches(n, meta) for n in node[1])
+    if kind == 'not':
+        return not matches(node[1], meta)
+    if kind == 'in':
+        return node[1] in meta.get(node[2], [])
+    _, field, operator, value = node
+    actual = meta.get(field)
+    if operator == 'contains':
+        return str(value).lower() in str(actual or '').lower()
+    if operator == '=':
+        return actual == value
+    if operator == '!=':
+        return actual != value
+    if actual is None:
+        return False
+    return {'<': actual < value, '>': actual > value, '<=': actual <= value, '>=': actual >= value}[operator]
+
+def parent_scope(node) -> Optional[set]:
+    """Parent ids that every match must be in, or None when the query does not restrict parents."""
+    if node[0] == 'in' and node[2] == 'parents':
+        return {node[1]}
+    if node[0] == 'or':
+        scopes = [parent_scope(n) for n in node[1]]
+        return None if any(s is None for s in scopes) else set().union(*scopes)
+    if node[0] == 'and':
+        scopes = [s for s in (parent_scope(n) for n in node[1]) if s is not None]
+        return set.intersection(*scopes) if scopes else None
+    return None
+
+# --- API --------------------------------------------------------------------
+
+def drive_error(status: int, reason: str, message: str) -> Tuple[int, Dict]:
+    return status, {'error': {'code': status, 'message': message,
+                              'errors': [{'domain': 'usageLimits' if status in (403, 429) else 'global',
+                                          'reason': reason, 'message': message}]}}
+
+def list_files(params: Dict) -> Tuple[int, Dict]:
+    try:
+        query = parse_query(params.get('q', ''))
+    except QueryError as e:
+        return drive_error(400, 'invalid', f"Invalid Value: {e}")
+    page_size = min(int(params.get('pageSize', 100)), MAX_PAGE_SIZE)
+    offset = int(params.get('pageToken') or 0)
+
+    with _tree_lock:
+        scope = parent_scope(query)
+        if scope is None:
+            candidates = sorted(_tree['files'], key=lambda i: (_tree['files'][i]['name'], i))
+        else:
+            candidates = [i for parent in sorted(scope) for i in _tree['children'].get(parent, [])]
+        hits = [_tree['files'][i] for i in candidates if matches(query, _tree['files'][i])]
+
+    body = {'kind': 'drive#fileList', 'incompleteSearch': False, 'files': hits[offset:offset + page_size]}
+    if offset + page_size < len(hits):
+        body['nextPageToken'] = str(offset + page_size)
+    return 200, body
+
+def list_changes(params: Dict) -> Tuple[int, Dict]:
+    rescan()
+    if 'pageToken' not in params:
+        return drive_error(400, 'required', "Required parameter: pageToken")
+    start = int(params['pageToken']) - 1
+    page_size = min(int(params.get('pageSize', 100)), MAX_PAGE_SIZE)
+    with _tree_lock:
+        log = _tree['changes']
+        page = log[start:start + page_size]
+        if params.get('includeRemoved', 'true') == 'false':
+            page = [c for c in page if not c['removed']]
+        body = {'kind': 'drive#changeList', 'changes': page}
+        if start + page_size < len(log):
+            body['nextPageToken'] = str(start + page_size + 1)
+        else:
+            body['newStartPageToken'] = str(len(log) + 1)
+    return 200, body
+
+def handle_api(method: str, path: str, params: Dict) -> Tuple[int, Dict]:
+    """Route a metadata request (direct or inside a batch) to its handler."""
+    path = path.rstrip('/')
+    if method != 'GET':
+        return drive_error(405, 'methodNotAllowed', f"{method} not supported by the mock")
+    if path == '/drive/v3/files':
+        return list_files(params)
+    if path == '/drive/v3/changes/startPageToken':
+        rescan()
+        with _tree_lock:
+            return 200, {'kind': 'drive#startPageToken', 'startPageToken': str(len(_tree['changes']) + 1)}
+    if path == '/drive/v3/changes':
+        return list_changes(params)
+    if path == '/drive/v3/about':
+        return 200, {'kind': 'drive#about', 'user': {'displayName': 'Mock Drive',
+                                                     'emailAddress': 'mock-drive@localhost'}}
+    if path.startswith('/drive/v3/files/'):
+        file_id = path.rsplit('/', 1)[1]
+        with _tree_lock:
+            meta = _tree['files'].get(file_id)
+        if meta is None:
+            return drive_error(404, 'notFound', f"File not found: {file_id}.")
+        return 200, meta
+    return drive_error(404, 'notFound', f"Unknown endpoint {path}")
+
+def admit_request() -> Optional[Tuple[int, Dict]]:
+    """Apply the quota and error injection. Returns the error response, or None to proceed."""
+    with _stats_lock:
+        _stats['requests'] += 1
+        if CONFIG['rate_limit'] > 0:
+            now = time.monotonic()
+            _quota['tokens'] = min(CONFIG['burst'], _quota['tokens'] + (now - _quota['updated']) * CONFIG['rate_limit'])
+            _quota['updated'] = now
+            if _quota['tokens'] < 1:
+                _stats['throttled'] += 1
+                if CONFIG['throttle_status'] == 429:
+                    return drive_error(429, 'rateLimitExceeded', "Rate Limit Exceeded")
+                return drive_error(403, 'userRateLimitExceeded', "User Rate Limit Exceeded")
+            _quota['tokens'] -= 1
+        if _rng.random() < CONFIG['error_rate']:
+            _stats['errors'] += 1
+            return drive_error(_rng.choice(CONFIG['error_codes']), 'backendError', "Injected mock error")
+    return None
+
+def sample_latency() -> float:
+    """Seconds to wait before answering."""
+    if CONFIG['latency_ms'] <= 0:
+        return 0.0
+    if CONFIG['latency_sigma'] <= 0:
+        return CONFIG['latency_ms'] / 1000
+    return _rng.lognormvariate(math.log(CONFIG['latency_ms'] / 1000), CONFIG['latency_sigma'])
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) from a single-range Range header; None if unsatisfiable."""
+    match = re.match(r'bytes=(\d*)-(\d*)$', header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        start, end = max(0, size - int(match.group(2))), size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    return (start, end) if start < size and start <= end else None
+
+class MockDriveHandler(BaseHTTPRequestHandler):
+    """Handles the Drive v3 endpoints, /batch/drive/v3 and /health."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, body: Dict):
+        headers = {'Retry-After': '1'} if status == 429 else {}
+        self._send(status, json.dumps(body).encode(), 'application/json; charset=UTF-8', headers)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path.rstrip('/') == '/health':
+            with _stats_lock:
+                self._send_json(200, {'status': 'ok', 'files': len(_tree['files']), **_stats})
+            return
+
+        time.sleep(sample_latency())
+        error = admit_request()
+        if error:
+            self._send_json(*error)
+        elif params.get('alt') == 'media' and url.path.startswith('/drive/v3/files/'):
+            self._send_media(url.path.rstrip('/').rsplit('/', 1)[1])
+        else:
+            self._send_json(*handle_api('GET', url.path, params))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlsplit(self.path).path.rstrip('/') != '/batch/drive/v3':
+            self._send_json(*drive_error(404, 'notFound', "Not found"))
+            return
+        time.sleep(sample_latency())
+        self._send_batch(body)
+
+    def _send_media(self, file_id: str):
+        with _tree_lock:
+            meta = _tree['files'].get(file_id)
+            path = _tree['paths'].get(file_id)
+        if meta is None:
+            self._send_json(*drive_error(404, 'notFound', f"File not found: {file_id}."))
+            return
+        if meta['mimeType'] == FOLDER_MIME:
+            self._send_json(*drive_error(403, 'fileNotDownloadable', "Only files with binary content can be downloaded"))
+            return
+
+        size = int(meta['size'])
+        start, end, status, headers = 0, size - 1, 200, {'Accept-Ranges': 'bytes'}
+        if self.headers.get('Range'):
+            byte_range = parse_range(self.headers['Range'], size)
+            if byte_range is None:
+                self._send(416, b'', 'text/plain', {'Content-Range': f"bytes */{size}"})
+                return
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        length = end - start + 1
+
+        with _stats_lock:
+            _stats['media'] += 1
+            drop = length > 1 and _rng.random() < CONFIG['drop_rate']
+            if drop:
+                _stats['dropped'] += 1
+        cutoff = _rng.randint(1, length - 1) if drop else length
+
+        self.send_response(status)
+        self.send_header('Content-Type', meta['mimeType'])
+        self.send_header('Content-Length', str(length))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        delay = STREAM_CHUNK / (CONFIG['bandwidth_mbps'] * 1e6) if CONFIG['bandwidth_mbps'] > 0 else 0
+        sent = 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            while sent < cutoff:
+                chunk = f.read(min(STREAM_CHUNK, cutoff - sent))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if delay:
+                    time.sleep(delay * len(chunk) / STREAM_CHUNK)
+        with _stats_lock:
+            _stats['bytes'] += sent
+
+        if drop:
+            # Cut the connection mid-body, as a flaky network would
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+
+    def _send_batch(self, body: bytes):
+        """Answer a multipart/mixed batch; each part is metered and can fail on its own."""
+        content_type = self.headers.get('Content-Type', '')
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = message.get_payload() if message.is_multipart() else []
+        if not parts or len(parts) > MAX_BATCH:
+            self._send_json(*drive_error(400, 'badRequest', f"A batch needs 1 to {MAX_BATCH} requests"))
+            return
+        with _stats_lock:
+            _stats['batches'] += 1
+
+        boundary = f"batch_{_rng.getrandbits(64):016x}"
+        out = io.StringIO()
+        for part in parts:
+            request_line = part.get_payload().lstrip().split('\r\n', 1)[0].split('\n', 1)[0]
+            method, target = request_line.split(' ')[:2]
+            url = urlsplit(target)
+            status, response = admit_request() or handle_api(method, url.path, {k: v[-1] for k, v in parse_qs(url.query).items()})
+            content_id = part.get('Content-ID', '<>')
+            out.write(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                      f"Content-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                      f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+                      f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                      f"{json.dumps(response)}\r\n")
+        out.write(f"--{boundary}--\r\n")
+        self._send(200, out.getvalue().encode(), f"multipart/mixed; boundary={boundary}")
+
+def start_server(fixture: Path, port: int = DEFAULT_PORT, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Load the fixture and serve it on a background thread."""
+    if CONFIG['seed'] is not None:
+        _rng.seed(CONFIG['seed'])
+    _quota.update({'tokens': float(CONFIG['burst']), 'updated': time.monotonic()})
+    load_fixture(fixture)
+
+    server = ThreadingHTTPServer((host, port), MockDriveHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+# --- Fixture and load generator ----------------------------------------------
+
+def synthetic_pdf(text: str, size: int, rng: random.Random) -> bytes:
+    """A one-page PDF showing text, padded with an unreferenced binary stream to about size bytes."""
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    content = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    padding = max(0, size - 700)
+    if padding:
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (padding, rng.randbytes(padding)))
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+def generate_fixture(root: Path, listings: int = 2000, cim_kb: int = 256, seed: int = 42,
+                     first_id: int = 100000) -> List[Dict]:
+    """
+    Build a fixture of listing folders laid out the ways real ones are: the CIM
+    in a Business Summary subfolder, at the top level, a couple of folders down,
+    or missing, next to financials and other documents that are not CIMs.
+    Writes the listing rows (as get_drive_listings returns them, plus the
+    expected CIM) to .listings.json and returns them.
+    """
+    root = Path(root)
+    rng = random.Random(seed)
+    rows = []
+
+    def write(relative: str, data: bytes):
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    for listing_id in range(first_id, first_id + listings):
+        folder = f"Listings/{listing_id} - Business {listing_id}"
+        cim_size = max(1024, int(rng.lognormvariate(math.log(cim_kb * 1024), 0.6)))
+        marker = rng.choice(["SBA Eligible: Yes", "SBA Eligible: No", "SBA Pre-Qualified: Yes"])
+        cim = synthetic_pdf(f"Business {listing_id} - Confidential Business Summary. {marker}", cim_size, rng)
+
+        layout = rng.random()
+        summary_folder = None
+        if layout < 0.6:
+            summary_folder = f"{folder}/Business Summary"
+            cim_path = f"{summary_folder}/Business {listing_id} Business Summary.pdf"
+        elif layout < 0.85:
+            cim_path = f"{folder}/CIM - {listing_id}.pdf"
+        elif layout < 0.95:
+            cim_path = f"{folder}/Marketing/Documents/Confidential Information Memorandum.pdf"
+        else:
+            cim_path = None
+
+        if cim_path:
+            write(cim_path, cim)
+        write(f"{folder}/Financials/P&L 2023.pdf", synthetic_pdf("Profit and loss", 4096, rng))
+        write(f"{folder}/Financials/Balance Sheet.xlsx", rng.randbytes(2048))
+        if rng.random() < 0.5:
+            write(f"{folder}/Photos/storefront.jpg", rng.randbytes(8192))
+
+        folder_id = drive_id(folder)
+        rows.append({
+            'id': listing_id,
+            'name': f"Business {listing_id}",
+            'google_drive_link': f"https://drive.google.com/drive/folders/{folder_id}",
+            'business_summary_folder_id': drive_id(summary_folder) if summary_folder and rng.random() < 0.5 else None,
+            'drive_folder_id': folder_id,
+            'closed_type': rng.choice([1, 2, 0]),
+            'expected_cim': Path(cim_path).name if cim_path else None,
+        })
+        if len(rows) % 1000 == 0:
+            print(f"  Generated {len(rows)}/{listings} listing folders")
+
+    for row in rows:
+        row['status'] = {1: 'sold', 2: 'lost'}.get(row['closed_type'], 'active')
+    (root / LISTINGS_FILE).write_text(json.dumps(rows, indent=1))
+    return rows
+
+def run_load_test(fixture: Path, workers: int, port: int = DEFAULT_PORT, walk: bool = False) -> Dict:
+    """
+    Locate and download every listing's CIM from the mock server through the
+    real pipeline code: drive_crawler + drive_downloader.download_many, or with
+    walk, drive_scheduler.run_listings over process_listing (one folder walk per
+    listing). Downloads land in cims/ under the current directory.
+    """
+    os.environ['DRIVE_API_URL'] = f"http://127.0.0.1:{port}"
+    from download_cims_from_drive import cim_output_path, process_listing, get_credentials, OUTPUT_DIR
+    from drive_scheduler import bucket_stats, run_listings
+    from drive_downloader import download_many, host_limits
+
+    listings = json.loads((Path(fixture) / LISTINGS_FILE).read_text())
+    expected = {row['id']: row['expected_cim'] for row in listings}
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    report = {'listings': len(listings), 'workers': workers, 'mode': 'walk' if walk else 'crawl'}
+    start = time.time()
+
+    if walk:
+        run = run_listings(listings, process_listing, get_credentials(), workers)
+        results = [r for w in run['workers'] for r in w['listings']]
+        located = {r['listing_id']: r['file_name'] for r in results}
+        report['locate_seconds'] = None
+        downloaded = [r for r in results if r.get('downloaded')]
+        megabytes = run['megabytes']
+    else:
+        from drive_crawler import find_cims
+        found = find_cims(listings, get_credentials(), concurrency=workers)
+        report['locate_seconds'] = time.time() - start
+        located = {listing_id: file['name'] if file else None for listing_id, file in found.items()}
+        items = [{'listing_id': listing_id, 'file_id': file['id'], 'path': str(cim_output_path(listing_id, file['name'])),
+                  'md5': file.get('md5Checksum'), 'size': int(file['size']) if file.get('size') else None}
+                 for listing_id, file in found.items() if file]
+        results = download_many(items, workers)
+        downloaded = [r for r in results if r['ok']]
+        megabytes = sum(r['bytes'] for r in results) / 1e6
+
+    elapsed = time.time() - start
+    report.update({
+        'elapsed_seconds': elapsed,
+        'listings_per_min': len(listings) / elapsed * 60 if elapsed else 0,
+        'mb_per_sec': megabytes / elapsed if elapsed else 0,
+        'megabytes': megabytes,
+        'downloaded': len(downloaded),
+        'located_correctly': sum(located.get(lid) == name for lid, name in expected.items() if name),
+        'expected_cims': sum(1 for name in expected.values() if name),
+        'false_positives': sum(1 for lid, name in expected.items() if name is None and located.get(lid)),
+        'client': bucket_stats(),
+        'host_limits': host_limits(),
+        'server': dict(_stats),
+    })
+
+    print("\n" + "=" * 60)
+    print("MOCK DRIVE LOAD TEST SUMMARY")
+    print("=" * 60)
+    print(f"Listings: {len(listings)} with {workers} workers ({report['mode']})")
+    print(f"Elapsed: {elapsed:.1f}s ({report['listings_per_min']:.0f} listings/min, "
+          f"{report['mb_per_sec']:.2f} MB/s, {megabytes:.1f} MB)")
+    if report['locate_seconds'] is not None:
+        print(f"Locate phase: {report['locate_seconds']:.1f}s")
+    print(f"CIMs located correctly: {report['located_correctly']}/{report['expected_cims']}, "
+          f"downloaded: {len(downloaded)}, false positives: {report['false_positives']}")
+    print(f"Client: {report['client']['requests']:.0f} requests, {report['client']['throttled']} rate-limit errors, "
+          f"final rate {report['client']['rate']} req/s; host limits {report['host_limits']}")
+    print(f"Server: {_stats['requests']} requests in {_stats['batches']} batches + direct, "
+          f"{_stats['throttled']} throttled, {_stats['errors']} injected errors, {_stats['dropped']} dropped transfers")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mock Google Drive v3 server')
+    parser.add_argument('command', choices=['generate', 'serve', 'loadtest'])
+    parser.add_argument('--fixture', help='Fixture directory (loadtest default: generated in --workdir)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--listings', type=int, default=2000, help='Listing folders to generate')
+    parser.add_argument('--cim-kb', type=int, default=256, help='Median generated CIM size')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Median request latency')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Lognormal latency spread')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 5xx')
+    parser.add_argument('--error-codes', default='500,503', help='Comma-separated error statuses')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Server quota in requests/s (0 = none)')
+    parser.add_argument('--burst', type=int, default=50)
+    parser.add_argument('--throttle-status', type=int, choices=[403, 429], default=403)
+    parser.add_argument('--bandwidth-mbps', type=float, default=0.0, help='Per-transfer bandwidth cap')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Fraction of transfers cut off partway')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=8, help='Load test: pipeline workers')
+    parser.add_argument('--walk', action='store_true', help='Load test: per-listing folder walk instead of the crawler')
+    parser.add_argument('--workdir', help='Load test: working directory for cims/ and cache/ (default: a temp dir)')
+    args = parser.parse_args()
+
+    CONFIG.update({
+        'latency_ms': args.latency_ms,
+        'latency_sigma': args.latency_sigma,
+        'error_rate': args.error_rate,
+        'error_codes': [int(code) for code in args.error_codes.split(',') if code],
+        'rate_limit': args.rate_limit,
+        'burst': args.burst,
+        'throttle_status': args.throttle_status,
+        'bandwidth_mbps': args.bandwidth_mbps,
+        'drop_rate': args.drop_rate,
+        'seed': args.seed,
+    })
+
+    if args.command == 'generate':
+        if not args.fixture:
+            parser.error('generate needs --fixture')
+        rows = generate_fixture(Path(args.fixture), args.listings, args.cim_kb, seed=args.seed or 42)
+        print(f"Wrote {len(rows)} listing folders to {args.fixture} (listing rows in {LISTINGS_FILE})")
+        sys.exit(0)
+
+    if args.command == 'loadtest':
+        # Run in a scratch directory so cims/, cache/ and the catalog stay out of the real tree
+        workdir = Path(args.workdir or tempfile.mkdtemp(prefix='mock_drive_'))
+        workdir.mkdir(parents=True, exist_ok=True)
+        fixture = Path(args.fixture).resolve() if args.fixture else workdir / 'fixture'
+        os.chdir(workdir)
+        if not (fixture / LISTINGS_FILE).exists():
+            print(f"Generating {args.listings} listing folders in {fixture}...")
+            generate_fixture(fixture, args.listings, args.cim_kb, seed=args.seed or 42)
+        server = start_server(fixture, args.port)
+        print(f"Mock Drive server on http://127.0.0.1:{args.port} serving {len(_tree['files'])} items; workdir {workdir}")
+        report = run_load_test(fixture, args.workers, args.port, args.walk)
+        server.shutdown()
+        with open('drive_loadtest_results.json', 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {workdir / 'drive_loadtest_results.json'}")
+        sys.exit(0)
+
+    if not args.fixture:
+        parser.error('serve needs --fixture')
+    server = start_server(Path(args.fixture), args.port)
+    print(f"Mock Drive server on http://127.0.0.1:{args.port} serving {len(_tree['files'])} items from {args.fixture}")
+    print(f"Point the pipeline at it with: export DRIVE_API_URL=http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\nMock server stopped")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible mock server for offline runs and load tests of the CIM pipeline.
+Serves /v1/chat/completions from canned or recorded responses, falling back to a
+synthetic SBA answer derived from the document text. Latency and error rates are
+configurable so retries and throughput can be exercised without an API key.
+
+Usage:
+    python3 mock_llm_server.py serve --port 8089 --latency-ms 800 --error-rate 0.02
+    python3 mock_llm_server.py loadtest --documents 10000 --concurrency 32
+"""
+
+import re
+import math
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+
+from llm_provider import request_key
+
+DEFAULT_PORT = 8089
+
+# Server behaviour, set from the command line
+CONFIG = {
+    'latency_ms': 0.0,  # Median latency per response
+    'latency_sigma': 0.5,  # Lognormal shape; 0 gives a fixed latency
+    'error_rate': 0.0,  # Fraction of requests answered with an error status
+    'error_codes': [429, 500, 503],
+    'seed': None,
+}
+
+# Responses loaded with --responses
+RECORDED = {}  # request_key -> response body
+CANNED = []  # [(compiled pattern, response body)]
+
+_stats = {'requests': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+_rng = random.Random()
+
+SBA_PATTERN = re.compile(r'SBA\s*(?:Pre-?)?(?:Eligible|Qualified)\s*[:\-]?\s*(Yes|No)', re.IGNORECASE)
+
+def load_responses(path: str):
+    """
+    Load canned or recorded responses.
+
+    The file is JSON (a list) or JSONL. Entries with a "request" field are recorded
+    pairs and are replayed for an identical request. Entries with a "match" regex
+    are returned for any request whose prompt matches. Either kind supplies the
+    reply as a full "response" body or just its "content".
+    """
+    text = Path(path).read_text()
+    stripped = text.lstrip()
+    entries = json.loads(text) if stripped.startswith('[') else [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    for entry in entries:
+        body = entry.get('response') or completion_body(entry.get('content', ''), entry.get('model', 'mock'))
+        if 'request' in entry:
+            RECORDED[request_key(entry['request'])] = body
+        elif 'match' in entry:
+            CANNED.append((re.compile(entry['match'], re.IGNORECASE | re.DOTALL), body))
+
+    print(f"Loaded {len(RECORDED)} recorded and {len(CANNED)} canned responses from {path}")
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def completion_body(content, model: str, prompt_tokens: int = 0) -> Dict:
+    """Wrap assistant content in an OpenAI chat-completion response body."""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return {
+        "id": f"mock-{_rng.getrandbits(48):012x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(content),
+            "total_tokens": prompt_tokens + estimate_tokens(content)
+        }
+    }
+
+def synthetic_answer(prompt: str) -> Dict:
+    """Answer in whichever schema the prompt asks for, based on SBA markers in the text."""
+    match = SBA_PATTERN.search(prompt)
+    eligible = match.group(1).lower() if match else None
+
+    if '"sba_eligible"' in prompt:
+        listing_id = re.search(r'"listing_id":\s*(\d+)', prompt)
+        return {
+            "listing_id": int(listing_id.group(1)) if listing_id else 0,
+            "sba_eligible": eligible or "unknown",
+            "sba_evidence": match.group(0) if match else "not found",
+            "seller_location": "unknown",
+            "asking_price": 0,
+            "sde": 0
+        }
+
+    status = {'yes': 'qualified', 'no': 'not_qualified'}.get(eligible, 'undetermined')
+    return {
+        "sba_status": status,
+        "confidence": 0.95 if match else 0.2,
+        "evidence": [match.group(0)] if match else [],
+        "page_numbers": []
+    }
+
+def build_response(payload: Dict) -> Dict:
+    """Pick the recorded, canned or synthetic response for a request."""
+    prompt = '\n'.join(m.get('content', '') for m in payload.get('messages', []))
+    prompt_tokens = estimate_tokens(prompt)
+    model = payload.get('model', 'mock')
+
+    recorded = RECORDED.get(request_key(payload))
+    if recorded:
+        return recorded
+
+    for pattern, body in CANNED:
+        if pattern.search(prompt):
+            return body
+
+    return completion_body(synthetic_answer(prompt), model, prompt_tokens)
+
+def sample_latency() -> float:
+    """Seconds to wait before answering."""
+    if CONFIG['latency_ms'] <= 0:
+        return 0.0
+    if CONFIG['latency_sigma'] <= 0:
+        return CONFIG['latency_ms'] / 1000
+    return _rng.lognormvariate(math.log(CONFIG['latency_ms'] / 1000), CONFIG['latency_sigma'])
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Handles /v1/chat/completions and /health."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+    def _send_json(self, status: int, body: Dict, headers: Dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/health':
+            with _stats_lock:
+                self._send_json(200, {"status": "ok", **_stats})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        time.sleep(sample_latency())
+
+        with _stats_lock:
+            _stats['requests'] += 1
+            fail = _rng.random() < CONFIG['error_rate']
+            if fail:
+                _stats['errors'] += 1
+
+        if fail:
+            status = _rng.choice(CONFIG['error_codes'])
+            headers = {'Retry-After': '0.1'} if status == 429 else {}
+            self._send_json(status, {"error": {"message": "Injected mock error", "code": status}}, headers)
+            return
+
+        self._send_json(200, build_response(payload))
+
+def start_server(port: int = DEFAULT_PORT, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Start the mock server on a background thread and return it."""
+    if CONFIG['seed'] is not None:
+        _rng.seed(CONFIG['seed'])
+
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def synthetic_cim(index: int, rng: random.Random, max_pages: int = 40) -> str:
+    """Generate CIM-like text with a randomly placed SBA marker."""
+    filler = ("The business sells consumer products online through its own store and Amazon. "
+              "Revenue has grown steadily and the owner works part time. ") * 25
+    pages = rng.randint(5, max_pages)
+    marker_page = rng.randint(1, pages)
+    marker = rng.choice(["SBA Eligible: Yes", "SBA Eligible: No", None])
+
+    text = ""
+    for page in range(1, pages + 1):
+        text += f"\n--- Page {page} ---\n"
+        if marker and page == marker_page:
+            text += f"Financial Quickview\n{marker}\n"
+        text += filler
+    return text
+
+def run_load_test(documents: int, concurrency: int, port: int = DEFAULT_PORT, seed: int = 42) -> Dict:
+    """
+    Push synthetic CIMs through the Grok full-CIM analysis against the mock server.
+    Exercises chunking, the provider retries and the JSON handling end to end.
+    Calls are ledgered to a scratch file so mock traffic never lands in the
+    production cost ledger.
+    """
+    import os
+    import tempfile
+    import llm_telemetry
+    os.environ['LLM_BASE_URL'] = f"http://127.0.0.1:{port}/v1"
+    ledger_dir = tempfile.mkdtemp(prefix='mock_ledger_')
+    os.environ['LLM_LEDGER_FILE'] = os.path.join(ledger_dir, 'llm_ledger.jsonl')
+    # The ledger path is read at import, and llm_provider is already loaded
+    production_ledger = llm_telemetry.LEDGER_FILE
+    llm_telemetry.LEDGER_FILE = Path(os.environ['LLM_LEDGER_FILE'])
+    from process_cims_with_grok import analyze_full_cim
+
+    rng = random.Random(seed)
+    texts = [synthetic_cim(i, rng) for i in range(documents)]
+
+    latencies = []
+    statuses = {}
+    start = time.time()
+
+    def run_one(text):
+        t0 = time.time()
+        result = analyze_full_cim(text)
+        return result, time.time() - t0
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(run_one, text) for text in texts]
+            for completed, future in enumerate(as_completed(futures), 1):
+                result, elapsed = future.result()
+                latencies.append(elapsed)
+                status = result.get('sba_status', 'unknown')
+                statuses[status] = statuses.get(status, 0) + 1
+                if completed % 500 == 0:
+                    print(f"  {completed}/{documents} documents ({completed / (time.time() - start):.1f} docs/s)")
+    finally:
+        llm_telemetry.LEDGER_FILE = production_ledger
+
+    elapsed = time.time() - start
+    latencies = np.array(latencies)
+    report = {
+        'documents': documents,
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        'documents_per_second': documents / elapsed if elapsed else 0,
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'latency_p99': float(np.percentile(latencies, 99)),
+        'status_counts': statuses,
+        'server': dict(_stats),
+        'ledger': os.environ['LLM_LEDGER_FILE'],
+    }
+
+    print("\n" + "=" * 60)
+    print("MOCK LOAD TEST SUMMARY")
+    print("=" * 60)
+    print(f"Documents: {documents} at concurrency {concurrency}")
+    print(f"Elapsed: {elapsed:.1f}s ({report['documents_per_second']:.1f} docs/s)")
+    print(f"Per-document latency p50/p95/p99: {report['latency_p50']:.2f}s / "
+          f"{report['latency_p95']:.2f}s / {report['latency_p99']:.2f}s")
+    print(f"Server requests: {_stats['requests']} ({_stats['errors']} injected errors)")
+    print(f"Status counts: {statuses}")
+    print(f"Mock ledger: {report['ledger']}")
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible LLM server')
+    parser.add_argument('command', choices=['serve', 'loadtest'])
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--responses', help='JSON/JSONL file of canned or recorded responses')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Median response latency')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Lognormal latency spread')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-codes', default='429,500,503', help='Comma-separated error statuses')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--documents', type=int, default=10000, help='Load test: number of documents')
+    parser.add_argument('--concurrency', type=int, default=32, help='Load test: parallel documents')
+
+    args = parser.parse_args()
+
+    CONFIG.update({
+        'latency_ms': args.latency_ms,
+        'latency_sigma': args.latency_sigma,
+        'error_rate': args.error_rate,
+        'error_codes': [int(code) for code in args.error_codes.split(',') if code],
+        'seed': args.seed,
+    })
+    if args.responses:
+        load_responses(args.responses)
+
+    server = start_server(args.port)
+    print(f"Mock LLM server listening on http://127.0.0.1:{args.port}/v1")
+
+    if args.command == 'loadtest':
+        run_load_test(args.documents, args.concurrency, args.port, seed=args.seed or 42)
+        server.shutdown()
+        sys.exit(0)
+
+    print(f"Point the pipeline at it with: export LLM_BASE_URL=http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\nMock server stopped")
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Vectorized asking price, SDE and multiple for every listing at once.
+
+The multiples scripts used to pick each listing's asking price and SDE with
+row-wise df.apply calls that parse the custom-field strings one value at a
+time, then look every listing up in Python lists of SBA / non-SBA IDs, which
+is O(listings x classified listings). Here the same rules are column
+operations:
+
+1. clean_money() strips '$' and ',' from a whole column and converts it with
+   pd.to_numeric (unparseable, zero and negative values become NaN)
+2. coalesce_positive() takes the first positive value in priority order with
+   np.where: the custom field, then *_at_close, then capsule_expected_value for
+   the asking price; the custom field, then sde_at_close for SDE
+3. the multiple is asking price / SDE where both are positive
+4. attach_sba_status() merges the fact table's sba_status on listing ID as a
+   categorical column; unmatched listings get the script's default status
+
+legacy_multiples() keeps the original row-wise rules for --verify and
+--benchmark.
+
+Usage:
+    python3 multiples_engine.py --benchmark 100000   # Synthetic listings, vectorized vs. row-wise
+    python3 multiples_engine.py --verify 5000        # Compare with the row-wise rules
+"""
+
+import argparse
+import time
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+ASKING_SOURCES = ['asking', 'asking_at_close', 'capsule_expected_value']
+SDE_SOURCES = ['cashflow', 'sde_at_close']
+STATUSES = ['yes', 'no', 'unknown', 'not_classified']
+VALID_RANGE = (0.5, 10)  # Exclusive bounds for a plausible multiple
+LEGACY_SAMPLE = 5000  # Row-wise rules are timed on at most this many listings
+
+def clean_money(values) -> np.ndarray:
+    """'$1,250,000'-style strings, numbers or Decimals as floats; NaN unless positive."""
+    series = pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.astype(str).str.replace(',', '', regex=False).str.replace('$', '', regex=False)
+    cleaned = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+    return np.where(cleaned > 0, cleaned, np.nan)
+
+def coalesce_positive(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """First positive value across columns, in priority order; columns df lacks are skipped."""
+    result = np.full(len(df), np.nan)
+    for column in reversed([c for c in columns if c in df.columns]):
+        values = clean_money(df[column].to_numpy())
+        result = np.where(np.isnan(values), result, values)
+    return result
+
+def compute_multiples(df: pd.DataFrame, asking_sources: Sequence[str] = ASKING_SOURCES,
+                      sde_sources: Sequence[str] = SDE_SOURCES) -> pd.DataFrame:
+    """Add asking_price, sde and multiple columns to df."""
+    df['asking_price'] = coalesce_positive(df, asking_sources)
+    df['sde'] = coalesce_positive(df, sde_sources)
+    df['multiple'] = df['asking_price'].to_numpy() / df['sde'].to_numpy()  # NaN unless both are positive
+    return df
+
+def attach_sba_status(df: pd.DataFrame, classification: pd.DataFrame,
+                      default: str = 'not_classified') -> pd.DataFrame:
+    """Add sba_status from classification (id, sba_status) by a merge on id."""
+    status = classification[['id', 'sba_status']].drop_duplicates('id')
+    status = status.astype({'id': df['id'].dtype,
+                            'sba_status': pd.CategoricalDtype(STATUSES)})
+    merged = df.drop(columns='sba_status', errors='ignore').merge(status, on='id', how='left')
+    merged['sba_status'] = merged['sba_status'].fillna(default)
+    return merged
+
+def valid_multiples(df: pd.DataFrame, low: float = VALID_RANGE[0], high: float = VALID_RANGE[1]) -> pd.DataFrame:
+    return df[(df['multiple'] > low) & (df['multiple'] < high)].copy()
+
+# --- Row-wise reference ------------------------------------------------------
+
+def legacy_multiples(df: pd.DataFrame, classification: pd.DataFrame,
+                     asking_sources: Sequence[str] = ASKING_SOURCES, sde_sources: Sequence[str] = SDE_SOURCES,
+                     default: str = 'not_classified') -> pd.DataFrame:
+    """The original df.apply / list-membership rules from final_multiples_analysis."""
+    def first_positive(row, columns):
+        for column in columns:
+            if pd.notna(row.get(column)):
+                try:
+                    val = float(str(row[column]).replace(',', '').replace('$', ''))
+                    if val > 0:
+                        return val
+                except:
+                    pass
+        return None
+
+    status_ids = {status: classification[classification['sba_status'] == status]['id'].tolist()
+                  for status in STATUSES[:3]}
+
+    def get_sba_status(listing_id):
+        for status, ids in status_ids.items():
+            if listing_id in ids:
+                return status
+        return default
+
+    df = df.copy()
+    df['asking_price'] = df.apply(lambda row: first_positive(row, asking_sources), axis=1)
+    df['sde'] = df.apply(lambda row: first_positive(row, sde_sources), axis=1)
+    df['multiple'] = df.apply(
+        lambda row: row['asking_price'] / row['sde']
+        if pd.notna(row['sde']) and row['sde'] > 0 and pd.notna(row['asking_price']) and row['asking_price'] > 0
+        else None,
+        axis=1
+    )
+    df['sba_status'] = df['id'].apply(get_sba_status)
+    return df
+
+# --- Synthetic data ----------------------------------------------------------
+
+def synthetic_listings(listings: int, seed: int = 42):
+    """Listing rows shaped like final_multiples_analysis's query, plus a fact-table classification."""
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(np.arange(1, listings * 2))[:listings].astype(np.int64)
+    sde = np.round(rng.lognormal(12.5, 0.8, listings), -2)
+    asking = np.round(sde * rng.uniform(0.3, 12, listings), -3)
+
+    def sparse(values, present):
+        return np.where(rng.random(listings) < present, values, np.nan)
+
+    def as_text(values):
+        text = pd.Series([f'${v:,.0f}' for v in values], dtype=object)
+        text[np.isnan(values)] = None
+        junk = rng.random(listings)
+        text[junk < 0.03] = 'N/A'
+        text[(junk >= 0.03) & (junk < 0.05)] = ''
+        text[(junk >= 0.05) & (junk < 0.06)] = '0'
+        return text
+
+    df = pd.DataFrame({
+        'id': ids,
+        'name': [f'Listing {i}' for i in ids],
+        'capsule_expected_value': sparse(asking * 1.05, 0.6),
+        'asking_at_close': sparse(np.where(rng.random(listings) < 0.05, 0, asking), 0.5),
+        'sde_at_close': sparse(sde, 0.5),
+        'revenue_at_close': sparse(sde * 4, 0.5),
+        'cashflow': as_text(sparse(sde * 1.02, 0.6)),
+        'asking': as_text(sparse(asking, 0.6)),
+    })
+    classified = rng.random(listings) < 0.7
+    classification = pd.DataFrame({
+        'id': ids[classified],
+        'sba_status': rng.choice(STATUSES[:3], classified.sum(), p=[0.4, 0.45, 0.15]),
+    })
+    return df, classification
+
+def _mismatches(vectorized: pd.DataFrame, legacy: pd.DataFrame) -> pd.Series:
+    """Rows where the two implementations disagree."""
+    wrong = pd.Series(False, index=legacy.index)
+    for column in ['asking_price', 'sde', 'multiple']:
+        a = vectorized[column].to_numpy(dtype=float)
+        b = pd.to_numeric(legacy[column]).to_numpy(dtype=float)
+        wrong |= ~(np.isclose(a, b) | (np.isnan(a) & np.isnan(b)))
+    wrong |= vectorized['sba_status'].astype(str).to_numpy() != legacy['sba_status'].to_numpy()
+    return wrong
+
+def verify(listings: int, seed: int = 42) -> int:
+    df, classification = synthetic_listings(listings, seed)
+    vectorized = attach_sba_status(compute_multiples(df.copy()), classification)
+    legacy = legacy_multiples(df, classification)
+    wrong = _mismatches(vectorized, legacy)
+    print(f"{listings:,} listings: {int(wrong.sum())} mismatches")
+    if wrong.any():
+        print(pd.concat([vectorized[wrong].head(), legacy[wrong].head()]).to_string())
+    return int(wrong.sum())
+
+def benchmark(listings: int, seed: int = 42):
+    df, classification = synthetic_listings(listings, seed)
+    print(f"{listings:,} listings, {len(classification):,} classified")
+
+    start = time.perf_counter()
+    vectorized = attach_sba_status(compute_multiples(df.copy()), classification)
+    valid = valid_multiples(vectorized)
+    elapsed = time.perf_counter() - start
+    print(f"vectorized: {elapsed:.3f}s ({listings / elapsed:,.0f} listings/s), {len(valid):,} valid multiples")
+
+    # Status lookups scan the full ID lists, so the sample keeps the whole classification
+    sample = min(listings, LEGACY_SAMPLE)
+    start = time.perf_counter()
+    legacy = legacy_multiples(df.head(sample), classification)
+    legacy_elapsed = time.perf_counter() - start
+    print(f"row-wise:   {legacy_elapsed:.3f}s for {sample:,} listings ({sample / legacy_elapsed:,.0f} listings/s); "
+          f"~{legacy_elapsed * listings / sample:,.0f}s for {listings:,}")
+    print(f"Speedup: ~{legacy_elapsed * listings / sample / elapsed:,.0f}x; "
+          f"mismatches in the sample: {int(_mismatches(vectorized.head(sample), legacy).sum())}")
+    print(valid.groupby('sba_status', observed=True)['multiple'].median().round(2).to_string())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Vectorized listing multiples')
+    parser.add_argument('--benchmark', type=int, metavar='LISTINGS', help='Time vectorized vs. row-wise on synthetic listings')
+    parser.add_argument('--verify', type=int, metavar='LISTINGS', help='Check against the row-wise rules')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.verify:
+        raise SystemExit(1 if verify(args.verify, args.seed) else 0)
+    benchmark(args.benchmark or 100000, args.seed)
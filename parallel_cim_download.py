@@ -1,18 +1,17 @@
 #!/usr/bin/env python3
 """
-Parallel CIM downloader - runs multiple download processes to speed up bulk downloads.
+Parallel CIM downloader - runs multiple download workers to speed up bulk downloads.
+Workers are threads sharing one Drive quota budget (see drive_scheduler.py).
 """
 
-import os
 import sys
 import time
 import json
-import subprocess
 from pathlib import Path
 from typing import List, Dict
 import pymysql
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import re
+
+from cim_catalog import existing_listing_ids
 
 def get_db_connection():
     return pymysql.connect(
@@ -26,16 +25,8 @@ def get_db_connection():
     )
 
 def get_existing_cim_ids() -> set:
-    """Get listing IDs for CIMs we already have."""
-    cims_dir = Path('cims')
-    cim_listing_ids = set()
-    
-    for f in cims_dir.glob('*.pdf'):
-        match = re.match(r'^(\d+)[_\-]', f.name)
-        if match:
-            cim_listing_ids.add(int(match.group(1)))
-    
-    return cim_listing_ids
+    """Get listing IDs for CIMs we already have (from the CIM catalog)."""
+    return existing_listing_ids(Path('cims'))
 
 def get_all_downloadable_listings() -> List[int]:
     """Get all listing IDs that have Drive folders and we don't have CIMs for."""
@@ -65,85 +56,41 @@ def get_all_downloadable_listings() -> List[int]:
     
     return missing_ids
 
-def download_batch(batch_ids: List[int], worker_id: int) -> Dict:
-    """Download a batch of CIMs using the main download script."""
-    from download_cims_from_drive import (
-        get_listings_to_download, 
-        process_listing,
-        SERVICE_ACCOUNT_FILE,
-        SCOPES,
-        OUTPUT_DIR
-    )
-    from google.oauth2 import service_account
-    from googleapiclient.discovery import build
+def get_listing_rows(listing_ids: List[int]) -> List[Dict]:
+    """Full listing data for the given IDs, in the same order."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
-    results = {
-        'worker_id': worker_id,
-        'total': len(batch_ids),
-        'successful': 0,
-        'failed': 0,
-        'listings': []
-    }
+    cursor.execute(f"""
+        SELECT 
+            l.id,
+            l.name,
+            l.google_drive_link,
+            l.business_summary_folder_id,
+            l.drive_folder_id,
+            l.closed_type,
+            CASE
+                WHEN l.closed_type = 1 THEN 'sold'
+                WHEN l.closed_type = 2 THEN 'lost'
+                ELSE 'active'
+            END as status
+        FROM listings l
+        WHERE l.id IN ({','.join(map(str, listing_ids))})
+    """)
     
-    try:
-        # Set up Drive API for this worker
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES
-        )
-        service = build('drive', 'v3', credentials=credentials)
-        
-        # Get full listing data for our batch
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            SELECT 
-                l.id,
-                l.name,
-                l.google_drive_link,
-                l.business_summary_folder_id,
-                l.drive_folder_id,
-                l.closed_type,
-                CASE
-                    WHEN l.closed_type = 1 THEN 'sold'
-                    WHEN l.closed_type = 2 THEN 'lost'
-                    ELSE 'active'
-                END as status
-            FROM listings l
-            WHERE l.id IN ({','.join(map(str, batch_ids))})
-        """)
-        
-        listings = cursor.fetchall()
-        conn.close()
-        
-        # Process each listing
-        for i, listing in enumerate(listings):
-            try:
-                print(f"[Worker {worker_id}] Processing {i+1}/{len(listings)}: {listing['id']}")
-                result = process_listing(service, listing)
-                
-                if result['downloaded']:
-                    results['successful'] += 1
-                else:
-                    results['failed'] += 1
-                    
-                results['listings'].append(result)
-                
-                # Small delay to avoid rate limits
-                time.sleep(0.5)
-                
-            except Exception as e:
-                print(f"[Worker {worker_id}] Error processing {listing['id']}: {e}")
-                results['failed'] += 1
-                
-    except Exception as e:
-        print(f"[Worker {worker_id}] Fatal error: {e}")
-        results['error'] = str(e)
+    rows = {row['id']: row for row in cursor.fetchall()}
+    conn.close()
     
-    return results
+    return [rows[lid] for lid in listing_ids if lid in rows]
 
 def parallel_download(total_limit: int = 100, workers: int = 3):
-    """Download CIMs in parallel using multiple workers."""
+    """
+    Download CIMs in parallel worker threads fed from one shared queue.
+    Drive requests from all workers share drive_scheduler's token bucket, which
+    backs off on rate-limit errors, so more workers help until the quota is hit.
+    """
+    from download_cims_from_drive import process_listing, get_credentials, OUTPUT_DIR
+    from drive_scheduler import run_listings
     
     print(f"Starting parallel download with {workers} workers")
     print("="*60)
@@ -161,37 +108,19 @@ def parallel_download(total_limit: int = 100, workers: int = 3):
     
     print(f"Found {len(missing_ids)} CIMs to download")
     
-    # Split into batches for workers
-    batch_size = len(missing_ids) // workers + 1
-    batches = []
-    for i in range(0, len(missing_ids), batch_size):
-        batch = missing_ids[i:i+batch_size]
-        if batch:
-            batches.append(batch)
-    
-    print(f"Split into {len(batches)} batches (~{batch_size} each)")
+    # One DB query and one set of credentials for all workers
+    listings = get_listing_rows(missing_ids)
+    OUTPUT_DIR.mkdir(exist_ok=True)
     
     # Run parallel downloads
-    start_time = time.time()
-    all_results = []
+    run = run_listings(listings, process_listing, get_credentials(), workers)
+    all_results = run['workers']
     
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = {
-            executor.submit(download_batch, batch, i): i 
-            for i, batch in enumerate(batches)
-        }
-        
-        for future in as_completed(futures):
-            worker_id = futures[future]
-            try:
-                result = future.result()
-                all_results.append(result)
-                print(f"\n[Worker {worker_id}] Completed: {result['successful']} successful, {result['failed']} failed")
-            except Exception as e:
-                print(f"\n[Worker {worker_id}] Failed: {e}")
+    for result in all_results:
+        print(f"\n[Worker {result['worker_id']}] Completed: {result['successful']} successful, {result['failed']} failed")
     
     # Summarize results
-    elapsed = time.time() - start_time
+    elapsed = run['elapsed']
     total_successful = sum(r['successful'] for r in all_results)
     total_failed = sum(r['failed'] for r in all_results)
     
@@ -201,12 +130,15 @@ def parallel_download(total_limit: int = 100, workers: int = 3):
     print(f"Time elapsed: {elapsed:.1f} seconds")
     print(f"Total successful: {total_successful}")
     print(f"Total failed: {total_failed}")
-    print(f"Success rate: {total_successful/(total_successful+total_failed)*100:.1f}%")
+    print(f"Success rate: {total_successful/max(1, total_successful+total_failed)*100:.1f}%")
     print(f"Downloads per second: {total_successful/elapsed:.2f}")
+    print(f"Throughput: {run['listings_per_min']:.1f} listings/min, {run['mb_per_sec']:.2f} MB/s ({run['megabytes']:.1f} MB)")
+    print(f"Drive API: {run['api_requests']:.0f} requests, {run['api_throttled']} rate-limit errors, "
+          f"final rate {run['api_rate']} req/s")
     
     # Save detailed results
     with open('parallel_download_results.json', 'w') as f:
-        json.dump(all_results, f, indent=2, default=str)
+        json.dump(run, f, indent=2, default=str)
     
     print("\nDetailed results saved to parallel_download_results.json")
 
@@ -240,8 +172,9 @@ if __name__ == "__main__":
         except KeyboardInterrupt:
             print("\nMonitoring stopped")
     else:
-        # Check service account exists
-        if not os.path.exists('service_account.json'):
+        # Check service account exists (or DRIVE_API_URL points at a stand-in)
+        from download_cims_from_drive import has_drive_access
+        if not has_drive_access():
             print("ERROR: service_account.json not found!")
             sys.exit(1)
         
@@ -16,15 +16,15 @@ import hashlib
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import PyPDF2
-import openai
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import pymysql
 import pandas as pd
 from datetime import datetime
 import time
+from llm_provider import chat_completion, parse_json_content
+from llm_telemetry import record_cache_hit
 
 # Configuration
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 CACHE_DIR = Path('cache/sba_analysis')
 CIMS_DIR = Path('/Users/markdaoust/Developer/ql_stats/cims')
 MAX_WORKERS = 3  # Parallel processing threads
@@ -33,9 +33,6 @@ RATE_LIMIT_DELAY = 1  # Seconds between API calls
 # Create cache directory
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-# Initialize OpenAI
-openai.api_key = OPENAI_API_KEY
-
 def get_db_connection():
     return pymysql.connect(
         host='127.0.0.1',
@@ -96,7 +93,7 @@ def extract_pdf_text(pdf_path: str, max_pages: int = None) -> Tuple[str, int]:
         print(f"Error reading PDF {pdf_path}: {e}")
         return "", 0
 
-def analyze_with_openai(text: str, prompt_template: str) -> Dict:
+def analyze_with_openai(text: str, prompt_template: str, stage: str = None) -> Dict:
     """Send text to OpenAI for analysis."""
     try:
         # Limit text length to avoid token limits
@@ -104,22 +101,20 @@ def analyze_with_openai(text: str, prompt_template: str) -> Dict:
         if len(text) > max_chars:
             text = text[:max_chars] + "\n[Text truncated for analysis]"
         
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert at analyzing business documents for SBA loan qualification indicators."},
-                {"role": "user", "content": prompt_template.format(content=text)}
-            ],
-            temperature=0.1,
-            max_tokens=500
-        )
+        messages = [
+            {"role": "system", "content": "You are an expert at analyzing business documents for SBA loan qualification indicators."},
+            {"role": "user", "content": prompt_template.format(content=text)}
+        ]
         
-        result_text = response.choices[0].message.content
+        response = chat_completion(messages, provider='openai',
+                                   temperature=0.1, max_tokens=500, stage=stage)
+        result_text = response['content']
         
         # Try to parse as JSON
-        try:
-            return json.loads(result_text)
-        except json.JSONDecodeError:
+        parsed = parse_json_content(result_text)
+        if parsed is not None:
+            return parsed
+        else:
             # Fallback to text parsing
             return {
                 "sba_status": "undetermined",
@@ -179,7 +174,7 @@ def analyze_executive_summary(pdf_text: str) -> Dict:
     {content}
     """
     
-    return analyze_with_openai(exec_summary, prompt)
+    return analyze_with_openai(exec_summary, prompt, stage="exec_summary")
 
 def analyze_full_cim(pdf_text: str) -> Dict:
     """Analyze full CIM for SBA indicators if Executive Summary is inconclusive."""
@@ -226,7 +221,7 @@ def analyze_full_cim(pdf_text: str) -> Dict:
     {content}
     """
     
-    return analyze_with_openai(pdf_text, prompt)
+    return analyze_with_openai(pdf_text, prompt, stage="full_cim")
 
 def check_database_title(listing_id: int) -> Dict:
     """Check if listing title in database indicates SBA status."""
@@ -270,6 +265,7 @@ def process_single_cim(cim_path: Path) -> Dict:
     cached = load_from_cache(str(cim_path))
     if cached:
         print(f"Using cached result for {cim_path.name}")
+        record_cache_hit("result_cache", "gpt-4")
         return cached
     
     print(f"Processing {cim_path.name} (ID: {listing_id})")
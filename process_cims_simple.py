@@ -6,41 +6,55 @@ Uses Grok API with better JSON handling.
 
 import os
 import json
-import re
 import time
 from pathlib import Path
 from typing import Dict, Optional, Tuple, List
 import PyPDF2
-import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from cim_chunking import count_tokens, map_reduce, reduce_sba_eligible
+from llm_provider import chat_completion, parse_json_content
+from llm_telemetry import record_cache_hit
+from sba_classifier import classify_text
+from cim_catalog import parse_listing_id, catalog_files
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-GROK_API_KEY = os.getenv('GROK_API_KEY')
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"
-
 # Paths
 CIM_DIR = Path('/Users/markdaoust/Developer/ql_stats/cims')
 CACHE_DIR = Path('/Users/markdaoust/Developer/ql_stats/.cache/cim_analysis')
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Token budget per Grok call (prompt + document chunk)
+MAX_CONTEXT_TOKENS = 4500
+MAX_CHUNK_WORKERS = 4
+SYSTEM_PROMPT = "You are analyzing business documents. Return ONLY valid JSON with no additional text or formatting."
+
+PROMPT_TEMPLATE = """Analyze this business document excerpt for SBA loan eligibility.
+
+Look specifically for:
+1. A "Financial Quickview" or similar table with "SBA Eligible" field
+2. Direct statements about SBA qualification/eligibility
+3. Mentions that seller is in Canada (which disqualifies SBA)
+
+Document text:
+{text}
+
+Respond with ONLY a JSON object (no markdown, no explanation) in this exact format:
+{{
+  "listing_id": {listing_id},
+  "sba_eligible": "yes|no|unknown",
+  "sba_evidence": "quote from document or 'not found'",
+  "seller_location": "location if mentioned or unknown",
+  "asking_price": 0,
+  "sde": 0
+}}"""
+
 def extract_listing_id(filename: str) -> Optional[int]:
     """Extract listing ID from CIM filename."""
-    # Try different patterns
-    patterns = [
-        r'^(\d+)[_\-]',  # 12345_business_name.pdf
-        r'^listing[_\-](\d+)',  # listing_12345_name.pdf
-        r'[_\-](\d+)[_\-]',  # business_12345_name.pdf
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, filename, re.IGNORECASE)
-        if match:
-            return int(match.group(1))
-    return None
+    return parse_listing_id(filename)
 
 def extract_executive_summary(pdf_path: str) -> str:
     """Extract first 8 pages which usually contain Executive Summary and Financial Quickview."""
@@ -64,100 +78,31 @@ def extract_executive_summary(pdf_path: str) -> str:
         print(f"Error reading PDF {pdf_path}: {e}")
         return ""
 
-def analyze_with_grok(text: str, listing_id: int) -> Dict:
-    """Send text to Grok for SBA analysis with improved JSON handling."""
+def call_grok(text: str, listing_id: int) -> Dict:
+    """Send a single chunk of text to Grok for SBA analysis with improved JSON handling."""
     
-    # Simple, focused prompt
-    prompt = """Analyze this business document excerpt for SBA loan eligibility.
-
-Look specifically for:
-1. A "Financial Quickview" or similar table with "SBA Eligible" field
-2. Direct statements about SBA qualification/eligibility
-3. Mentions that seller is in Canada (which disqualifies SBA)
-
-Document text:
-{text}
-
-Respond with ONLY a JSON object (no markdown, no explanation) in this exact format:
-{{
-  "listing_id": {listing_id},
-  "sba_eligible": "yes|no|unknown",
-  "sba_evidence": "quote from document or 'not found'",
-  "seller_location": "location if mentioned or unknown",
-  "asking_price": 0,
-  "sde": 0
-}}"""
-
     try:
-        headers = {
-            "Authorization": f"Bearer {GROK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # Use grok-2-1212 as the model name
-        data = {
-            "model": "grok-2-1212",
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": "You are analyzing business documents. Return ONLY valid JSON with no additional text or formatting."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt.format(text=text[:15000], listing_id=listing_id)  # Limit text
-                }
-            ],
-            "temperature": 0.1,
-            "max_tokens": 500
-        }
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": PROMPT_TEMPLATE.format(text=text, listing_id=listing_id)}
+        ]
         
-        response = requests.post(GROK_API_URL, headers=headers, json=data, timeout=30)
+        response = chat_completion(messages, provider='grok',
+                                   temperature=0.1, max_tokens=500, timeout=30, stage="exec_summary")
         
-        # Debug: print response if error
-        if response.status_code != 200:
-            print(f"API Error: {response.status_code}")
-            print(f"Response: {response.text}")
-        
-        response.raise_for_status()
-        
-        result = response.json()
-        content = result['choices'][0]['message']['content']
-        
-        # Clean up response - remove markdown code blocks if present
-        content = content.strip()
-        if '```json' in content:
-            # Extract JSON from markdown code block
-            content = content.split('```json')[1].split('```')[0]
-        elif '```' in content:
-            # Extract from generic code block
-            parts = content.split('```')
-            if len(parts) >= 2:
-                content = parts[1]
-                if content.startswith('json'):
-                    content = content[4:]
-        
-        # Try to parse JSON
-        try:
-            parsed = json.loads(content.strip())
+        parsed = parse_json_content(response['content'])
+        if parsed is not None:
             return parsed
-        except json.JSONDecodeError:
-            # Try to extract JSON object from text
-            json_match = re.search(r'\{[^{}]*\}', content, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except:
-                    pass
-            
-            # Return default if parsing fails
-            return {
-                "listing_id": listing_id,
-                "sba_eligible": "unknown",
-                "sba_evidence": "JSON parsing failed",
-                "seller_location": "unknown",
-                "asking_price": 0,
-                "sde": 0
-            }
+        
+        # Return default if parsing fails
+        return {
+            "listing_id": listing_id,
+            "sba_eligible": "unknown",
+            "sba_evidence": "JSON parsing failed",
+            "seller_location": "unknown",
+            "asking_price": 0,
+            "sde": 0
+        }
             
     except Exception as e:
         print(f"Grok API error for listing {listing_id}: {e}")
@@ -170,6 +115,21 @@ Respond with ONLY a JSON object (no markdown, no explanation) in this exact form
             "sde": 0
         }
 
+def analyze_with_grok(text: str, listing_id: int) -> Dict:
+    """
+    Analyze the extracted text with Grok without truncating it.
+    Text over the token budget is split on page boundaries, the chunks are
+    classified in parallel and merged with reduce_sba_eligible.
+    """
+    overhead = count_tokens(PROMPT_TEMPLATE.format(text='', listing_id=listing_id)) + count_tokens(SYSTEM_PROMPT)
+    budget = MAX_CONTEXT_TOKENS - overhead
+    analyze_chunk = lambda chunk: call_grok(chunk, listing_id)
+    
+    if count_tokens(text) <= budget:
+        return analyze_chunk(text)
+    
+    return map_reduce(text, analyze_chunk, budget, reduce_sba_eligible, max_workers=MAX_CHUNK_WORKERS)
+
 def process_single_cim(pdf_path: Path) -> Dict:
     """Process a single CIM file."""
     filename = pdf_path.name
@@ -183,6 +143,7 @@ def process_single_cim(pdf_path: Path) -> Dict:
     cache_file = CACHE_DIR / f"{listing_id}_simple.json"
     if cache_file.exists():
         print(f"Using cached result for listing {listing_id}")
+        record_cache_hit("result_cache", "grok-2-1212")
         with open(cache_file, 'r') as f:
             return json.load(f)
     
@@ -202,8 +163,20 @@ def process_single_cim(pdf_path: Path) -> Dict:
             "sde": 0
         }
     else:
-        # Analyze with Grok
-        result = analyze_with_grok(text, listing_id)
+        # Local classifier first; only uncertain documents go to Grok
+        local = classify_text(text)
+        if local and local["confident"]:
+            result = {
+                "listing_id": listing_id,
+                "sba_eligible": local["sba_eligible"],
+                "sba_evidence": f"local classifier (p={local['probability']:.2f})",
+                "seller_location": "unknown",
+                "asking_price": 0,
+                "sde": 0,
+                "source": "local_classifier"
+            }
+        else:
+            result = analyze_with_grok(text, listing_id)
         result["filename"] = filename
     
     # Save to cache
@@ -223,7 +196,7 @@ def test_batch(num_files: int = 5):
     print("=" * 80)
     
     # Get PDF files
-    pdf_files = list(CIM_DIR.glob('*.pdf'))[:num_files]
+    pdf_files = catalog_files(CIM_DIR)[:num_files]
     
     if not pdf_files:
         print("No PDF files found in CIM directory!")
@@ -268,7 +241,7 @@ def process_all_cims(max_workers: int = 5):
     print("=" * 80)
     
     # Get all PDF files
-    pdf_files = list(CIM_DIR.glob('*.pdf'))
+    pdf_files = catalog_files(CIM_DIR)
     total_files = len(pdf_files)
     
     print(f"Found {total_files} PDF files to process")
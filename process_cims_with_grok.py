@@ -9,27 +9,39 @@ Uses a multi-step approach:
 """
 
 import os
+import sys
 import json
 import re
-import asyncio
 import hashlib
+import argparse
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
 import PyPDF2
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import pymysql
-import pandas as pd
 from datetime import datetime
 import time
+from cim_chunking import count_tokens, prompt_overhead, map_reduce, reduce_sba_status
+from llm_provider import chat_completion, parse_json_content
+from llm_telemetry import RUN_ID, call_cost, record_cache_hit, load_ledger, summarize_ledger, print_ledger_report
+from sba_classifier import classify_text, executive_summary_text, model_fingerprint, CONFIDENCE_THRESHOLD
+from cim_tiers import TIER_POLICY, SMALL_MODEL, SMALL_TIER_TOKENS, rule_classify, select_pages, run_tiers
+from cim_results import RESULTS_LOG, repair_log, new_aggregates, append_result, compact_results, print_aggregates
+from cim_catalog import catalog_files
+from cim_job_queue import (QUEUE_DB, connect_queue, enqueue_files, reclaim_dead_leases, queue_status,
+                           run_workers, requeue_failed, print_status as print_queue_status)
 
 # Configuration
-GROK_API_KEY = os.getenv('GROK_API_KEY')
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"
 CACHE_DIR = Path('cache/sba_analysis')
 CIMS_DIR = Path('/Users/markdaoust/Developer/ql_stats/cims')
+FULL_TEXT_DIR = Path('cache/cim_fulltext')  # Written by stream_cims.py for CIMs streamed without the PDF
 MAX_WORKERS = 5  # Can handle more parallel requests with Grok
 RATE_LIMIT_DELAY = 0.5  # Grok typically has higher rate limits
+MAX_CONTEXT_TOKENS = 8000  # Per-call budget for prompt + document chunk
+MAX_CHUNK_WORKERS = 4  # Parallel chunk calls per document
+LARGE_MODEL = os.getenv('LLM_MODEL') or 'grok-2-1212'  # llm_provider honours the same override
+LOCAL_STATUS = {'yes': 'qualified', 'no': 'not_qualified'}  # Local classifier label -> sba_status
+SYSTEM_PROMPT = "You are an expert at analyzing business documents for SBA loan qualification indicators. Always respond with valid JSON."
 
 # Create cache directory
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
@@ -59,6 +71,22 @@ def load_from_cache(file_path: str) -> Optional[Dict]:
             return json.load(f)
     return None
 
+def invalidate_cache(file_path: str) -> bool:
+    """Drop the cached result so the next run re-classifies the file."""
+    cache_file = CACHE_DIR / f"{get_cache_key(file_path)}_grok.json"
+    if cache_file.exists():
+        cache_file.unlink()
+        return True
+    return False
+
+def file_sha256(file_path: str) -> str:
+    """Content hash of a PDF, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 def save_to_cache(file_path: str, result: Dict):
     """Save analysis results to cache."""
     cache_key = get_cache_key(file_path)
@@ -74,78 +102,75 @@ def extract_listing_id(filename: str) -> Optional[int]:
         return int(match.group(1))
     return None
 
-def extract_pdf_text(pdf_path: str, max_pages: int = None) -> Tuple[str, int]:
-    """Extract text from PDF file."""
+def extract_pdf_text(pdf_path: Union[str, BinaryIO], max_pages: int = None) -> Tuple[str, int]:
+    """Extract text from a PDF file path or a binary file object (e.g. a download buffer)."""
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            total_pages = len(pdf_reader.pages)
-            
-            text = ""
-            pages_to_read = min(max_pages, total_pages) if max_pages else total_pages
-            
-            for page_num in range(pages_to_read):
-                page = pdf_reader.pages[page_num]
-                text += f"\n--- Page {page_num + 1} ---\n"
-                text += page.extract_text()
-            
-            return text, total_pages
+        if isinstance(pdf_path, str):
+            with open(pdf_path, 'rb') as file:
+                return _read_pdf_text(file, max_pages)
+        return _read_pdf_text(pdf_path, max_pages)
     except Exception as e:
-        print(f"Error reading PDF {pdf_path}: {e}")
+        print(f"Error reading PDF {getattr(pdf_path, 'name', pdf_path)}: {e}")
         return "", 0
 
-def analyze_with_grok(text: str, prompt_template: str, model: str = "grok-2-1212") -> Dict:
-    """Send text to Grok for analysis."""
+def _read_pdf_text(file: BinaryIO, max_pages: int = None) -> Tuple[str, int]:
+    pdf_reader = PyPDF2.PdfReader(file)
+    total_pages = len(pdf_reader.pages)
+    
+    text = ""
+    pages_to_read = min(max_pages, total_pages) if max_pages else total_pages
+    
+    for page_num in range(pages_to_read):
+        page = pdf_reader.pages[page_num]
+        text += f"\n--- Page {page_num + 1} ---\n"
+        text += page.extract_text()
+    
+    return text, total_pages
+
+def full_text_path(cim_path: Path) -> Path:
+    """Where stream_cims.py leaves the extracted text of a CIM it did not save as a PDF."""
+    return FULL_TEXT_DIR / f"{Path(cim_path).stem}.txt"
+
+def read_full_text(text_path: Path) -> Tuple[str, int]:
+    """Page-marked text from FULL_TEXT_DIR, in the (text, pages) shape of extract_pdf_text."""
+    text = Path(text_path).read_text()
+    return text, len(re.findall(r'--- Page \d+ ---', text))
+
+def document_paths(cims_dir: Path = CIMS_DIR) -> List[Path]:
+    """
+    The catalogued PDFs, plus a cims/<stem>.pdf path for every streamed text
+    whose PDF was not kept (process_single_cim reads the text instead).
+    """
+    paths = catalog_files(cims_dir)
+    stems = {path.stem for path in paths}
+    if FULL_TEXT_DIR.is_dir():
+        paths += [Path(cims_dir) / f"{text.stem}.pdf" for text in sorted(FULL_TEXT_DIR.glob('*.txt'))
+                  if text.stem not in stems]
+    return paths
+
+def call_grok(text: str, prompt_template: str, model: str = LARGE_MODEL, stage: str = None) -> Dict:
+    """Send a single chunk of text to Grok for analysis."""
     try:
-        # Limit text length to avoid token limits
-        max_chars = 30000  # Grok has higher limits than GPT-4
-        if len(text) > max_chars:
-            text = text[:max_chars] + "\n[Text truncated for analysis]"
-        
-        headers = {
-            "Authorization": f"Bearer {GROK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": "You are an expert at analyzing business documents for SBA loan qualification indicators. Always respond with valid JSON."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt_template.format(content=text)
-                }
-            ],
-            "temperature": 0.1,
-            "max_tokens": 1000,
-            "response_format": {"type": "json_object"}  # Force JSON response
-        }
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_template.replace('{content}', text)}
+        ]
         
-        response = requests.post(GROK_API_URL, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
+        response = chat_completion(messages, provider='grok', model=model, json_mode=True,
+                                   temperature=0.1, max_tokens=1000, timeout=30, stage=stage)
+        content = response['content']
         
-        result = response.json()
-        content = result['choices'][0]['message']['content']
+        parsed = parse_json_content(content)
+        if parsed is not None:
+            return parsed
         
-        # Parse JSON response
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            # Try to extract JSON from the response
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {
-                    "sba_status": "undetermined",
-                    "confidence": 0.0,
-                    "evidence": [content],
-                    "page_numbers": [],
-                    "analysis_note": "Could not parse structured response"
-                }
+        return {
+            "sba_status": "undetermined",
+            "confidence": 0.0,
+            "evidence": [content],
+            "page_numbers": [],
+            "analysis_note": "Could not parse structured response"
+        }
             
     except requests.exceptions.RequestException as e:
         print(f"Grok API error: {e}")
@@ -164,14 +189,21 @@ def analyze_with_grok(text: str, prompt_template: str, model: str = "grok-2-1212
             "error": str(e)
         }
 
-def analyze_executive_summary(pdf_text: str) -> Dict:
-    """Analyze Executive Summary for SBA indicators using Grok."""
+def analyze_with_grok(text: str, prompt_template: str, model: str = LARGE_MODEL, stage: str = None) -> Dict:
+    """
+    Analyze text with Grok, covering the whole document.
+    Text that does not fit the token budget is split into page-aligned chunks that
+    are classified in parallel and merged with reduce_sba_status.
+    """
+    budget = MAX_CONTEXT_TOKENS - prompt_overhead(prompt_template, SYSTEM_PROMPT)
+    analyze_chunk = lambda chunk: call_grok(chunk, prompt_template, model, stage)
     
-    # Extract first 3-4 pages (usually contains exec summary)
-    pages = pdf_text.split('--- Page')[:5]
-    exec_summary = ''.join(pages)
+    if count_tokens(text) <= budget:
+        return analyze_chunk(text)
     
-    prompt = """
+    return map_reduce(text, analyze_chunk, budget, reduce_sba_status, max_workers=MAX_CHUNK_WORKERS)
+
+EXEC_SUMMARY_PROMPT = """
     Analyze this Executive Summary section of a business listing to determine SBA pre-qualification status.
     
     IMPORTANT: Return your response as a valid JSON object with this exact structure:
@@ -208,13 +240,8 @@ def analyze_executive_summary(pdf_text: str) -> Dict:
     Content to analyze:
     {content}
     """
-    
-    return analyze_with_grok(exec_summary, prompt)
 
-def analyze_full_cim(pdf_text: str) -> Dict:
-    """Analyze full CIM for SBA indicators if Executive Summary is inconclusive."""
-    
-    prompt = """
+FULL_CIM_PROMPT = """
     Analyze this full business listing document for SBA loan eligibility indicators.
     The Executive Summary was inconclusive, so search the entire document carefully.
     
@@ -260,8 +287,40 @@ def analyze_full_cim(pdf_text: str) -> Dict:
     Content to analyze:
     {content}
     """
+
+# Results classified under a different version are re-queued by cim_drift.py.
+# Bump PROMPT_REVISION when the classification logic changes outside the prompts.
+PROMPT_REVISION = 1
+
+def pipeline_version(policy: Dict = None) -> str:
+    """
+    Hash of everything that decides a classification: the prompts, the large
+    model, the saved local classifier and its confidence threshold and, for
+    tiered runs, the small model, its page budget and the acceptance
+    thresholds (prefetch_after only changes latency).
+    """
+    parts = [str(PROMPT_REVISION), LARGE_MODEL, SYSTEM_PROMPT, EXEC_SUMMARY_PROMPT, FULL_CIM_PROMPT,
+             f"classifier={model_fingerprint()}", f"threshold={CONFIDENCE_THRESHOLD}"]
+    if policy is not None:
+        policy = {**TIER_POLICY, **policy}
+        parts += [SMALL_MODEL, str(SMALL_TIER_TOKENS), f"rules={policy['rules']}", f"small={policy['small']}"]
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:12]
+
+PIPELINE_VERSION = pipeline_version()
+
+def analyze_executive_summary(pdf_text: str) -> Dict:
+    """Analyze Executive Summary for SBA indicators using Grok."""
+    
+    # Extract first 3-4 pages (usually contains exec summary)
+    pages = pdf_text.split('--- Page')[:5]
+    exec_summary = ''.join(pages)
+    
+    return analyze_with_grok(exec_summary, EXEC_SUMMARY_PROMPT, stage="exec_summary")
+
+def analyze_full_cim(pdf_text: str) -> Dict:
+    """Analyze full CIM for SBA indicators if Executive Summary is inconclusive."""
     
-    return analyze_with_grok(pdf_text, prompt)
+    return analyze_with_grok(pdf_text, FULL_CIM_PROMPT, stage="full_cim")
 
 def check_database_title(listing_id: int) -> Dict:
     """Check if listing title in database indicates SBA status."""
@@ -289,8 +348,100 @@ def check_database_title(listing_id: int) -> Dict:
         
     return {"title_indicates_sba": None, "title": result.get('name', '') if result else ''}
 
-def process_single_cim(cim_path: Path) -> Dict:
-    """Process a single CIM file for SBA status using Grok."""
+def rules_tier(pdf_text: str, model: Dict = None) -> Dict:
+    """Tier 1: regex rules, falling back to the local classifier (the saved model by default). No API calls."""
+    result = rule_classify(pdf_text)
+    if result["confidence"] > 0:
+        return result
+    
+    local = classify_text(executive_summary_text(pdf_text), model)
+    if local and local["sba_eligible"] in LOCAL_STATUS:
+        return {
+            "sba_status": LOCAL_STATUS[local["sba_eligible"]],
+            "confidence": local["probability"],
+            "evidence": [f"Local classifier: SBA eligible {local['sba_eligible']} (p={local['probability']:.2f})"],
+        }
+    return result
+
+def small_model_tier(pdf_text: str) -> Dict:
+    """Tier 2: the small model on the first pages plus the pages that mention SBA or financing."""
+    return analyze_with_grok(select_pages(pdf_text), EXEC_SUMMARY_PROMPT, model=SMALL_MODEL, stage="tier_small")
+
+def build_tiers() -> List[Dict]:
+    """Tiers for run_tiers, cheapest first, with a cost estimate used by the frontier report."""
+    overhead = prompt_overhead(EXEC_SUMMARY_PROMPT, SYSTEM_PROMPT)
+    return [
+        {"name": "rules", "fn": rules_tier, "estimate_cost": lambda text: 0.0},
+        {"name": "small", "fn": small_model_tier,
+         "estimate_cost": lambda text: call_cost(SMALL_MODEL, count_tokens(select_pages(text)) + overhead, 200)},
+        {"name": "large", "fn": analyze_full_cim,
+         "estimate_cost": lambda text: call_cost(LARGE_MODEL, count_tokens(text) + overhead, 300)},
+    ]
+
+def classify_document(pdf_text: str, name: str = "", use_local: bool = True, policy: Dict = None) -> Dict:
+    """
+    Classify extracted CIM text. The local classifier answers confident cases;
+    otherwise Grok reads the executive summary and, if that is not conclusive,
+    the full CIM. With a tier policy, the rules -> small model -> large model
+    scheduler in cim_tiers is used instead. Returns the fields to merge into
+    the document result.
+    """
+    if policy is not None:
+        return run_tiers(pdf_text, build_tiers(), policy)
+    
+    if use_local:
+        local = classify_text(executive_summary_text(pdf_text))
+        if local and local["confident"]:
+            return {
+                "sba_status": LOCAL_STATUS[local["sba_eligible"]],
+                "confidence": local["probability"],
+                "evidence": [f"Local classifier: SBA eligible {local['sba_eligible']} (p={local['probability']:.2f})"],
+                "source": "local_classifier",
+                "model": "sba_classifier",
+            }
+    
+    exec_analysis = analyze_executive_summary(pdf_text)
+    time.sleep(RATE_LIMIT_DELAY)  # Rate limiting
+    
+    if exec_analysis.get("confidence", 0) > 0.7:
+        # High confidence from executive summary
+        return {**exec_analysis, "source": "executive_summary"}
+    
+    # Analyze full CIM if needed
+    print(f"  Analyzing full CIM for {name}...")
+    full_analysis = analyze_full_cim(pdf_text)
+    time.sleep(RATE_LIMIT_DELAY)  # Rate limiting
+    
+    # Combine evidence from both analyses
+    fields = {
+        "sba_status": full_analysis.get("sba_status", "undetermined"),
+        "confidence": max(
+            exec_analysis.get("confidence", 0),
+            full_analysis.get("confidence", 0)
+        ),
+        "evidence": (
+            exec_analysis.get("evidence", []) + 
+            full_analysis.get("evidence", [])
+        ),
+        "source": "full_analysis"
+    }
+    
+    # Add additional details if found
+    if "financial_metrics" in full_analysis:
+        fields["financial_metrics"] = full_analysis["financial_metrics"]
+    if "business_characteristics" in full_analysis:
+        fields["business_characteristics"] = full_analysis["business_characteristics"]
+    
+    return fields
+
+def process_single_cim(cim_path: Path, on_state: Callable[[str], None] = None, policy: Dict = None) -> Dict:
+    """
+    Process a single CIM file for SBA status using Grok.
+    When the PDF is not on disk, the text stream_cims.py extracted for it is used.
+    on_state, if given, is called with 'extracting' and 'classifying' as the
+    document moves through the pipeline (the job queue uses it to renew leases).
+    policy switches classification to the tiered scheduler (see cim_tiers).
+    """
     
     # Extract listing ID
     listing_id = extract_listing_id(cim_path.name)
@@ -301,10 +452,12 @@ def process_single_cim(cim_path: Path) -> Dict:
             "sba_status": "error"
         }
     
-    # Check cache first
+    # Check cache first (errored results and results from another pipeline version are redone)
+    version = pipeline_version(policy)
     cached = load_from_cache(str(cim_path))
-    if cached:
+    if cached and cached.get("sba_status") != "error" and cached.get("pipeline_version", version) == version:
         print(f"Using cached result for {cim_path.name}")
+        record_cache_hit("result_cache", cached.get("model"))
         return cached
     
     print(f"Processing {cim_path.name} (ID: {listing_id}) with Grok")
@@ -318,16 +471,30 @@ def process_single_cim(cim_path: Path) -> Dict:
         "confidence": 0.0,
         "evidence": [],
         "source": "unknown",
-        "model": "grok-2-1212"
+        "model": LARGE_MODEL,
+        "pipeline_version": version
     }
     
     try:
+        # Fingerprint the PDF (or its streamed text) so drift detection can tell when it changes
+        source = cim_path if cim_path.exists() else full_text_path(cim_path)
+        stat = source.stat()
+        result["pdf_sha256"] = file_sha256(str(source))
+        result["pdf_size"] = stat.st_size
+        result["pdf_mtime"] = stat.st_mtime
+        
         # Step 1: Check database title
         db_info = check_database_title(listing_id)
         result["database_title"] = db_info["title"]
         
-        # Step 2: Extract PDF text (more pages for Grok's larger context)
-        pdf_text, total_pages = extract_pdf_text(str(cim_path), max_pages=20)
+        # Step 2: Extract the full PDF text (long CIMs are chunked, not truncated)
+        if on_state:
+            on_state("extracting")
+        if source == cim_path:
+            pdf_text, total_pages = extract_pdf_text(str(cim_path))
+        else:
+            pdf_text, total_pages = read_full_text(source)
+            result["text_source"] = "stream_cims"
         result["total_pages"] = total_pages
         
         if not pdf_text:
@@ -336,37 +503,10 @@ def process_single_cim(cim_path: Path) -> Dict:
             save_to_cache(str(cim_path), result)
             return result
         
-        # Step 3: Analyze Executive Summary with Grok
-        exec_analysis = analyze_executive_summary(pdf_text)
-        time.sleep(RATE_LIMIT_DELAY)  # Rate limiting
-        
-        if exec_analysis.get("confidence", 0) > 0.7:
-            # High confidence from executive summary
-            result.update(exec_analysis)
-            result["source"] = "executive_summary"
-        else:
-            # Step 4: Analyze full CIM if needed
-            print(f"  Analyzing full CIM for {cim_path.name}...")
-            full_analysis = analyze_full_cim(pdf_text)
-            time.sleep(RATE_LIMIT_DELAY)  # Rate limiting
-            
-            # Combine evidence from both analyses
-            result["sba_status"] = full_analysis.get("sba_status", "undetermined")
-            result["confidence"] = max(
-                exec_analysis.get("confidence", 0),
-                full_analysis.get("confidence", 0)
-            )
-            result["evidence"] = (
-                exec_analysis.get("evidence", []) + 
-                full_analysis.get("evidence", [])
-            )
-            result["source"] = "full_analysis"
-            
-            # Add additional details if found
-            if "financial_metrics" in full_analysis:
-                result["financial_metrics"] = full_analysis["financial_metrics"]
-            if "business_characteristics" in full_analysis:
-                result["business_characteristics"] = full_analysis["business_characteristics"]
+        # Steps 3-4: Local classifier, then Grok on the executive summary and full CIM
+        if on_state:
+            on_state("classifying")
+        result.update(classify_document(pdf_text, cim_path.name, policy=policy))
         
         # Step 5: Consider database title as supporting evidence
         if db_info["title_indicates_sba"] is not None:
@@ -390,84 +530,66 @@ def process_single_cim(cim_path: Path) -> Dict:
     
     return result
 
-def process_all_cims(limit: int = None, start_from: int = 0) -> pd.DataFrame:
-    """Process all CIM files in parallel using Grok."""
+def process_all_cims(limit: int = None, workers: int = MAX_WORKERS, retry_failed: bool = False,
+                     queue_db: Path = QUEUE_DB, policy: Dict = None) -> Dict:
+    """
+    Process CIM files through the durable job queue using Grok.
+    New PDFs in CIMS_DIR (and CIMs streamed to text only) are enqueued, finished documents are never redone, and
+    documents left in flight by a crashed run are picked up again. limit caps
+    how many documents this run processes. Returns aggregates over all results.
+    """
+    conn = connect_queue(queue_db)
+    added = enqueue_files(conn, document_paths(CIMS_DIR), extract_listing_id)
+    reclaimed = reclaim_dead_leases(conn)
+    if retry_failed:
+        print(f"Re-queued {requeue_failed(conn)} failed documents")
+    
+    counts = queue_status(conn)
+    runnable = counts['pending'] + counts['extracting'] + counts['classifying']
+    total = min(runnable, limit) if limit else runnable
+    print(f"Job queue: {added} new, {reclaimed} reclaimed from a crashed run, "
+          f"{counts['done']} already done, {counts['failed']} failed")
+    print(f"Processing {total} CIM files with {workers} workers")
+    print(f"Using Grok API with model: {LARGE_MODEL}")
+    
+    # Stream each result to disk as it finishes; keep only running aggregates in memory
+    repair_log(RESULTS_LOG)
+    run_aggregates = new_aggregates()
+    
+    def handle(job, set_state):
+        return process_single_cim(Path(job['path']), on_state=set_state, policy=policy)
+    
+    def report(job, result):
+        append_result(result, run_aggregates)
+        status = result.get("sba_status", "unknown")
+        confidence = result.get("confidence", 0) or 0
+        print(f"  [{run_aggregates['total']}/{total}] {job['doc_key']}: {status} (confidence: {confidence:.2f})")
+    
+    run_workers(handle, queue_db, workers=workers, limit=limit,
+                is_failure=lambda result: result.get("sba_status") == "error",
+                on_result=report)
+    conn.close()
     
-    # Get list of CIM files
-    cim_files = sorted(list(CIMS_DIR.glob("*.pdf")))
+    print(f"\nThis run: {run_aggregates['total']} documents {run_aggregates['status_counts']}")
     
-    # Apply start and limit
-    if start_from:
-        cim_files = cim_files[start_from:]
-    if limit:
-        cim_files = cim_files[:limit]
+    # Compact the log (latest result per file, across runs) into the final outputs
+    output_file = Path('sba_cim_analysis_grok.json')
+    aggregates = compact_results(RESULTS_LOG, output_file, parquet_path=Path('sba_cim_analysis_grok.parquet'))
+    print(f"Results saved to {output_file}")
     
-    print(f"Found {len(cim_files)} CIM files to process (starting from index {start_from})")
-    print(f"Using Grok API with model: grok-2-1212")
+    print_aggregates(aggregates)
     
-    results = []
+    # Actual cost and latency for this run, from the per-call ledger
+    print_ledger_report(summarize_ledger(load_ledger(), RUN_ID))
     
-    # Process in parallel with rate limiting
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(process_single_cim, cim): cim for cim in cim_files}
-        
-        completed = 0
-        for future in as_completed(futures):
-            cim = futures[future]
-            completed += 1
-            try:
-                result = future.result()
-                results.append(result)
-                
-                # Progress update
-                status = result.get("sba_status", "unknown")
-                confidence = result.get("confidence", 0)
-                print(f"  [{completed}/{len(cim_files)}] {cim.name}: {status} (confidence: {confidence:.2f})")
-                
-            except Exception as e:
-                print(f"  Failed to process {cim.name}: {e}")
-                results.append({
-                    "file": cim.name,
-                    "error": str(e),
-                    "sba_status": "error"
-                })
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(results)
-    
-    # Save results
-    output_file = 'sba_cim_analysis_grok.json'
-    df.to_json(output_file, orient='records', indent=2)
-    print(f"\nResults saved to {output_file}")
-    
-    # Summary statistics
-    print("\nSBA Status Summary (Grok Analysis):")
-    print(df['sba_status'].value_counts())
-    
-    print("\nConfidence Distribution:")
-    if 'confidence' in df.columns:
-        print(f"High confidence (>0.7): {len(df[df['confidence'] > 0.7])}")
-        print(f"Medium confidence (0.4-0.7): {len(df[(df['confidence'] >= 0.4) & (df['confidence'] <= 0.7)])}")
-        print(f"Low confidence (<0.4): {len(df[df['confidence'] < 0.4])}")
-    
-    undetermined = df[df['sba_status'] == 'undetermined']
-    if not undetermined.empty:
-        print(f"\nUndetermined cases requiring human review: {len(undetermined)}")
-        print(undetermined[['file', 'listing_id', 'confidence']].head(10))
-    
-    # Calculate estimated cost
-    total_processed = len(df[df['sba_status'] != 'error'])
-    estimated_cost = total_processed * 0.003  # Grok is typically cheaper than GPT-4
-    print(f"\nEstimated API cost: ${estimated_cost:.2f}")
-    
-    return df
+    return aggregates
 
 def test_grok_connection():
     """Test Grok API connection with a simple request."""
     print("Testing Grok API connection...")
     
     test_prompt = "Respond with a JSON object containing a single field 'status' with value 'connected'"
-    test_result = analyze_with_grok("Test", test_prompt)
+    test_result = analyze_with_grok("Test", test_prompt, stage="connection_test")
     
     if test_result.get('status') == 'connected' or not test_result.get('error'):
         print("✓ Grok API connection successful!")
@@ -477,42 +599,36 @@ def test_grok_connection():
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='SBA pre-qualification analysis from CIMs using Grok')
+    parser.add_argument('--limit', type=int, default=None, help='Process at most N documents this run')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Parallel documents')
+    parser.add_argument('--retry-failed', action='store_true', help='Re-queue documents that failed before')
+    parser.add_argument('--status', action='store_true', help='Show job queue status and exit')
+    parser.add_argument('--queue', default=str(QUEUE_DB), help='Job queue database')
+    parser.add_argument('--skip-connection-test', action='store_true')
+    parser.add_argument('--tiered', action='store_true', help='Rules -> small model -> large model escalation')
+    parser.add_argument('--rules-threshold', type=float, default=TIER_POLICY['rules'])
+    parser.add_argument('--small-threshold', type=float, default=TIER_POLICY['small'])
+    parser.add_argument('--prefetch-after', type=float, default=TIER_POLICY['prefetch_after'],
+                        help='Seconds before the next tier is started speculatively')
+    args = parser.parse_args()
+    
+    if args.status:
+        print_queue_status(connect_queue(Path(args.queue)))
+        sys.exit(0)
+    
     print("SBA Pre-Qualification Analysis from CIMs using Grok")
     print("=" * 60)
     
     # Test API connection first
-    if not test_grok_connection():
+    if not args.skip_connection_test and not test_grok_connection():
         print("\nPlease check your Grok API key and try again.")
-        exit(1)
-    
-    print("\nProcessing options:")
-    print("1. Test with 5 CIMs")
-    print("2. Process first 50 CIMs")
-    print("3. Process all CIMs")
-    print("4. Resume from specific index")
-    
-    choice = input("\nEnter choice (1-4): ").strip()
-    
-    if choice == "1":
-        print("\nProcessing 5 CIMs for testing...")
-        results_df = process_all_cims(limit=5)
-    elif choice == "2":
-        print("\nProcessing first 50 CIMs...")
-        results_df = process_all_cims(limit=50)
-    elif choice == "3":
-        confirm = input("This will process all 252 CIMs. Estimated cost: ~$0.75. Continue? (yes/no): ")
-        if confirm.lower() == "yes":
-            results_df = process_all_cims()
-        else:
-            print("Cancelled.")
-    elif choice == "4":
-        start_idx = int(input("Enter starting index (0-251): "))
-        limit = input("Enter limit (or press Enter for all remaining): ").strip()
-        limit = int(limit) if limit else None
-        results_df = process_all_cims(limit=limit, start_from=start_idx)
-    else:
-        print("Invalid choice.")
+        sys.exit(1)
+    
+    policy = None
+    if args.tiered:
+        policy = {'rules': args.rules_threshold, 'small': args.small_threshold,
+                  'prefetch_after': args.prefetch_after}
     
-    if 'results_df' in locals():
-        print("\nSample results:")
-        print(results_df[['file', 'listing_id', 'sba_status', 'confidence', 'source']].head(10))
\ No newline at end of file
+    process_all_cims(limit=args.limit, workers=args.workers, retry_failed=args.retry_failed,
+                     queue_db=Path(args.queue), policy=policy)
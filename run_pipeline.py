@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Run the analysis scripts as a dependency graph instead of by hand.
+
+Each stage declares its script, the files it reads and the files it writes;
+the order follows from which stage writes what the next one reads. A stage's
+key is a hash of its command, its script and every local module the script
+imports, and the contents of its input files. A stage runs only when its key
+differs from the last successful run or an output is missing, and stages whose
+inputs are ready run in parallel. Because keys hash file contents, a stage that
+reruns but writes identical outputs does not trigger its dependents.
+
+Stages marked db read the production database, which cannot be hashed: they
+run when their code or file inputs change, or with --refresh-db. With
+--offline they never run; existing outputs are taken as current (facts/ is
+seeded from the CSVs instead of the database).
+
+Usage:
+    python3 run_pipeline.py                    # Everything that is out of date
+    python3 run_pipeline.py chart_data         # One stage (and what it needs)
+    python3 run_pipeline.py chart_data.js      # Same, by output file
+    python3 run_pipeline.py --dry-run          # Show what would run
+    python3 run_pipeline.py --refresh-db --jobs 4
+    python3 run_pipeline.py --offline
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Set
+
+STATE_FILE = Path('cache/pipeline_state.json')
+LOG_DIR = Path('cache/pipeline_logs')
+CIM_RESULTS = 'cim_analysis_results_*.json'
+FACTS = 'facts/*.npy'
+
+STAGES = {
+    'launch_dates': {
+        'script': 'launch_date_analysis_v2.py',
+        'inputs': [CIM_RESULTS],
+        'outputs': ['launch_date_analysis_v2.csv', 'launch_date_summary_v2.json'],
+        'db': True,
+    },
+    'sba_usage': {
+        'script': 'sba_actual_usage_analysis.py',
+        'inputs': [CIM_RESULTS],
+        'outputs': ['sba_actual_usage_analysis.csv', 'sba_usage_summary.json'],
+        'db': True,
+    },
+    'facts': {
+        'script': 'listing_facts.py',
+        'args': ['build'],
+        'offline_args': ['import-csv'],
+        'inputs': [CIM_RESULTS, 'launch_date_analysis_v2.csv', 'sba_actual_usage_analysis.csv'],
+        'outputs': ['facts/schema.json', 'facts/id.npy'],
+        'db': True,
+    },
+    'sba_usage_timing': {
+        'script': 'sba_actual_usage_analysis.py',
+        'args': ['--time-to-close'],
+        'inputs': [FACTS],
+        'outputs': ['sba_usage_time_to_close.json'],
+    },
+    'corrected_sba': {
+        'script': 'correct_sba_classifications.py',
+        'inputs': ['launch_date_analysis_v2.csv'],
+        'outputs': ['launch_date_analysis_corrected.csv', 'sba_classification_corrections.csv'],
+    },
+    'sba_controlled': {
+        'script': 'sba_controlled_analysis.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_controlled_analysis.json'],
+    },
+    'sba_title': {
+        'script': 'sba_title_analysis.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_title_analysis.json', 'sba_title_analysis.csv'],
+    },
+    'sba_conflicts': {
+        'script': 'investigate_sba_conflicts.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_conflicts_analysis.csv'],
+    },
+    'cost_benefit': {
+        'script': 'sba_cost_benefit_analysis.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_cost_benefit_analysis.json'],
+    },
+    'inquiry_counts': {
+        'script': 'analyze_inquiry_counts.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_analysis_with_inquiries.csv', 'inquiry_stats.js'],
+    },
+    'median_cis': {
+        'script': 'bootstrap_engine.py',
+        'inputs': [FACTS],
+        'outputs': ['bootstrap_median_cis.csv'],
+    },
+    'verification_data': {
+        'script': 'generate_verification_data.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_verification_data.js'],
+    },
+    'enhanced_verification': {
+        'script': 'generate_enhanced_verification.py',
+        'inputs': [FACTS],
+        'outputs': ['sba_verification_enhanced.js'],
+    },
+    'chart_data': {
+        'script': 'generate_chart_data.py',
+        'inputs': [FACTS],
+        'outputs': ['chart_data.js'],
+    },
+    'listing_json': {
+        'script': 'generate_listing_json.py',
+        'inputs': [FACTS],
+        'outputs': ['listing_data.js'],
+    },
+}
+
+# --- Graph ------------------------------------------------------------------
+
+def _matches(pattern: str, output: str) -> bool:
+    return Path(output).match(pattern) if any(c in pattern for c in '*?[') else pattern == output
+
+def upstream(stages: Dict = STAGES) -> Dict[str, Set[str]]:
+    """Stage -> the stages that write something it reads."""
+    return {name: {other for other, spec in stages.items() if other != name
+                   for pattern in stage['inputs'] for output in spec['outputs'] if _matches(pattern, output)}
+            for name, stage in stages.items()}
+
+def select(targets: List[str], stages: Dict = STAGES) -> List[str]:
+    """The named stages (or the stages writing the named files) and everything they depend on, in order."""
+    needs = upstream(stages)
+    wanted = set()
+    for target in targets:
+        found = [name for name, spec in stages.items() if target == name or target in spec['outputs']]
+        if not found:
+            raise SystemExit(f"Unknown stage or output: {target}")
+        wanted.update(found)
+    pending = list(wanted)
+    while pending:
+        for dependency in needs[pending.pop()] - wanted:
+            wanted.add(dependency)
+            pending.append(dependency)
+    return topological_order(stages, wanted)
+
+def topological_order(stages: Dict = STAGES, subset: Set[str] = None) -> List[str]:
+    needs = upstream(stages)
+    subset = set(stages) if subset is None else subset
+    order, done = [], set()
+    while len(order) < len(subset):
+        ready = [name for name in stages if name in subset and name not in done and needs[name] & subset <= done]
+        if not ready:
+            raise SystemExit(f"Cycle among stages: {sorted(subset - done)}")
+        order.extend(ready)
+        done.update(ready)
+    return order
+
+# --- Hashing ----------------------------------------------------------------
+
+def local_modules(script: str, seen: Set[str] = None) -> Set[str]:
+    """The script and every module in this directory it imports, directly or not."""
+    seen = set() if seen is None else seen
+    if script in seen or not Path(script).exists():
+        return seen
+    seen.add(script)
+    tree = ast.parse(Path(script).read_text(), filename=script)
+    for node in ast.walk(tree):
+        names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else \
+            [node.module] if isinstance(node, ast.ImportFrom) and node.module and not node.level else []
+        for name in names:
+            module = name.split('.')[0] + '.py'
+            if Path(module).exists():
+                local_modules(module, seen)
+    return seen
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def input_files(stage: Dict) -> List[Path]:
+    files = []
+    for pattern in stage['inputs']:
+        files.extend(sorted(Path('.').glob(pattern)) if any(c in pattern for c in '*?[') else [Path(pattern)])
+    return files
+
+def stage_key(name: str, stage: Dict, offline: bool = False) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps([name, stage['script'], stage_args(stage, offline)]).encode())
+    for module in sorted(local_modules(stage['script'])):
+        digest.update(f"code {module} {_file_hash(Path(module))}\n".encode())
+    for path in input_files(stage):
+        digest.update(f"input {path} {_file_hash(path) if path.exists() else 'missing'}\n".encode())
+    return digest.hexdigest()
+
+def stage_args(stage: Dict, offline: bool) -> List[str]:
+    return stage.get('offline_args', stage.get('args', [])) if offline else stage.get('args', [])
+
+# --- State ------------------------------------------------------------------
+
+def load_state(path: Path = STATE_FILE) -> Dict:
+    if not Path(path).exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state: Dict, path: Path = STATE_FILE):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def out_of_date(name: str, stage: Dict, state: Dict, key: str) -> Optional[str]:
+    """Why the stage has to run, or None if it is current."""
+    missing = [output for output in stage['outputs'] if not Path(output).exists()]
+    if missing:
+        return f"missing {', '.join(missing)}"
+    if name not in state:
+        return "never run"
+    if state[name]['key'] != key:
+        return "inputs or code changed"
+    return None
+
+# --- Running ----------------------------------------------------------------
+
+def run_stage(name: str, stage: Dict, offline: bool) -> Dict:
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    start = time.time()
+    with open(LOG_DIR / f'{name}.log', 'w') as log:
+        result = subprocess.run([sys.executable, stage['script']] + stage_args(stage, offline),
+                                stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    return {'returncode': result.returncode, 'seconds': time.time() - start}
+
+def run_pipeline(names: List[str], jobs: int = None, force: bool = False, refresh_db: bool = False,
+                 offline: bool = False, dry_run: bool = False, stages: Dict = STAGES) -> Dict[str, str]:
+    """
+    Run the out-of-date stages among names, in parallel where the graph
+    allows. Keys are computed when a stage's upstream has finished, so they
+    see the files upstream just wrote. Returns stage -> outcome.
+    """
+    state = load_state()
+    needs = upstream(stages)
+    outcome: Dict[str, str] = {}
+    running = {}
+    jobs = jobs or os.cpu_count() or 1
+
+    def decide(name: str) -> Optional[str]:
+        stage = stages[name]
+        if any(outcome.get(dependency) in ('failed', 'blocked') for dependency in needs[name] & set(names)):
+            return 'blocked'
+        key = stage_key(name, stage, offline)
+        reason = 'forced' if force else out_of_date(name, stage, state, key)
+        if stage.get('db') and refresh_db and not offline:
+            reason = reason or 'database refresh'
+        if stage.get('db') and offline and 'offline_args' not in stage:
+            if all(Path(output).exists() for output in stage['outputs']):
+                state[name] = {**state.get(name, {}), 'key': key}
+                return 'current'
+            return 'blocked'
+        if dry_run and reason is None and any(outcome.get(d) == 'ran' for d in needs[name]):
+            reason = 'if upstream outputs change'
+        if reason is None:
+            return 'current'
+        if dry_run:
+            print(f"  would run {name:<22} ({reason})")
+            return 'ran'
+        print(f"  running   {name:<22} ({reason})")
+        running[executor.submit(run_stage, name, stage, offline)] = (name, key)
+        return None
+
+    print(f"Pipeline: {len(names)} stages, {jobs} jobs{' (dry run)' if dry_run else ''}")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while len(outcome) < len(names):
+            in_flight = {name for name, _ in running.values()}
+            for name in names:
+                if name in outcome or name in in_flight:
+                    continue
+                if needs[name] & set(names) <= set(outcome):
+                    decision = decide(name)
+                    if decision:
+                        outcome[name] = decision
+                        if decision == 'blocked':
+                            print(f"  blocked   {name}")
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                result = future.result()
+                if result['returncode'] == 0:
+                    state[name] = {'key': key, 'seconds': round(result['seconds'], 2),
+                                   'finished_at': datetime.now().isoformat()}
+                    outcome[name] = 'ran'
+                    print(f"  done      {name:<22} {result['seconds']:.1f}s")
+                else:
+                    outcome[name] = 'failed'
+                    print(f"  FAILED    {name:<22} exit {result['returncode']}, see {LOG_DIR / (name + '.log')}")
+            if not dry_run:
+                save_state(state)
+
+    if not dry_run:
+        save_state(state)
+    counts = {kind: sum(1 for value in outcome.values() if value == kind) for kind in ('ran', 'current', 'failed', 'blocked')}
+    print(f"{'Would run' if dry_run else 'Ran'} {counts['ran']}, up to date {counts['current']}, "
+          f"failed {counts['failed']}, blocked {counts['blocked']}")
+    return outcome
+
+def print_graph(stages: Dict = STAGES):
+    needs = upstream(stages)
+    for name in topological_order(stages):
+        stage = stages[name]
+        after = f" <- {', '.join(sorted(needs[name]))}" if needs[name] else ''
+        print(f"{name:<22} {stage['script']}{' [db]' if stage.get('db') else ''}{after}")
+        print(f"{'':<22}   -> {', '.join(stage['outputs'])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the analysis pipeline')
+    parser.add_argument('targets', nargs='*', help='Stages or output files (default: all)')
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='Run the selected stages even if current')
+    parser.add_argument('--refresh-db', action='store_true', help='Rerun the stages that read the database')
+    parser.add_argument('--offline', action='store_true', help='Never touch the database')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--graph', action='store_true', help='Print the stages and their dependencies')
+    args = parser.parse_args()
+
+    if args.graph:
+        print_graph()
+        sys.exit(0)
+    selected = select(args.targets) if args.targets else topological_order()
+    results = run_pipeline(selected, args.jobs, args.force, args.refresh_db, args.offline, args.dry_run)
+    sys.exit(1 if any(value in ('failed', 'blocked') for value in results.values()) else 0)
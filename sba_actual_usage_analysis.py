@@ -2,6 +2,12 @@
 """
 Analyze SBA-prequalified deals to see what percentage actually used SBA financing
 and how that affected outcomes.
+
+The time-to-close comparison reads the listing fact table, which is itself
+built from this script's CSV, so it runs separately once the table exists:
+
+    python3 sba_actual_usage_analysis.py                  # LOI usage (database), writes the CSV
+    python3 sba_actual_usage_analysis.py --time-to-close  # Days on market / under LOI from facts/
 """
 
 import pymysql
@@ -10,6 +16,7 @@ import json
 from datetime import datetime
 from pathlib import Path
 import numpy as np
+import sys
 
 def get_db_connection():
     return pymysql.connect(
@@ -208,45 +215,8 @@ def analyze_sba_actual_usage():
         print(f"  Average commission: ${avg_comm_no_sba:,.0f}")
         print(f"  Median commission: ${median_comm_no_sba:,.0f}")
     
-    # 5. Time Analysis (need to load from our previous analysis)
-    print("\n5. TIME TO CLOSE ANALYSIS")
-    print("-" * 40)
-    
-    # Load the launch date analysis to get time metrics
-    try:
-        launch_df = pd.read_csv('launch_date_analysis_v2.csv')
-        
-        # Merge with our SBA usage data
-        merged = pd.merge(df[df['status'] == 'sold'], 
-                         launch_df[['id', 'days_on_market', 'days_under_loi', 'days_to_loi']], 
-                         on='id', 
-                         how='left')
-        
-        # Split by actual SBA usage
-        with_sba_time = merged[merged['winning_loi_sba'] == True]
-        without_sba_time = merged[merged['winning_loi_sba'] == False]
-        
-        if len(with_sba_time) > 0 and with_sba_time['days_on_market'].notna().any():
-            print(f"\nSold with SBA financing (n={len(with_sba_time)}):")
-            print(f"  Median days on market: {with_sba_time['days_on_market'].median():.0f}")
-            print(f"  Mean days on market: {with_sba_time['days_on_market'].mean():.0f}")
-            
-            if with_sba_time['days_under_loi'].notna().any():
-                print(f"  Median days under LOI: {with_sba_time['days_under_loi'].median():.0f}")
-        
-        if len(without_sba_time) > 0 and without_sba_time['days_on_market'].notna().any():
-            print(f"\nSold without SBA financing (n={len(without_sba_time)}):")
-            print(f"  Median days on market: {without_sba_time['days_on_market'].median():.0f}")
-            print(f"  Mean days on market: {without_sba_time['days_on_market'].mean():.0f}")
-            
-            if without_sba_time['days_under_loi'].notna().any():
-                print(f"  Median days under LOI: {without_sba_time['days_under_loi'].median():.0f}")
-    
-    except FileNotFoundError:
-        print("\nNote: Could not load time analysis data")
-    
-    # 6. Key Insights
-    print("\n6. KEY INSIGHTS")
+    # 5. Key Insights
+    print("\n5. KEY INSIGHTS")
     print("-" * 40)
     
     print(f"\n• Of {total_prequalified} SBA-prequalified listings:")
@@ -280,6 +250,48 @@ def analyze_sba_actual_usage():
     
     return df
 
+def _number(value):
+    return None if pd.isna(value) else float(value)
+
+def analyze_time_to_close():
+    """Time on market for sold SBA-prequalified deals, split by whether the winning LOI used SBA."""
+    from listing_facts import load_facts
+
+    print("\nTIME TO CLOSE BY ACTUAL FINANCING")
+    print("-" * 40)
+    
+    facts = load_facts(['id', 'status', 'sba_status', 'winning_loi_sba', 'days_on_market', 'days_under_loi',
+                        'days_to_loi'])
+    sold = facts[(facts['sba_status'] == 'yes') & (facts['status'] == 'sold')]
+    
+    # Split by actual SBA usage (unknown usage is left out of both)
+    with_sba_time = sold[sold['winning_loi_sba'] == True]
+    without_sba_time = sold[sold['winning_loi_sba'] == False]
+    
+    summary = {'timestamp': datetime.now().isoformat()}
+    for label, group, key in [('with', with_sba_time, 'used_sba'), ('without', without_sba_time, 'used_other')]:
+        summary[key] = {
+            'count': len(group),
+            'median_days_on_market': _number(group['days_on_market'].median()),
+            'mean_days_on_market': _number(group['days_on_market'].mean()),
+            'median_days_under_loi': _number(group['days_under_loi'].median()),
+        }
+        if len(group) > 0 and group['days_on_market'].notna().any():
+            print(f"\nSold {label} SBA financing (n={len(group)}):")
+            print(f"  Median days on market: {group['days_on_market'].median():.0f}")
+            print(f"  Mean days on market: {group['days_on_market'].mean():.0f}")
+            
+            if group['days_under_loi'].notna().any():
+                print(f"  Median days under LOI: {group['days_under_loi'].median():.0f}")
+    
+    with open('sba_usage_time_to_close.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    print("\n📁 Summary saved to sba_usage_time_to_close.json")
+    return summary
+
 if __name__ == "__main__":
-    df = analyze_sba_actual_usage()
-    print("\n✅ SBA actual usage analysis complete!")
\ No newline at end of file
+    if '--time-to-close' in sys.argv[1:]:
+        analyze_time_to_close()
+    else:
+        df = analyze_sba_actual_usage()
+        print("\n✅ SBA actual usage analysis complete!")
\ No newline at end of file
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Local SBA eligibility classifier trained on the existing Grok labels.
+Hashed word n-grams, TF-IDF weighted, feed a multinomial logistic regression whose probabilities
+are calibrated with temperature scaling on cross-validated predictions. The CIM
+pipelines only escalate a document to Grok when the local prediction is below
+the confidence threshold.
+
+Usage:
+    python3 sba_classifier.py train      # Fit on cim_analysis_results_*.json and save the model
+    python3 sba_classifier.py evaluate   # Cross-validated agreement, coverage and latency
+    python3 sba_classifier.py classify path/to/cim.pdf [...]
+"""
+
+import re
+import sys
+import json
+import time
+import zlib
+import hashlib
+import glob
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from scipy.optimize import minimize, minimize_scalar
+
+from cim_chunking import split_pages
+
+MODEL_FILE = Path('cache/sba_classifier.npz')
+TEXT_CACHE_DIR = Path('cache/cim_text')
+LABEL_FILES = 'cim_analysis_results_*.json'
+CIMS_DIR = Path('/Users/markdaoust/Developer/ql_stats/cims')
+
+CLASSES = ['yes', 'no', 'unknown']
+N_FEATURES = 2 ** 18
+NGRAM_RANGE = (1, 3)  # "sba eligible yes" is a single trigram feature
+EXEC_SUMMARY_PAGES = 8  # The labels were produced from the first 8 pages
+L2_PENALTY = 1e-4
+CV_FOLDS = 5
+CONFIDENCE_THRESHOLD = 0.9  # Below this the document goes to Grok
+ACCEPT_CLASSES = ('yes', 'no')  # "unknown" always escalates; Grok may still find the answer
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+_model_cache = {}
+_model_lock = threading.Lock()
+_fingerprint_cache = {}
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def featurize(text: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed n-gram features with sublinear term frequency (IDF is applied later)."""
+    tokens = tokenize(text)
+    counts = {}
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(tokens) - n + 1):
+            index = zlib.crc32(' '.join(tokens[i:i + n]).encode()) & (n_features - 1)
+            counts[index] = counts.get(index, 0) + 1
+
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    return indices, values
+
+def build_matrix(texts: List[str], n_features: int = N_FEATURES) -> sparse.csr_matrix:
+    """Stack featurised documents into a sparse term-frequency matrix."""
+    indptr = [0]
+    indices = []
+    values = []
+    for text in texts:
+        idx, val = featurize(text, n_features)
+        indices.append(idx)
+        values.append(val)
+        indptr.append(indptr[-1] + len(idx))
+    return sparse.csr_matrix(
+        (np.concatenate(values) if values else [], np.concatenate(indices) if indices else [], indptr),
+        shape=(len(texts), n_features)
+    )
+
+def fit_idf(X_tf: sparse.csr_matrix) -> np.ndarray:
+    """Smoothed inverse document frequency per hashed feature."""
+    n_docs = X_tf.shape[0]
+    df = np.bincount(X_tf.indices, minlength=X_tf.shape[1])
+    return (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+def apply_idf(X_tf: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+    """Scale term frequencies by IDF and L2-normalise each row."""
+    X = sparse.csr_matrix(X_tf.multiply(idf[None, :]))
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ X)
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+def train_logreg(X: sparse.csr_matrix, y: np.ndarray, l2: float = L2_PENALTY) -> Tuple[np.ndarray, np.ndarray]:
+    """Fit a multinomial logistic regression with L-BFGS. Returns (weights, bias)."""
+    n_samples, n_features = X.shape
+    n_classes = len(CLASSES)
+    targets = np.eye(n_classes)[y]
+    # Only features seen in training can get non-zero weight; optimise over those
+    active = np.unique(X.indices)
+    X_active = X[:, active]
+
+    def loss_and_grad(params):
+        W = params[:-n_classes].reshape(len(active), n_classes)
+        b = params[-n_classes:]
+        probs = _softmax(X_active @ W + b)
+        loss = -np.log(np.clip(probs[np.arange(n_samples), y], 1e-12, None)).mean() + 0.5 * l2 * np.sum(W * W)
+        diff = (probs - targets) / n_samples
+        grad_W = X_active.T @ diff + l2 * W
+        grad_b = diff.sum(axis=0)
+        return loss, np.concatenate([np.asarray(grad_W).ravel(), grad_b])
+
+    params = np.zeros(len(active) * n_classes + n_classes)
+    fit = minimize(loss_and_grad, params, jac=True, method='L-BFGS-B', options={'maxiter': 500})
+
+    weights = np.zeros((n_features, n_classes), dtype=np.float32)
+    weights[active] = fit.x[:-n_classes].reshape(len(active), n_classes)
+    return weights, fit.x[-n_classes:]
+
+def fit_temperature(logits: np.ndarray, y: np.ndarray) -> float:
+    """Temperature that minimises the negative log-likelihood of held-out logits."""
+    def nll(log_t):
+        probs = _softmax(logits / np.exp(log_t))
+        return -np.log(np.clip(probs[np.arange(len(y)), y], 1e-12, None)).mean()
+
+    fit = minimize_scalar(nll, bounds=(np.log(0.05), np.log(20.0)), method='bounded')
+    return float(np.exp(fit.x))
+
+def stratified_folds(y: np.ndarray, k: int = CV_FOLDS, seed: int = 42) -> np.ndarray:
+    """Fold number for each sample, balanced across classes."""
+    rng = np.random.default_rng(seed)
+    folds = np.zeros(len(y), dtype=int)
+    for label in np.unique(y):
+        members = rng.permutation(np.where(y == label)[0])
+        folds[members] = np.arange(len(members)) % k
+    return folds
+
+def cross_val_logits(X_tf: sparse.csr_matrix, y: np.ndarray, k: int = CV_FOLDS) -> np.ndarray:
+    """Out-of-fold logits for every document, with IDF fitted inside each fold."""
+    folds = stratified_folds(y, k)
+    logits = np.zeros((len(y), len(CLASSES)))
+    for fold in range(k):
+        test = folds == fold
+        idf = fit_idf(X_tf[~test])
+        weights, bias = train_logreg(apply_idf(X_tf[~test], idf), y[~test])
+        logits[test] = apply_idf(X_tf[test], idf) @ weights + bias
+    return logits
+
+def load_labels(pattern: str = LABEL_FILES) -> Dict[str, str]:
+    """Filename -> sba_eligible label, later result files overriding earlier ones."""
+    labels = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r') as f:
+            for record in json.load(f):
+                label = record.get('sba_eligible')
+                if record.get('filename') and label:
+                    labels[record['filename']] = label if label in CLASSES else 'unknown'
+    return labels
+
+def executive_summary_text(text: str, max_pages: int = EXEC_SUMMARY_PAGES) -> str:
+    """First pages of already-extracted PDF text, matching what the labels were made from."""
+    return ''.join(split_pages(text)[:max_pages])
+
+def get_cim_text(pdf_path: Path, max_pages: int = EXEC_SUMMARY_PAGES) -> str:
+    """Executive-summary text for a CIM, cached under cache/cim_text."""
+    pdf_path = Path(pdf_path)
+    cache_file = TEXT_CACHE_DIR / f"{pdf_path.stem}.txt"
+    if cache_file.exists():
+        return cache_file.read_text()
+
+    import PyPDF2
+    text = ""
+    try:
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page_num in range(min(max_pages, len(pdf_reader.pages))):
+                text += f"\n--- Page {page_num + 1} ---\n"
+                text += pdf_reader.pages[page_num].extract_text()
+    except Exception as e:
+        print(f"Error reading PDF {pdf_path}: {e}")
+        return ""
+
+    TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(text)
+    return text
+
+def load_training_data(cims_dir: Path = CIMS_DIR) -> Tuple[List[str], np.ndarray, List[str]]:
+    """Texts, label indices and filenames for every labelled CIM with extractable text."""
+    texts, y, names = [], [], []
+    for filename, label in sorted(load_labels().items()):
+        pdf_path = cims_dir / filename
+        if not pdf_path.exists() and not (TEXT_CACHE_DIR / f"{pdf_path.stem}.txt").exists():
+            continue
+        text = get_cim_text(pdf_path)
+        if text.strip():
+            texts.append(text)
+            y.append(CLASSES.index(label))
+            names.append(filename)
+    return texts, np.array(y, dtype=int), names
+
+def train(cims_dir: Path = CIMS_DIR, model_file: Path = MODEL_FILE) -> Dict:
+    """Fit the classifier and its temperature, then save the model."""
+    texts, y, _ = load_training_data(cims_dir)
+    if len(texts) == 0:
+        raise ValueError("No labelled CIM text found; check CIMS_DIR and the cim_analysis_results files")
+
+    X_tf = build_matrix(texts)
+    temperature = fit_temperature(cross_val_logits(X_tf, y), y)
+    idf = fit_idf(X_tf)
+    weights, bias = train_logreg(apply_idf(X_tf, idf), y)
+
+    model_file.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(model_file, weights=weights, bias=bias, idf=idf, temperature=temperature,
+                        classes=np.array(CLASSES), n_features=N_FEATURES)
+    print(f"Trained on {len(texts)} CIMs (temperature {temperature:.2f}), saved to {model_file}")
+    return load_model(model_file, reload=True)
+
+def out_of_fold_models(cims_dir: Path = CIMS_DIR, k: int = CV_FOLDS) -> Dict[str, Dict]:
+    """
+    Filename -> a model trained without that CIM's fold, for scoring the
+    classifier against the same labels it learns from.
+    """
+    texts, y, names = load_training_data(cims_dir)
+    if len(texts) == 0:
+        return {}
+
+    X_tf = build_matrix(texts)
+    folds = stratified_folds(y, k)
+    models = {}
+    for fold in range(k):
+        test = folds == fold
+        if not test.any():
+            continue
+        train_y = y[~test]
+        temperature = fit_temperature(cross_val_logits(X_tf[~test], train_y, k), train_y)
+        idf = fit_idf(X_tf[~test])
+        weights, bias = train_logreg(apply_idf(X_tf[~test], idf), train_y)
+        model = {'weights': weights, 'bias': bias, 'idf': idf, 'temperature': temperature,
+                 'classes': list(CLASSES), 'n_features': N_FEATURES}
+        for i in np.where(test)[0]:
+            models[names[i]] = model
+    return models
+
+def load_model(model_file: Path = MODEL_FILE, reload: bool = False) -> Optional[Dict]:
+    """Load the saved model once per process. Returns None if it has not been trained."""
+    key = str(model_file)
+    with _model_lock:
+        if key in _model_cache and not reload:
+            return _model_cache[key]
+        if not Path(model_file).exists():
+            _model_cache[key] = None
+            return None
+        data = np.load(model_file)
+        _model_cache[key] = {
+            'weights': data['weights'],
+            'bias': data['bias'],
+            'idf': data['idf'],
+            'temperature': float(data['temperature']),
+            'classes': [str(c) for c in data['classes']],
+            'n_features': int(data['n_features']),
+        }
+        return _model_cache[key]
+
+def model_fingerprint(model_file: Path = MODEL_FILE) -> str:
+    """Short sha256 of the saved model, or 'untrained'. Re-hashed only when the file changes."""
+    path = Path(model_file)
+    if not path.exists():
+        return 'untrained'
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime)
+    with _model_lock:
+        if key not in _fingerprint_cache:
+            _fingerprint_cache[key] = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+        return _fingerprint_cache[key]
+
+def predict_proba(text: str, model: Dict) -> np.ndarray:
+    """Calibrated class probabilities for one document."""
+    indices, values = featurize(text, model['n_features'])
+    values = values * model['idf'][indices]
+    norm = np.linalg.norm(values)
+    if norm:
+        values /= norm
+    logits = values @ model['weights'][indices] + model['bias']
+    return _softmax((logits / model['temperature'])[None, :])[0]
+
+def classify_text(text: str, model: Dict = None, threshold: float = CONFIDENCE_THRESHOLD) -> Optional[Dict]:
+    """
+    Classify executive-summary text locally. Returns the label, its calibrated
+    probability, whether the pipelines may accept it without Grok, and the latency.
+    Returns None when no model has been trained.
+    """
+    model = model or load_model()
+    if model is None:
+        return None
+
+    start = time.perf_counter()
+    probs = predict_proba(text, model)
+    best = int(np.argmax(probs))
+    label = model['classes'][best]
+    return {
+        'sba_eligible': label,
+        'probability': float(probs[best]),
+        'probabilities': {c: float(p) for c, p in zip(model['classes'], probs)},
+        'confident': bool(probs[best] >= threshold and label in ACCEPT_CLASSES),
+        'latency_ms': (time.perf_counter() - start) * 1000,
+    }
+
+def evaluate(cims_dir: Path = CIMS_DIR, threshold: float = CONFIDENCE_THRESHOLD) -> Dict:
+    """Cross-validated agreement with the existing labels, escalation rate and latency."""
+    texts, y, _ = load_training_data(cims_dir)
+    X_tf = build_matrix(texts)
+    logits = cross_val_logits(X_tf, y)
+    temperature = fit_temperature(logits, y)
+    probs = _softmax(logits / temperature)
+    predicted = probs.argmax(axis=1)
+    confidence = probs.max(axis=1)
+
+    accepted = (confidence >= threshold) & np.isin(predicted, [CLASSES.index(c) for c in ACCEPT_CLASSES])
+    confusion = np.zeros((len(CLASSES), len(CLASSES)), dtype=int)
+    np.add.at(confusion, (y, predicted), 1)
+
+    # Latency of the full per-document path: featurise + predict with a fitted model
+    idf = fit_idf(X_tf)
+    weights, bias = train_logreg(apply_idf(X_tf, idf), y)
+    model = {'weights': weights, 'bias': bias, 'idf': idf, 'temperature': temperature,
+             'classes': CLASSES, 'n_features': N_FEATURES}
+    latencies = np.array([classify_text(text, model)['latency_ms'] for text in texts])
+
+    report = {
+        'documents': len(y),
+        'temperature': temperature,
+        'agreement': float((predicted == y).mean()),
+        'per_class_agreement': {c: float((predicted[y == i] == i).mean()) if (y == i).any() else None
+                                for i, c in enumerate(CLASSES)},
+        'confusion': confusion.tolist(),
+        'threshold': threshold,
+        'accepted_locally': int(accepted.sum()),
+        'escalated_to_grok': int((~accepted).sum()),
+        'agreement_when_accepted': float((predicted[accepted] == y[accepted]).mean()) if accepted.any() else None,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+    }
+
+    print("\n" + "=" * 60)
+    print("LOCAL SBA CLASSIFIER (5-fold cross-validation)")
+    print("=" * 60)
+    print(f"Documents: {report['documents']} (temperature {temperature:.2f})")
+    print(f"Agreement with existing labels: {report['agreement']:.1%}")
+    for label, value in report['per_class_agreement'].items():
+        if value is not None:
+            print(f"  {label}: {value:.1%}")
+    print("Confusion (rows = label, cols = predicted, order yes/no/unknown):")
+    for row in confusion:
+        print(f"  {row.tolist()}")
+    print(f"At threshold {threshold}: {report['accepted_locally']} accepted locally, "
+          f"{report['escalated_to_grok']} escalated to Grok")
+    if report['agreement_when_accepted'] is not None:
+        print(f"Agreement on locally accepted documents: {report['agreement_when_accepted']:.1%}")
+    print(f"Per-document latency p50/p99: {report['latency_ms_p50']:.2f} ms / {report['latency_ms_p99']:.2f} ms")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local SBA eligibility classifier')
+    parser.add_argument('command', choices=['train', 'evaluate', 'classify'])
+    parser.add_argument('files', nargs='*', help='PDFs to classify')
+    parser.add_argument('--cims-dir', default=str(CIMS_DIR))
+    parser.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(Path(args.cims_dir))
+    elif args.command == 'evaluate':
+        evaluate(Path(args.cims_dir), args.threshold)
+    else:
+        if load_model() is None:
+            print(f"No model at {MODEL_FILE}; run 'python3 sba_classifier.py train' first")
+            sys.exit(1)
+        for path in args.files:
+            result = classify_text(get_cim_text(Path(path)), threshold=args.threshold)
+            action = 'accept' if result['confident'] else 'escalate to Grok'
+            print(f"{Path(path).name}: {result['sba_eligible']} (p={result['probability']:.2f}, "
+                  f"{result['latency_ms']:.2f} ms) -> {action}")
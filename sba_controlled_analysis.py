@@ -3,12 +3,14 @@
 Controlled analysis of SBA impact, accounting for deal size and focusing on true trade-offs.
 """
 
-import pandas as pd
 import numpy as np
 from scipy import stats
 import json
 from datetime import datetime
 
+from bootstrap_engine import SIZE_LABELS, ci_records, deal_size_bucket, format_ci, median_cis
+from listing_facts import load_facts
+
 def analyze_sba_controlled():
     """
     Analyze SBA impact controlling for deal size and other confounding factors.
@@ -16,16 +18,7 @@ def analyze_sba_controlled():
     
     # Load all necessary data
     print("Loading data...")
-    launch_df = pd.read_csv('launch_date_analysis_v2.csv')
-    sba_usage_df = pd.read_csv('sba_actual_usage_analysis.csv')
-    
-    # Merge datasets
-    df = pd.merge(
-        launch_df,
-        sba_usage_df[['id', 'winning_loi_sba', 'has_sba_loi', 'total_lois', 'sba_lois']],
-        on='id',
-        how='left'
-    )
+    df = load_facts()
     
     print("\n" + "="*80)
     print("CONTROLLED SBA ANALYSIS - ACCOUNTING FOR DEAL SIZE")
@@ -42,13 +35,8 @@ def analyze_sba_controlled():
     deals_with_size = df[df['closed_commission'].notna() & (df['closed_commission'] > 0)]
     
     # Categorize by deal size
-    size_bins = [0, 250000, 500000, 1000000, 2000000, 5000000, float('inf')]
-    size_labels = ['<$250K', '$250-500K', '$500K-1M', '$1-2M', '$2-5M', '>$5M']
-    deals_with_size['size_category'] = pd.cut(
-        deals_with_size['estimated_deal_size'],
-        bins=size_bins,
-        labels=size_labels
-    )
+    size_labels = SIZE_LABELS
+    deals_with_size['size_category'] = deal_size_bucket(deals_with_size['closed_commission'])
     
     # Analyze SBA usage by deal size
     print("\nSBA Prequalification by Deal Size:")
@@ -95,6 +83,10 @@ def analyze_sba_controlled():
         
         metrics = ['days_on_market', 'days_under_loi', 'days_to_loi', 'total_inquiries', 'closed_commission']
         
+        # Bootstrap CIs, resampling within deal-size buckets (commission, which defines them, without)
+        sweet_cis = median_cis(sweet_spot, metrics, 'sba_status', ['yes', 'no'], 'size_category',
+                               unstratified=['closed_commission'])
+        
         for metric in metrics:
             sba_median = sba_eligible_sweet[metric].median()
             non_sba_median = non_sba_sweet[metric].median()
@@ -115,9 +107,9 @@ def analyze_sba_controlled():
             pct_diff = (diff / non_sba_median * 100) if non_sba_median != 0 else 0
             
             print(f"  {metric}:")
-            print(f"    SBA: {sba_median:.1f}")
-            print(f"    Non-SBA: {non_sba_median:.1f}")
-            print(f"    Difference: {diff:+.1f} ({pct_diff:+.1f}%){sig}")
+            print(f"    SBA: {sba_median:.1f} {format_ci(sweet_cis, metric, 'yes')}")
+            print(f"    Non-SBA: {non_sba_median:.1f} {format_ci(sweet_cis, metric, 'no')}")
+            print(f"    Difference: {diff:+.1f} ({pct_diff:+.1f}%){sig} {format_ci(sweet_cis, metric, 'difference')}")
             if pvalue:
                 print(f"    P-value: {pvalue:.4f}")
     
@@ -131,6 +123,7 @@ def analyze_sba_controlled():
         (df['status'] == 'sold') &
         (df['closed_commission'].notna())
     ].copy()
+    sba_eligible_sold['size_category'] = deal_size_bucket(sba_eligible_sold['closed_commission'])
     
     # Split by actual usage
     used_sba = sba_eligible_sold[sba_eligible_sold['winning_loi_sba'] == True]
@@ -142,7 +135,11 @@ def analyze_sba_controlled():
     
     print("\nComparing outcomes WITHIN SBA-eligible deals:")
     
-    for metric in ['days_on_market', 'days_under_loi', 'total_inquiries', 'closed_commission']:
+    usage_metrics = ['days_on_market', 'days_under_loi', 'total_inquiries', 'closed_commission']
+    usage_cis = median_cis(sba_eligible_sold, usage_metrics, 'winning_loi_sba', [True, False], 'size_category',
+                           unstratified=['closed_commission'])
+    
+    for metric in usage_metrics:
         if len(used_sba) > 0 and len(didnt_use_sba) > 0:
             used_median = used_sba[metric].median()
             didnt_median = didnt_use_sba[metric].median()
@@ -151,9 +148,9 @@ def analyze_sba_controlled():
             pct_diff = (diff / didnt_median * 100) if didnt_median != 0 else 0
             
             print(f"  {metric}:")
-            print(f"    Used SBA: {used_median:.1f}")
-            print(f"    Didn't use SBA: {didnt_median:.1f}")
-            print(f"    Difference: {diff:+.1f} ({pct_diff:+.1f}%)")
+            print(f"    Used SBA: {used_median:.1f} {format_ci(usage_cis, metric, True)}")
+            print(f"    Didn't use SBA: {didnt_median:.1f} {format_ci(usage_cis, metric, False)}")
+            print(f"    Difference: {diff:+.1f} ({pct_diff:+.1f}%) {format_ci(usage_cis, metric, 'difference')}")
     
     # 4. SUCCESS RATE ANALYSIS
     print("\n4. SUCCESS RATE ANALYSIS")
@@ -302,6 +299,10 @@ def analyze_sba_controlled():
             'sba_usage_rate': 0.43,
             'deals_per_year_sba': sba_deals_per_year,
             'deals_per_year_non_sba': non_sba_deals_per_year
+        },
+        'median_cis': {
+            'sweet_spot_500k_2m': ci_records(sweet_cis) if len(sba_eligible_sweet) > 0 and len(non_sba_sweet) > 0 else [],
+            'sba_eligible_by_usage': ci_records(usage_cis)
         }
     }
     
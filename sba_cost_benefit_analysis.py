@@ -9,6 +9,8 @@ import numpy as np
 from datetime import datetime, timedelta
 import json
 
+from listing_facts import load_facts
+
 def calculate_opportunity_cost(principal, days_delay, annual_return_rate=0.10):
     """
     Calculate opportunity cost of delayed capital deployment.
@@ -30,8 +32,9 @@ def analyze_sba_cost_benefit():
     Comprehensive cost/benefit analysis of SBA vs alternative financing.
     """
     
-    # Load our analysis data
-    df = pd.read_csv('sba_analysis_with_inquiries.csv')
+    # SBA-prequalified listings from the fact table
+    df = load_facts()
+    df = df[df['sba_status'] == 'yes']
     
     # Filter to sold deals only
     sold_df = df[df['status'] == 'sold'].copy()
@@ -10,6 +10,19 @@ import json
 import re
 from datetime import datetime
 
+from listing_facts import load_facts
+
+# Patterns that identify SBA mentions in titles
+SBA_TITLE_PATTERNS = [
+    r'\bSBA\b',
+    r'SBA[- ]?(?:pre)?[- ]?quali',
+    r'SBA[- ]?eligible',
+    r'SBA[- ]?approved',
+    r'SBA[- ]?PQ\b',
+    r'Small Business Administration',
+    r'Financing Available',  # Sometimes used as proxy
+]
+
 def analyze_sba_titles():
     """
     Analyze which listings advertised SBA in their titles and the impact on inquiries.
@@ -17,16 +30,7 @@ def analyze_sba_titles():
     
     # Load data
     print("Loading data...")
-    launch_df = pd.read_csv('launch_date_analysis_v2.csv')
-    sba_usage_df = pd.read_csv('sba_actual_usage_analysis.csv')
-    
-    # Merge datasets
-    df = pd.merge(
-        launch_df,
-        sba_usage_df[['id', 'winning_loi_sba', 'has_sba_loi']],
-        on='id',
-        how='left'
-    )
+    df = load_facts()
     
     print("\n" + "="*80)
     print("SBA TITLE ADVERTISING ANALYSIS")
@@ -36,19 +40,8 @@ def analyze_sba_titles():
     print("\n1. IDENTIFYING SBA ADVERTISING IN TITLES")
     print("-"*50)
     
-    # Create patterns to identify SBA mentions in titles
-    sba_patterns = [
-        r'\bSBA\b',
-        r'SBA[- ]?(?:pre)?[- ]?quali',
-        r'SBA[- ]?eligible',
-        r'SBA[- ]?approved',
-        r'SBA[- ]?PQ\b',
-        r'Small Business Administration',
-        r'Financing Available',  # Sometimes used as proxy
-    ]
-    
     # Combine patterns
-    sba_pattern = '|'.join(sba_patterns)
+    sba_pattern = '|'.join(SBA_TITLE_PATTERNS)
     
     # Check each listing name
     df['sba_in_title'] = df['name'].str.contains(sba_pattern, case=False, na=False)
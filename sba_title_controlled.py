@@ -7,13 +7,16 @@ import pandas as pd
 import numpy as np
 from scipy import stats
 
+from listing_facts import load_facts
+
 def analyze_controlled_inquiries():
     """
     Compare inquiry rates controlling for title advertising.
     """
     
-    # Load the title analysis data
-    df = pd.read_csv('sba_title_analysis.csv')
+    # Title flags, SBA status and inquiries from the fact table
+    df = load_facts(['id', 'name', 'sba_in_title', 'sba_status', 'total_inquiries', 'status',
+                     'has_sba_loi', 'total_lois'])
     
     print("\n" + "="*80)
     print("CONTROLLED INQUIRY ANALYSIS - ADVERTISED SBA ONLY")
@@ -98,11 +101,8 @@ This is our best natural experiment!
     print("\n5. INQUIRY QUALITY VS QUANTITY")
     print("-"*50)
     
-    # Load the usage data to check conversion
-    usage_df = pd.read_csv('sba_actual_usage_analysis.csv')
-    
-    # Merge with our title data
-    merged = pd.merge(df, usage_df[['id', 'has_sba_loi', 'total_lois']], on='id', how='left')
+    # LOI counts are already in the fact table
+    merged = df
     
     # For advertised vs not, check LOI conversion
     advertised_merged = merged[merged['sba_in_title'] == True]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+One-pass CIM download and text extraction.
+Instead of downloading every CIM into cims/ and globbing the directory later,
+each PDF is fetched into a spooled buffer (drive_downloader.fetch_to_buffer),
+verified, and handed straight to extract_pdf_text. Only the text is written:
+
+- cache/cim_fulltext/<name>.txt   full document text, page-marked like extract_pdf_text
+- cache/cim_text/<name>.txt       executive summary, the text cache sba_classifier reads
+
+<name> is the stem the PDF would have in cims/, so the text lines up with
+files downloaded the normal way. --keep-pdf also saves the PDF; without it,
+process_cims_with_grok.py queues the CIM anyway and classifies the full text.
+
+Usage:
+    python3 stream_cims.py --limit 50                 # Locate with drive_crawler, stream, extract
+    python3 stream_cims.py --from-index --keep-pdf    # Every CIM selected by drive_index, PDFs kept
+"""
+
+import json
+import time
+import argparse
+from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+
+from download_cims_from_drive import cim_output_path, get_drive_listings
+from drive_downloader import fetch_to_buffer, save_buffer, get_session
+from process_cims_with_grok import FULL_TEXT_DIR, extract_pdf_text
+from sba_classifier import TEXT_CACHE_DIR, executive_summary_text
+
+MANIFEST_FILE = 'stream_extract_results.json'
+
+def stream_items_from_crawl(limit: int = None) -> List[Dict]:
+    """Listings' CIMs located by drive_crawler."""
+    from drive_crawler import find_cims
+    found = find_cims(get_drive_listings(limit))
+    return [{'listing_id': listing_id, 'file_id': file['id'], 'name': file['name'],
+             'md5': file.get('md5Checksum'), 'size': file.get('size')}
+            for listing_id, file in sorted(found.items()) if file]
+
+def stream_items_from_index(limit: int = None) -> List[Dict]:
+    """Listings' CIMs selected from the drive_index database."""
+    import drive_index
+    conn = drive_index.connect_index()
+    selected = drive_index.select_cims(conn)
+    conn.close()
+    items = [{'listing_id': listing_id, 'file_id': file['file_id'], 'name': file['name'],
+              'md5': file['md5'], 'size': file['size']}
+             for listing_id, file in sorted(selected.items())]
+    return items[:limit]
+
+def stream_extract(item: Dict, keep_pdf: bool = False, session=None) -> Dict:
+    """Fetch one CIM into memory, extract its text and write the text caches."""
+    pdf_path = cim_output_path(item['listing_id'], item['name'])
+    result = {'listing_id': item['listing_id'], 'file_name': pdf_path.name, 'ok': False,
+              'pages': 0, 'bytes': 0, 'error': None}
+
+    buffer, download = fetch_to_buffer(item['file_id'], item.get('md5'), item.get('size'), session=session)
+    result['bytes'] = download['bytes']
+    if buffer is None:
+        result['error'] = download['error']
+        return result
+
+    with buffer:
+        if keep_pdf:
+            save_buffer(buffer, pdf_path)
+        text, pages = extract_pdf_text(buffer)
+
+    if not text:
+        result['error'] = 'No text extracted'
+        return result
+
+    FULL_TEXT_DIR.mkdir(parents=True, exist_ok=True)
+    TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    (FULL_TEXT_DIR / f"{pdf_path.stem}.txt").write_text(text)
+    (TEXT_CACHE_DIR / f"{pdf_path.stem}.txt").write_text(executive_summary_text(text))
+    result.update({'ok': True, 'pages': pages})
+    return result
+
+def stream_all(items: List[Dict], workers: int = 8, keep_pdf: bool = False) -> List[Dict]:
+    session = get_session()
+    start = time.time()
+
+    def run(item):
+        result = stream_extract(item, keep_pdf, session)
+        status = f"{result['pages']} pages" if result['ok'] else f"FAILED ({result['error']})"
+        print(f"  {result['file_name']}: {status}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, items))
+
+    elapsed = time.time() - start
+    megabytes = sum(r['bytes'] for r in results) / 1e6
+    print(f"\nExtracted {sum(r['ok'] for r in results)}/{len(results)} CIMs, {megabytes:.1f} MB "
+          f"in {elapsed:.1f}s ({len(results) / elapsed * 60 if elapsed else 0:.1f} CIMs/min)")
+    print(f"Text written to {FULL_TEXT_DIR}/ and {TEXT_CACHE_DIR}/" + (" (PDFs kept)" if keep_pdf else ""))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download CIMs straight into text extraction')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--from-index', action='store_true', help='Use the CIMs selected by drive_index.py')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--keep-pdf', action='store_true', help='Also save the PDFs to cims/')
+    args = parser.parse_args()
+
+    items = stream_items_from_index(args.limit) if args.from_index else stream_items_from_crawl(args.limit)
+    print(f"Streaming {len(items)} CIMs...")
+    results = stream_all(items, args.workers, args.keep_pdf)
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {MANIFEST_FILE}")
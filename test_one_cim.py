@@ -9,12 +9,10 @@ import PyPDF2
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
+from llm_provider import chat_completion, parse_json_content
 
 load_dotenv()
 
-GROK_API_KEY = os.getenv('GROK_API_KEY')
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"
-
 def extract_full_text(pdf_path: str, max_pages: int = 10) -> str:
     """Extract text from PDF."""
     try:
@@ -57,48 +55,29 @@ Return a JSON object with these fields:
 
 Return ONLY the JSON object, no other text."""
 
-    headers = {
-        "Authorization": f"Bearer {GROK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "grok-2-1212",
-        "messages": [
-            {"role": "user", "content": prompt.format(text=text[:10000])}
-        ],
-        "temperature": 0.1,
-        "max_tokens": 500
-    }
+    messages = [{"role": "user", "content": prompt.format(text=text[:10000])}]
     
     print("Sending request to Grok API...")
-    response = requests.post(GROK_API_URL, headers=headers, json=data, timeout=30)
+    try:
+        response = chat_completion(messages, provider='grok',
+                                   temperature=0.1, max_tokens=500, timeout=30, max_retries=0)
+    except requests.exceptions.RequestException as e:
+        print(f"Error: {e}")
+        if getattr(e, 'response', None) is not None:
+            print(f"Status: {e.response.status_code}")
+            print(e.response.text)
+        return None
     
-    print(f"Status: {response.status_code}")
+    print(f"Latency: {response['latency']:.2f}s")
+    content = response['content']
+    print(f"\nRaw response:\n{content}\n")
     
-    if response.status_code == 200:
-        result = response.json()
-        content = result['choices'][0]['message']['content']
-        print(f"\nRaw response:\n{content}\n")
-        
-        # Try to parse as JSON
-        try:
-            # Clean up response
-            content = content.strip()
-            if content.startswith('```'):
-                content = content.split('```')[1]
-                if content.startswith('json'):
-                    content = content[4:]
-                content = content.split('```')[0]
-            
-            parsed = json.loads(content.strip())
-            print(f"Parsed JSON:\n{json.dumps(parsed, indent=2)}")
-            return parsed
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            print(f"Trying to clean: {content[:200]}")
-    else:
-        print(f"Error: {response.text}")
+    parsed = parse_json_content(content)
+    if parsed is not None:
+        print(f"Parsed JSON:\n{json.dumps(parsed, indent=2)}")
+        return parsed
+    
+    print(f"JSON parse error, raw content: {content[:200]}")
     
     return None
 
@@ -1,7 +1,9 @@
 import pandas as pd
 
-# Load the CSV and check title analysis
-df = pd.read_csv('launch_date_analysis_v2.csv')
+from listing_facts import load_facts
+
+# Load the fact table and check title analysis
+df = load_facts()
 
 # More comprehensive SBA title detection
 sba_patterns = [